@@ -14,14 +14,42 @@ This package provides:
     - Feldman-Cousins confidence intervals
     - Flux and E³J(E) spectrum calculation
     - Publication-quality plotting
+    - Columnar results store (Arrow IPC) readable via `load_results`
     - Text + JSON logging
     - CLI entry point: `python -m cbspec`
 
-The main entry point for programmatic use is `run_pipeline` in `main.py`
+The main entry point for programmatic use is `run_pipeline` in `main.py`;
+for notebooks, `Pipeline` in `pipeline.py` keeps stage results in memory and
+recomputes only what a configuration change affects.
+
+Public names are resolved lazily (PEP 562 module __getattr__): `import cbspec`
+loads no heavy dependency, and matplotlib, pandas, pyarrow and FCpy are
+imported only by the pipeline step that uses them.
 """
 
-from cbspec.main import run_pipeline
+import importlib
+
+# Public name → defining module, imported on first attribute access
+_LAZY_ATTRS = {
+    "run_pipeline": "cbspec.main",
+    "Pipeline": "cbspec.pipeline",
+    "load_results": "cbspec.results_store",
+}
 
 __all__ = [
     "run_pipeline",
-]
\ No newline at end of file
+    "Pipeline",
+    "load_results",
+]
+
+
+def __getattr__(name):
+    if name in _LAZY_ATTRS:
+        value = getattr(importlib.import_module(_LAZY_ATTRS[name]), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
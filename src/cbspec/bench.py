@@ -0,0 +1,522 @@
+"""
+Benchmarks for the cbspec package.
+
+Import time:
+    python -m cbspec bench import
+    python -m cbspec bench import --repeat 10 --budget_s 0.3 --module cbspec.stages
+
+Each target module is imported in a fresh interpreter (python -X importtime),
+so modules already cached in the current process cannot hide a regression.
+The benchmark fails when a target exceeds its time budget or pulls in one of
+HEAVY_MODULES -- dependencies that must only be imported by the pipeline step
+that needs them (ingestion, CSV export, results store, plotting).
+
+Stage suite (asv-style parameterized cases, see CASES):
+    python -m cbspec bench run --output bench/before.json
+    python -m cbspec bench run --case ingest --case histogram --max_rows 1e7
+    python -m cbspec bench compare bench/before.json bench/after.json --threshold 0.1
+
+    ingest        set_up_energy_array per tree type, NumPy path vs numba selection kernel
+    partial_ingest  partials.ingest_partial, NumPy path vs fused numba kernel
+    cuts          process_data.quality_mask on per-event cut variables
+    histogram     binning.histgram_data_per_bin
+    fc_vector     feldman_cousins.feldman_cousins_vector
+    plotting      plotting.render_plots (serial and process pool)
+    run_pipeline  end-to-end main.run_pipeline without cache or plots
+
+Sizes go up to 1e7 rows; cases above --max_rows (default 1e6) are skipped.
+Every case is set up once (synth.py inputs under a temporary directory,
+untimed) and timed `repeat` times; results record min/median/mean/stdev and
+items (rows/events/bins) per second. `bench compare` flags cases whose median
+time grew by more than the threshold.
+"""
+
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+
+# Modules imported by `python -m cbspec` before any pipeline work starts
+IMPORT_TARGETS = ("cbspec", "cbspec.cli")
+
+# Heavy dependencies that importing a target must NOT load
+HEAVY_MODULES = ("matplotlib", "pandas", "pyarrow", "FCpy", "scipy")
+
+# Median import time above which `bench import` reports a regression [s]
+DEFAULT_IMPORT_BUDGET_S = 0.5
+
+_IMPORT_PROBE = """
+import json, sys, time
+t0 = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - t0
+print(json.dumps({{"seconds": seconds, "heavy": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def _parse_importtime(stderr, top=10):
+    """
+    Slowest modules of `python -X importtime` output, by self time.
+
+    :param stderr: str
+                   Captured stderr of the interpreter
+    :param top: int
+                Number of entries to return
+    :return entries: list of (module, self_seconds, cumulative_seconds)
+    """
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        if not self_us.strip().isdigit():
+            continue  # header line
+        entries.append((name.strip(), int(self_us) / 1e6, int(cumulative_us) / 1e6))
+    return sorted(entries, key=lambda e: e[1], reverse=True)[:top]
+
+
+def measure_import(module, repeat=5, heavy=HEAVY_MODULES):
+    """
+    Measure the cold import time of a module in fresh interpreters.
+
+    :param module: str
+                   Dotted module name, e.g. "cbspec.cli"
+    :param repeat: int
+                   Number of interpreters to start
+    :param heavy: tuple of str
+                  Modules whose presence after the import is reported
+    :return result: dict
+                    module, median_s, min_s, max_s, heavy (modules loaded),
+                    top (slowest modules by self time, last repeat)
+    """
+    if repeat < 1:
+        raise ValueError(f"repeat must be >= 1, got {repeat}")
+
+    code = _IMPORT_PROBE.format(module=module, heavy=tuple(heavy))
+    times = []
+    for _ in range(repeat):
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", code],
+            capture_output=True,
+            text=True,
+        )
+        if proc.returncode != 0:
+            raise RuntimeError(f"Importing {module} failed:\n{proc.stderr.strip()}")
+        probe = json.loads(proc.stdout.strip().splitlines()[-1])
+        times.append(probe["seconds"])
+
+    return {
+        "module": module,
+        "median_s": statistics.median(times),
+        "min_s": min(times),
+        "max_s": max(times),
+        "heavy": probe["heavy"],
+        "top": _parse_importtime(proc.stderr),
+    }
+
+
+def check_imports(results, budget_s=DEFAULT_IMPORT_BUDGET_S):
+    """
+    Regressions in import benchmark results.
+
+    :param results: list of dict
+                    See measure_import
+    :param budget_s: float
+                     Maximum allowed median import time [s]
+    :return failures: list of str
+                      Human-readable failure messages (empty if all passed)
+    """
+    failures = []
+    for r in results:
+        if r["median_s"] > budget_s:
+            failures.append(f"{r['module']}: median import {r['median_s']:.3f} s exceeds budget {budget_s:.3f} s")
+        if r["heavy"]:
+            failures.append(f"{r['module']}: imports heavy module(s) {', '.join(r['heavy'])}")
+    return failures
+
+
+# Stage benchmark suite
+TREE_TYPES = ("resTree", "tTlfit")
+SUITE_ROWS = (100_000, 1_000_000, 10_000_000)
+DEFAULT_MAX_ROWS = 1_000_000
+DEFAULT_REPEAT = 3
+
+# Relative growth of the median time reported as a regression by `bench compare`
+DEFAULT_REGRESSION_THRESHOLD = 0.10
+
+# Quality cuts and binning used by every case (the default configuration values)
+BENCH_CUTS = dict(
+    number_of_good_sd=5,
+    theta_deg=45.,
+    boarder_dist_m=1200.,
+    geometry_chi2=4.,
+    ldf_chi2=4.,
+    ped_error=5.,
+    frac_s800=0.25,
+)
+BENCH_BINS = [18.0, 18.1, 18.2, 18.3, 18.4, 18.5, 18.6, 18.7, 18.8, 18.9, 19.0, 19.1, 19.2,
+              19.3, 19.4, 19.5, 19.6, 19.8, 20.0, 20.3]
+
+
+def _synthetic_inputs(workdir, rows, tree_type):
+    """
+    synth.py MC file with `rows` events and a data file with rows // 4 events
+    (reused if already present in workdir).
+    """
+    from .data_classes import SynthConfig
+    from .synth import write_parquet
+
+    files = []
+    for kind, n in (("mc", rows), ("data", rows // 4)):
+        path = workdir / f"{tree_type}_{kind}_{rows}.parquet"
+        if not path.exists():
+            write_parquet(path, SynthConfig(tree_type=tree_type, kind=kind, rows=n, seed=1))
+        files.append(path)
+    return tuple(files)
+
+
+def _bench_cuts():
+    from .data_classes import QualityCuts
+
+    return QualityCuts(**BENCH_CUTS)
+
+
+def _random_events(rows, seed=0):
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    return rng.uniform(17.5, 20.5, rows)
+
+
+# Case setups: setup(params, workdir, logger) → (timed callable, items processed per call)
+def _setup_ingest(params, workdir, logger):
+    from .fused import numba_available
+    from .process_data import set_up_energy_array
+
+    if params["kernel"] == "fused" and not numba_available():
+        return None, "numba is not installed"
+    mc_file, dt_file = _synthetic_inputs(workdir, params["rows"], params["tree_type"])
+    cuts = _bench_cuts()
+    jit = params["kernel"] == "fused"
+    # Compile the kernel outside the timed calls
+    set_up_energy_array([mc_file, dt_file], "TASD", cuts, logger, jit=jit)
+    items = params["rows"] + params["rows"] // 4
+    return lambda: set_up_energy_array([mc_file, dt_file], "TASD", cuts, logger, jit=jit), items
+
+
+def _setup_partial_ingest(params, workdir, logger):
+    from .fused import numba_available
+    from .partials import ingest_partial
+
+    if params["kernel"] == "fused" and not numba_available():
+        return None, "numba is not installed"
+    mc_file, dt_file = _synthetic_inputs(workdir, params["rows"], params["tree_type"])
+    cuts = _bench_cuts()
+    jit = params["kernel"] == "fused"
+    # Compile the kernel outside the timed calls
+    ingest_partial([mc_file], [dt_file], "TASD", cuts, logger, jit=jit)
+    items = params["rows"] + params["rows"] // 4
+    return lambda: ingest_partial([mc_file], [dt_file], "TASD", cuts, logger, jit=jit), items
+
+
+def _setup_cuts(params, workdir, logger):
+    import numpy as np
+
+    from .process_data import quality_mask
+
+    rows = params["rows"]
+    rng = np.random.default_rng(0)
+    variables = {
+        "ngsd": rng.integers(3, 20, rows).astype(float),
+        "theta": rng.uniform(0., 60., rows),
+        "bdist": rng.uniform(0., 5000., rows),
+        "gf": rng.uniform(0., 6., rows),
+        "ldf": rng.uniform(0., 6., rows),
+        "pderr": rng.uniform(0., 8., rows),
+        "fs800": rng.uniform(0., 0.4, rows),
+    }
+    cuts = _bench_cuts()
+    return lambda: quality_mask(variables, cuts), rows
+
+
+def _setup_histogram(params, workdir, logger):
+    import numpy as np
+
+    from .binning import histgram_data_per_bin
+
+    rows = params["rows"]
+    mc, dt, thrown = _random_events(rows // 2, 1), _random_events(rows // 4, 2), _random_events(rows, 3)
+    edges = np.array(BENCH_BINS)
+    return lambda: histgram_data_per_bin(mc, dt, thrown, edges), len(mc) + len(dt) + len(thrown)
+
+
+def _setup_fc_vector(params, workdir, logger):
+    import numpy as np
+
+    from .feldman_cousins import feldman_cousins_vector
+
+    counts = np.random.default_rng(0).poisson(params["mean"], params["bins"])
+    return lambda: feldman_cousins_vector(counts), params["bins"]
+
+
+def _setup_plotting(params, workdir, logger):
+    import numpy as np
+
+    from .plotting import make_plot_jobs, render_plots
+
+    centers = np.arange(18.55, 20.0, 0.1)
+    values = np.logspace(-30, -34, len(centers))
+    hist_edges = np.linspace(18., 21., 31)
+    hist = np.arange(30, 0, -1, dtype=float) * 100
+    jobs = make_plot_jobs(
+        array_type="TASD",
+        centers=centers,
+        aperture=np.full(len(centers), 1e9),
+        exposure=np.full(len(centers), 5e17),
+        flux=values,
+        flux_lower=values * 0.9,
+        flux_upper=values * 1.1,
+        spectrum=values * 1e57,
+        spectrum_lower=values * 0.9e57,
+        spectrum_upper=values * 1.1e57,
+        hist_edges=hist_edges,
+        mc_hist=hist,
+        mc_thrown_hist=hist * 2,
+        dt_hist=hist / 4,
+    )
+    workers = 0 if params["workers"] == "serial" else None
+    run_dir = workdir / "plotting"
+    return lambda: render_plots(jobs, workdir / "global", run_dir, logger, max_workers=workers), len(jobs)
+
+
+def _setup_run_pipeline(params, workdir, logger):
+    from .load_config import config_from_dict
+    from .main import run_pipeline
+
+    rows = params["rows"]
+    mc_file, dt_file = _synthetic_inputs(workdir, rows, "resTree")
+    out_dir = workdir / f"pipeline_{rows}"
+    cfg = {
+        "array": {"type": "TASD"},
+        "data": {"tasd": {"mc_file": str(mc_file), "dt_file": str(dt_file)}},
+        "energy": {"bins": BENCH_BINS},
+        "geometry": {"generated_area_m2": 1.96349541e9, "generated_solid_angle_sr": 2.35619449},
+        "run": {"time_s": 504921600.},
+        "quality_cuts": dict(BENCH_CUTS),
+        "output": {
+            "base_dir": str(out_dir),
+            "plots_dir": str(out_dir / "plots"),
+            "logs_dir": str(out_dir / "logs"),
+            "runs_dir": str(out_dir / "runs"),
+            "log_level": "WARNING",
+            "progress": "off",
+        },
+    }
+
+    def run():
+        array_cfg, spectrum_cfg, cuts_cfg, output_cfg, raw = config_from_dict(cfg)
+        run_pipeline(array_cfg, spectrum_cfg, cuts_cfg, output_cfg, raw, use_cache=False, make_plots=False)
+
+    return run, rows + rows // 4
+
+
+# name → (setup, parameter grid)
+CASES = {
+    "ingest": (
+        _setup_ingest,
+        [{"tree_type": t, "rows": n, "kernel": k} for t in TREE_TYPES for n in SUITE_ROWS for k in ("numpy", "fused")],
+    ),
+    "partial_ingest": (
+        _setup_partial_ingest,
+        [{"tree_type": t, "rows": n, "kernel": k} for t in TREE_TYPES for n in SUITE_ROWS for k in ("numpy", "fused")],
+    ),
+    "cuts": (_setup_cuts, [{"rows": n} for n in SUITE_ROWS]),
+    "histogram": (_setup_histogram, [{"rows": n} for n in SUITE_ROWS]),
+    "fc_vector": (_setup_fc_vector, [{"bins": 20, "mean": m} for m in (5, 500)]),
+    "plotting": (_setup_plotting, [{"workers": w} for w in ("serial", "pool")]),
+    "run_pipeline": (_setup_run_pipeline, [{"rows": n} for n in SUITE_ROWS]),
+}
+
+
+def case_id(name, params):
+    """
+    Identifier of a parameterized case, e.g. "ingest[tree_type=resTree,rows=100000]".
+    """
+    return f"{name}[{','.join(f'{k}={v}' for k, v in params.items())}]"
+
+
+def time_call(func, repeat=DEFAULT_REPEAT):
+    """
+    Wall times of `repeat` calls of func.
+
+    :return times: list of float
+    """
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - t0)
+    return times
+
+
+def _environment():
+    """
+    Interpreter, library versions, CPU count and git commit of a benchmark run.
+    """
+    import numpy as np
+
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, cwd=Path(__file__).parent
+        ).stdout.strip() or None
+    except OSError:
+        commit = None
+    try:
+        import pyarrow
+        pyarrow_version = pyarrow.__version__
+    except ImportError:
+        pyarrow_version = None
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "numpy": np.__version__,
+        "pyarrow": pyarrow_version,
+        "git_commit": commit,
+        "time": datetime.now().isoformat(timespec="seconds"),
+    }
+
+
+def run_suite(cases=None, max_rows=DEFAULT_MAX_ROWS, repeat=DEFAULT_REPEAT, workdir=None, report=print):
+    """
+    Run the stage benchmark suite.
+
+    :param cases: iterable of str, optional
+                  Case names (keys of CASES) to run (default: all)
+    :param max_rows: int
+                     Skip parameter sets with more rows than this
+    :param repeat: int
+                   Timed calls per case
+    :param workdir: str or Path, optional
+                    Where synthetic inputs are written (default: a temporary
+                    directory, removed afterwards; pass a directory to reuse them)
+    :param report: callable, optional
+                   Called with one progress line per case (None: silent)
+    :return results: dict
+                     {"environment": {...}, "results": {case_id: {...}}}
+    """
+    from .logging_utils import RunLogger, WARNING
+
+    names = list(cases or CASES)
+    unknown = set(names) - set(CASES)
+    if unknown:
+        raise ValueError(f"Unknown benchmark case(s) {sorted(unknown)}; valid cases: {', '.join(CASES)}")
+    if repeat < 1:
+        raise ValueError(f"repeat must be >= 1, got {repeat}")
+
+    tmp = None
+    if workdir is None:
+        tmp = tempfile.TemporaryDirectory(prefix="cbspec-bench-")
+        workdir = tmp.name
+    workdir = Path(workdir)
+    workdir.mkdir(parents=True, exist_ok=True)
+
+    logger = RunLogger(workdir / "logs", level=WARNING, console=False)
+    results = {}
+    try:
+        for name in names:
+            setup, grid = CASES[name]
+            for params in grid:
+                if params.get("rows", 0) > max_rows:
+                    continue
+                cid = case_id(name, params)
+                func, items = setup(params, workdir, logger)
+                if func is None:
+                    # Optional dependency missing: items holds the reason
+                    if report is not None:
+                        report(f"{cid}: skipped ({items})")
+                    continue
+                times = time_call(func, repeat)
+                median = statistics.median(times)
+                results[cid] = {
+                    "case": name,
+                    "params": params,
+                    "repeat": repeat,
+                    "times_s": times,
+                    "min_s": min(times),
+                    "median_s": median,
+                    "mean_s": statistics.fmean(times),
+                    "stdev_s": statistics.stdev(times) if len(times) > 1 else 0.,
+                    "items": items,
+                    "items_per_s": items / median if median > 0 else None,
+                }
+                if report is not None:
+                    report(f"{cid}: median {median:.4g} s ({items / median:.4g} items/s)")
+    finally:
+        logger.close()
+        if tmp is not None:
+            tmp.cleanup()
+
+    return {"environment": _environment(), "results": results}
+
+
+def write_results(results, path):
+    """
+    Write suite results as JSON.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(results, f, indent=2)
+    return path
+
+
+def load_results(path):
+    """
+    Read suite results written by write_results.
+    """
+    path = Path(path)
+    if not path.exists():
+        raise FileNotFoundError(f"File {path} does not exist")
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare_results(base, new, threshold=DEFAULT_REGRESSION_THRESHOLD):
+    """
+    Compare the median times of two suite results.
+
+    :param base: dict
+                 Baseline results (see run_suite)
+    :param new: dict
+                Results to check
+    :param threshold: float
+                      Relative slowdown flagged as a regression (0.1 = 10 %)
+    :return rows: list of tuple
+                  (case_id, base_median_s, new_median_s, new/base, status) with
+                  status "regression", "faster", "ok", "new" or "missing"
+    """
+    base_results, new_results = base["results"], new["results"]
+    rows = []
+    for cid in list(base_results) + [c for c in new_results if c not in base_results]:
+        b = base_results.get(cid, {}).get("median_s")
+        n = new_results.get(cid, {}).get("median_s")
+        if b is None or n is None:
+            rows.append((cid, b, n, None, "missing" if n is None else "new"))
+            continue
+        ratio = n / b if b > 0 else float("inf")
+        if ratio > 1 + threshold:
+            status = "regression"
+        elif ratio < 1 / (1 + threshold):
+            status = "faster"
+        else:
+            status = "ok"
+        rows.append((cid, b, n, ratio, status))
+    return rows
@@ -7,6 +7,11 @@ for MC reconstruction, MC thrown, and data reconstructed energies.
 
 All downstream physics (aperture, exposure, flux, spectrum) depends on these
 bins being consistent and reproducible.
+
+The *_nd helpers generalize the binning to N axes (e.g. log10(E/eV) × cos θ,
+see the zenith stages): events are mapped to flattened multi-indices and all
+histograms are filled with a single np.bincount, using the same bin
+convention as np.histogram.
 """
 
 import numpy as np
@@ -68,6 +73,114 @@ def histgram_data_per_bin(mc_log_energy, dt_log_energy, mc_thrown_log_energy, ed
     mc_thrown_counts = histogram_events(mc_thrown_log_energy, edges)
     return mc_counts, dt_counts, mc_thrown_counts
 
+
+def make_bins_nd(axes):
+    """
+    Bin edges, centers, and widths of every axis of an N-dimensional binning.
+    :param axes: sequence of array-like
+                 Bin edges per axis, e.g. (log10(E/eV) edges, cos θ edges)
+    :return bins: list of (edges, centers, widths)
+                  One make_energy_bins tuple per axis
+    """
+    return [make_energy_bins(edges) for edges in axes]
+
+
+def bin_index(values, edges):
+    """
+    Bin index of every value, with the np.histogram convention (bins are
+    half-open, the last bin also holds its upper edge).
+    :param values: array-like
+                   Values to bin (any shape, flattened)
+    :param edges: array-like
+                  Increasing bin edges
+    :return index: np.ndarray of int64
+                   Bin index per value; -1 outside the edges or for NaN
+    """
+    values = np.asarray(values, dtype=float).ravel()
+    edges = np.asarray(edges, dtype=float)
+    n_bins = len(edges) - 1
+    index = np.searchsorted(edges, values, side="right").astype(np.int64) - 1
+    index[values == edges[-1]] = n_bins - 1
+    index[(index < 0) | (index >= n_bins)] = -1  # NaN sorts past the last edge
+    return index
+
+
+def flat_bin_index(values, edges):
+    """
+    Flattened (C-order) multi-index of N-dimensional bins.
+    :param values: sequence of array-like
+                   One array per axis, all of the same length
+    :param edges: sequence of array-like
+                  Bin edges per axis
+    :return index: np.ndarray of int64
+                   Flat bin index per event; -1 if any coordinate lies outside
+    """
+    if len(values) != len(edges):
+        raise ValueError(f"{len(values)} value arrays for {len(edges)} binned axes")
+    flat = None
+    for axis_values, axis_edges in zip(values, edges):
+        index = bin_index(axis_values, axis_edges)
+        if flat is None:
+            flat = index
+            outside = index < 0
+        else:
+            flat = flat * (len(axis_edges) - 1) + index
+            outside |= index < 0
+    flat[outside] = -1
+    return flat
+
+
+def histograms_nd(blocks):
+    """
+    Fill several N-dimensional histograms with a single np.bincount.
+
+    Each histogram owns one range of a common flat index space (its C-order
+    multi-indices shifted by an offset), so all events of all histograms are
+    counted in one pass.
+    :param blocks: sequence of (values, edges)
+                   values: one array per axis; edges: bin edges per axis
+    :return counts: list of np.ndarray of int64
+                    One array per block, shaped (bins of axis 0, bins of axis 1, ...)
+    """
+    shapes = [tuple(len(e) - 1 for e in edges) for _, edges in blocks]
+    sizes = [int(np.prod(shape)) for shape in shapes]
+    offsets = np.cumsum([0] + sizes[:-1])
+
+    index = []
+    for (values, edges), offset in zip(blocks, offsets):
+        flat = flat_bin_index(values, edges)
+        index.append(flat[flat >= 0] + offset)
+    counts = np.bincount(np.concatenate(index), minlength=sum(sizes)) if index else np.zeros(0, dtype=np.int64)
+    counts = counts.astype(np.int64, copy=False)
+    return [counts[o:o + n].reshape(shape) for o, n, shape in zip(offsets, sizes, shapes)]
+
+
+def histgram_data_per_bin_nd(mc_values, dt_values, mc_thrown_values, edges, thrown_axes=(0,)):
+    """
+    N-dimensional version of histgram_data_per_bin, filled by one bincount.
+    :param mc_values: sequence of array-like
+                      Reconstructed MC values, one array per axis
+    :param dt_values: sequence of array-like
+                      Reconstructed data values, one array per axis
+    :param mc_thrown_values: sequence of array-like
+                             Thrown MC values of the axes in thrown_axes
+    :param edges: sequence of array-like
+                  Bin edges per axis; axis 0 is log10(E/eV)
+    :param thrown_axes: tuple of int
+                        Axes the thrown MC is binned in (default: energy only,
+                        the trees carry no thrown zenith angle)
+    :return mc_counts: np.ndarray
+    :return dt_counts: np.ndarray
+    :return mc_thrown_counts: np.ndarray
+    """
+    thrown_edges = [edges[axis] for axis in thrown_axes]
+    return tuple(histograms_nd([
+        (mc_values, edges),
+        (dt_values, edges),
+        (mc_thrown_values, thrown_edges),
+    ]))
+
+
 def filter_bins(mc_counts, dt_counts, mc_raw_counts, centers):
     """
     Apply physics-motivated bin filters:
@@ -0,0 +1,243 @@
+"""
+Crash-safe checkpoints of the parquet ingestion pass, for resuming runs
+interrupted by node preemption.
+
+    python -m cbspec                                      # checkpoints every output.checkpoint_s
+    python -m cbspec --resume output/runs/<timestamp>     # continue an interrupted run
+
+While process_data.set_up_energy_array reads the inputs, its accumulated
+state is checkpointed into the run directory:
+
+    output/runs/<timestamp>/checkpoint/ingest.json         manifest
+    output/runs/<timestamp>/checkpoint/chunk_00000.npz     accumulated energies
+    ...
+
+Checkpoints are taken at row-group boundaries, at most every checkpoint_s
+seconds. Each one writes only the energies accumulated since the previous
+checkpoint (one .npz chunk, plus the running totals of the energy × zenith
+histograms when they are filled), then replaces the manifest -- chunk list, next
+row group per file, running totals -- with a temporary file and
+os.replace(). Both are fsynced before the rename, so a crash at any point
+leaves the previous manifest and all of its chunks intact.
+
+The manifest records the array type, the quality cuts, the histogram
+binning and the input file fingerprints (provenance.file_fingerprint); resuming with anything
+different is refused. A resumed ingestion restores the accumulators, skips
+the completed row groups and returns arrays identical to an uninterrupted
+run. The checkpoint directory is removed once ingestion completes -- from
+then on the stage cache holds the result.
+"""
+
+import json
+import os
+import shutil
+import time
+from dataclasses import asdict
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+from .data_classes import QualityCuts
+from .logging_utils import RunLogger
+from .provenance import file_fingerprint
+
+CHECKPOINT_VERSION = 2
+MANIFEST = "ingest.json"
+
+# Default seconds between two checkpoints (output.checkpoint_s)
+DEFAULT_CHECKPOINT_S = 300.0
+
+
+def _write_atomic(path, write):
+    # write(f) into a temporary file, fsync it and rename it onto path
+    tmp_path = path.with_name(f".{path.name}.tmp-{os.getpid()}")
+    with open(tmp_path, "wb") as f:
+        write(f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def _binning(spec):
+    # "logen (14 bins) × cos_theta (4 bins)" of an EventHistograms.spec()
+    if spec is None:
+        return "none"
+    return " × ".join(f"{axis} ({len(edges) - 1} bins)" for axis, edges in zip(spec["axes"], spec["edges"]))
+
+
+class IngestCheckpoint:
+    """
+    Checkpoints of one ingestion pass (see module docstring).
+
+    :param directory: Path
+                      Checkpoint directory (run_dir/checkpoint)
+    :param infiles: list of Path
+                    [MC_file, data_file] (MC_file None with MC productions)
+    :param array_type: str
+    :param cuts: QualityCuts
+    :param logger: RunLogger
+    :param interval_s: float
+                       Minimum seconds between two checkpoints
+    :param histograms: process_data.EventHistograms, optional
+                       Histograms filled by the same ingestion; their counts are
+                       checkpointed too and restored by load()
+    """
+
+    def __init__(self, directory, infiles, array_type, cuts: QualityCuts, logger: RunLogger,
+                 interval_s=DEFAULT_CHECKPOINT_S, histograms=None):
+        self.directory = Path(directory)
+        self.logger = logger
+        self.interval_s = float(interval_s)
+        self.histograms = histograms
+        self.identity = {
+            "version": CHECKPOINT_VERSION,
+            "array_type": array_type,
+            "quality_cuts": asdict(cuts),
+            "inputs": [file_fingerprint(f) for f in infiles if f is not None],
+            "histograms": histograms.spec() if histograms is not None else None,
+        }
+        self.chunks = []
+        self.lengths = [0, 0, 0]
+        self._saved_parts = [0, 0, 0]
+        self._last = time.monotonic()
+
+    @property
+    def manifest_path(self):
+        return self.directory / MANIFEST
+
+    def verify(self):
+        """
+        Manifest of the last checkpoint, checked against this ingestion.
+
+        :raise ValueError: if it was taken with other inputs, array type, quality cuts
+                           or histogram binning
+        :return manifest: dict or None
+                          None if no checkpoint was taken
+        """
+        if not self.manifest_path.exists():
+            return None
+        with open(self.manifest_path) as f:
+            manifest = json.load(f)
+
+        problems = []
+        if manifest.get("version") != CHECKPOINT_VERSION:
+            problems.append(f"checkpoint version {manifest.get('version')} (expected {CHECKPOINT_VERSION})")
+        if manifest["array_type"] != self.identity["array_type"]:
+            problems.append(f"array type {manifest['array_type']} (configured: {self.identity['array_type']})")
+        if manifest["quality_cuts"] != self.identity["quality_cuts"]:
+            stored, current = manifest["quality_cuts"], self.identity["quality_cuts"]
+            changed = ", ".join(f"{k} {stored.get(k)} → {current.get(k)}"
+                                for k in sorted(set(stored) | set(current)) if stored.get(k) != current.get(k))
+            problems.append(f"other quality cuts ({changed})")
+        if manifest.get("histograms") != self.identity["histograms"]:
+            stored, current = (_binning(h) for h in (manifest.get("histograms"), self.identity["histograms"]))
+            problems.append(f"other histogram binning ({stored}; configured: {current})")
+        if len(manifest["inputs"]) != len(self.identity["inputs"]):
+            problems.append(f"{len(manifest['inputs'])} input files (configured: {len(self.identity['inputs'])})")
+        for stored, current in zip(manifest["inputs"], self.identity["inputs"]):
+            if stored != current:
+                problems.append(f"input {stored['path']} (size {stored['size']}, mtime_ns {stored['mtime_ns']}; "
+                                f"now {current['path']}, size {current['size']}, mtime_ns {current['mtime_ns']})")
+        if problems:
+            raise ValueError(f"Cannot resume from {self.manifest_path}: taken with " + "; ".join(problems))
+        return manifest
+
+    def load(self):
+        """
+        State of the last checkpoint (see verify for the checks).
+
+        :return state: dict or None
+                       file_index, row_group (next to read), count (accepted events
+                       of that file so far) and arrays (the three accumulators,
+                       each the first part of its accumulator list); None without
+                       checkpoint. The histogram counts are restored in place.
+        """
+        manifest = self.verify()
+        if manifest is None:
+            return None
+
+        parts = [[], [], []]
+        for name in manifest["chunks"]:
+            with np.load(self.directory / name) as chunk:
+                for k in range(3):
+                    parts[k].append(chunk[f"a{k}"])
+        if self.histograms is not None and manifest["chunks"]:
+            # Every chunk holds the running histogram totals; the last one is current
+            with np.load(self.directory / manifest["chunks"][-1]) as chunk:
+                for k, counts in enumerate(self.histograms.counts):
+                    counts[...] = chunk[f"h{k}"]
+        self.chunks = list(manifest["chunks"])
+        self.lengths = list(manifest["lengths"])
+        self._saved_parts = [1, 1, 1]
+        self._last = time.monotonic()
+
+        arrays = [np.concatenate(p) if p else np.empty(0) for p in parts]
+        self.logger.log_text(
+            f"Resuming ingestion from {self.manifest_path}: file {manifest['file_index']}, "
+            f"row group {manifest['row_group']} ({len(arrays[0])} MC reco, {len(arrays[1])} data, "
+            f"{len(arrays[2])} MC thrown events restored)"
+        )
+        self.logger.log_json(event="checkpoint_resume", file_index=manifest["file_index"],
+                             row_group=manifest["row_group"], lengths=self.lengths)
+        return {
+            "file_index": manifest["file_index"],
+            "row_group": manifest["row_group"],
+            "count": manifest["count"],
+            "arrays": arrays,
+        }
+
+    def due(self):
+        """
+        True if checkpoint_s elapsed since the last checkpoint (never for checkpoint_s 0).
+        """
+        return self.interval_s > 0 and time.monotonic() - self._last >= self.interval_s
+
+    def save(self, parts, file_index, row_group, count):
+        """
+        Checkpoint the accumulators after a completed row group.
+
+        :param parts: list of list of np.ndarray
+                      Accumulators of set_up_energy_array (per-batch parts of the
+                      MC reco, data and MC thrown arrays; only appended to)
+        :param file_index: int
+                           Input file being read
+        :param row_group: int
+                          Next row group to read in that file
+        :param count: int
+                      Accepted events of that file so far
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        # Parts appended since the previous checkpoint
+        new = {f"a{k}": np.concatenate(p[self._saved_parts[k]:]) if len(p) > self._saved_parts[k] else np.empty(0)
+               for k, p in enumerate(parts)}
+        if self.histograms is not None:
+            new.update({f"h{k}": counts for k, counts in enumerate(self.histograms.counts)})
+        name = f"chunk_{len(self.chunks):05d}.npz"
+        _write_atomic(self.directory / name, lambda f: np.savez(f, **new))
+
+        self.chunks.append(name)
+        self._saved_parts = [len(p) for p in parts]
+        self.lengths = [length + len(new[f"a{k}"]) for k, length in enumerate(self.lengths)]
+        manifest = {
+            **self.identity,
+            "file_index": file_index,
+            "row_group": row_group,
+            "count": int(count),
+            "chunks": self.chunks,
+            "lengths": self.lengths,
+            "written": datetime.now().isoformat(timespec="seconds"),
+        }
+        _write_atomic(self.manifest_path, lambda f: f.write(json.dumps(manifest, indent=2).encode()))
+        self._last = time.monotonic()
+
+        self.logger.log_text(f"Checkpoint {name}: file {file_index}, next row group {row_group}")
+        self.logger.log_json(event="checkpoint", chunk=name, file_index=file_index, row_group=row_group,
+                             lengths=self.lengths)
+
+    def remove(self):
+        """
+        Delete the checkpoints (ingestion completed).
+        """
+        if self.directory.exists():
+            shutil.rmtree(self.directory)
@@ -11,21 +11,62 @@ The CLI supports overriding:
     - array type (TASD or CBSD)
     - MC parquet file path
     - data parquet file path
+    - energy-scale scan factors
+    - stage cache behaviour (--force_stage, --no_cache)
+    - output steps (--no_plots, --no_csv; skipped steps never import matplotlib/pandas)
+    - per-stage profiling (--profile cpu|memory|both)
+    - cut-passing event skim (--skim)
+    - energy × zenith binning (--zenith_bins, --zenith_axis)
+    - ingestion checkpoints and resuming an interrupted run (--checkpoint_s, --resume)
+    - NumPy-only ingestion without the numba selection kernel (--no_jit)
 
 All arguments are optional -- if omitted, defaults come from YAML file.
+
+Subcommands (first argument):
+    python -m cbspec runs list                      # newest runs in output/runs.sqlite
+    python -m cbspec runs query --where quality_cuts.theta_deg=45 --array CBSD --input 2025 --last
+    python -m cbspec runs diff <run_id_a> <run_id_b>
+    python -m cbspec runs rebuild                   # backfill index from output/runs/
+    python -m cbspec bench import                   # cold import-time benchmark
+    python -m cbspec bench run --output bench/new.json  # per-stage benchmark suite
+    python -m cbspec bench compare bench/old.json bench/new.json --threshold 0.1
+    python -m cbspec report output/runs/<timestamp> # stage breakdown + throughput
+    python -m cbspec sweep configs/*.yaml           # many variants, shared ingestion
+    python -m cbspec sweep --matrix config/sweep.yaml --workers 8
+    python -m cbspec serve --array TASD --array CBSD  # resident JSON API on 127.0.0.1:8765
+    python -m cbspec check --config a.yaml --config b.yaml  # preflight: schemas, bins, cuts, estimates
+    python -m cbspec synth --kind mc --rows 1e8 --shards 16   # synthetic resTree/tTlfit parquet files
+    python -m cbspec partial --mc shard_00*.parquet --output node07.partial.arrow  # counts of some shards
+    python -m cbspec merge node*.partial.arrow      # sum partials → aperture/flux/spectrum run
+    python -m cbspec update --dt "/data/sddt/*.parquet"  # incremental: read only new data shards
 """
 
 import argparse
+import sys
 from pathlib import Path
 
-from .load_config import load_config
+import numpy as np
+
+from .load_config import (load_config, load_energy_scale_config, load_mc_productions_config, load_skim_config,
+                          load_zenith_config, zenith_config)
+from .data_classes import EnergyScaleConfig, SkimConfig, SynthConfig
 from .main import run_pipeline
+from .stages import STAGE_NAMES
+from .logging_utils import RunLogger
+from .run_registry import REGISTRY_FILENAME, RunRegistry, rebuild_registry
+from .report import load_spans, run_wall_seconds, stage_breakdown, throughput
+from .bench import (
+    IMPORT_TARGETS, DEFAULT_IMPORT_BUDGET_S, measure_import, check_imports,
+    CASES, DEFAULT_MAX_ROWS, DEFAULT_REPEAT, DEFAULT_REGRESSION_THRESHOLD,
+)
 
 
 # CLI argument parser
-def pars_args():
+def pars_args(argv=None):
     """
     Define and parse command-line arguments.
+    :param argv: list of str, optional
+                 Arguments to parse (default: sys.argv[1:])
     :return argparse.Namespace: Parsed arguments
     """
     parser = argparse.ArgumentParser(
@@ -53,20 +94,1085 @@ def pars_args():
         type=str,
         help="Override data parquet file path.",
     )
+    parser.add_argument(
+        "--energy_scale",
+        type=float,
+        nargs="+",
+        help="Energy-scale factors to scan, e.g. 0.9 1.0 1.1 (overrides YAML energy_scale.scales).",
+    )
+    parser.add_argument(
+        "--energy_scale_mc",
+        action="store_true",
+        help="Also shift MC reconstructed energies in the energy-scale scan.",
+    )
+    parser.add_argument(
+        "--force_stage",
+        "--force-stage",
+        action="append",
+        default=[],
+        choices=list(STAGE_NAMES) + ["all"],
+        help="Recompute this pipeline stage even if its output is cached (repeatable, or 'all').",
+    )
+    parser.add_argument(
+        "--no_cache",
+        "--no-cache",
+        action="store_true",
+        help="Disable the on-disk stage cache for this run.",
+    )
+    parser.add_argument(
+        "--no_plots",
+        "--no-plots",
+        action="store_true",
+        help="Skip plotting (matplotlib is never imported).",
+    )
+    parser.add_argument(
+        "--no_csv",
+        "--no-csv",
+        action="store_true",
+        help="Skip CSV export; only the columnar results store is written.",
+    )
+    parser.add_argument(
+        "--log_level",
+        "--log-level",
+        type=str.upper,
+        choices=["DEBUG", "INFO", "WARNING", "ERROR"],
+        help="Override output.log_level (run.log/console verbosity).",
+    )
+    parser.add_argument(
+        "--progress",
+        choices=["auto", "bar", "heartbeat", "off"],
+        help="Override output.progress (ingestion progress bar / JSONL heartbeats).",
+    )
+    parser.add_argument(
+        "--skim",
+        action="store_true",
+        help="Write the cut-passing events to output/runs/<ts>/skim/ (defaults from the YAML skim block).",
+    )
+    parser.add_argument(
+        "--checkpoint_s",
+        "--checkpoint-s",
+        type=float,
+        help="Override output.checkpoint_s (seconds between ingestion checkpoints, 0 = off).",
+    )
+    parser.add_argument(
+        "--no_jit",
+        "--no-jit",
+        action="store_true",
+        help="Always ingest through the NumPy path, even if numba is installed (sets output.jit: false).",
+    )
+    parser.add_argument(
+        "--resume",
+        type=str,
+        metavar="RUN_DIR",
+        help="Continue an interrupted run from its last ingestion checkpoint (output/runs/<timestamp>).",
+    )
+    parser.add_argument(
+        "--zenith_bins",
+        "--zenith-bins",
+        type=float,
+        nargs="+",
+        help="Zenith-axis bin edges for the energy × zenith binning, e.g. 0.7 0.8 0.9 1.0 "
+             "(overrides YAML zenith.bins).",
+    )
+    parser.add_argument(
+        "--zenith_axis",
+        "--zenith-axis",
+        choices=["cos_theta", "sec_theta"],
+        help="Zenith axis of --zenith_bins (default: YAML zenith.axis, else cos_theta).",
+    )
+    parser.add_argument(
+        "--profile",
+        choices=["cpu", "memory", "both"],
+        help="Profile every pipeline stage (cProfile and/or tracemalloc) into output/runs/<ts>/profile/.",
+    )
+    parser.add_argument(
+        "--profile_top",
+        "--profile-top",
+        type=int,
+        default=15,
+        help="Hot functions / allocation sites per stage summarized in run.log (default 15).",
+    )
+
+    return parser.parse_args(argv)
+
+
+def pars_runs_args(argv):
+    """
+    Define and parse arguments of the `runs` subcommand (run registry).
+    :param argv: list of str
+    :return argparse.Namespace: Parsed arguments
+    """
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument(
+        "--config",
+        type=str,
+        default="config/default_config.yaml",
+        help="YAML configuration file (locates output/runs.sqlite).",
+    )
+    common.add_argument(
+        "--registry",
+        type=str,
+        help=f"Path to the registry database (default: <output.base_dir>/{REGISTRY_FILENAME}).",
+    )
+
+    parser = argparse.ArgumentParser(
+        prog="cbspec runs",
+        description="Query the cbspec run registry.",
+    )
+    sub = parser.add_subparsers(dest="action", required=True)
+
+    p_list = sub.add_parser("list", parents=[common], help="List the newest runs.")
+    p_list.add_argument("--limit", type=int, default=20)
+    p_list.add_argument("--array_type", "--array", type=str, choices=["TASD", "CBSD"])
+
+    p_query = sub.add_parser("query", parents=[common], help="Find runs by config values and inputs.")
+    p_query.add_argument(
+        "--where",
+        action="append",
+        default=[],
+        help="Config filter, e.g. quality_cuts.theta_deg=45 or run.time_s>=5e8 (repeatable).",
+    )
+    p_query.add_argument("--array_type", "--array", type=str, choices=["TASD", "CBSD"])
+    p_query.add_argument("--input", type=str, help="Substring of an input file path.")
+    p_query.add_argument("--status", type=str, help="Run status, e.g. completed.")
+    p_query.add_argument("--limit", type=int, default=20)
+    p_query.add_argument("--last", action="store_true", help="Only the newest matching run.")
+
+    p_diff = sub.add_parser("diff", parents=[common], help="Compare two runs.")
+    p_diff.add_argument("run_a", type=str)
+    p_diff.add_argument("run_b", type=str)
+
+    p_show = sub.add_parser("show", parents=[common], help="Show one run record.")
+    p_show.add_argument("run_id", type=str)
+
+    sub.add_parser("rebuild", parents=[common], help="Backfill the registry from output/runs/.")
+
+    return parser.parse_args(argv)
+
+
+def pars_bench_args(argv):
+    """
+    Define and parse arguments of the `bench` subcommand.
+    :param argv: list of str
+    :return argparse.Namespace: Parsed arguments
+    """
+    parser = argparse.ArgumentParser(
+        prog="cbspec bench",
+        description="Run cbspec benchmarks.",
+    )
+    sub = parser.add_subparsers(dest="action", required=True)
+
+    p_import = sub.add_parser("import", help="Cold import time of cbspec modules.")
+    p_import.add_argument(
+        "--module",
+        action="append",
+        help=f"Module to import (repeatable, default: {' '.join(IMPORT_TARGETS)}).",
+    )
+    p_import.add_argument("--repeat", type=int, default=5, help="Fresh interpreters per module.")
+    p_import.add_argument(
+        "--budget_s",
+        type=float,
+        default=DEFAULT_IMPORT_BUDGET_S,
+        help="Fail if a median import time exceeds this many seconds.",
+    )
+    p_import.add_argument("--top", action="store_true", help="Also list the slowest modules by self time.")
+
+    p_run = sub.add_parser("run", help="Time every pipeline stage on synthetic inputs.")
+    p_run.add_argument(
+        "--case",
+        action="append",
+        choices=list(CASES),
+        help="Benchmark case to run (repeatable, default: all).",
+    )
+    p_run.add_argument(
+        "--max_rows", "--max-rows",
+        type=lambda value: int(float(value)),
+        default=DEFAULT_MAX_ROWS,
+        help=f"Skip cases with more input rows than this (default: {DEFAULT_MAX_ROWS:.0e}; 1e7 runs everything).",
+    )
+    p_run.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="Timed calls per case.")
+    p_run.add_argument(
+        "--output",
+        type=Path,
+        help="Results JSON (default: output/bench/<timestamp>.json).",
+    )
+    p_run.add_argument(
+        "--workdir",
+        type=Path,
+        help="Keep the synthetic inputs in this directory and reuse them (default: temporary directory).",
+    )
+
+    p_compare = sub.add_parser("compare", help="Diff two `bench run` result files.")
+    p_compare.add_argument("base", type=Path, help="Baseline results JSON.")
+    p_compare.add_argument("new", type=Path, help="Results JSON to check.")
+    p_compare.add_argument(
+        "--threshold",
+        type=float,
+        default=DEFAULT_REGRESSION_THRESHOLD,
+        help="Relative median slowdown flagged as a regression (default: 0.1 = 10%%).",
+    )
+
+    return parser.parse_args(argv)
+
+
+def pars_report_args(argv):
+    """
+    Define and parse arguments of the `report` subcommand.
+    :param argv: list of str
+    :return argparse.Namespace: Parsed arguments
+    """
+    parser = argparse.ArgumentParser(
+        prog="cbspec report",
+        description="Per-stage time/CPU/memory breakdown and throughput of one run.",
+    )
+    parser.add_argument("run_dir", type=str, help="Run directory, e.g. output/runs/20260101-120000.")
+    parser.add_argument("--batches", action="store_true", help="Also list every parquet batch span.")
+
+    return parser.parse_args(argv)
+
+
+def pars_sweep_args(argv):
+    """
+    Define and parse arguments of the `sweep` subcommand.
+    :param argv: list of str
+    :return argparse.Namespace: Parsed arguments
+    """
+    parser = argparse.ArgumentParser(
+        prog="cbspec sweep",
+        description="Run many configuration variants, ingesting each group of shared inputs once.",
+    )
+    parser.add_argument("configs", nargs="*", help="YAML configuration files (one variant each).")
+    parser.add_argument(
+        "--matrix",
+        action="append",
+        default=[],
+        help="Matrix spec: `base` config plus `matrix` lists of dotted keys (repeatable).",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        help="Worker processes for the downstream stages (default: one per variant, capped at the CPU count).",
+    )
+    parser.add_argument(
+        "--sweep_dir",
+        "--sweep-dir",
+        type=str,
+        help="Sweep output directory (default: <output.base_dir>/sweeps/<timestamp>).",
+    )
+    parser.add_argument(
+        "--force_stage",
+        "--force-stage",
+        action="append",
+        default=[],
+        choices=list(STAGE_NAMES) + ["all"],
+        help="Recompute this pipeline stage even if its output is cached (repeatable, or 'all').",
+    )
+    parser.add_argument("--no_cache", "--no-cache", action="store_true", help="Disable the on-disk stage cache.")
+    parser.add_argument("--no_plots", "--no-plots", action="store_true", help="Skip plotting in every run.")
+    parser.add_argument("--no_csv", "--no-csv", action="store_true", help="Skip CSV export in every run.")
+    parser.add_argument(
+        "--keep_shared",
+        "--keep-shared",
+        action="store_true",
+        help="Keep the shared event arrays (<sweep_dir>/shared/*.npy) after the sweep.",
+    )
+
+    return parser.parse_args(argv)
+
+
+def pars_serve_args(argv):
+    """
+    Define and parse arguments of the `serve` subcommand.
+    :param argv: list of str
+    :return argparse.Namespace: Parsed arguments
+    """
+    parser = argparse.ArgumentParser(
+        prog="cbspec serve",
+        description="Keep event data in memory and serve flux/spectrum requests as JSON.",
+    )
+    parser.add_argument(
+        "--config",
+        type=str,
+        default="config/default_config.yaml",
+        help="YAML configuration file (input files and request defaults).",
+    )
+    parser.add_argument(
+        "--array",
+        action="append",
+        choices=["TASD", "CBSD"],
+        help="Array type to load (repeatable, default: array.type from the YAML).",
+    )
+    parser.add_argument("--host", type=str, default="127.0.0.1", help="HTTP bind address.")
+    parser.add_argument("--port", type=int, default=8765, help="HTTP port.")
+    parser.add_argument("--socket", type=str, help="Serve on this Unix socket instead of HTTP host:port.")
+    parser.add_argument(
+        "--cache_size",
+        "--cache-size",
+        type=int,
+        default=128,
+        help="Responses kept in the LRU result cache (0 disables it).",
+    )
+
+    return parser.parse_args(argv)
+
+
+def pars_check_args(argv):
+    """
+    Define and parse arguments of the `check` subcommand.
+    :param argv: list of str
+    :return argparse.Namespace: Parsed arguments
+    """
+    parser = argparse.ArgumentParser(
+        prog="cbspec check",
+        description="Preflight check of configurations and their parquet inputs (footers and schemas only).",
+    )
+    parser.add_argument(
+        "--config",
+        action="append",
+        help="YAML configuration file (repeatable, default: config/default_config.yaml).",
+    )
+    parser.add_argument(
+        "--array_type",
+        type=str,
+        choices=["TASD", "CBSD"],
+        help="Override array type (TASD or CBSD).",
+    )
+
+    return parser.parse_args(argv)
+
+
+def pars_partial_args(argv):
+    """
+    Define and parse arguments of the `partial` subcommand.
+    :param argv: list of str
+    :return argparse.Namespace: Parsed arguments
+    """
+    parser = argparse.ArgumentParser(
+        prog="cbspec partial",
+        description="Ingest any subset of MC/data shards into a mergeable partial-histogram file.",
+    )
+    parser.add_argument(
+        "--config",
+        type=str,
+        default="config/default_config.yaml",
+        help="YAML configuration file (array type, quality cuts, output directories).",
+    )
+    parser.add_argument(
+        "--array_type", "--array-type",
+        type=str,
+        choices=["TASD", "CBSD"],
+        help="Override array type (TASD or CBSD).",
+    )
+    parser.add_argument("--mc", type=Path, nargs="*", default=[], help="MC parquet shards.")
+    parser.add_argument("--dt", type=Path, nargs="*", default=[], help="Data parquet shards.")
+    parser.add_argument(
+        "--output",
+        type=Path,
+        help="Partial file (default: <base_dir>/partials/<timestamp>/<array>_partial.arrow).",
+    )
+    parser.add_argument(
+        "--no_migration", "--no-migration",
+        action="store_true",
+        help="Do not fill the MC (thrown, reconstructed) migration matrix.",
+    )
+    parser.add_argument(
+        "--no_jit", "--no-jit",
+        action="store_true",
+        help="Always use the NumPy ingest path, even if numba is installed.",
+    )
+
+    return parser.parse_args(argv)
+
+
+def pars_merge_args(argv):
+    """
+    Define and parse arguments of the `merge` subcommand.
+    :param argv: list of str
+    :return argparse.Namespace: Parsed arguments
+    """
+    parser = argparse.ArgumentParser(
+        prog="cbspec merge",
+        description="Sum partial-histogram files and run the aperture/exposure/flux/spectrum stages.",
+    )
+    parser.add_argument("partials", type=Path, nargs="+", help="Partial files written by `cbspec partial`.")
+    parser.add_argument(
+        "--config",
+        type=str,
+        default="config/default_config.yaml",
+        help="YAML configuration file (energy bins, geometry, run time, output).",
+    )
+    parser.add_argument("--output", type=Path, help="Also write the merged partial to this file.")
+    parser.add_argument(
+        "--no_cache", "--no-cache",
+        action="store_true",
+        help="Neither read nor write the stage cache.",
+    )
+    parser.add_argument("--no_plots", "--no-plots", action="store_true", help="Skip plotting.")
+    parser.add_argument("--no_csv", "--no-csv", action="store_true", help="Skip the CSV export.")
+
+    return parser.parse_args(argv)
+
+
+def pars_update_args(argv):
+    """
+    Define and parse arguments of the `update` subcommand.
+    :param argv: list of str
+    :return argparse.Namespace: Parsed arguments
+    """
+    parser = argparse.ArgumentParser(
+        prog="cbspec update",
+        description="Incremental run: ingest only data shards not yet under the watermark.",
+    )
+    parser.add_argument(
+        "--config",
+        type=str,
+        default="config/default_config.yaml",
+        help="YAML configuration file.",
+    )
+    parser.add_argument(
+        "--array_type", "--array-type",
+        type=str,
+        choices=["TASD", "CBSD"],
+        help="Override array type (TASD or CBSD).",
+    )
+    parser.add_argument(
+        "--dt",
+        type=str,
+        help="Data shards: directory, glob pattern or file (default: data.<array>.dt_file).",
+    )
+    parser.add_argument(
+        "--state_dir", "--state-dir",
+        type=Path,
+        help="Watermark and stored partials (default: <base_dir>/incremental/<array_type>).",
+    )
+    parser.add_argument(
+        "--rebuild",
+        action="store_true",
+        help="Discard the stored partials and re-ingest MC and every data shard.",
+    )
+    parser.add_argument(
+        "--dry_run", "--dry-run",
+        action="store_true",
+        help="Only list which shards would be read.",
+    )
+    parser.add_argument(
+        "--no_cache", "--no-cache",
+        action="store_true",
+        help="Neither read nor write the stage cache.",
+    )
+    parser.add_argument("--no_plots", "--no-plots", action="store_true", help="Skip plotting.")
+    parser.add_argument("--no_csv", "--no-csv", action="store_true", help="Skip the CSV export.")
+
+    return parser.parse_args(argv)
+
+
+def pars_synth_args(argv):
+    """
+    Define and parse arguments of the `synth` subcommand.
+    :param argv: list of str
+    :return argparse.Namespace: Parsed arguments
+    """
+    defaults = SynthConfig()
+    count = lambda value: int(float(value))  # accepts 1e8
+
+    parser = argparse.ArgumentParser(
+        prog="cbspec synth",
+        description="Write synthetic resTree/tTlfit parquet files (broken power law + simple detector response).",
+    )
+    parser.add_argument(
+        "--tree_type", "--tree-type",
+        choices=["resTree", "tTlfit"],
+        default=defaults.tree_type,
+        help="Column layout of the files.",
+    )
+    parser.add_argument(
+        "--kind",
+        choices=["mc", "data"],
+        default=defaults.kind,
+        help="mc: every thrown event with mcenergy; data: triggered events only, mcenergy = 0.",
+    )
+    parser.add_argument("--rows", type=count, default=defaults.rows, help="Total rows over all shards.")
+    parser.add_argument(
+        "--row_group_size", "--row-group-size",
+        type=count,
+        default=defaults.row_group_size,
+        help="Rows per parquet row group (and per generation chunk).",
+    )
+    parser.add_argument("--shards", type=int, default=defaults.shards, help="Number of output files.")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        help="Processes writing shards in parallel (default: one per shard, capped at the CPU count).",
+    )
+    parser.add_argument(
+        "--output_dir", "--output-dir",
+        type=Path,
+        default=Path("output") / "synth",
+        help="Directory of the generated files.",
+    )
+    parser.add_argument("--prefix", help="Filename prefix (default: <tree_type>_<kind>).")
+    parser.add_argument("--seed", type=int, default=defaults.seed, help="Random seed.")
+    parser.add_argument(
+        "--log_e_min", "--log-e-min", type=float, default=defaults.log_e_min, help="Lowest thrown log10(E/eV)."
+    )
+    parser.add_argument(
+        "--log_e_max", "--log-e-max", type=float, default=defaults.log_e_max, help="Highest thrown log10(E/eV)."
+    )
+    parser.add_argument(
+        "--breaks",
+        type=float,
+        nargs="*",
+        default=list(defaults.breaks),
+        help="Break energies in log10(E/eV).",
+    )
+    parser.add_argument(
+        "--indices",
+        type=float,
+        nargs="+",
+        default=list(defaults.indices),
+        help="Spectral indices of dN/dE ∝ E^-γ (one more than --breaks).",
+    )
+    parser.add_argument(
+        "--resolution", type=float, default=defaults.resolution, help="Energy resolution σ(ln E) above threshold."
+    )
+    parser.add_argument(
+        "--theta_max_deg", "--theta-max-deg", type=float, default=defaults.theta_max_deg,
+        help="Maximum thrown zenith angle.",
+    )
+    parser.add_argument("--compression", default=defaults.compression, help="Parquet compression codec.")
+
+    return parser.parse_args(argv)
+
+
+def _print_table(rows, headers):
+    """
+    Print rows as a plain-text table.
+    """
+    from tabulate import tabulate
+
+    print(tabulate(rows, headers=headers, floatfmt=".4g"))
+
+
+def runs_main(argv):
+    """
+    Entry point for `cbspec runs list/query/diff/show/rebuild`.
+    """
+    args = pars_runs_args(argv)
+
+    _, _, _, output_cfg, _ = load_config(args.config)
+    registry_path = Path(args.registry) if args.registry else output_cfg.base_dir / REGISTRY_FILENAME
+
+    with RunRegistry(registry_path) as registry:
+        if args.action == "rebuild":
+            n = rebuild_registry(registry, output_cfg.runs_dir)
+            print(f"Registered {n} runs from {output_cfg.runs_dir} into {registry_path}")
+            return
+
+        if args.action == "diff":
+            diff = registry.diff(args.run_a, args.run_b)
+            _print_table(diff["runs"], headers=["field", args.run_a, args.run_b])
+            print()
+            _print_table(diff["params"], headers=["parameter", args.run_a, args.run_b])
+            print()
+            _print_table(diff["stages"], headers=["stage [s]", args.run_a, args.run_b])
+            return
+
+        if args.action == "show":
+            record = registry.get(args.run_id)
+            if record is None:
+                raise SystemExit(f"Run {args.run_id} is not in the registry {registry_path}")
+            _print_table(
+                [(k, v) for k, v in record.items() if not isinstance(v, (dict, list))],
+                headers=["field", "value"],
+            )
+            print()
+            _print_table(sorted(record["params"].items()), headers=["parameter", "value"])
+            print()
+            _print_table(record["stage_timings"].items(), headers=["stage", "seconds"])
+            print()
+            _print_table(record["artifacts"], headers=["kind", "path"])
+            return
+
+        if args.action == "list":
+            rows = registry.query(array_type=args.array_type, limit=args.limit)
+        else:
+            rows = registry.query(
+                where=args.where,
+                array_type=args.array_type,
+                input_like=args.input,
+                status=args.status,
+                limit=1 if args.last else args.limit,
+            )
+
+        _print_table(
+            [
+                (
+                    r["run_id"],
+                    r["status"],
+                    r["array_type"],
+                    (r["config_hash"] or "")[:12],
+                    Path(r["dt_file"]).name if r["dt_file"] else None,
+                    r["n_data"],
+                    r["total_seconds"],
+                    r["run_dir"],
+                )
+                for r in rows
+            ],
+            headers=["run_id", "status", "array", "config", "data file", "N_data", "time [s]", "run_dir"],
+        )
+
+
+def bench_main(argv):
+    """
+    Entry point for `cbspec bench import|run|compare`. `import` and `compare`
+    exit with status 1 on a regression.
+    """
+    args = pars_bench_args(argv)
+
+    if args.action == "run":
+        _bench_run(args)
+        return
+    if args.action == "compare":
+        _bench_compare(args)
+        return
+
+    results = [measure_import(module, repeat=args.repeat) for module in args.module or IMPORT_TARGETS]
+    _print_table(
+        [
+            (r["module"], r["median_s"], r["min_s"], r["max_s"], ", ".join(r["heavy"]) or "-")
+            for r in results
+        ],
+        headers=["module", "median [s]", "min [s]", "max [s]", "heavy modules"],
+    )
+    if args.top:
+        for r in results:
+            print()
+            _print_table(r["top"], headers=[f"{r['module']}: import", "self [s]", "cumulative [s]"])
+
+    failures = check_imports(results, budget_s=args.budget_s)
+    for failure in failures:
+        print(f"REGRESSION: {failure}", file=sys.stderr)
+    if failures:
+        raise SystemExit(1)
+
+
+def _bench_run(args):
+    """
+    `cbspec bench run`: time the stage cases and write the results JSON.
+    """
+    from datetime import datetime
+
+    from .bench import run_suite, write_results
+
+    results = run_suite(cases=args.case, max_rows=args.max_rows, repeat=args.repeat, workdir=args.workdir)
+    _print_table(
+        [
+            (cid, r["median_s"], r["min_s"], r["stdev_s"], r["items_per_s"])
+            for cid, r in results["results"].items()
+        ],
+        headers=["case", "median [s]", "min [s]", "stdev [s]", "items/s"],
+    )
+    output = args.output or Path("output") / "bench" / f"{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}.json"
+    print(f"Results written to {write_results(results, output)}")
+
+
+def _bench_compare(args):
+    """
+    `cbspec bench compare`: median-time diff of two result files.
+    """
+    from .bench import compare_results, load_results
+
+    base, new = load_results(args.base), load_results(args.new)
+    rows = compare_results(base, new, threshold=args.threshold)
+    _print_table(
+        [
+            (cid, "-" if b is None else f"{b:.4g}", "-" if n is None else f"{n:.4g}",
+             "-" if ratio is None else f"{ratio:.3f}", status)
+            for cid, b, n, ratio, status in rows
+        ],
+        headers=["case", "base median [s]", "new median [s]", "new/base", "status"],
+    )
+    for env_key in ("git_commit", "python", "numpy", "pyarrow", "cpus"):
+        b, n = base["environment"].get(env_key), new["environment"].get(env_key)
+        if b != n:
+            print(f"Note: {env_key} differs ({b} → {n})")
+
+    regressions = [cid for cid, _, _, _, status in rows if status == "regression"]
+    for cid in regressions:
+        print(f"REGRESSION: {cid}", file=sys.stderr)
+    if regressions:
+        raise SystemExit(1)
+
+
+def report_main(argv):
+    """
+    Entry point for `cbspec report <run_dir>`.
+    """
+    args = pars_report_args(argv)
+
+    spans, events = load_spans(args.run_dir)
+    if not spans:
+        raise SystemExit(f"No spans in the log of {args.run_dir} (run predates span logging)")
+
+    total_s = run_wall_seconds(events)
+    if total_s is not None:
+        print(f"Run wall time: {total_s:.3f} s")
+        print()
+
+    _print_table(
+        stage_breakdown(spans, total_s=total_s),
+        headers=["stage", "cache", "calls", "wall [s]", "share [%]", "cpu [s]", "cpu/wall", "peak RSS Δ [MB]"],
+    )
+    print()
+    _print_table(
+        throughput(spans),
+        headers=["span", "calls", "events", "wall [s]", "events/s", "MB", "MB/s"],
+    )
+
+    if args.batches:
+        print()
+        _print_table(
+            [
+                (s.get("file_index"), s.get("batch"), s["rows"], s["wall_s"], s["rows"] / s["wall_s"] if s["wall_s"] else None)
+                for s in spans if s["name"] == "batch"
+            ],
+            headers=["file", "batch", "events", "wall [s]", "events/s"],
+        )
+
+
+def sweep_main(argv):
+    """
+    Entry point for `cbspec sweep`. Exits with status 1 if any variant failed.
+    """
+    from .sweep import load_variants, run_sweep
+
+    args = pars_sweep_args(argv)
+
+    variants = load_variants(args.configs, args.matrix)
+    summary, sweep_dir = run_sweep(
+        variants,
+        sweep_dir=args.sweep_dir,
+        max_workers=args.workers,
+        use_cache=not args.no_cache,
+        make_plots=not args.no_plots,
+        write_csv=False if args.no_csv else None,
+        force_stages=args.force_stage,
+        keep_shared=args.keep_shared,
+    )
+
+    columns = [c for c in summary[0] if c not in ("run_id", "error")]
+    _print_table([[row[c] for c in columns] for row in summary], headers=columns)
+    print()
+    print(f"Sweep directory: {sweep_dir}")
+
+    failed = [row for row in summary if row["status"] != "completed"]
+    for row in failed:
+        print(f"FAILED: {row['variant']}: {row['error']}", file=sys.stderr)
+    if failed:
+        raise SystemExit(1)
+
+
+def serve_main(argv):
+    """
+    Entry point for `cbspec serve`. Runs until interrupted.
+    """
+    from datetime import datetime
+
+    from .output_utils import make_unique_dir
+    from .serve import AnalysisServer, make_server
+
+    args = pars_serve_args(argv)
+
+    array_cfg, _, _, output_cfg, cfg = load_config(args.config)
+    serve_dir = make_unique_dir(output_cfg.base_dir / "serve", datetime.now().strftime("%Y%m%d-%H%M%S"))
+    logger = RunLogger(serve_dir / "logs", level=output_cfg.log_level, buffered=output_cfg.log_buffered)
+
+    with logger:
+        analysis = AnalysisServer(
+            cfg,
+            array_types=args.array or [array_cfg.array_type],
+            logger=logger,
+            cache_size=args.cache_size,
+        )
+        httpd = make_server(analysis, host=args.host, port=args.port, socket_path=args.socket)
+        where = args.socket or f"http://{args.host}:{httpd.server_address[1]}"
+        logger.log_text(f"Serving {', '.join(analysis.health()['arrays'])} on {where} (Ctrl-C to stop)")
+        logger.log_json(event="serve_start", address=where)
+        try:
+            httpd.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            httpd.server_close()
+            if args.socket:
+                Path(args.socket).unlink(missing_ok=True)
+            logger.log_json(event="serve_end", **analysis.cache.stats())
+
+
+def check_main(argv):
+    """
+    Entry point for `cbspec check`. Exits with status 1 if any check failed.
+    """
+    from .main import select_input_files
+    from .preflight import preflight
+
+    args = pars_check_args(argv)
+
+    n_errors = 0
+    for config_path in args.config or ["config/default_config.yaml"]:
+        print(f"== {config_path}")
+        try:
+            array_cfg, spectrum_cfg, cuts_cfg, _, cfg = load_config(config_path)
+            if args.array_type is not None:
+                array_cfg.array_type = args.array_type
+            select_input_files(array_cfg, cfg)
+            report = preflight(array_cfg, spectrum_cfg, cuts_cfg, load_energy_scale_config(cfg),
+                               load_mc_productions_config(cfg, array_cfg.array_type))
+        except (FileNotFoundError, KeyError, TypeError, ValueError) as exc:
+            print(f"ERROR: cannot load configuration: {type(exc).__name__}: {exc}")
+            n_errors += 1
+            continue
+
+        _print_table(
+            [
+                (info["role"], info["path"], info["tree_type"], info["rows"], info["row_groups"],
+                 None if info["bytes"] is None else info["bytes"] / 2**20,
+                 None if info["uncompressed_bytes"] is None else info["uncompressed_bytes"] / 2**20)
+                for info in report["inputs"]
+            ],
+            headers=["input", "path", "tree", "rows", "row groups", "MB", "uncompressed MB"],
+        )
+        est = report["estimate"]
+        print(
+            f"Estimate: {est['rows']} rows, event arrays {est['event_array_bytes'] / 2**20:.1f} MB, "
+            f"batch {est['batch_bytes'] / 2**20:.1f} MB, peak ~{est['peak_memory_bytes'] / 2**20:.1f} MB"
+        )
+        for warning in report["warnings"]:
+            print(f"WARNING: {warning}")
+        for error in report["errors"]:
+            print(f"ERROR: {error}")
+        n_errors += len(report["errors"])
+        print()
+
+    if n_errors:
+        print(f"{n_errors} error(s)", file=sys.stderr)
+        raise SystemExit(1)
+    print("All checks passed.")
+
+
+def synth_main(argv):
+    """
+    Entry point for `cbspec synth`.
+    """
+    import time
+
+    from .synth import generate
+
+    args = pars_synth_args(argv)
+    cfg = SynthConfig(
+        tree_type=args.tree_type,
+        kind=args.kind,
+        rows=args.rows,
+        row_group_size=args.row_group_size,
+        shards=args.shards,
+        log_e_min=args.log_e_min,
+        log_e_max=args.log_e_max,
+        breaks=tuple(args.breaks),
+        indices=tuple(args.indices),
+        resolution=args.resolution,
+        theta_max_deg=args.theta_max_deg,
+        seed=args.seed,
+        compression=args.compression,
+    )
+
+    t0 = time.perf_counter()
+    try:
+        files = generate(cfg, args.output_dir, prefix=args.prefix, max_workers=args.workers)
+    except ValueError as exc:
+        raise SystemExit(f"cbspec synth: {exc}")
+    wall_s = time.perf_counter() - t0
+
+    _print_table(
+        [(f["path"], f["rows"], f["row_groups"], f["bytes"] / 2**20, f["seconds"]) for f in files],
+        headers=["file", "rows", "row groups", "MB", "time [s]"],
+    )
+    rows = sum(f["rows"] for f in files)
+    print(f"{rows} {cfg.tree_type} {cfg.kind} rows in {wall_s:.1f} s ({rows / wall_s:.3g} rows/s)")
+
+
+def partial_main(argv):
+    """
+    Entry point for `cbspec partial`.
+    """
+    from datetime import datetime
+
+    from .output_utils import make_unique_dir
+    from .partials import ingest_partial, save_partial
+    from .progress import Progress, parquet_totals
+
+    args = pars_partial_args(argv)
+    if not args.mc and not args.dt:
+        raise SystemExit("cbspec partial: give at least one --mc or --dt shard")
+    for path in [*args.mc, *args.dt]:
+        if not path.exists():
+            raise SystemExit(f"cbspec partial: file {path} does not exist")
+
+    array_cfg, _, cuts_cfg, output_cfg, _ = load_config(args.config)
+    if args.array_type is not None:
+        array_cfg.array_type = args.array_type
+
+    out_dir = make_unique_dir(output_cfg.base_dir / "partials", datetime.now().strftime("%Y%m%d-%H%M%S"))
+    output = args.output or out_dir / f"{array_cfg.array_type}_partial.arrow"
+    logger = RunLogger(out_dir / "logs", level=output_cfg.log_level, buffered=output_cfg.log_buffered)
+
+    with logger:
+        total_rows, total_bytes = parquet_totals([*args.mc, *args.dt])
+        with Progress(total_rows, total_bytes, logger=logger, mode=output_cfg.progress,
+                      heartbeat_s=output_cfg.heartbeat_s) as progress:
+            partial = ingest_partial(
+                args.mc, args.dt, array_cfg.array_type, cuts_cfg, logger,
+                migration=not args.no_migration, progress=progress, jit=False if args.no_jit else None,
+            )
+        save_partial(output, partial, logger)
+
+    print(
+        f"{output}: {len(partial['meta']['inputs'])} shard(s), {int(partial['n_mc_thrown'])} MC thrown, "
+        f"{int(partial['n_mc_reco'])} MC reco, {int(partial['n_data'])} data events"
+    )
+
+
+def merge_main(argv):
+    """
+    Entry point for `cbspec merge`.
+    """
+    from .data_classes import QualityCuts
+    from .partials import load_partial, merge_partials, save_partial
+
+    args = pars_merge_args(argv)
+    try:
+        partial = merge_partials([load_partial(path) for path in args.partials])
+    except (FileNotFoundError, ValueError) as exc:
+        raise SystemExit(f"cbspec merge: {exc}")
+    if args.output is not None:
+        save_partial(args.output, partial)
+
+    array_cfg, spectrum_cfg, _, output_cfg, cfg = load_config(args.config)
+    # Ingestion already happened on the nodes: array type and cuts come from the partials
+    meta = partial["meta"]
+    array_cfg.array_type = meta["array_type"]
+    cuts_cfg = QualityCuts(**meta["quality_cuts"])
+    if args.no_csv:
+        output_cfg.write_csv = False
+
+    results = run_pipeline(
+        array_cfg,
+        spectrum_cfg,
+        cuts_cfg,
+        output_cfg,
+        cfg,
+        use_cache=not args.no_cache,
+        make_plots=not args.no_plots,
+        partial=partial,
+    )
+    print(f"Merged {len(args.partials)} partial(s) ({len(meta['inputs'])} shards) → {results['run_dir']}")
+
+
+def update_main(argv):
+    """
+    Entry point for `cbspec update`.
+    """
+    import shutil
+
+    from .incremental import IncrementalState, expand_shards
+    from .main import select_input_files
+
+    args = pars_update_args(argv)
+
+    array_cfg, spectrum_cfg, cuts_cfg, output_cfg, cfg = load_config(args.config)
+    if args.array_type is not None:
+        array_cfg.array_type = args.array_type
+    select_input_files(array_cfg, cfg)
+    if args.no_csv:
+        output_cfg.write_csv = False
+
+    dt_shards = expand_shards(args.dt or array_cfg.dt_file)
+    missing = [str(path) for path in dt_shards if not path.exists()]
+    if not dt_shards or missing:
+        raise SystemExit(f"cbspec update: no data shards found ({', '.join(missing) or args.dt or array_cfg.dt_file})")
+
+    state_dir = args.state_dir or output_cfg.base_dir / "incremental" / array_cfg.array_type
+    if args.rebuild and state_dir.exists() and not args.dry_run:
+        shutil.rmtree(state_dir)
+    state = IncrementalState(state_dir, array_cfg.array_type, cuts_cfg)
+
+    if args.dry_run:
+        try:
+            state.check_settings()
+        except ValueError as exc:
+            print(f"WARNING: {exc}")
+        plan = state.plan(array_cfg.mc_file, dt_shards)
+        print(f"MC {array_cfg.mc_file}: {plan['mc']}")
+        for status in ("new", "changed", "reused", "removed"):
+            for path in plan[status]:
+                print(f"{status:8s} {path}")
+        return
+
+    logger = RunLogger(state_dir / "logs", level=output_cfg.log_level, buffered=output_cfg.log_buffered)
+    with logger:
+        try:
+            partial, plan = state.update(array_cfg.mc_file, dt_shards, logger)
+        except ValueError as exc:
+            raise SystemExit(f"cbspec update: {exc}")
+
+    results = run_pipeline(
+        array_cfg,
+        spectrum_cfg,
+        cuts_cfg,
+        output_cfg,
+        cfg,
+        use_cache=not args.no_cache,
+        make_plots=not args.no_plots,
+        partial=partial,
+    )
+    print(
+        f"Read {len(plan['new']) + len(plan['changed'])} data shard(s), reused {len(plan['reused'])} "
+        f"(MC {plan['mc']}) → {results['run_dir']}"
+    )
+
 
-    return parser.parse_args()
+# Subcommands dispatched on the first command-line argument
+COMMANDS = {
+    "runs": runs_main,
+    "bench": bench_main,
+    "report": report_main,
+    "sweep": sweep_main,
+    "serve": serve_main,
+    "check": check_main,
+    "synth": synth_main,
+    "partial": partial_main,
+    "merge": merge_main,
+    "update": update_main,
+}
 
-def main():
+
+def main(argv=None):
     """
     Entry point for the cbspec CLI.
 
+    If the first argument names a subcommand (see COMMANDS), the remaining
+    arguments are handed to that subcommand. Otherwise the full pipeline runs.
+
     Steps:
         1. Parse command-line arguments
         2. Load YAML configuration file
         3. Apply CLI overrides
         4. Run the full pipeline
     """
-    args = pars_args()
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if argv and argv[0] in COMMANDS:
+        return COMMANDS[argv[0]](argv[1:])
+
+    args = pars_args(argv)
 
     # Load YAML config → dataclasses
     array_cfg, spectrum_cfg, cuts_cfg, output_cfg, cfg = load_config(args.config)
@@ -81,11 +1187,55 @@ def main():
     if args.dt_file is not None:
         array_cfg.dt_file = Path(args.dt_file)
 
+    if args.no_csv:
+        output_cfg.write_csv = False
+
+    if args.log_level is not None:
+        output_cfg.log_level = args.log_level
+
+    if args.progress is not None:
+        output_cfg.progress = args.progress
+
+    if args.checkpoint_s is not None:
+        output_cfg.checkpoint_s = args.checkpoint_s
+
+    if args.no_jit:
+        output_cfg.jit = False
+
+    energy_scale_cfg = load_energy_scale_config(cfg)
+    if args.energy_scale is not None:
+        energy_scale_cfg = EnergyScaleConfig(
+            scales=np.array(args.energy_scale, dtype=float),
+            apply_to_mc=args.energy_scale_mc,
+        )
+    elif args.energy_scale_mc and energy_scale_cfg is not None:
+        energy_scale_cfg.apply_to_mc = True
+
+    skim_cfg = load_skim_config(cfg)
+    if args.skim and skim_cfg is None:
+        skim_cfg = SkimConfig()
+
+    zenith_cfg = load_zenith_config(cfg)
+    if args.zenith_bins is not None:
+        axis = args.zenith_axis or (zenith_cfg.axis if zenith_cfg is not None else "cos_theta")
+        zenith_cfg = zenith_config(args.zenith_bins, axis)
+    elif args.zenith_axis is not None and zenith_cfg is not None:
+        zenith_cfg.axis = args.zenith_axis
+
     # Run the full pipeline
     run_pipeline(
         array_cfg=array_cfg,
         spectrum_cfg=spectrum_cfg,
         cuts_cfg=cuts_cfg,
         output_cfg=output_cfg,
-        cfg=cfg
+        cfg=cfg,
+        energy_scale_cfg=energy_scale_cfg,
+        force_stages=args.force_stage,
+        use_cache=not args.no_cache,
+        make_plots=not args.no_plots,
+        profile=args.profile,
+        profile_top=args.profile_top,
+        skim_cfg=skim_cfg,
+        zenith_cfg=zenith_cfg,
+        resume=args.resume,
     )
\ No newline at end of file
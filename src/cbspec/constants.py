@@ -19,4 +19,9 @@ s_to_yr = 1 / 31557600
 
 
 # Conversion from km^2 to m^2
-m2_to_km2 = 1 / (1000)**2
\ No newline at end of file
+m2_to_km2 = 1 / (1000)**2
+
+
+# Fixed log10(E/eV) binning of the MC/data event histogram plots
+hist_range = (18., 21.)
+hist_bins = 30
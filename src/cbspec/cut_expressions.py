@@ -0,0 +1,345 @@
+"""
+Declarative quality cuts: expressions from the YAML `quality_cuts` block,
+parsed once and compiled into a single fused kernel.
+
+    quality_cuts:
+        theta_deg: 45.
+        ...
+        expressions:                        (optional)
+            theta: "theta < theta_deg"      replaces a default cut
+            core: "sqrt(xcore**2 + ycore**2) < 12000"   adds a cut on parquet columns
+            fs800: null                     drops a default cut
+
+Every cut is a boolean expression over:
+    - the per-event cut variables of process_data.extract_cut_variables
+      (logen, mclogen, theta (corrected), fs800, pderr, ngsd, bdist (m), ldf, gf)
+    - the thresholds of the quality_cuts block (theta_deg, ped_error, ...)
+    - constants (pi) and functions (FUNCTIONS: abs, sqrt, log10, cos, ...)
+    - any other parquet column, read along with the cut columns (list
+      columns give the element of process_data.LIST_ELEMENT, else branch s)
+
+Operators: + - * / **, comparisons (chained comparisons allowed), and / or /
+not (or & | ~ with parentheses). DEFAULT_EXPRESSIONS reproduces the seven
+TA-style cuts; `expressions` entries replace, add (in YAML order) or, with
+null, drop cuts.
+
+compile_cuts parses each expression once into a small tree (tuples, see
+parse) and ANDs all cuts into one fused expression, cached per cut setting
+(the COMPILED_CACHE_SIZE most recently used settings):
+    - with numexpr installed and more than one core, the fused expression is
+      one numexpr.evaluate call (multi-threaded, no full-size temporaries)
+    - otherwise the tree is evaluated with NumPy over CHUNK_ROWS events at a
+      time, so temporaries stay chunk-sized and cache-resident (on a single
+      core this beats numexpr, which gains from its threads only)
+Both give the same mask as the former seven-comparison AND. terms() keeps
+the cuts separate for cut flows.
+"""
+
+import ast
+import json
+import operator
+import threading
+from collections import OrderedDict
+from dataclasses import asdict, fields
+
+import numpy as np
+
+from .data_classes import QualityCuts
+
+# The seven TA-style cuts, in cut-flow order
+DEFAULT_EXPRESSIONS = {
+    "ngsd": "ngsd >= number_of_good_sd",
+    "theta": "theta < theta_deg",
+    "bdist": "bdist >= boarder_dist_m",
+    "gf": "gf < geometry_chi2",
+    "ldf": "ldf < ldf_chi2",
+    "pderr": "pderr < ped_error",
+    "fs800": "fs800 < frac_s800",
+}
+
+# Events per NumPy chunk (bounds the temporaries of the fallback kernel)
+CHUNK_ROWS = 65536
+
+FUNCTIONS = {
+    "abs": (1, np.abs),
+    "sqrt": (1, np.sqrt),
+    "exp": (1, np.exp),
+    "log": (1, np.log),
+    "log10": (1, np.log10),
+    "sin": (1, np.sin),
+    "cos": (1, np.cos),
+    "tan": (1, np.tan),
+    "arcsin": (1, np.arcsin),
+    "arccos": (1, np.arccos),
+    "arctan": (1, np.arctan),
+    "arctan2": (2, np.arctan2),
+}
+
+CONSTANTS = {"pi": np.pi}
+
+_BINARY = {ast.Add: "+", ast.Sub: "-", ast.Mult: "*", ast.Div: "/", ast.Pow: "**"}
+_COMPARE = {ast.Lt: "<", ast.LtE: "<=", ast.Gt: ">", ast.GtE: ">=", ast.Eq: "==", ast.NotEq: "!="}
+_NUMPY_OPS = {
+    "+": operator.add, "-": operator.sub, "*": operator.mul, "/": operator.truediv, "**": operator.pow,
+    "<": operator.lt, "<=": operator.le, ">": operator.gt, ">=": operator.ge, "==": operator.eq, "!=": operator.ne,
+}
+
+
+def _tree(node, source):
+    # ast node → ("and"|"or", [children]) / ("not"|"neg", x) / ("bin"|"cmp", op, a, b)
+    #            / ("call", fn, [args]) / ("name", str) / ("const", float)
+    if isinstance(node, ast.BoolOp):
+        return ("and" if isinstance(node.op, ast.And) else "or", [_tree(v, source) for v in node.values])
+    if isinstance(node, ast.BinOp) and isinstance(node.op, (ast.BitAnd, ast.BitOr)):
+        return ("and" if isinstance(node.op, ast.BitAnd) else "or", [_tree(node.left, source), _tree(node.right, source)])
+    if isinstance(node, ast.UnaryOp):
+        if isinstance(node.op, (ast.Not, ast.Invert)):
+            return ("not", _tree(node.operand, source))
+        if isinstance(node.op, ast.USub):
+            return ("neg", _tree(node.operand, source))
+        if isinstance(node.op, ast.UAdd):
+            return _tree(node.operand, source)
+    if isinstance(node, ast.BinOp) and type(node.op) in _BINARY:
+        return ("bin", _BINARY[type(node.op)], _tree(node.left, source), _tree(node.right, source))
+    if isinstance(node, ast.Compare):
+        if not all(type(op) in _COMPARE for op in node.ops):
+            raise ValueError(f"unsupported comparison in {source!r}")
+        operands = [_tree(node.left, source)] + [_tree(c, source) for c in node.comparators]
+        terms = [("cmp", _COMPARE[type(op)], a, b) for op, a, b in zip(node.ops, operands, operands[1:])]
+        return terms[0] if len(terms) == 1 else ("and", terms)
+    if isinstance(node, ast.Call):
+        if not isinstance(node.func, ast.Name) or node.func.id not in FUNCTIONS or node.keywords:
+            raise ValueError(f"unknown function in {source!r} (available: {', '.join(FUNCTIONS)})")
+        n_args = FUNCTIONS[node.func.id][0]
+        if len(node.args) != n_args:
+            raise ValueError(f"{node.func.id}() takes {n_args} argument(s) in {source!r}")
+        return ("call", node.func.id, [_tree(a, source) for a in node.args])
+    if isinstance(node, ast.Name):
+        return ("name", node.id)
+    if isinstance(node, ast.Constant) and isinstance(node.value, (bool, int, float)):
+        return ("const", float(node.value))
+    raise ValueError(f"unsupported syntax {type(node).__name__} in {source!r}")
+
+
+def parse(source):
+    """
+    Parse one cut expression into its tree.
+
+    :param source: str
+                   e.g. "theta < theta_deg"
+    :raise ValueError: on a syntax error or an unsupported construct
+    :return tree: tuple
+    """
+    if not isinstance(source, str):
+        raise ValueError(f"cut expression must be a string, got {source!r}")
+    try:
+        node = ast.parse(source.strip(), mode="eval").body
+    except SyntaxError as exc:
+        raise ValueError(f"invalid cut expression {source!r}: {exc.msg}") from None
+    return _tree(node, source)
+
+
+def names(tree):
+    """
+    Symbols (variables, thresholds, columns, constants) used by a tree.
+
+    :return names: set of str
+    """
+    kind = tree[0]
+    if kind == "name":
+        return {tree[1]}
+    if kind == "const":
+        return set()
+    if kind in ("and", "or"):
+        return set().union(*(names(t) for t in tree[1]))
+    if kind in ("not", "neg"):
+        return names(tree[1])
+    if kind == "call":
+        return set().union(*(names(t) for t in tree[2]))
+    return names(tree[2]) | names(tree[3])
+
+
+def render(tree):
+    """
+    numexpr source of a tree (fully parenthesized).
+    """
+    kind = tree[0]
+    if kind == "name":
+        return tree[1]
+    if kind == "const":
+        return repr(tree[1])
+    if kind in ("and", "or"):
+        return "(" + (" & " if kind == "and" else " | ").join(render(t) for t in tree[1]) + ")"
+    if kind == "not":
+        return f"(~{render(tree[1])})"
+    if kind == "neg":
+        return f"(-{render(tree[1])})"
+    if kind == "call":
+        return f"{tree[1]}({', '.join(render(t) for t in tree[2])})"
+    return f"({render(tree[2])} {tree[1]} {render(tree[3])})"
+
+
+def _evaluate(tree, env):
+    kind = tree[0]
+    if kind == "name":
+        return env[tree[1]]
+    if kind == "const":
+        return tree[1]
+    if kind in ("and", "or"):
+        combine = np.logical_and if kind == "and" else np.logical_or
+        result = _evaluate(tree[1][0], env)
+        for t in tree[1][1:]:
+            result = combine(result, _evaluate(t, env))
+        return result
+    if kind == "not":
+        return np.logical_not(_evaluate(tree[1], env))
+    if kind == "neg":
+        return -_evaluate(tree[1], env)
+    if kind == "call":
+        return FUNCTIONS[tree[1]][1](*(_evaluate(t, env) for t in tree[2]))
+    return _NUMPY_OPS[tree[1]](_evaluate(tree[2], env), _evaluate(tree[3], env))
+
+
+def expression_set(cuts: QualityCuts):
+    """
+    Cut name → expression source: DEFAULT_EXPRESSIONS updated by cuts.expressions.
+
+    :return expressions: dict
+    """
+    expressions = dict(DEFAULT_EXPRESSIONS)
+    for name, source in (cuts.expressions or {}).items():
+        if source is None or source is False:
+            expressions.pop(name, None)
+        else:
+            expressions[name] = source
+    return expressions
+
+
+def thresholds(cuts: QualityCuts):
+    """
+    Numeric fields of QualityCuts by name (the thresholds expressions may use).
+    """
+    return {f.name: getattr(cuts, f.name) for f in fields(QualityCuts) if f.name != "expressions"}
+
+
+def _numexpr():
+    try:
+        import numexpr
+    except ImportError:
+        return None
+    return numexpr if numexpr.detect_number_of_cores() > 1 else None
+
+
+class CompiledCuts:
+    """
+    Parsed quality cuts with a fused evaluation kernel (see module docstring).
+
+    :param cuts: QualityCuts
+    :raise ValueError: if an expression does not parse or no cut is left
+    """
+
+    def __init__(self, cuts: QualityCuts):
+        from .process_data import CUT_VARIABLES
+
+        self.expressions = expression_set(cuts)
+        if not self.expressions:
+            raise ValueError("quality_cuts.expressions removes every cut")
+        self.trees = {}
+        for name, source in self.expressions.items():
+            try:
+                self.trees[name] = parse(source)
+            except ValueError as exc:
+                raise ValueError(f"quality_cuts.expressions.{name}: {exc}") from None
+        self.names = tuple(self.trees)
+        self.params = {name: float(value) for name, value in thresholds(cuts).items()}
+        self.params.update(CONSTANTS)
+        self.fused = ("and", list(self.trees.values()))
+        self.source = render(self.fused)
+
+        used = set().union(*(names(tree) for tree in self.trees.values()))
+        # Symbols that are neither cut variables nor scalars: extra parquet columns
+        self.columns = tuple(sorted(used - set(CUT_VARIABLES) - set(self.params) - set(FUNCTIONS)))
+        self._ne = _numexpr()
+        self.backend = "numexpr" if self._ne is not None else "numpy"
+
+    def _env(self, variables, tree):
+        env = {}
+        for name in names(tree):
+            if name in variables:
+                env[name] = np.asarray(variables[name])
+            elif name in self.params:
+                env[name] = self.params[name]
+            else:
+                raise ValueError(
+                    f"unknown name {name!r} in quality cuts: not a cut variable, threshold or loaded column"
+                )
+        return env
+
+    def _run(self, tree, variables):
+        n = len(next(iter(variables.values())))
+        env = self._env(variables, tree)
+        if self._ne is not None:
+            result = self._ne.evaluate(render(tree), local_dict=env)
+            return np.broadcast_to(result, n).astype(bool, copy=False)
+
+        out = np.empty(n, dtype=bool)
+        arrays = {k: v for k, v in env.items() if isinstance(v, np.ndarray)}
+        for start in range(0, n, CHUNK_ROWS):
+            stop = min(start + CHUNK_ROWS, n)
+            chunk = {**env, **{k: v[start:stop] for k, v in arrays.items()}}
+            out[start:stop] = _evaluate(tree, chunk)
+        return out
+
+    def mask(self, variables):
+        """
+        Events passing every cut, from one fused kernel.
+
+        :param variables: dict of array-like
+                          See process_data.extract_cut_variables
+        :return mask: np.ndarray of bool
+        """
+        return self._run(self.fused, variables)
+
+    def terms(self, variables):
+        """
+        Each cut on its own, in cut-flow order.
+
+        :return terms: list of (str, np.ndarray of bool)
+        """
+        return [(name, self._run(tree, variables)) for name, tree in self.trees.items()]
+
+
+# Compiled cut settings kept (least recently used evicted first); the analysis
+# server compiles one per distinct quality_cuts override
+COMPILED_CACHE_SIZE = 64
+
+_COMPILED = OrderedDict()
+_COMPILED_LOCK = threading.Lock()
+
+
+def compile_cuts(cuts: QualityCuts):
+    """
+    CompiledCuts of a cut setting, parsed once per distinct setting while it
+    stays among the COMPILED_CACHE_SIZE most recently used (thread-safe).
+
+    :param cuts: QualityCuts
+    :return compiled: CompiledCuts
+    """
+    key = json.dumps(asdict(cuts), sort_keys=True, default=str)
+    with _COMPILED_LOCK:
+        compiled = _COMPILED.get(key)
+        if compiled is None:
+            compiled = _COMPILED[key] = CompiledCuts(cuts)
+            while len(_COMPILED) > COMPILED_CACHE_SIZE:
+                _COMPILED.popitem(last=False)
+        else:
+            _COMPILED.move_to_end(key)
+    return compiled
+
+
+def clear_compiled_cuts():
+    """
+    Drop every cached CompiledCuts.
+    """
+    with _COMPILED_LOCK:
+        _COMPILED.clear()
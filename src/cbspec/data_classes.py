@@ -70,7 +70,10 @@ class QualityCuts:
     These thresholds are applied batch-wise in process_data.py and determine
     which reconstructed events are accepted into the final MC/data histograms.
 
-    Parameters correspond directly to YAML fields.
+    Parameters correspond directly to YAML fields. The cuts themselves are
+    expressions over the per-event variables and these thresholds
+    (cut_expressions.DEFAULT_EXPRESSIONS); `expressions` maps cut names to
+    expressions that replace, add or (None) drop cuts.
     """
     number_of_good_sd: int
     theta_deg: float
@@ -79,6 +82,7 @@ class QualityCuts:
     ldf_chi2: float
     ped_error: float
     frac_s800: float
+    expressions: dict = None
 
 @dataclass
 class OutputConfig:
@@ -94,8 +98,180 @@ class OutputConfig:
     :param runs_dir: Path
                      Parent directory for run-specific snapshots:
                         output/runs/<timestamp>/
+    :param write_csv: bool
+                      Also export flux/spectrum tables as CSV. The columnar
+                      results file ({array_type}_results.arrow) is always written.
+    :param cache_dir: Path
+                      Root of the stage-output cache (default: base_dir / "cache")
+    :param plot_workers: int or None
+                         Processes used to render plots (None: one per plot,
+                         capped at the CPU count; 0 or 1: render serially)
+    :param log_level: str
+                      Minimum level of run.log/console lines ("DEBUG" shows the
+                      per-batch ingestion lines); run.jsonl records everything
+    :param log_buffered: bool
+                         Write logs from a background thread with periodic flushing
+    :param progress: str
+                     Ingestion progress display: "auto" (tqdm bar on a TTY,
+                     heartbeats otherwise), "bar", "heartbeat" or "off"
+    :param heartbeat_s: float
+                        Seconds between progress heartbeats in run.jsonl/run.log
+    :param checkpoint_s: float
+                         Seconds between ingestion checkpoints in run_dir/checkpoint
+                         (see checkpoint.py; 0 disables them)
+    :param production_workers: int or None
+                               Processes streaming MC productions (None: one per
+                               production, capped at the CPU count; 0 or 1: serially)
+    :param jit: bool or None
+                Ingest through the generated numba selection kernel (None: when
+                numba is installed and the inputs hold at least
+                fused.JIT_MIN_ROWS rows; False: always NumPy; True: require it)
     """
     base_dir: Path
     plots_dir: Path
     logs_dir: Path
-    runs_dir: Path
\ No newline at end of file
+    runs_dir: Path
+    write_csv: bool = True
+    cache_dir: Path = None
+    plot_workers: int = None
+    log_level: str = "INFO"
+    log_buffered: bool = True
+    progress: str = "auto"
+    heartbeat_s: float = 30.0
+    checkpoint_s: float = 300.0
+    production_workers: int = None
+    jit: bool = None
+
+    def __post_init__(self):
+        if self.cache_dir is None:
+            self.cache_dir = Path(self.base_dir) / "cache"
+
+@dataclass
+class EnergyScaleConfig:
+    """
+    Configuration for the optional energy-scale systematic scan.
+
+    :param scales: np.ndarray
+                   Multiplicative energy-scale factors applied on top of the
+                   FD energy correction (1.0 = nominal, e.g. [0.9, 1.0, 1.1])
+    :param apply_to_mc: bool
+                        Also shift MC reconstructed energies (changes the aperture).
+                        MC thrown energies are never shifted.
+    """
+    scales: np.ndarray
+    apply_to_mc: bool = False
+@dataclass
+class SynthConfig:
+    """
+    Configuration of a synthetic resTree/tTlfit dataset (see synth.py).
+
+    :param tree_type: str
+                      "resTree" (list columns) or "tTlfit" (flat energy_s800_p/ngsd/ldfchi2pdof)
+    :param kind: str
+                 "mc" (every thrown event, mcenergy = thrown energy) or
+                 "data" (triggered events only, mcenergy = 0)
+    :param rows: int
+                 Total rows over all shards
+    :param row_group_size: int
+                           Rows per parquet row group (also the generation chunk)
+    :param shards: int
+                   Number of output files
+    :param log_e_min: float
+                      Lower edge of the thrown log10(E/eV) range
+    :param log_e_max: float
+                      Upper edge of the thrown log10(E/eV) range
+    :param breaks: tuple of float
+                   log10(E/eV) break energies of the power law
+    :param indices: tuple of float
+                    Spectral indices γ of dN/dE ∝ E^-γ, one more than breaks
+    :param resolution: float
+                       Energy resolution (σ of ln E_reco/E_true) well above threshold
+    :param theta_max_deg: float
+                          Maximum thrown zenith angle
+    :param seed: int
+                 Seed of the per-shard random streams
+    :param compression: str
+                        Parquet compression codec
+    """
+    tree_type: str = "resTree"
+    kind: str = "mc"
+    rows: int = 1_000_000
+    row_group_size: int = 250_000
+    shards: int = 1
+    log_e_min: float = 17.5
+    log_e_max: float = 20.5
+    breaks: tuple = (18.7, 19.8)
+    indices: tuple = (3.2, 2.7, 4.5)
+    resolution: float = 0.15
+    theta_max_deg: float = 60.
+    seed: int = 0
+    compression: str = "snappy"
+
+
+@dataclass
+class SkimConfig:
+    """
+    Configuration of the optional cut-passing event skim (see skim.py).
+
+    :param columns: tuple of str or None
+                    Input columns kept in the skim (None = all); logen/mclogen
+                    are always added
+    :param compression: str
+                        Parquet compression codec
+    :param row_group_size: int
+                           Rows per parquet row group (and per write)
+    """
+    columns: tuple = None
+    compression: str = "zstd"
+    row_group_size: int = 100_000
+
+
+@dataclass
+class ZenithConfig:
+    """
+    Configuration of the optional energy × zenith binning (zenith stages).
+
+    :param edges: np.ndarray
+                  Bin edges of the zenith axis (increasing)
+    :param axis: str
+                 "cos_theta" or "sec_theta" of the corrected reconstructed zenith angle
+    """
+    edges: np.ndarray
+    axis: str = "cos_theta"
+
+
+@dataclass
+class MCProduction:
+    """
+    One MC production of a multi-production aperture (see productions.py).
+
+    :param name: str
+                 Label used in logs, diagnostics and plots
+    :param file: Path
+                 MC parquet file of the production
+    :param generated_area_m2: float
+                              A_gen of this production in m²
+    :param generated_solid_angle_sr: float
+                                     Ω_gen of this production in sr
+    :param spectral_index: float or None
+                           γ of the thrown spectrum dN/dE ∝ E^-γ (needed for reweighting)
+    """
+    name: str
+    file: Path
+    generated_area_m2: float
+    generated_solid_angle_sr: float
+    spectral_index: float = None
+
+
+@dataclass
+class MCProductionsConfig:
+    """
+    Configuration of several MC productions combined into one aperture.
+
+    :param productions: tuple of MCProduction
+    :param reference_index: float or None
+                            Spectral index every production is reweighted to
+                            (None: no spectral reweighting)
+    """
+    productions: tuple
+    reference_index: float = None
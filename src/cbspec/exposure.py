@@ -16,6 +16,14 @@ where:
 
 The acceptance fraction (N_MC_reco(E) / N_MC_raw(E)) is the key physics quantity that
 encodes reconstruction efficiency and quality-cut survival probability.
+
+Several MC productions p (each with its own A_gen,p × Ω_gen,p) are combined by
+compute_combined_aperture into one estimate per bin:
+
+    AΩ(E) = Σ_p N_MC_reco,p(E) / Σ_p (N_MC_raw,p(E) / (A_gen,p × Ω_gen,p))
+
+i.e. all reconstructed events over the summed thrown fluence (events per m² sr),
+the maximum-likelihood aperture of Poisson counts sharing one true aperture.
 """
 
 
@@ -63,6 +71,50 @@ def compute_aperture(mc_counts, mc_raw_counts, generated_area_m2, generated_soli
     return aperture
 
 
+def compute_combined_aperture(mc_counts, mc_raw_counts, generated_area_m2, generated_solid_angle_sr):
+    """
+    Combine several MC productions into one aperture (see module docstring).
+
+    :param mc_counts: array-like, shape (n_productions, n_bins)
+                      Reconstructed MC counts per production and bin (may be weighted)
+    :param mc_raw_counts: array-like, shape (n_productions, n_bins)
+                          Thrown MC counts per production and bin (same weighting)
+    :param generated_area_m2: array-like, shape (n_productions,)
+                              A_gen of every production in m²
+    :param generated_solid_angle_sr: array-like, shape (n_productions,)
+                                     Ω_gen of every production in sr
+    :return aperture: np.ndarray, shape (n_bins,)
+                      Combined aperture per bin [m² sr]
+    :return production_apertures: np.ndarray, shape (n_productions, n_bins)
+                                  Aperture of every production on its own [m² sr]
+    :return share: np.ndarray, shape (n_productions, n_bins)
+                   Fraction of the thrown fluence (the weight in the combined
+                   estimate) each production contributes per bin
+
+    Notes:
+        - With one production this is compute_aperture
+        - Bins no production threw events into get aperture 0 and share 0
+    """
+    mc_counts = np.atleast_2d(np.asarray(mc_counts, dtype=float))
+    mc_raw_counts = np.atleast_2d(np.asarray(mc_raw_counts, dtype=float))
+    generated = (np.asarray(generated_area_m2, dtype=float)
+                 * np.asarray(generated_solid_angle_sr, dtype=float))[:, None]
+
+    # Thrown events per m² sr of every production, and their sum per bin
+    fluence = mc_raw_counts / generated
+    total = fluence.sum(axis=0)
+
+    aperture = np.zeros(mc_counts.shape[1], dtype=float)
+    share = np.zeros_like(fluence)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        thrown = total > 0
+        aperture[thrown] = mc_counts.sum(axis=0)[thrown] / total[thrown]
+        share[:, thrown] = fluence[:, thrown] / total[thrown]
+
+    production_apertures = compute_aperture(mc_counts, mc_raw_counts, generated, 1.0)
+    return aperture, production_apertures, share
+
+
 # Exposure
 def compute_exposure(aperture, time_s):
     """
@@ -0,0 +1,502 @@
+"""
+Optional numba-compiled ingest kernels: correction and cuts of a parquet
+batch in one pass over its Arrow buffers.
+
+Two kernels are generated from the same per-event code:
+
+    - SelectKernel (process_data.set_up_energy_array, the default run):
+      writes the row index and the corrected energy (plus requested cut
+      variables, e.g. theta for the energy × zenith binning) of every
+      accepted event; log10 and the thrown energies stay in NumPy
+    - FusedKernel (partials.ingest_partial: cbspec partial / merge / update):
+      increments the fine-grid MC reco / thrown / data counts, the cut flow
+      and the migration matrix directly
+
+When numba is installed, each batch is handed over as flat column buffers
+(list columns as values + offsets) and a single loop per event
+    - fetches only the elements the next cut needs (rejected events stop
+      at the first failing cut)
+    - applies the FD energy correction, the zenith correction, bdist units
+      and fS800 = dsc/sc exactly as process_data.extract_cut_variables
+    - evaluates the cut expressions (cut_expressions.py), generated as
+      scalar code for this cut setting and tree type
+without a pandas conversion or any full-size intermediate array.
+
+The log10 is not evaluated per event. SelectKernel returns corrected
+energies and NumPy takes their log10, as extract_cut_variables does;
+FusedKernel compares against energy_thresholds, the smallest corrected
+energy whose NumPy log10(E) + EeV_corr reaches each bin edge, so its bin
+indices equal those of the NumPy path bit for bit (libm and NumPy log10
+differ in the last bit for a few percent of values). For the same reason
+the kernels are only used when the cuts are exact in scalar code: no
+logen/mclogen in the cut expressions, no functions other than abs/sqrt,
+and ** only as a square. Otherwise, or without numba, the NumPy path is
+taken (extract_cut_variables → cut mask), which gives identical results.
+
+Kernel source depends on the tree type, array type, cut setting and column
+types. It is written once to KERNEL_DIR as a module named after its hash and
+compiled with numba.njit(cache=True), so only the first process to use a
+cut setting compiles it (about a second); later processes load the machine
+code from numba's on-disk cache. With jit=None (the default) the kernels are
+used for inputs of at least JIT_MIN_ROWS rows, where they pay off even when
+compiling.
+"""
+
+import hashlib
+import importlib.util
+import json
+import os
+import sys
+import tempfile
+from dataclasses import asdict
+from pathlib import Path
+
+import numpy as np
+
+from .constants import EeV_corr, fd_energy_corr
+from .cut_expressions import CONSTANTS, compile_cuts, names as tree_names
+from .data_classes import QualityCuts
+
+# Functions and operators that are exact in scalar code (bit-identical to NumPy)
+EXACT_FUNCTIONS = ("abs", "sqrt")
+
+# Generated kernel modules and their numba caches
+KERNEL_DIR = Path(tempfile.gettempdir()) / "cbspec-kernels"
+
+# Rows (all inputs of an ingestion) from which jit=None uses the kernels
+JIT_MIN_ROWS = 1_000_000
+
+_KERNELS = {}
+
+# Helpers shared by every generated kernel module
+HELPERS_SOURCE = """
+import numba
+import numpy as np
+
+
+@numba.njit(inline="always", cache=True)
+def scalar(values, i):
+    return float(values[i])
+
+
+@numba.njit(inline="always", cache=True)
+def element(values, offsets, valid, i, k):
+    if valid.size and not valid[i]:
+        return np.nan
+    start = offsets[i]
+    if offsets[i + 1] - start <= k:
+        return np.nan
+    return float(values[start + k])
+
+
+@numba.njit(inline="always", cache=True)
+def find_bin(x, lower, upper):
+    # lower/upper from energy_thresholds; NaN and out-of-range give -1
+    if not (x >= lower[0]) or not (x < upper):
+        return -1
+    b = np.searchsorted(lower, x, side="right") - 1
+    return min(b, lower.size - 2)
+"""
+
+
+def numba_available():
+    """
+    True if numba can be imported.
+    """
+    try:
+        import numba  # noqa: F401  (optional dependency)
+    except ImportError:
+        return False
+    return True
+
+
+def use_jit(jit, rows):
+    """
+    Whether to try the kernels for an ingestion.
+
+    :param jit: bool or None
+                True → always (fails later without numba), False → never,
+                None → with numba installed and at least JIT_MIN_ROWS rows
+    :param rows: int
+                 Rows of all inputs
+    :return use: bool
+    :return reason: str
+                    Why the NumPy path is used ("" when use is True)
+    """
+    if jit is False:
+        return False, "disabled"
+    if jit is None and rows < JIT_MIN_ROWS:
+        return False, f"{rows} rows < JIT_MIN_ROWS"
+    if jit is None and not numba_available():
+        return False, "numba is not installed"
+    return True, ""
+
+
+def energy_thresholds(edges, offset=EeV_corr):
+    """
+    Smallest corrected energies E with np.log10(E) + offset >= edge, per edge.
+
+    :param edges: np.ndarray
+                  log10(E/eV) bin edges
+    :return lower: np.ndarray
+                   E >= lower[k]  ⟺  log10(E) + offset >= edges[k]
+    :return upper: float
+                   E < upper  ⟺  log10(E) + offset <= edges[-1]
+    """
+    edges = np.asarray(edges, dtype=float)
+
+    def smallest(targets, strict):
+        # Bisection over the bit patterns of positive doubles (ordered like their values)
+        lo = np.full(targets.shape, np.float64(np.finfo(float).tiny).view(np.int64))
+        hi = np.full(targets.shape, np.float64(np.finfo(float).max).view(np.int64))
+        while np.any(hi - lo > 1):
+            mid = lo + (hi - lo) // 2
+            # Padded so NumPy evaluates log10 in its vectorized loop, like on event arrays
+            values = np.log10(np.concatenate([mid.view(np.float64), np.ones(16)]))[:len(mid)] + offset
+            reached = values > targets if strict else values >= targets
+            hi = np.where(reached, mid, hi)
+            lo = np.where(reached, lo, mid)
+        return hi.view(np.float64)
+
+    return smallest(edges, False), float(smallest(edges[-1:], True)[0])
+
+
+def _definitions(tree_type, array_type):
+    # Variable → (expression over fetched values, fetches); see extract_cut_variables
+    from .process_data import BRANCH
+
+    s = BRANCH[tree_type]
+    theta_corr = 0.5 if array_type == "TASD" else 1.0
+    if tree_type == "resTree":
+        fetch = {"energy": ("energy", 0), "sc": ("sc", 0), "dsc": ("dsc", 0), "ngsd": ("nstclust", None),
+                 "bdist": ("bdist", None), "ldf": ("ldfchi2", 0), "gf": ("gfchi2", 2),
+                 "theta": ("theta", s), "pderr": ("pderr", s), "mcenergy": ("mcenergy", None)}
+        en = f"f_energy / {fd_energy_corr!r}"
+        bdist = "f_bdist * 1000.0"
+    else:
+        fetch = {"energy": ("energy_s800_p", None), "sc": ("sc", None), "dsc": ("dsc", None),
+                 "ngsd": ("ngsd", None), "bdist": ("bdist", None), "ldf": ("ldfchi2pdof", None),
+                 "gf": ("gfchi2pdof", 1), "theta": ("theta", s), "pderr": ("pderr", s),
+                 "mcenergy": ("mcenergy", None)}
+        en = f"f_energy / {fd_energy_corr!r}"
+        bdist = "f_bdist"
+    variables = {
+        "_en": (en, ("energy",)),
+        "_mcen": (f"f_mcenergy / {fd_energy_corr!r}", ("mcenergy",)),
+        "theta": (f"f_theta + {theta_corr!r}", ("theta",)),
+        "fs800": ("f_dsc / f_sc", ("dsc", "sc")),
+        "pderr": ("f_pderr", ("pderr",)),
+        "ngsd": ("f_ngsd", ("ngsd",)),
+        "bdist": (bdist, ("bdist",)),
+        "ldf": ("f_ldf", ("ldf",)),
+        "gf": ("f_gf", ("gf",)),
+    }
+    return fetch, variables
+
+
+def _exact(tree):
+    kind = tree[0]
+    if kind == "call":
+        return tree[1] in EXACT_FUNCTIONS and all(_exact(t) for t in tree[2])
+    if kind == "bin" and tree[1] == "**":
+        return tree[3] == ("const", 2.0) and _exact(tree[2])
+    if kind in ("and", "or"):
+        return all(_exact(t) for t in tree[1])
+    if kind in ("not", "neg"):
+        return _exact(tree[1])
+    if kind in ("bin", "cmp"):
+        return _exact(tree[2]) and _exact(tree[3])
+    return True
+
+
+def _scalar(tree, params):
+    # Scalar Python/numba source of a cut tree
+    kind = tree[0]
+    if kind == "name":
+        return repr(params[tree[1]]) if tree[1] in params else f"v_{tree[1]}"
+    if kind == "const":
+        return repr(tree[1])
+    if kind in ("and", "or"):
+        return "(" + f" {kind} ".join(_scalar(t, params) for t in tree[1]) + ")"
+    if kind == "not":
+        return f"(not {_scalar(tree[1], params)})"
+    if kind == "neg":
+        return f"(-{_scalar(tree[1], params)})"
+    if kind == "call":
+        fn = "abs" if tree[1] == "abs" else f"np.{tree[1]}"
+        return f"{fn}({', '.join(_scalar(t, params) for t in tree[2])})"
+    if kind == "bin" and tree[1] == "**":
+        base = _scalar(tree[2], params)
+        return f"({base} * {base})"
+    return f"({_scalar(tree[2], params)} {tree[1]} {_scalar(tree[3], params)})"
+
+
+def _load(source, name):
+    """
+    Compiled `kernel` function of a generated module (see module docstring).
+
+    The module is KERNEL_DIR/<name>_<hash>.py; if KERNEL_DIR is not writable
+    the kernel is compiled in memory, without on-disk caching.
+    """
+    source = HELPERS_SOURCE + "\n\n" + source.replace("@njit", "@numba.njit(error_model='numpy', cache=True)")
+    module_name = f"{name}_{hashlib.blake2b(source.encode(), digest_size=10).hexdigest()}"
+    path = KERNEL_DIR / f"{module_name}.py"
+    try:
+        if not path.exists():
+            KERNEL_DIR.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_name(f".{path.name}.tmp-{os.getpid()}")
+            tmp_path.write_text(source)
+            os.replace(tmp_path, path)
+    except OSError:
+        namespace = {}
+        exec(compile(source.replace("cache=True", "cache=False"), f"<cbspec {name}>", "exec"), namespace)
+        return namespace["kernel"]
+    spec = importlib.util.spec_from_file_location(f"cbspec_kernel_{module_name}", path)
+    module = importlib.util.module_from_spec(spec)
+    # numba's cache resolves the module of a cached function by name
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    return module.kernel
+
+
+class _ArrowKernel:
+    """
+    Per-event code of one tree type, array type and cut setting over the
+    Arrow buffers of a batch; subclasses add what happens to accepted events.
+
+    :param tree_type: str
+    :param array_type: str
+    :param cuts: QualityCuts
+    :param list_columns: set of str
+                         Parquet columns that are list columns (extra cut columns only)
+    """
+
+    def __init__(self, tree_type, array_type, cuts: QualityCuts, list_columns=()):
+        from .process_data import BRANCH, LIST_ELEMENT
+
+        self.compiled = compile_cuts(cuts)
+        fetch, self._variables = _definitions(tree_type, array_type)
+        for column in self.compiled.columns:
+            k = LIST_ELEMENT[tree_type].get(column, BRANCH[tree_type]) if column in list_columns else None
+            fetch[f"col_{column}"] = (column, k)
+            self._variables[column] = (f"f_col_{column}", (f"col_{column}",))
+
+        # Parquet buffers handed to the kernel: one slot per distinct (column, element)
+        self.columns = []
+        self._slots = {}
+        for name, (column, k) in fetch.items():
+            if column not in self.columns:
+                self.columns.append(column)
+            self._slots[name] = (self.columns.index(column), k)
+        self.list_columns = {column for column, k in fetch.values() if k is not None}
+        self._params = {**self.compiled.params, **CONSTANTS}
+        self._fetched, self._defined = set(), set()
+
+    def _need(self, lines, variable, indent="        "):
+        # Fetch the buffers of a variable (once) and define v_<variable>
+        if variable in self._defined:
+            return
+        expression, sources = self._variables[variable]
+        for source in sources:
+            if source not in self._fetched:
+                col, k = self._slots[source]
+                if k is None:
+                    lines.append(f"{indent}f_{source} = scalar(cols[{col}], i)")
+                else:
+                    lines.append(f"{indent}f_{source} = element(cols[{col}][0], cols[{col}][1], "
+                                 f"cols[{col}][2], i, {k})")
+                self._fetched.add(source)
+        lines.append(f"{indent}v_{variable} = {expression}")
+        self._defined.add(variable)
+
+    def _cuts(self, lines, on_pass=lambda j: []):
+        # One `continue` per cut, in cut-flow order; on_pass(j) lines after cut j passed
+        for j, tree in enumerate(self.compiled.trees.values()):
+            for variable in sorted(tree_names(tree) - set(self._params)):
+                self._need(lines, variable)
+            lines += [
+                f"        if not {_scalar(tree, self._params)}:",
+                "            continue",
+                *on_pass(j),
+            ]
+
+    def buffers(self, batch):
+        """
+        Flat column buffers of a pyarrow.RecordBatch, in kernel slot order.
+        """
+        cols = []
+        for column in self.columns:
+            array = batch.column(column)
+            if column in self.list_columns:
+                valid = np.asarray(array.is_valid()) if array.null_count else np.empty(0, dtype=np.bool_)
+                cols.append((array.values.to_numpy(zero_copy_only=False), array.offsets.to_numpy(), valid))
+            else:
+                cols.append(array.to_numpy(zero_copy_only=False))
+        return tuple(cols)
+
+
+class SelectKernel(_ArrowKernel):
+    """
+    Compiled kernel returning the accepted events of a batch (default ingestion).
+
+    :param outputs: tuple of str
+                    Cut variables written per accepted event besides the
+                    corrected energy (e.g. ("theta",))
+    """
+
+    def __init__(self, tree_type, array_type, cuts: QualityCuts, list_columns=(), outputs=()):
+        super().__init__(tree_type, array_type, cuts, list_columns)
+        self.outputs = tuple(outputs)
+        lines = [
+            "@njit",
+            "def kernel(n, cols, rows, values):",
+            "    accepted = 0",
+            "    for i in range(n):",
+        ]
+        self._need(lines, "_en")
+        self._cuts(lines)
+        for variable in self.outputs:
+            self._need(lines, variable)
+        lines += [
+            "        rows[accepted] = i",
+            "        values[0, accepted] = v__en",
+            *(f"        values[{k + 1}, accepted] = v_{variable}" for k, variable in enumerate(self.outputs)),
+            "        accepted += 1",
+            "    return accepted",
+        ]
+        self.source = "\n".join(lines)
+        self._kernel = _load(self.source, f"select_{tree_type}")
+
+    def __call__(self, batch):
+        """
+        Accepted events of one batch.
+
+        :param batch: pyarrow.RecordBatch
+        :return rows: np.ndarray of int64
+                      Positions in the batch of the events passing the cuts
+        :return energy: np.ndarray
+                        Their FD-corrected reconstructed energies (before log10)
+        :return outputs: dict of np.ndarray
+                         The requested cut variables of those events
+        """
+        n = batch.num_rows
+        rows = np.empty(n, dtype=np.int64)
+        values = np.empty((1 + len(self.outputs), n))
+        accepted = self._kernel(n, self.buffers(batch), rows, values)
+        return rows[:accepted], values[0, :accepted], {v: values[k + 1, :accepted] for k, v in enumerate(self.outputs)}
+
+
+class FusedKernel(_ArrowKernel):
+    """
+    Compiled kernel adding a batch to fine-grid counts (partial ingestion).
+    """
+
+    def __init__(self, tree_type, array_type, cuts: QualityCuts, list_columns=()):
+        super().__init__(tree_type, array_type, cuts, list_columns)
+        lines = [
+            "@njit",
+            "def kernel(n, cols, is_mc, fine, fine_top, coarse, coarse_top,",
+            "           counts, thrown, flow, migration, do_migration):",
+            "    accepted = 0",
+            "    for i in range(n):",
+            "        flow[0] += 1",
+        ]
+        self._need(lines, "_en")
+        lines.append("        v__mcen = np.nan")
+        lines.append("        if is_mc:")
+        self._need(lines, "_mcen", indent="            ")
+        lines += [
+            "            b = find_bin(v__mcen, fine, fine_top)",
+            "            if b >= 0:",
+            "                thrown[b] += 1",
+        ]
+        self._cuts(lines, on_pass=lambda j: [f"        flow[{j + 1}] += 1"])
+        lines += [
+            "        accepted += 1",
+            "        b = find_bin(v__en, fine, fine_top)",
+            "        if b >= 0:",
+            "            counts[b] += 1",
+            "        if is_mc and do_migration:",
+            "            t = find_bin(v__mcen, coarse, coarse_top)",
+            "            r = find_bin(v__en, coarse, coarse_top)",
+            "            if t >= 0 and r >= 0:",
+            "                migration[t, r] += 1",
+            "    return accepted",
+        ]
+        self.source = "\n".join(lines)
+        self._kernel = _load(self.source, f"fused_{tree_type}")
+
+    def __call__(self, batch, is_mc, grids, counts, thrown, flow, migration=None):
+        """
+        Add one batch to the counts (in place).
+
+        :param batch: pyarrow.RecordBatch
+        :param is_mc: bool
+        :param grids: tuple
+                      (fine lower, fine upper, coarse lower, coarse upper) from energy_thresholds
+        :param counts: np.ndarray of int64
+                       Fine-grid reconstructed counts
+        :param thrown: np.ndarray of int64
+                       Fine-grid thrown counts (MC only)
+        :param flow: np.ndarray of int64
+                     Cut flow (all rows first)
+        :param migration: np.ndarray of int64, optional
+        :return accepted: int
+        """
+        do_migration = migration is not None
+        if migration is None:
+            migration = np.zeros((1, 1), dtype=np.int64)
+        return int(self._kernel(batch.num_rows, self.buffers(batch), is_mc, grids[0], grids[1], grids[2],
+                                grids[3], counts, thrown, flow, migration, do_migration))
+
+
+def _kernel(kind, tree_type, array_type, cuts: QualityCuts, schema, **kwargs):
+    # Kernel of class `kind` for a cut setting (built once per process), or (None, reason)
+    import pyarrow as pa
+
+    if not numba_available():
+        return None, "numba is not installed"
+    compiled = compile_cuts(cuts)
+    if {"logen", "mclogen"} & set().union(*(tree_names(t) for t in compiled.trees.values())):
+        return None, "cut expressions use logen/mclogen"
+    if not all(_exact(tree) for tree in compiled.trees.values()):
+        return None, f"cut expressions use functions other than {'/'.join(EXACT_FUNCTIONS)} or non-square powers"
+
+    list_columns = {
+        column for column in compiled.columns
+        if column in schema.names
+        and (pa.types.is_list(schema.field(column).type) or pa.types.is_large_list(schema.field(column).type))
+    }
+    key = (kind.__name__, tree_type, array_type, json.dumps(asdict(cuts), sort_keys=True, default=str),
+           tuple(sorted(list_columns)), json.dumps(kwargs, sort_keys=True))
+    if key not in _KERNELS:
+        _KERNELS[key] = kind(tree_type, array_type, cuts, list_columns, **kwargs)
+    return _KERNELS[key], ""
+
+
+def fused_kernel(tree_type, array_type, cuts: QualityCuts, schema):
+    """
+    Compiled counting kernel for a cut setting, or None when the NumPy path must be used.
+
+    :param schema: pyarrow.Schema
+                   Schema of the input (list vs scalar extra columns)
+    :return kernel: FusedKernel or None
+    :return reason: str
+                    Why the NumPy path is used ("" when a kernel is returned)
+    """
+    return _kernel(FusedKernel, tree_type, array_type, cuts, schema)
+
+
+def select_kernel(tree_type, array_type, cuts: QualityCuts, schema, outputs=()):
+    """
+    Compiled selection kernel for a cut setting, or None when the NumPy path must be used.
+
+    :param schema: pyarrow.Schema
+                   Schema of the input (list vs scalar extra columns)
+    :param outputs: tuple of str
+                    Cut variables returned per accepted event (see SelectKernel)
+    :return kernel: SelectKernel or None
+    :return reason: str
+                    Why the NumPy path is used ("" when a kernel is returned)
+    """
+    return _kernel(SelectKernel, tree_type, array_type, cuts, schema, outputs=list(outputs))
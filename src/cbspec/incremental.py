@@ -0,0 +1,207 @@
+"""
+Incremental ingestion: only newly appended data shards are read.
+
+    python -m cbspec update --config config/default_config.yaml
+    python -m cbspec update --dt /data/sddt/2025-*.parquet --dry_run
+
+Telescope Array data grows month by month while the MC stays the same. In
+incremental mode the data input (data.<array>.dt_file, or --dt) may be a
+directory or a glob of monthly shards. The state directory
+(<base_dir>/incremental/<array_type>/ by default) keeps:
+
+    state.json                  watermark: settings + one entry per ingested shard
+                                (fingerprint, partial file, time added)
+    mc.partial.arrow            MC partial histograms (partials.py format)
+    dt/<digest>.partial.arrow   one partial per data shard
+
+An update:
+    1. refuses to continue if array type or quality cuts differ from the
+       state (rerun with --rebuild)
+    2. re-ingests the MC only when its fingerprint changed; otherwise the
+       stored MC counts (and hence the aperture) are reused unchanged
+    3. ingests shards that are new or whose size/mtime changed; shards
+       already under the watermark are not opened
+    4. sums MC + shard partials and runs the downstream stages through
+       run_pipeline(partial=...), which logs every contributing shard
+
+Shards that disappeared from the input are dropped from the totals with a
+warning, so the result always equals a full run over the current inputs.
+Partials and state.json are replaced atomically; an interrupted update
+leaves the previous watermark valid.
+"""
+
+import hashlib
+import json
+import os
+from dataclasses import asdict
+from datetime import datetime
+from glob import glob
+from pathlib import Path
+
+from .data_classes import QualityCuts
+from .logging_utils import RunLogger, WARNING
+from .provenance import file_fingerprint
+
+STATE_FILENAME = "state.json"
+STATE_VERSION = 1
+
+
+def expand_shards(path):
+    """
+    Parquet shards of an input: a directory (its *.parquet files), a glob
+    pattern, or a single file.
+
+    :return paths: list of Path, sorted
+    """
+    path = str(path)
+    if os.path.isdir(path):
+        return sorted(Path(path).glob("*.parquet"))
+    if any(char in path for char in "*?["):
+        return sorted(Path(p) for p in glob(path))
+    return [Path(path)]
+
+
+def _same_file(a, b):
+    return a is not None and b is not None and all(a[k] == b[k] for k in ("path", "size", "mtime_ns"))
+
+
+def _shard_filename(fingerprint):
+    return hashlib.sha256(fingerprint["path"].encode()).hexdigest()[:16] + ".partial.arrow"
+
+
+class IncrementalState:
+    """
+    Watermark and stored partials of incremental ingestion (see module docstring).
+
+    :param state_dir: Path
+    :param array_type: str
+    :param cuts: QualityCuts
+    """
+
+    def __init__(self, state_dir, array_type, cuts: QualityCuts):
+        self.state_dir = Path(state_dir)
+        self.settings = {"array_type": array_type, "quality_cuts": asdict(cuts)}
+        self.path = self.state_dir / STATE_FILENAME
+        self.state = {"version": STATE_VERSION, "settings": self.settings, "mc": None, "shards": {}}
+        if self.path.exists():
+            with open(self.path) as f:
+                self.state = json.load(f)
+
+    def check_settings(self):
+        """
+        Raise ValueError if the stored partials were made with other settings.
+        """
+        if self.state.get("version") != STATE_VERSION:
+            raise ValueError(f"{self.path}: unsupported state version {self.state.get('version')}; use --rebuild")
+        stored = self.state["settings"]
+        changed = sorted(k for k in self.settings if stored.get(k) != self.settings[k])
+        if changed:
+            raise ValueError(
+                f"{', '.join(changed)} changed since the stored partials in {self.state_dir} were made; "
+                f"rerun with --rebuild to re-ingest everything"
+            )
+
+    def save(self):
+        """
+        Write state.json atomically.
+        """
+        self.state_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(f".{self.path.name}.tmp-{os.getpid()}")
+        with open(tmp_path, "w") as f:
+            json.dump(self.state, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def plan(self, mc_file, dt_shards):
+        """
+        Decide what an update must read.
+
+        :return plan: dict
+                      mc ("reuse" or "ingest"), new / changed / reused / removed
+                      (lists of shard paths as str)
+        """
+        mc_entry = self.state["mc"]
+        mc_fp = file_fingerprint(mc_file)
+        plan = {
+            "mc": "reuse" if mc_entry and _same_file(mc_entry["fingerprint"], mc_fp) else "ingest",
+            "new": [], "changed": [], "reused": [], "removed": [],
+        }
+        current = set()
+        for shard in dt_shards:
+            fp = file_fingerprint(shard)
+            current.add(fp["path"])
+            entry = self.state["shards"].get(fp["path"])
+            if entry is None:
+                plan["new"].append(fp["path"])
+            elif _same_file(entry["fingerprint"], fp):
+                plan["reused"].append(fp["path"])
+            else:
+                plan["changed"].append(fp["path"])
+        plan["removed"] = sorted(set(self.state["shards"]) - current)
+        return plan
+
+    def update(self, mc_file, dt_shards, logger: RunLogger, migration=True):
+        """
+        Ingest what plan() asks for and return the summed partial.
+
+        :param mc_file: Path
+        :param dt_shards: list of Path
+        :param logger: RunLogger
+        :param migration: bool
+                          Fill the MC migration matrix when the MC is (re)ingested
+        :return partial: dict
+                         Merged MC + data partial (see partials.merge_partials)
+        :return plan: dict
+        """
+        from .partials import ingest_partial, load_partial, merge_partials, save_partial
+
+        self.check_settings()
+        plan = self.plan(mc_file, dt_shards)
+        array_type = self.settings["array_type"]
+        cuts = QualityCuts(**self.settings["quality_cuts"])
+
+        logger.log_text(
+            f"Incremental update: MC {plan['mc']}, {len(plan['new'])} new, {len(plan['changed'])} changed, "
+            f"{len(plan['reused'])} reused, {len(plan['removed'])} removed data shard(s)"
+        )
+        logger.log_json(event="incremental_plan", state_dir=str(self.state_dir), **plan)
+        for path in plan["changed"]:
+            logger.log_text(f"Data shard {path} changed since it was ingested; re-reading it", level=WARNING)
+        for path in plan["removed"]:
+            logger.log_text(f"Data shard {path} is no longer an input; dropped from the totals", level=WARNING)
+
+        if plan["mc"] == "ingest":
+            with logger.span("incremental_mc", file=str(mc_file)):
+                mc_partial = ingest_partial([mc_file], [], array_type, cuts, logger, migration=migration)
+            save_partial(self.state_dir / "mc.partial.arrow", mc_partial)
+            self.state["mc"] = {"fingerprint": file_fingerprint(mc_file), "partial": "mc.partial.arrow",
+                                "added": datetime.now().isoformat(timespec="seconds")}
+        else:
+            mc_partial = load_partial(self.state_dir / self.state["mc"]["partial"])
+
+        for path in plan["new"] + plan["changed"]:
+            with logger.span("incremental_shard", file=path):
+                shard_partial = ingest_partial([], [Path(path)], array_type, cuts, logger, migration=False)
+            fp = file_fingerprint(path)
+            filename = _shard_filename(fp)
+            save_partial(self.state_dir / "dt" / filename, shard_partial)
+            self.state["shards"][fp["path"]] = {
+                "fingerprint": fp,
+                "partial": f"dt/{filename}",
+                "added": datetime.now().isoformat(timespec="seconds"),
+            }
+            # Advance the watermark after every shard, so an interruption loses one shard at most
+            self.save()
+
+        for path in plan["removed"]:
+            entry = self.state["shards"].pop(path)
+            (self.state_dir / entry["partial"]).unlink(missing_ok=True)
+        self.save()
+
+        contributing = plan["reused"] + plan["new"] + plan["changed"]
+        partials = [mc_partial] + [
+            load_partial(self.state_dir / self.state["shards"][path]["partial"]) for path in sorted(contributing)
+        ]
+        logger.log_json(event="incremental_shards", shards=sorted(contributing))
+        merged = merge_partials(partials)
+        merged["meta"]["incremental"] = {"state_dir": str(self.state_dir), **plan}
+        return merged, plan
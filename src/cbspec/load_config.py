@@ -26,12 +26,48 @@ The YAML file is expected to contain the following top-level keys:
         ldf_chi2: float
         ped_error: float
         frac_s800: float
+        expressions: Dict    (optional; cut name → expression, null drops a cut;
+                              see cut_expressions.py)
 
     output:
         base_dir: str
         plots_dir: str
         log_dir: str
         runs_dir: str
+        write_csv: bool      (optional, default true)
+        cache_dir: str       (optional, default <base_dir>/cache)
+        plot_workers: int    (optional, default one process per plot; 0/1 = serial)
+        log_level: str       (optional, default INFO; DEBUG adds per-batch lines to run.log)
+        log_buffered: bool   (optional, default true; background log writer)
+        progress: str        (optional, default auto; auto | bar | heartbeat | off)
+        heartbeat_s: float   (optional, default 30; seconds between progress heartbeats)
+        checkpoint_s: float  (optional, default 300; seconds between ingestion checkpoints, 0 = off)
+        production_workers: int (optional, default one process per MC production; 0/1 = serial)
+        jit: bool            (optional, default auto; numba selection kernel when installed and >= fused.JIT_MIN_ROWS rows)
+
+    energy_scale:            (optional)
+        scales: List
+        apply_to_mc: bool
+
+    skim:                    (optional; write cut-passing events, see skim.py)
+        enabled: bool        (optional, default true when the block is present)
+        columns: List        (optional, default all input columns)
+        compression: str    (optional, default zstd)
+        row_group_size: int  (optional, default 100000)
+
+    zenith:                  (optional; energy × zenith binning, see stages.py)
+        bins: List           (zenith-axis bin edges, increasing)
+        axis: str            (optional, default cos_theta; cos_theta | sec_theta)
+
+    mc_productions:          (optional; several MC productions in one aperture, see productions.py)
+        reference_index: float  (optional; reweight every production to dN/dE ∝ E^-γ)
+        tasd:                (list per array type; replaces data.<array>.mc_file)
+            - file: path/to/mc.parquet
+              generated_area_m2: float
+              generated_solid_angle_sr: float
+              spectral_index: float (optional; thrown γ, required with reference_index)
+              name: str      (optional, default file stem)
+        cbsd: ...
 
 These fields map directly into the dataclasses defined in data_classes.py.
 """
@@ -39,7 +75,8 @@ These fields map directly into the dataclasses defined in data_classes.py.
 from pathlib import Path
 import yaml
 import numpy as np
-from .data_classes import ArrayConfig, SpectrumConfig, QualityCuts, OutputConfig
+from .data_classes import ArrayConfig, SpectrumConfig, QualityCuts, OutputConfig, EnergyScaleConfig, SkimConfig, ZenithConfig
+from .data_classes import MCProduction, MCProductionsConfig
 
 
 def load_config(path: Path):
@@ -62,6 +99,27 @@ def load_config(path: Path):
     with open(path, 'r') as f:
         cfg = yaml.safe_load(f)
 
+    return config_from_dict(cfg)
+
+
+def _cut_expressions(expressions):
+    # quality_cuts.expressions: mapping of cut name → expression string (or null)
+    if not expressions:
+        return None
+    if not isinstance(expressions, dict):
+        raise TypeError(f"quality_cuts.expressions must be a mapping of cut name to expression, got {expressions!r}")
+    return {str(name): source for name, source in expressions.items()}
+
+
+def config_from_dict(cfg: dict):
+    """
+    Build the configuration dataclasses from an already-loaded YAML dictionary
+    (see load_config; used by sweeps that derive variants in memory).
+
+    :param cfg: dict
+                Raw configuration with the keys listed in the module docstring
+    :return array_cfg, spectrum_cfg, quality_cuts, output_cfg, cfg
+    """
     # Array configuration
     array_type = cfg["array"]["type"]
 
@@ -89,6 +147,7 @@ def load_config(path: Path):
         ldf_chi2=qc["ldf_chi2"],
         ped_error=qc["ped_error"],
         frac_s800=qc["frac_s800"],
+        expressions=_cut_expressions(qc.get("expressions")),
     )
 
     # Output configuration
@@ -98,6 +157,141 @@ def load_config(path: Path):
         plots_dir=Path(out_cfg["plots_dir"]),
         logs_dir=Path(out_cfg["logs_dir"]),
         runs_dir=Path(out_cfg["runs_dir"]),
+        write_csv=bool(out_cfg.get("write_csv", True)),
+        cache_dir=Path(out_cfg["cache_dir"]) if out_cfg.get("cache_dir") else None,
+        plot_workers=out_cfg.get("plot_workers"),
+        log_level=str(out_cfg.get("log_level", "INFO")).upper(),
+        log_buffered=bool(out_cfg.get("log_buffered", True)),
+        progress=str(out_cfg.get("progress", "auto")),
+        heartbeat_s=float(out_cfg.get("heartbeat_s", 30.0)),
+        checkpoint_s=float(out_cfg.get("checkpoint_s", 300.0)),
+        production_workers=out_cfg.get("production_workers"),
+        jit=None if out_cfg.get("jit") is None else bool(out_cfg["jit"]),
     )
 
-    return array_cfg, spectrum_cfg, quality_cuts, output_cfg, cfg
\ No newline at end of file
+    return array_cfg, spectrum_cfg, quality_cuts, output_cfg, cfg
+
+
+def load_energy_scale_config(cfg):
+    """
+    Build the optional EnergyScaleConfig from a loaded YAML dictionary.
+
+    :param cfg: dict
+                Raw configuration returned by load_config
+    :return escale_cfg: EnergyScaleConfig or None
+                        None when the `energy_scale` block is absent or empty
+    """
+    es_cfg = cfg.get("energy_scale")
+    if not es_cfg or not es_cfg.get("scales"):
+        return None
+
+    return EnergyScaleConfig(
+        scales=np.array(es_cfg["scales"], dtype=float),
+        apply_to_mc=bool(es_cfg.get("apply_to_mc", False)),
+    )
+
+
+def load_skim_config(cfg):
+    """
+    Build the optional SkimConfig from a loaded YAML dictionary.
+
+    :param cfg: dict
+                Raw configuration returned by load_config
+    :return skim_cfg: SkimConfig or None
+                      None when the `skim` block is absent or disabled
+    """
+    skim_cfg = cfg.get("skim")
+    if skim_cfg is None or skim_cfg is False:
+        return None
+    if skim_cfg is True:
+        skim_cfg = {}
+    if not skim_cfg.get("enabled", True):
+        return None
+
+    columns = skim_cfg.get("columns")
+    return SkimConfig(
+        columns=tuple(columns) if columns else None,
+        compression=str(skim_cfg.get("compression", "zstd")),
+        row_group_size=int(skim_cfg.get("row_group_size", 100_000)),
+    )
+
+
+def load_zenith_config(cfg):
+    """
+    Build the optional ZenithConfig from a loaded YAML dictionary.
+
+    :param cfg: dict
+                Raw configuration returned by load_config
+    :raise ValueError: for an unknown axis or non-increasing edges
+    :return zenith_cfg: ZenithConfig or None
+                        None when the `zenith` block is absent or has no bins
+    """
+    zenith_cfg = cfg.get("zenith")
+    if not zenith_cfg or not zenith_cfg.get("bins"):
+        return None
+    return zenith_config(zenith_cfg["bins"], zenith_cfg.get("axis", "cos_theta"))
+
+
+def zenith_config(bins, axis="cos_theta"):
+    """
+    Validated ZenithConfig (shared by the YAML block and the CLI override).
+
+    :param bins: array-like
+                 Zenith-axis bin edges
+    :param axis: str
+                 "cos_theta" or "sec_theta"
+    :return zenith_cfg: ZenithConfig
+    """
+    edges = np.array(bins, dtype=float)
+    if axis not in ("cos_theta", "sec_theta"):
+        raise ValueError(f"zenith.axis must be cos_theta or sec_theta, got {axis!r}")
+    if edges.ndim != 1 or len(edges) < 2 or np.any(np.diff(edges) <= 0):
+        raise ValueError(f"zenith.bins must be at least two increasing edges, got {list(bins)}")
+    return ZenithConfig(edges=edges, axis=axis)
+
+
+def load_mc_productions_config(cfg, array_type):
+    """
+    Build the optional MCProductionsConfig of one array type from a loaded YAML dictionary.
+
+    :param cfg: dict
+                Raw configuration returned by load_config
+    :param array_type: str
+                       "TASD" or "CBSD" (selects mc_productions.tasd / .cbsd)
+    :raise ValueError: for a production without file or with non-positive geometry,
+                       duplicate names, or a reference_index without spectral indices
+    :return productions_cfg: MCProductionsConfig or None
+                             None when the block is absent or lists no production
+                             for the array type
+    """
+    block = cfg.get("mc_productions")
+    if not block or not block.get(str(array_type).lower()):
+        return None
+
+    reference_index = block.get("reference_index")
+    productions = []
+    for k, entry in enumerate(block[str(array_type).lower()]):
+        where = f"mc_productions.{str(array_type).lower()}[{k}]"
+        if not entry.get("file"):
+            raise ValueError(f"{where}: file is required")
+        file = Path(entry["file"])
+        production = MCProduction(
+            name=str(entry.get("name") or file.stem),
+            file=file,
+            generated_area_m2=float(entry["generated_area_m2"]),
+            generated_solid_angle_sr=float(entry["generated_solid_angle_sr"]),
+            spectral_index=None if entry.get("spectral_index") is None else float(entry["spectral_index"]),
+        )
+        if not (production.generated_area_m2 > 0 and production.generated_solid_angle_sr > 0):
+            raise ValueError(f"{where}: generated_area_m2 and generated_solid_angle_sr must be positive")
+        if reference_index is not None and production.spectral_index is None:
+            raise ValueError(f"{where}: spectral_index is required to reweight to reference_index {reference_index}")
+        productions.append(production)
+
+    names = [p.name for p in productions]
+    if len(set(names)) != len(names):
+        raise ValueError(f"mc_productions.{str(array_type).lower()}: production names must be unique, got {names}")
+    return MCProductionsConfig(
+        productions=tuple(productions),
+        reference_index=None if reference_index is None else float(reference_index),
+    )
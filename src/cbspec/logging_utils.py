@@ -14,15 +14,179 @@ The JSONL format (one JSON object per line) is ideal for:
     - reproducibility
     - batch analysis across many runs
 
-The logger is intentionally simple and synchronous -- no buffering, no threads,
-no external dependencies -- to ensure logs always written even if the pipeline
-terminates early.
+Two write modes:
+    - synchronous (default) → every line is written and flushed immediately
+    - buffered              → lines are queued to a background writer thread
+                              that flushes every `flush_interval_s` seconds or
+                              once `flush_bytes` are pending. The buffer is
+                              always drained by close(), at interpreter exit
+                              (atexit) and when used as a context manager.
+
+Text lines carry a level (DEBUG, INFO, WARNING, ERROR; standard `logging`
+values). Lines below the logger's level are dropped from run.log and the
+console, while the JSONL log keeps every entry -- per-batch chatter is
+logged at DEBUG so it lives in run.jsonl only.
+
+Pool workers log through logger.worker_handle(): a picklable WorkerLogger
+that sends formatted lines over a multiprocessing queue to the parent, which
+writes them. Only the parent process ever touches the log files.
+
+Spans time a block of work and write one "span" entry to run.jsonl:
+
+    with logger.span("aperture") as span:
+        ...
+        span.add(rows=n_events, bytes=n_bytes)
+
+    {"event": "span", "name": "aperture", "start_ns": ..., "end_ns": ...,
+     "wall_s": ..., "cpu_s": ..., "rss_peak_delta_bytes": ..., "rows": ...,
+     "bytes": ..., "parent": null, "status": "ok"}
+
+start_ns/end_ns are time.monotonic_ns() readings, cpu_s is process CPU time
+(all threads of this process; pool children are not included), rss_peak_delta_bytes is the growth of the process peak RSS
+during the span. Spans nest per thread; rows/bytes of a child span are added
+to its parent. `cbspec report <run_dir>` summarizes the spans of a run.
 """
 
+import atexit
 import json
+import logging
+import queue
+import resource
+import sys
+import threading
+import time
 from datetime import datetime
 from pathlib import Path
 
+# Log levels (same values as the standard logging module)
+DEBUG = logging.DEBUG
+INFO = logging.INFO
+WARNING = logging.WARNING
+ERROR = logging.ERROR
+
+_TEXT, _JSON = "text", "json"
+
+
+def _ts():
+    """
+    Return a human-readable timestamp.
+    """
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _text_line(message):
+    return f"{_ts()}\t{message}\n"
+
+
+def _json_line(kwargs):
+    entry = {"time": _ts(), "mono_s": round(time.monotonic(), 6), **kwargs}
+    return json.dumps(entry) + "\n"
+
+
+def _peak_rss_bytes():
+    """
+    Peak resident set size of this process (ru_maxrss is KiB on Linux).
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+# Open spans per thread (innermost last), shared by RunLogger and WorkerLogger
+_open_spans = threading.local()
+
+
+def _innermost_span(logger):
+    """
+    Innermost open span of `logger` in this thread (spans of other loggers,
+    e.g. a sweep's logger around the runs it starts, are not parents).
+    """
+    for span in reversed(_open_spans.__dict__.get("stack", ())):
+        if span.logger is logger:
+            return span
+    return None
+
+
+class Span:
+    """
+    Timed block of work logged as one "span" JSONL entry (see module docstring).
+
+    Use as a context manager, or call start()/end() explicitly.
+
+    :param logger: RunLogger or WorkerLogger
+    :param name: str
+                 Span name (stage spans use the stage name)
+    :param fields: extra JSON fields recorded with the span
+    """
+
+    def __init__(self, logger, name, **fields):
+        self.logger = logger
+        self.name = name
+        self.fields = fields
+        self.rows = 0
+        self.bytes = 0
+        self.parent = None
+
+    def add(self, rows=0, bytes=0):
+        """
+        Count rows/bytes processed inside the span.
+        """
+        self.rows += int(rows)
+        self.bytes += int(bytes)
+
+    def start(self):
+        self.parent = _innermost_span(self.logger)
+        _open_spans.__dict__.setdefault("stack", []).append(self)
+        self._rss0 = _peak_rss_bytes()
+        self._cpu0 = time.process_time_ns()
+        self._t0 = time.monotonic_ns()
+        return self
+
+    def end(self, status="ok"):
+        t1 = time.monotonic_ns()
+        cpu1 = time.process_time_ns()
+        rss1 = _peak_rss_bytes()
+
+        stack = _open_spans.__dict__.get("stack", [])
+        if self in stack:
+            stack.remove(self)
+        if self.parent is not None:
+            self.parent.add(self.rows, self.bytes)
+
+        self.logger.log_json(
+            event="span",
+            name=self.name,
+            start_ns=self._t0,
+            end_ns=t1,
+            wall_s=round((t1 - self._t0) / 1e9, 9),
+            cpu_s=round((cpu1 - self._cpu0) / 1e9, 9),
+            rss_peak_delta_bytes=rss1 - self._rss0,
+            rows=self.rows,
+            bytes=self.bytes,
+            parent=None if self.parent is None else self.parent.name,
+            status=status,
+            **self.fields,
+        )
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.end(status="ok" if exc_type is None else "error")
+        return False
+
+
+def parse_level(level):
+    """
+    Convert a level name ("DEBUG", "info", ...) or number into a logging level.
+    """
+    if isinstance(level, int):
+        return level
+    value = logging.getLevelName(str(level).upper())
+    if not isinstance(value, int):
+        raise ValueError(f"Unknown log level {level!r}; use DEBUG, INFO, WARNING or ERROR")
+    return value
+
+
 class RunLogger:
     """
     Handles both text and JSON output and logging for a single pipeline run.
@@ -30,6 +194,18 @@ class RunLogger:
     :param logs_dir: Path
                      Directory where log files will be written. This directory is
                      created automatically if it does not already exist.
+    :param level: int or str
+                  Minimum level of text lines written to run.log and the console
+                  (default INFO). run.jsonl always receives every entry.
+    :param buffered: bool
+                     Queue lines to a background writer thread instead of writing
+                     and flushing each line synchronously (default False)
+    :param flush_interval_s: float
+                             Buffered mode: maximum time a line waits before being flushed
+    :param flush_bytes: int
+                        Buffered mode: flush as soon as this many bytes are pending
+    :param console: bool
+                    Echo text lines to stdout (default True)
 
     Notes:
         - Two files are opened:
@@ -39,12 +215,24 @@ class RunLogger:
         - Files are opened in append mode so multiple pipeline stages can write
           to the same log without overwriting previous entries.
 
-        - The logger must be closed at the end of the run to flush file handles.
+        - Timestamps are taken when a line is logged, not when it is written.
+
+        - The logger is thread-safe. close() is idempotent and is also
+          registered with atexit, so buffered lines survive an uncaught
+          exception.
     """
 
-    def __init__(self, logs_dir: Path):
+    def __init__(
+            self,
+            logs_dir: Path,
+            level=INFO,
+            buffered: bool = False,
+            flush_interval_s: float = 1.0,
+            flush_bytes: int = 64 * 1024,
+            console: bool = True,
+    ):
         # Ensure directory exists
-        self.logs_dir = logs_dir
+        self.logs_dir = Path(logs_dir)
         self.logs_dir.mkdir(parents=True, exist_ok=True)
 
         # File paths
@@ -55,30 +243,107 @@ class RunLogger:
         self.text_file = open(self.text_path, "a")
         self.json_file = open(self.json_path, "a")
 
-    # Timestamp helper
-    @staticmethod
-    def _ts():
+        self.level = parse_level(level)
+        self.buffered = buffered
+        self.flush_interval_s = flush_interval_s
+        self.flush_bytes = flush_bytes
+        self.console = console
+
+        self._lock = threading.Lock()
+        self._closed = False
+        self._queue = None
+        self._writer = None
+        self._mp_manager = None
+        self._mp_queue = None
+        self._listener = None
+
+        if buffered:
+            self._queue = queue.SimpleQueue()
+            self._writer = threading.Thread(target=self._write_loop, name="cbspec-log-writer", daemon=True)
+            self._writer.start()
+
+        atexit.register(self.close)
+
+    # Context manager: always drain the buffer, record the error on a crash
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None and not self._closed:
+            self.log_text(f"Pipeline failed: {exc_type.__name__}: {exc}", level=ERROR)
+            self.log_json(event="pipeline_error", error=f"{exc_type.__name__}: {exc}")
+        self.close()
+        return False
+
+    # Writing
+    def _write(self, records):
+        """
+        Write (kind, line) records to the files (and console) and flush once.
+        """
+        text = "".join(line for kind, line in records if kind == _TEXT)
+        jsonl = "".join(line for kind, line in records if kind == _JSON)
+        with self._lock:
+            if text:
+                self.text_file.write(text)
+                self.text_file.flush()
+                if self.console:
+                    sys.stdout.write(text)
+                    sys.stdout.flush()
+            if jsonl:
+                self.json_file.write(jsonl)
+                self.json_file.flush()
+
+    def _write_loop(self):
         """
-        Return a human-readable timestamp.
+        Buffered mode: background thread draining the queue.
         """
-        return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        pending = []
+        pending_bytes = 0
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(deadline - time.monotonic(), 0.0)
+            try:
+                record = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                record = ()
+
+            if record is None:  # close() sentinel
+                self._write(pending)
+                return
+
+            if record:
+                pending.append(record)
+                pending_bytes += len(record[1])
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval_s
+
+            if pending and (pending_bytes >= self.flush_bytes or time.monotonic() >= deadline):
+                self._write(pending)
+                pending, pending_bytes, deadline = [], 0, None
+
+    def _emit(self, kind, line):
+        if self._closed:
+            return
+        if self.buffered:
+            self._queue.put((kind, line))
+        else:
+            self._write([(kind, line)])
 
     # Text logging
-    def log_text(self, message: str):
+    def log_text(self, message: str, level=INFO):
         """
         Write a single line to the human-readable text log.
 
         Format:
             YYYY-MM-DD HH:MM:SS     message
-        """
-        line = f"{self._ts()}\t{message}\n"
-
-        # write to file
-        self.text_file.write(line)
-        self.text_file.flush()
 
-        # print to console
-        print(line, end="")
+        :param message: str
+        :param level: int
+                      Lines below the logger's level are dropped (default INFO)
+        """
+        if level < self.level:
+            return
+        self._emit(_TEXT, _text_line(message))
 
     # JSON logging
     def log_json(self, **kwargs):
@@ -86,21 +351,116 @@ class RunLogger:
         Write a structured JSON entry to run.jsonl.
 
         Each call writes one JSON object per line, e.g.:
-            {"time": "...", "event": "batch_start", "batch": 3}
+            {"time": "...", "mono_s": 1234.567890, "event": "batch_start", "batch": 3}
+
+        "mono_s" is a monotonic clock reading in seconds; differences between
+        entries give sub-second stage durations (see run_registry).
 
         This format is ideal for downstream parsing.
         """
-        entry = {"time": self._ts(), **kwargs}
-        line = json.dumps(entry) + "\n"
+        self._emit(_JSON, _json_line(kwargs))
+
+    # Spans
+    def span(self, name, **fields):
+        """
+        Context manager timing a block of work (see Span).
+
+        :return Span
+        """
+        return Span(self, name, **fields)
 
-        # write to file
-        self.json_file.write(line)
-        self.json_file.flush()
+    def start_span(self, name, **fields):
+        """
+        Start a span that is ended explicitly with span.end().
+
+        :return Span
+        """
+        return Span(self, name, **fields).start()
+
+    def add_to_span(self, rows=0, bytes=0):
+        """
+        Count rows/bytes in the innermost open span of this thread (no-op if none).
+        """
+        span = _innermost_span(self)
+        if span is not None:
+            span.add(rows, bytes)
+
+    # Pool workers
+    def worker_handle(self):
+        """
+        Picklable logger for process-pool workers.
+
+        The first call starts a multiprocessing manager queue and a listener
+        thread that forwards worker lines to this logger.
+
+        :return WorkerLogger
+        """
+        if self._mp_queue is None:
+            import multiprocessing
+
+            self._mp_manager = multiprocessing.Manager()
+            self._mp_queue = self._mp_manager.Queue()
+            self._listener = threading.Thread(target=self._listen, name="cbspec-log-listener", daemon=True)
+            self._listener.start()
+        return WorkerLogger(self._mp_queue, self.level)
+
+    def _listen(self):
+        while True:
+            record = self._mp_queue.get()
+            if record is None:
+                return
+            self._emit(*record)
 
     # Cleanup
     def close(self):
         """
-        Close the logger and flush all files and directories.
+        Drain pending lines, then close the logger and all files.
+        """
+        if self._closed:
+            return
+
+        if self._mp_queue is not None:
+            self._mp_queue.put(None)
+            self._listener.join()
+            self._mp_manager.shutdown()
+
+        self._closed = True
+        if self._writer is not None:
+            self._queue.put(None)
+            self._writer.join()
+
+        with self._lock:
+            self.text_file.close()
+            self.json_file.close()
+        atexit.unregister(self.close)
+
+
+class WorkerLogger:
+    """
+    RunLogger stand-in for pool workers (see RunLogger.worker_handle).
+
+    Lines are formatted in the worker (timestamps included) and sent to the
+    parent logger, which writes them. The object is picklable and can be
+    passed as a task argument.
+    """
+
+    def __init__(self, mp_queue, level=INFO):
+        self._queue = mp_queue
+        self.level = level
+
+    def log_text(self, message: str, level=INFO):
+        if level < self.level:
+            return
+        self._queue.put((_TEXT, _text_line(message)))
+
+    def log_json(self, **kwargs):
+        self._queue.put((_JSON, _json_line(kwargs)))
+
+    span = RunLogger.span
+    start_span = RunLogger.start_span
+    add_to_span = RunLogger.add_to_span
+
+    def close(self):
+        """
+        Nothing to close -- the parent RunLogger owns the files.
         """
-        self.text_file.close()
-        self.json_file.close()
\ No newline at end of file
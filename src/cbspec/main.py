@@ -6,12 +6,18 @@ This module defines `run_pipeline`, which is the central function called by:
     - cbspec (via pyproject.toml entry point)
     - programmatic use: from cbspec import run_pipeline
 
+Steps 2-13 are stages of the memoized DAG in stages.py, resolved by a
+pipeline.Pipeline: each stage is re-executed only when its config
+subsection, input files, or upstream outputs changed since a cached run.
+run_pipeline adds the run directory, artifacts and registry around it; for
+interactive use, hold a Pipeline directly.
+
 The pipeline performs:
-     1. Logging + run directory setup
+     1. Logging + run directory setup, preflight check of inputs and settings
      2. Parquet ingestion (MC + data)
      3. Quality cuts
      4. Energy binning
-     5. Histogramming (MC_recon, MC_thrown, data)
+     5. Histogramming (MC_recon, MC_thrown, data; plus fixed-range plot histograms)
      6. Bin filtering
      7. Energy conversions (log10(E/eV) to eV)
      8. Aperture AΩ(E)
@@ -19,8 +25,24 @@ The pipeline performs:
     10. Feldman-Cousins intervals
     11. Flux J(E)
     12. Spectrum E³J(E)
-    13. CSV output (global + run-specific)
-    14. Plotting (global + run-specific)
+    13. Energy-scale systematic scan (optional)
+        Energy × zenith aperture/exposure/flux (optional, `zenith` block)
+    14. Columnar results store + optional CSV export (run-specific, written once)
+    15. Plotting (run-specific, rendered once, figures rendered in parallel)
+    16. Publish global copies (hardlinks) after everything succeeded
+    17. Register the run in output/runs.sqlite
+
+With `partial=` (cbspec merge), steps 2-5 are replaced by merged partial
+histograms from several nodes (see partials.py); the energy-scale scan is
+skipped in that mode, and so is the energy × zenith binning.
+
+With `mc_productions` (productions.py), several MC files -- each with its own
+generated area, solid angle and thrown spectrum -- are streamed in parallel
+and combined into one aperture; only the data file goes through step 2.
+
+pyarrow (results store), pandas (CSV export) and matplotlib (plotting) are
+imported only when their step runs, so `import cbspec` stays cheap and
+make_plots=False / output_cfg.write_csv=False skip those imports entirely.
 """
 
 from pathlib import Path
@@ -31,44 +53,129 @@ import numpy as np
 import warnings
 warnings.filterwarnings("ignore", category=RuntimeWarning, message="divide by zero encountered in log10")
 
-from .process_data import set_up_energy_array
-from .binning import make_energy_bins, histgram_data_per_bin, filter_bins, energy_conv
-from .exposure import compute_aperture, compute_exposure
-from .feldman_cousins import feldman_cousins_vector
-from .flux import compute_flux
-from .spectrum import flux_to_spectrum
-from .output_utils import save_flux_csv, save_spectrum_csv
-from .plotting import (
-    plot_aperture,
-    plot_exposure,
-    plot_flux,
-    plot_spectrum,
-    mc_recon_hist,
-    mc_thrown_hist,
-    dt_hist,
+from .pipeline import RESULT_STAGES, Pipeline, final_results
+from .stages import StageCache, serialize_outputs
+from .output_utils import make_unique_dir, publish_artifacts
+from .provenance import config_to_dict, stable_hash
+from .load_config import load_energy_scale_config, load_mc_productions_config, load_skim_config, load_zenith_config
+from .logging_utils import RunLogger, WARNING
+from .provenance import file_fingerprint
+from .run_registry import (
+    REGISTRY_FILENAME,
+    RunRegistry,
+    list_artifacts,
+    read_jsonl,
+    stage_timings_from_events,
+    write_run_record,
 )
-from .logging_utils import RunLogger
 
 
 # Run directory helper
-def _make_run_directory(output_cfg):
+def _make_run_directory(output_cfg, run_name=None):
     """
-    Create a timestamped run directory under output/runs/.
+    Create a new run directory under output/runs/.
+
+    Two runs started within the same second get distinct directories
+    (<timestamp>, <timestamp>-2, ...).
+
+    :param run_name: str, optional
+                     Directory name (default: the current timestamp)
     :return run_dir: Path
                      Path to the run directory
     :return logs_dir: Path
                       Path to the logs directory inside the run directory
     """
-    timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")
-    run_dir = output_cfg.runs_dir / timestamp
+    name = run_name or datetime.now().strftime("%Y%m%d-%H%M%S")
+    run_dir = make_unique_dir(output_cfg.runs_dir, name)
     logs_dir = run_dir / "logs"
 
     logs_dir.mkdir(parents=True, exist_ok=True)
     return run_dir, logs_dir
 
 
+def _resume_run_directory(run_dir):
+    """
+    Reopen the directory of an interrupted run (logs are appended).
+
+    :param run_dir: str or Path
+    :raise FileNotFoundError: if the directory does not exist
+    :raise ValueError: if the run already completed
+    :return run_dir: Path
+    :return logs_dir: Path
+    """
+    run_dir = Path(run_dir)
+    if not run_dir.is_dir():
+        raise FileNotFoundError(f"Run directory {run_dir} does not exist")
+    if (run_dir / "run_record.json").exists():
+        raise ValueError(f"Run {run_dir} already completed; nothing to resume")
+    logs_dir = run_dir / "logs"
+    logs_dir.mkdir(parents=True, exist_ok=True)
+    return run_dir, logs_dir
+
+
+def select_input_files(array_cfg, cfg):
+    """
+    Set array_cfg.mc_file/dt_file from the YAML `data` block of the array type.
+
+    :param array_cfg: ArrayConfig
+    :param cfg: dict
+                Raw configuration returned by load_config
+    :return array_cfg: ArrayConfig
+    """
+    if array_cfg.array_type == "TASD":
+        files = cfg["data"]["tasd"]
+    elif array_cfg.array_type == "CBSD":
+        files = cfg["data"]["cbsd"]
+    else:
+        raise TypeError(f"Array type {array_cfg.array_type} is not supported")
+    # mc_file may be left out when mc_productions lists the MC of this array
+    array_cfg.mc_file = Path(files["mc_file"]) if files.get("mc_file") else None
+    array_cfg.dt_file = Path(files["dt_file"])
+    return array_cfg
+
+
 # Main pipeline
-def run_pipeline(array_cfg, spectrum_cfg, cuts_cfg, output_cfg, cfg):
+def zenith_unavailable(report, productions_cfg=None, partial=None):
+    """
+    Why the energy × zenith binning cannot run on these inputs.
+
+    :param report: dict
+                   Preflight report of the inputs (preflight.preflight)
+    :param productions_cfg: MCProductionsConfig, optional
+    :param partial: dict, optional
+                    Merged partial histograms the run starts from
+    :return reason: str or None
+                    None if it can run
+    """
+    if partial is not None or any(info["skim"] for info in report["inputs"]):
+        return "the inputs hold no per-event zenith angles"
+    if productions_cfg is not None:
+        return "it needs a single MC file, not MC productions"
+    return None
+
+
+def run_pipeline(
+        array_cfg,
+        spectrum_cfg,
+        cuts_cfg,
+        output_cfg,
+        cfg,
+        energy_scale_cfg=None,
+        force_stages=(),
+        use_cache=True,
+        make_plots=True,
+        profile=None,
+        profile_top=15,
+        run_name=None,
+        shared_stages=None,
+        publish=True,
+        register=True,
+        partial=None,
+        skim_cfg=None,
+        zenith_cfg=None,
+        resume=None,
+        productions_cfg=None,
+):
     """
     Execute the full cbspec pipeline.
     :param array_cfg: ArrayConfig
@@ -80,11 +187,61 @@ def run_pipeline(array_cfg, spectrum_cfg, cuts_cfg, output_cfg, cfg):
     :param output_cfg: OutputConfig
                        Base, plots, logs, and runs directory configuration.
     :param cfg: Configuration
+    :param energy_scale_cfg: EnergyScaleConfig, optional
+                             Energy-scale scan settings. Defaults to the YAML
+                             `energy_scale` block; no scan if neither is given.
+    :param force_stages: iterable of str, optional
+                         Stage names to recompute even if cached ("all" for every stage)
+    :param use_cache: bool, optional
+                      Reuse/store stage outputs under output_cfg.cache_dir (default True)
+    :param make_plots: bool, optional
+                       Render the plots (default True). CSV export is controlled
+                       by output_cfg.write_csv.
+    :param profile: str, optional
+                    "cpu", "memory" or "both": profile every stage separately into
+                    run_dir/profile/ (see profiling.py). Default: no profiling.
+    :param profile_top: int, optional
+                        Hot functions / allocation sites per stage summarized in run.log
+    :param run_name: str, optional
+                     Run directory name under output_cfg.runs_dir (default: timestamp)
+    :param shared_stages: dict, optional
+                          {stage: (outputs, output_hash)} computed elsewhere, e.g. the
+                          parquet_ingest outputs a sweep shares between its variants
+    :param publish: bool, optional
+                    Publish global copies under output_cfg.base_dir (default True)
+    :param register: bool, optional
+                     Register the run in <base_dir>/runs.sqlite (default True); the
+                     record is always written to run_dir/run_record.json
+    :param partial: dict, optional
+                    Merged partial histograms (see partials.py) replacing parquet
+                    ingestion; array_cfg.array_type and cuts_cfg must match it.
+                    The energy-scale scan is skipped (it needs per-event energies).
+    :param skim_cfg: SkimConfig, optional
+                     Write the cut-passing events to run_dir/skim (see skim.py).
+                     Defaults to the YAML `skim` block; no skim if neither is given.
+    :param zenith_cfg: ZenithConfig, optional
+                       Energy × zenith binning (see stages.py). Defaults to the YAML
+                       `zenith` block; 1D energy binning only if neither is given.
+    :param resume: str or Path, optional
+                   Run directory of an interrupted run: continue its parquet ingestion
+                   from the last checkpoint (see checkpoint.py) and write the outputs
+                   there. The checkpoint must match the inputs, array type and cuts.
+    :param productions_cfg: MCProductionsConfig, optional
+                            Several MC productions combined into one aperture, replacing
+                            array_cfg.mc_file (see productions.py). Defaults to the YAML
+                            `mc_productions` block of the array type.
     :return dict: Dictionary containing all final arrays (flux, spectrum, etc.)
+                  and the run directory ("run_dir")
     """
-    # Create run directory + logger
-    run_dir, logs_dir = _make_run_directory(output_cfg)
-    logger = RunLogger(logs_dir)
+    # Create run directory (or reopen an interrupted one) + logger
+    if resume is None:
+        run_dir, logs_dir = _make_run_directory(output_cfg, run_name)
+    else:
+        if partial is not None:
+            raise ValueError("resume continues a parquet ingestion; it cannot be combined with partial histograms")
+        run_dir, logs_dir = _resume_run_directory(resume)
+    logger = RunLogger(logs_dir, level=output_cfg.log_level, buffered=output_cfg.log_buffered)
+    started = datetime.now().isoformat(timespec="seconds")
 
     logger.log_text("Starting cbspec pipeline...")
     logger.log_json(event="pipeline_start", array=array_cfg.array_type)
@@ -92,143 +249,404 @@ def run_pipeline(array_cfg, spectrum_cfg, cuts_cfg, output_cfg, cfg):
     # Select MC/DT files based on final array type (after overrides)
     logger.log_text("Determining array type...")
     logger.log_json(event="type_select")
-    if array_cfg.array_type == "TASD":
-        array_cfg.mc_file = Path(cfg["data"]["tasd"]["mc_file"])
-        array_cfg.dt_file = Path(cfg["data"]["tasd"]["dt_file"])
-    elif array_cfg.array_type == "CBSD":
-        array_cfg.mc_file = Path(cfg["data"]["cbsd"]["mc_file"])
-        array_cfg.dt_file = Path(cfg["data"]["cbsd"]["dt_file"])
-    else:
-        raise TypeError(f"Array type {array_cfg.array_type} is not supported")
+    if partial is None:
+        select_input_files(array_cfg, cfg)
     logger.log_text(f"Array type: {array_cfg.array_type}")
     logger.log_json(event=f"{array_cfg.array_type}_array_selected", array=array_cfg.array_type)
 
-    # Parquet ingestion (MC + data)
-    logger.log_text("Reading parquet files and applying quality cuts...")
-    logger.log_json(event="parquet_ingest")
-    mc_array, dt_array, mc_thrown_array = set_up_energy_array(
-        infiles=[array_cfg.mc_file, array_cfg.dt_file],
-        array_type=array_cfg.array_type,
-        cuts=cuts_cfg,
-        logger=logger,
-    )
+    # MC productions (YAML block unless passed explicitly) replace the single MC file
+    if productions_cfg is None:
+        productions_cfg = load_mc_productions_config(cfg, array_cfg.array_type)
+    if productions_cfg is not None and partial is not None:
+        logger.log_text("MC productions ignored: partial histograms carry their own MC counts", level=WARNING)
+        productions_cfg = None
+    if productions_cfg is not None:
+        if array_cfg.mc_file is not None:
+            logger.log_text(f"MC file {array_cfg.mc_file} ignored: {len(productions_cfg.productions)} "
+                            "MC productions are configured", level=WARNING)
+            array_cfg.mc_file = None
+        logger.log_text("MC productions: " + ", ".join(
+            f"{p.name} ({p.file})" for p in productions_cfg.productions))
+        logger.log_json(event="mc_productions", productions=[p.name for p in productions_cfg.productions],
+                        reference_index=productions_cfg.reference_index)
 
-    # Energy binning
-    logger.log_text("Creating energy bins...")
-    logger.log_json(event="create_bins")
-    edges, centers, widths = make_energy_bins(spectrum_cfg.en_range)
+    # Checkpoints of the ingestion pass; a resumed run must match its checkpoint
+    from .checkpoint import IngestCheckpoint
 
-    # Histogram MC_recon, MC_thrown, data
-    logger.log_text("Binning energy arrays...")
-    logger.log_json(event="bin_energy")
-    mc_counts, dt_counts, mc_thrown_counts = histgram_data_per_bin(
-        mc_array, dt_array, mc_thrown_array, edges
-    )
+    checkpoint = IngestCheckpoint(run_dir / "checkpoint", [array_cfg.mc_file, array_cfg.dt_file],
+                                  array_cfg.array_type, cuts_cfg, logger) if partial is None else None
+    if resume is not None:
+        logger.log_text(f"Resuming run {run_dir}")
+        logger.log_json(event="resume", run_dir=str(run_dir))
+        try:
+            manifest = checkpoint.verify()
+        except ValueError:
+            logger.close()
+            raise
+        if manifest is None:
+            logger.log_text("No ingestion checkpoint: ingestion starts from the beginning "
+                            "(completed stages still come from the stage cache)", level=WARNING)
 
-    # Filter bins (log10(E/eV) > 18.5, N_MC_Thrown > 1)
-    logger.log_text("Filtering energy bins...")
-    logger.log_json(event="filter_energy")
-    (
-        mask,
-        mc_counts_f,
-        dt_counts_f,
-        mc_thrown_counts_f,
-        centers_f,
-    ) = filter_bins(mc_counts, dt_counts, mc_thrown_counts, centers)
-
-    widths_f = widths[mask]
-
-    # Convert filtered log10(E/eV) energy centers and widths into eV
-    logger.log_text("Converting log10(E/eV) to eV...")
-    logger.log_json(event="convert_log10_eV")
-    energies_ev, delta_energies_ev = energy_conv(centers_f, widths_f)
-
-    # Aperture AΩ(E)
-    logger.log_text("Calculating aperture...")
-    logger.log_json(event="aperture")
-    aperture = compute_aperture(
-        mc_counts_f,
-        mc_thrown_counts_f,
-        spectrum_cfg.generated_area_m2,
-        spectrum_cfg.generated_solid_angle_sr,
-    )
+    # Energy-scale systematic scan settings (YAML block unless passed explicitly)
+    if energy_scale_cfg is None:
+        energy_scale_cfg = load_energy_scale_config(cfg)
 
-    # Exposure λ(E)
-    logger.log_text("Calculating exposure...")
-    logger.log_json(event="exposure")
-    exposure = compute_exposure(aperture, spectrum_cfg.run_time_s)
-
-    # Feldman-Cousins intervals on counts
-    logger.log_text("Calculating Feldman-Cousins intervals...")
-    logger.log_json(event="feldman_cousins")
-    fc_lower, fc_upper = feldman_cousins_vector(dt_counts_f, cl=0.68)
-
-    # Flux J(E)
-    logger.log_text("Calculating Flux J(E)...")
-    logger.log_json(event="flux")
-    flux = compute_flux(dt_counts_f, exposure, delta_energies_ev)
-    flux_lower = compute_flux(fc_lower, exposure, delta_energies_ev)
-    flux_upper = compute_flux(fc_upper, exposure, delta_energies_ev)
-
-    # Spectrum E³J(E)
-    logger.log_text("Calculating Spectrum E³J(E)...")
-    logger.log_json(event="spectrum")
-    spectrum, spectrum_lower, spectrum_upper = flux_to_spectrum(
-        energies_ev, flux, flux_lower, flux_upper
-    )
+    if partial is not None:
+        from .partials import log_inputs, stage_outputs as partial_stage_outputs
 
-    # Save CSV outputs (global + run-specific)
-    save_flux_csv(
-        global_output_dir=str(output_cfg.base_dir),
-        run_output_dir=str(run_dir),
-        array_type=array_cfg.array_type,
-        centers=centers_f,
-        widths=widths_f,
-        n_events=dt_counts_f,
-        exposure=exposure,
-        flux=flux,
-        flux_lower=flux_lower,
-        flux_upper=flux_upper,
+        log_inputs(partial, logger)
+        if energy_scale_cfg is not None:
+            logger.log_text("Energy-scale scan skipped: partial histograms hold no per-event energies",
+                            level=WARNING)
+            energy_scale_cfg = None
+
+    # Preflight: footers/schemas of the inputs and the settings, before any ingestion
+    from .preflight import check_settings, log_report, preflight, raise_on_errors
+
+    with logger.span("preflight"):
+        if partial is None:
+            report = preflight(array_cfg, spectrum_cfg, cuts_cfg, energy_scale_cfg, productions_cfg)
+            log_report(report, logger)
+        else:
+            errors, warnings_ = check_settings(spectrum_cfg, cuts_cfg, energy_scale_cfg)
+            report = {"errors": errors, "warnings": warnings_}
+            for warning in warnings_:
+                logger.log_text(f"Preflight warning: {warning}", level=WARNING)
+    if report["errors"]:
+        logger.close()
+        raise_on_errors(report)
+
+    # The energy-scale scan shifts the energies of one MC event file
+    if productions_cfg is not None and energy_scale_cfg is not None:
+        logger.log_text("Energy-scale scan skipped: it needs a single MC file, not MC productions", level=WARNING)
+        energy_scale_cfg = None
+
+    # Skims: written by the ingestion pass; skim inputs carry no per-event cut variables
+    if skim_cfg is None:
+        skim_cfg = load_skim_config(cfg)
+    if partial is not None and skim_cfg is not None:
+        logger.log_text("Skim not written: partial histograms hold no events", level=WARNING)
+        skim_cfg = None
+    if productions_cfg is not None and skim_cfg is not None:
+        logger.log_text("Skim not written: MC productions are streamed into histograms, not ingested",
+                        level=WARNING)
+        skim_cfg = None
+    if resume is not None and skim_cfg is not None:
+        logger.log_text("Skim not written: a resumed ingestion cannot stream a skim", level=WARNING)
+        skim_cfg = None
+    if partial is None and any(info["skim"] for info in report["inputs"]):
+        if energy_scale_cfg is not None:
+            logger.log_text("Energy-scale scan skipped: skim inputs hold no cut variables", level=WARNING)
+            energy_scale_cfg = None
+        if skim_cfg is not None:
+            logger.log_text("Skim not written: the inputs already are skims", level=WARNING)
+            skim_cfg = None
+
+    # Energy × zenith binning needs the per-event zenith angles of the raw inputs
+    if zenith_cfg is None:
+        zenith_cfg = load_zenith_config(cfg)
+    problem = zenith_unavailable(report, productions_cfg, partial)
+    if zenith_cfg is not None and problem is not None:
+        logger.log_text(f"Energy × zenith binning skipped: {problem}", level=WARNING)
+        zenith_cfg = None
+
+    # Physics stages (ingestion → spectrum): a Pipeline resolved through the stage cache
+    if skim_cfg is not None:
+        # The skim is a side output of ingestion: a cached ingest would not write it
+        force_stages = set(force_stages or ()) | {"parquet_ingest"}
+    profiler = None
+    if profile:
+        from .profiling import StageProfiler
+
+        profiler = StageProfiler(run_dir / "profile", profile, logger, top_n=profile_top)
+        logger.log_text(f"Profiling mode: {profile} → {profiler.profile_dir}")
+        logger.log_json(event="profile_start", mode=profile, dir=str(profiler.profile_dir))
+
+    pipeline = Pipeline(
+        array_cfg,
+        spectrum_cfg,
+        cuts_cfg,
+        energy_scale_cfg=energy_scale_cfg,
+        zenith_cfg=zenith_cfg,
+        productions_cfg=productions_cfg,
         logger=logger,
+        cache=StageCache(output_cfg.cache_dir / "stages") if use_cache else None,
+        force=force_stages,
+        profiler=profiler,
+        progress=output_cfg.progress,
+        heartbeat_s=output_cfg.heartbeat_s,
+        skim=skim_cfg,
+        skim_dir=run_dir / "skim",
+        checkpoint_s=output_cfg.checkpoint_s,
+        checkpoint_dir=checkpoint.directory if checkpoint is not None else None,
+        production_workers=output_cfg.production_workers,
+        jit=output_cfg.jit,
     )
+    for name, (outputs, output_hash) in (shared_stages or {}).items():
+        pipeline.seed(name, outputs, output_hash)
+    if partial is not None:
+        # Rebinned partial counts stand in for the event-level histogram stages
+        try:
+            seeded = partial_stage_outputs(partial, spectrum_cfg.en_range)
+        except ValueError:
+            logger.close()
+            raise
+        for name, outputs in seeded.items():
+            pipeline.seed(name, outputs, serialize_outputs(outputs)[1])
+        skipped = ("energy_scale_scan", "zenith_aperture", "zenith_flux")
+        needed = [name for name in RESULT_STAGES if name not in skipped]
+        stage_outputs = {**pipeline.run(needed), "scan": None, "zenith": None}
+    else:
+        # Event arrays are consumed inside the stages only; on a fully cached run
+        # parquet_ingest outputs are never loaded from disk
+        stage_outputs = pipeline.run()
+        # parquet_ingest removes its checkpoints; a cache hit on resume leaves them behind
+        checkpoint.remove()
 
-    save_spectrum_csv(
-        global_output_dir=str(output_cfg.base_dir),
-        run_output_dir=str(run_dir),
+    results = final_results(stage_outputs)
+    edges = stage_outputs["edges"]
+    mask = stage_outputs["mask"]
+    centers_f = results["centers"]
+    widths_f = results["widths"]
+    dt_counts_f = results["dt_counts"]
+    scan = results["energy_scale"]
+    zenith = results["zenith"]
+    productions = results["productions"]
+
+    cache_status = ", ".join(f"{name}={status}" for name, status in pipeline.status.items())
+    logger.log_text(f"Stage cache: {cache_status}")
+
+    # Columnar results store: every array + mask, edges, unfiltered counts and config
+    from .results_store import save_results
+
+    logger.log_json(event="save_outputs")
+    save_span = logger.start_span("save_outputs")
+    if profiler is not None:
+        profiler.start("save_outputs")
+    run_config = config_to_dict(
+        array=array_cfg,
+        spectrum=spectrum_cfg,
+        quality_cuts=cuts_cfg,
+        energy_scale=energy_scale_cfg,
+        # Only present when configured, so config hashes of 1D runs do not change
+        **({"zenith": zenith_cfg} if zenith_cfg is not None else {}),
+        **({"mc_productions": productions_cfg} if productions_cfg is not None else {}),
+    )
+    results_name = f"{array_cfg.array_type}_results.arrow"
+    results_path = save_results(
+        path=run_dir / "data" / results_name,
+        results={
+            **results,
+            # The zenith axis and production names are strings (not storable); the stored
+            # config records them
+            "zenith": None if zenith is None else {k: v for k, v in zenith.items() if k != "axis"},
+            "productions": None if productions is None else {k: v for k, v in productions.items() if k != "names"},
+            "mask": mask,
+            "edges": edges,
+            "centers_all": stage_outputs["centers"],
+            "widths_all": stage_outputs["widths"],
+            "mc_counts_all": stage_outputs["mc_counts"],
+            "dt_counts_all": stage_outputs["dt_counts"],
+            "mc_thrown_counts_all": stage_outputs["mc_thrown_counts"],
+        },
         array_type=array_cfg.array_type,
-        centers=centers_f,
-        spectrum=spectrum,
-        spectrum_lower=spectrum_lower,
-        spectrum_upper=spectrum_upper,
+        config=run_config,
+        config_digest=stable_hash(run_config),
         logger=logger,
     )
 
-    # Plotting (global + run-specific)
-    plot_aperture(centers_f, aperture, array_cfg.array_type, output_cfg.base_dir, run_dir, logger)
-    plot_exposure(centers_f, exposure, array_cfg.array_type, output_cfg.base_dir, run_dir, logger)
-    plot_flux(centers_f, flux, flux_lower, flux_upper, array_cfg.array_type, output_cfg.base_dir, run_dir, logger)
-    plot_spectrum(centers_f, spectrum, spectrum_lower, spectrum_upper, array_cfg.array_type,output_cfg.base_dir, run_dir, logger)
-    mc_recon_hist(mc_array,array_cfg.array_type, output_cfg.base_dir, run_dir, logger)
-    mc_thrown_hist(mc_thrown_array,array_cfg.array_type, output_cfg.base_dir, run_dir, logger)
-    dt_hist(dt_array, array_cfg.array_type, output_cfg.base_dir, run_dir, logger)
+    # Every artifact is written once into run_dir; global copies are published at the end
+    artifacts = [(output_cfg.base_dir / "data" / results_name, results_path)]
+
+    # Optional CSV export (written once into run_dir/data)
+    if output_cfg.write_csv:
+        from .output_utils import save_flux_csv, save_spectrum_csv, save_energy_scale_band_csv
+
+        artifacts.append(save_flux_csv(
+            global_output_dir=str(output_cfg.base_dir),
+            run_output_dir=str(run_dir),
+            array_type=array_cfg.array_type,
+            centers=centers_f,
+            widths=widths_f,
+            n_events=dt_counts_f,
+            exposure=results["exposure"],
+            flux=results["flux"],
+            flux_lower=results["flux_lower"],
+            flux_upper=results["flux_upper"],
+            logger=logger,
+        ))
+
+        artifacts.append(save_spectrum_csv(
+            global_output_dir=str(output_cfg.base_dir),
+            run_output_dir=str(run_dir),
+            array_type=array_cfg.array_type,
+            centers=centers_f,
+            spectrum=results["spectrum"],
+            spectrum_lower=results["spectrum_lower"],
+            spectrum_upper=results["spectrum_upper"],
+            logger=logger,
+        ))
+
+    if output_cfg.write_csv and scan is not None:
+        # One flux/spectrum table per scale, e.g. TASD_Escale1.100_flux.csv
+        for k, scale in enumerate(scan["scales"]):
+            scale_tag = f"{array_cfg.array_type}_Escale{scale:.3f}"
+            artifacts.append(save_flux_csv(
+                global_output_dir=str(output_cfg.base_dir),
+                run_output_dir=str(run_dir),
+                array_type=scale_tag,
+                centers=scan["centers"],
+                widths=scan["widths"],
+                n_events=scan["dt_counts"][k],
+                exposure=scan["exposure"][k],
+                flux=scan["flux"][k],
+                flux_lower=scan["flux_lower"][k],
+                flux_upper=scan["flux_upper"][k],
+                logger=logger,
+            ))
+            artifacts.append(save_spectrum_csv(
+                global_output_dir=str(output_cfg.base_dir),
+                run_output_dir=str(run_dir),
+                array_type=scale_tag,
+                centers=scan["centers"],
+                spectrum=scan["spectrum"][k],
+                spectrum_lower=scan["spectrum_lower"][k],
+                spectrum_upper=scan["spectrum_upper"][k],
+                logger=logger,
+            ))
+
+        artifacts.append(save_energy_scale_band_csv(
+            global_output_dir=str(output_cfg.base_dir),
+            run_output_dir=str(run_dir),
+            array_type=array_cfg.array_type,
+            centers=scan["centers"],
+            scales=scan["scales"],
+            flux=scan["flux"],
+            spectrum=scan["spectrum"],
+            logger=logger,
+        ))
+
+    if output_cfg.write_csv and zenith is not None:
+        from .output_utils import save_zenith_flux_csv
+
+        artifacts.append(save_zenith_flux_csv(
+            global_output_dir=str(output_cfg.base_dir),
+            run_output_dir=str(run_dir),
+            array_type=array_cfg.array_type,
+            centers=centers_f,
+            widths=widths_f,
+            zenith=zenith,
+            logger=logger,
+        ))
+
+    if output_cfg.write_csv and productions is not None:
+        from .output_utils import save_productions_csv
+
+        artifacts.append(save_productions_csv(
+            global_output_dir=str(output_cfg.base_dir),
+            run_output_dir=str(run_dir),
+            array_type=array_cfg.array_type,
+            centers=centers_f,
+            aperture=results["aperture"],
+            productions=productions,
+            logger=logger,
+        ))
+
+    if profiler is not None:
+        profiler.stop()
+    save_span.end()
+
+    # Plotting (rendered once into run_dir/plots, in parallel, from pre-binned counts)
+    if make_plots:
+        from .plotting import make_plot_jobs, render_plots
+
+        logger.log_json(event="plotting")
+        plot_span = logger.start_span("plotting")
+        plot_workers = output_cfg.plot_workers
+        if profiler is not None:
+            profiler.start("plotting")
+            if profiler.cpu:
+                plot_workers = 0  # pool workers are invisible to cProfile; render in-process
+        plot_jobs = make_plot_jobs(
+            array_type=array_cfg.array_type,
+            centers=centers_f,
+            aperture=results["aperture"],
+            exposure=results["exposure"],
+            flux=results["flux"],
+            flux_lower=results["flux_lower"],
+            flux_upper=results["flux_upper"],
+            spectrum=results["spectrum"],
+            spectrum_lower=results["spectrum_lower"],
+            spectrum_upper=results["spectrum_upper"],
+            hist_edges=stage_outputs["hist_edges"],
+            mc_hist=stage_outputs["mc_hist"],
+            mc_thrown_hist=stage_outputs["mc_thrown_hist"],
+            dt_hist=stage_outputs["dt_hist"],
+        )
+        if zenith is not None:
+            from .plotting import make_zenith_plot_jobs
+
+            plot_jobs += make_zenith_plot_jobs(array_cfg.array_type, edges, mask, results["flux"], zenith)
+        if productions is not None:
+            from .plotting import make_productions_plot_jobs
+
+            plot_jobs += make_productions_plot_jobs(array_cfg.array_type, centers_f, results["aperture"], productions)
+        artifacts += render_plots(
+            plot_jobs, output_cfg.base_dir, run_dir, logger, max_workers=plot_workers
+        )
+        if profiler is not None:
+            profiler.stop()
+        plot_span.end()
+
+    # Publish global copies (output/data, output/plots) only after the run succeeded
+    if publish:
+        logger.log_text("Publishing global output copies...")
+        logger.log_json(event="publish_outputs", n_artifacts=len(artifacts))
+        with logger.span("publish_outputs", n_artifacts=len(artifacts)):
+            publish_artifacts(artifacts, logger)
+
+    if profiler is not None:
+        profiler.close()
 
     # Finalize
     logger.log_text("Pipeline completed successfully.")
     logger.log_json(event="pipeline_end")
     logger.close()
 
-    return {
-        "centers": centers_f,
-        "widths": widths_f,
-        "mc_counts": mc_counts_f,
-        "dt_counts": dt_counts_f,
-        "mc_thrown_counts": mc_thrown_counts_f,
-        "aperture": aperture,
-        "exposure": exposure,
-        "flux": flux,
-        "flux_lower": flux_lower,
-        "flux_upper": flux_upper,
-        "spectrum": spectrum,
-        "spectrum_lower": spectrum_lower,
-        "spectrum_upper": spectrum_upper,
-    }
\ No newline at end of file
+    # Register the run in output/runs.sqlite (record also kept in run_dir)
+    if partial is not None:
+        inputs = partial["meta"]["inputs"]
+    elif productions_cfg is not None:
+        inputs = [{"role": "mc", "production": p.name, **file_fingerprint(p.file)} for p in productions_cfg.productions]
+        inputs.append({"role": "dt", **file_fingerprint(array_cfg.dt_file)})
+    else:
+        inputs = [
+            {"role": "mc", **file_fingerprint(array_cfg.mc_file)},
+            {"role": "dt", **file_fingerprint(array_cfg.dt_file)},
+        ]
+    record = {
+        "run_id": run_dir.name,
+        "run_dir": str(run_dir),
+        "started": started,
+        "finished": datetime.now().isoformat(timespec="seconds"),
+        "status": "completed",
+        "array_type": array_cfg.array_type,
+        "config_hash": stable_hash(run_config),
+        "config": run_config,
+        "inputs": inputs,
+        "counts": {
+            "n_mc_reco": int(stage_outputs["n_mc_reco"]),
+            "n_data": int(stage_outputs["n_data"]),
+            "n_mc_thrown": int(stage_outputs["n_mc_thrown"]),
+            "n_data_in_bins": float(np.sum(dt_counts_f)),
+        },
+        "stage_timings": stage_timings_from_events(read_jsonl(logger.json_path)),
+        "artifacts": list_artifacts(run_dir),
+    }
+    write_run_record(run_dir, record)
+    if register:
+        with RunRegistry(output_cfg.base_dir / REGISTRY_FILENAME) as registry:
+            registry.register(record)
+
+    results["run_dir"] = run_dir
+    return results
\ No newline at end of file
@@ -1,23 +1,43 @@
 """
-Utility functions for saving flux and spectrum tables to CSV files.
+Utility functions for saving flux and spectrum tables to CSV files and for
+publishing run artifacts to the global output directories.
 
 This module handles **both**:
     - global outputs        → output/data
     - run-specific outputs  → output/runs/<timestamp>/data/
 
+Every artifact is rendered/serialized exactly ONCE, into the run directory.
+The save functions return the (global_path, run_path) pair, and the global
+copy is created later by publish_artifacts():
+    1. hardlink run file → temporary name in the global directory
+       (falls back to a symlink, then to a plain copy)
+    2. os.replace() the temporary name onto the global filename
+
+Publishing happens only after the pipeline finished, so the "latest" global
+copies always come from one complete run -- a run that dies midway leaves
+the previous global outputs untouched.
+
 The filenames are automatically array-tagged:
     {array_type}_flux.csv
     {array_type}_spectrum.csv
+    {array_type}_energy_scale_band.csv   (energy-scale scan only)
+    {array_type}_flux_2d.csv             (energy × zenith binning only)
 
 This ensures that:
     - multiple runs do not overwrite each other
     - TASD and CBSD results are easily identifiable
     - global and run-specific directories remain synchronized
+
+pandas is imported inside the CSV writers only, so publishing (and runs with
+CSV export disabled) never pay for it.
 """
 
 
 import os
-import pandas as pd
+import shutil
+from pathlib import Path
+
+import numpy as np
 
 from .logging_utils import RunLogger
 
@@ -38,6 +58,96 @@ def ensure_dir(path: str):
     os.makedirs(path, exist_ok=True)
 
 
+def make_unique_dir(parent, name: str):
+    """
+    Create a new directory parent/name, appending -2, -3, ... if it exists.
+
+    :param parent: str or Path
+                   Parent directory (created if missing)
+    :param name: str
+                 Preferred directory name, e.g. a timestamp
+    :return path: Path
+                  The directory created by this call
+
+    Notes:
+        - The directory is claimed with an exclusive mkdir, so runs started
+          within the same second (or by parallel sweep workers) never share
+          a directory.
+    """
+    parent = Path(parent)
+    parent.mkdir(parents=True, exist_ok=True)
+    path = parent / name
+    suffix = 1
+    while True:
+        try:
+            path.mkdir()
+            return path
+        except FileExistsError:
+            suffix += 1
+            path = parent / f"{name}-{suffix}"
+
+
+def publish_artifact(run_path: str, global_path: str):
+    """
+    Atomically publish a run artifact under its global filename.
+
+    :param run_path: str
+                     Artifact already written inside the run directory
+    :param global_path: str
+                        Global filename (e.g. output/plots/TASD_flux.png)
+    :return method: str
+                    "hardlink", "symlink", or "copy"
+
+    Notes:
+        - The link/copy is created under a temporary name in the destination
+          directory and renamed with os.replace(), so readers of the global
+          path see either the previous file or the new one -- never a
+          partially written file.
+        - Hardlinks need the run and global directories on the same
+          filesystem; symlinks need OS support. The copy fallback always works.
+    """
+    ensure_dir(os.path.dirname(global_path) or ".")
+    tmp_path = os.path.join(
+        os.path.dirname(global_path), f".{os.path.basename(global_path)}.tmp-{os.getpid()}"
+    )
+    if os.path.lexists(tmp_path):
+        os.remove(tmp_path)
+
+    try:
+        os.link(run_path, tmp_path)
+        method = "hardlink"
+    except OSError:
+        try:
+            os.symlink(os.path.abspath(run_path), tmp_path)
+            method = "symlink"
+        except OSError:
+            shutil.copy2(run_path, tmp_path)
+            method = "copy"
+
+    os.replace(tmp_path, global_path)
+    return method
+
+
+def publish_artifacts(artifacts, logger: RunLogger):
+    """
+    Publish all run artifacts to their global locations.
+
+    :param artifacts: list of (global_path, run_path) tuples
+                      As returned by the save_* and plot_* functions
+    :param logger: RunLogger
+    :return methods: dict
+                     {global_path: method}
+    """
+    methods = {}
+    for global_path, run_path in artifacts:
+        method = publish_artifact(str(run_path), str(global_path))
+        methods[str(global_path)] = method
+
+        logger.log_text(f"Publishing {os.path.basename(str(global_path))} to {os.path.dirname(str(global_path))} ({method})...")
+        logger.log_json(event="publish", file=str(global_path), source=str(run_path), method=method)
+    return methods
+
+
 def save_flux_csv(
         global_output_dir: str,
         run_output_dir: str,
@@ -54,9 +164,8 @@ def save_flux_csv(
     """
     Save final flux table to CSV.
 
-    The table is written to BOTH:
-        - global_output_dir/data/
-        - run_output_dir/data/
+    The table is written once to run_output_dir/data/; the copy in
+    global_output_dir/data/ is created by publish_artifacts().
 
     Final CSV columns:
         Energy, Bin_size, N_events, Exposure, J, Lower, Upper
@@ -91,19 +200,20 @@ def save_flux_csv(
     :param flux_upper: array-like
                       Feldman-Cousins upper bounds on J(E)
     :param logger: RunLogger
-    :return global_path: tuple of str
-                         Path to global saved CSV file
-    :return run_path: tuple of str
-                      Path to run-specific saved CSV file
+    :return global_path: str
+                         Publish destination in the global data directory
+    :return run_path: str
+                      Path to the written run-specific CSV file
     """
-    # Global directory
+    # Global directory (publish destination)
     global_data_dir = os.path.join(global_output_dir, "data")
-    ensure_dir(global_data_dir)
 
     # Run-specific directory
     run_data_dir = os.path.join(run_output_dir, "data")
     ensure_dir(run_data_dir)
 
+    import pandas as pd
+
     # Construct DataFrame
     df = pd.DataFrame({
         "Energy": centers,
@@ -121,11 +231,7 @@ def save_flux_csv(
     global_path = os.path.join(global_data_dir, filename)
     run_path = os.path.join(run_data_dir, filename)
 
-    # Save to both locations
-    logger.log_text(f"Saving {filename} to {global_path}...")
-    logger.log_json(event=f"save_{filename}_global")
-    df.to_csv(global_path, index=False)
-
+    # Serialize once into the run directory
     logger.log_text(f"Saving {filename} to {run_path}...")
     logger.log_json(event=f"save_{filename}_run")
     df.to_csv(run_path, index=False)
@@ -146,9 +252,8 @@ def save_spectrum_csv(
     """
     Save final E³J(E) spectrum table to CSV.
 
-    The table is written to BOTH:
-        - global_output_dir/data/
-        - run_output_dir/data/
+    The table is written once to run_output_dir/data/; the copy in
+    global_output_dir/data/ is created by publish_artifacts().
 
     Final CSV columns:
         Energy, Spectrum, Lower, Upper
@@ -174,19 +279,20 @@ def save_spectrum_csv(
     :param spectrum_upper: array-like
                           Feldman-Cousins upper bounds on J(E) in spectrum space
     :param logger: RunLogger
-    :return global_path: tuple of str
-                         Path to global saved CSV file
-    :return run_path: tuple of str
-                      Path to run-specific saved CSV file
+    :return global_path: str
+                         Publish destination in the global data directory
+    :return run_path: str
+                      Path to the written run-specific CSV file
     """
-    # Global directory
+    # Global directory (publish destination)
     global_data_dir = os.path.join(global_output_dir, "data")
-    ensure_dir(global_data_dir)
 
     # Run-specific directory
     run_data_dir = os.path.join(run_output_dir, "data")
     ensure_dir(run_data_dir)
 
+    import pandas as pd
+
     # Construct DataFrame
     df = pd.DataFrame({
         "Energy": centers,
@@ -201,13 +307,260 @@ def save_spectrum_csv(
     global_path = os.path.join(global_data_dir, filename)
     run_path = os.path.join(run_data_dir, filename)
 
-    # Save to both locations
-    logger.log_text(f"Saving {filename} to {global_path}...")
-    logger.log_json(event=f"save_{filename}_global")
-    df.to_csv(global_path, index=False)
+    # Serialize once into the run directory
+    logger.log_text(f"Saving {filename} to {run_path}...")
+    logger.log_json(event=f"save_{filename}_run")
+    df.to_csv(run_path, index=False)
+
+    return global_path, run_path
+
+
+def save_energy_scale_band_csv(
+        global_output_dir: str,
+        run_output_dir: str,
+        array_type: str,
+        centers,
+        scales,
+        flux,
+        spectrum,
+        logger: RunLogger,
+):
+    """
+    Save the energy-scale systematic band to CSV.
+
+    The table is written once to run_output_dir/data/; the copy in
+    global_output_dir/data/ is created by publish_artifacts().
 
+    Final CSV columns:
+        Energy, J_min, J_max, Spectrum_min, Spectrum_max, J_<scale>..., Spectrum_<scale>...
+
+    Here:
+        Energy          = log10(E/eV) bin center
+        J_min/J_max     = envelope of J(E) over all scanned energy scales
+        Spectrum_min/max= envelope of E^3 J(E) over all scanned energy scales
+        J_<scale>       = J(E) for one energy-scale factor (e.g. J_1.100)
+
+    :param global_output_dir: str
+                              Path to global output directory (e.g., "output")
+    :param run_output_dir: str
+                           Path to run-specific output directory (e.g., "output/runs/<timestamp>")
+    :param array_type: str
+                       "TASD" or "CBSD". Used to tag filenames
+    :param centers: array-like
+                    log10(E/eV) bin centers
+    :param scales: array-like
+                   Energy-scale factors, one per row of flux/spectrum
+    :param flux: np.ndarray
+                 J(E) with shape (n_scales, n_bins)
+    :param spectrum: np.ndarray
+                     E³J(E) with shape (n_scales, n_bins)
+    :param logger: RunLogger
+    :return global_path: str
+                         Publish destination in the global data directory
+    :return run_path: str
+                      Path to the written run-specific CSV file
+    """
+    # Global directory (publish destination)
+    global_data_dir = os.path.join(global_output_dir, "data")
+
+    # Run-specific directory
+    run_data_dir = os.path.join(run_output_dir, "data")
+    ensure_dir(run_data_dir)
+
+    # Construct DataFrame: envelope first, then one column per scale
+    columns = {
+        "Energy": centers,
+        "J_min": flux.min(axis=0),
+        "J_max": flux.max(axis=0),
+        "Spectrum_min": spectrum.min(axis=0),
+        "Spectrum_max": spectrum.max(axis=0),
+    }
+    for k, scale in enumerate(scales):
+        columns[f"J_{scale:.3f}"] = flux[k]
+    for k, scale in enumerate(scales):
+        columns[f"Spectrum_{scale:.3f}"] = spectrum[k]
+
+    import pandas as pd
+
+    df = pd.DataFrame(columns)
+
+    # Array-tagged filename
+    filename = f"{array_type}_energy_scale_band.csv"
+
+    global_path = os.path.join(global_data_dir, filename)
+    run_path = os.path.join(run_data_dir, filename)
+
+    # Serialize once into the run directory
     logger.log_text(f"Saving {filename} to {run_path}...")
     logger.log_json(event=f"save_{filename}_run")
     df.to_csv(run_path, index=False)
 
-    return global_path, run_path
\ No newline at end of file
+    return global_path, run_path
+
+
+def save_zenith_flux_csv(
+        global_output_dir: str,
+        run_output_dir: str,
+        array_type: str,
+        centers,
+        widths,
+        zenith: dict,
+        logger: RunLogger,
+):
+    """
+    Save the energy × zenith flux table to CSV (one row per 2D bin).
+
+    The table is written once to run_output_dir/data/; the copy in
+    global_output_dir/data/ is created by publish_artifacts().
+
+    Final CSV columns:
+        Energy, Bin_size, <Axis>_low, <Axis>_high, N_events, Aperture, Exposure,
+        J, Lower, Upper, Spectrum, Spectrum_lower, Spectrum_upper
+
+    Here:
+        Energy          = log10(E/eV) bin center
+        Bin_size        = bin width in log10(E/eV)
+        <Axis>_low/high = zenith-axis bin edges (Cos_theta or Sec_theta)
+        Aperture        = aperture of the zenith bin [m^2 sr]
+        J               = flux J(E) estimated from that zenith bin alone
+
+    :param global_output_dir: str
+                              Path to global output directory (e.g., "output")
+    :param run_output_dir: str
+                           Path to run-specific output directory (e.g., "output/runs/<timestamp>")
+    :param array_type: str
+                       "TASD" or "CBSD". Used to tag filenames
+    :param centers: array-like
+                    Filtered log10(E/eV) bin centers (rows of the 2D arrays)
+    :param widths: array-like
+                   Filtered bin widths in log10(E/eV)
+    :param zenith: dict
+                   Output of the zenith_flux stage (arrays shaped (n_energy, n_zenith))
+    :param logger: RunLogger
+    :return global_path: str
+                         Publish destination in the global data directory
+    :return run_path: str
+                      Path to the written run-specific CSV file
+    """
+    # Global directory (publish destination)
+    global_data_dir = os.path.join(global_output_dir, "data")
+
+    # Run-specific directory
+    run_data_dir = os.path.join(run_output_dir, "data")
+    ensure_dir(run_data_dir)
+
+    import pandas as pd
+
+    # Long format: energy varies slowest, like the C-order 2D arrays
+    n_zenith = len(zenith["zenith_edges"]) - 1
+    axis = zenith["axis"].capitalize()
+    df = pd.DataFrame({
+        "Energy": np.repeat(centers, n_zenith),
+        "Bin_size": np.repeat(widths, n_zenith),
+        f"{axis}_low": np.tile(zenith["zenith_edges"][:-1], len(centers)),
+        f"{axis}_high": np.tile(zenith["zenith_edges"][1:], len(centers)),
+        "N_events": zenith["dt_counts_f"].ravel(),
+        "Aperture": zenith["aperture"].ravel(),
+        "Exposure": zenith["exposure"].ravel(),
+        "J": zenith["flux"].ravel(),
+        "Lower": zenith["flux_lower"].ravel(),
+        "Upper": zenith["flux_upper"].ravel(),
+        "Spectrum": zenith["spectrum"].ravel(),
+        "Spectrum_lower": zenith["spectrum_lower"].ravel(),
+        "Spectrum_upper": zenith["spectrum_upper"].ravel(),
+    })
+
+    # Array-tagged filename
+    filename = f"{array_type}_flux_2d.csv"
+
+    global_path = os.path.join(global_data_dir, filename)
+    run_path = os.path.join(run_data_dir, filename)
+
+    # Serialize once into the run directory
+    logger.log_text(f"Saving {filename} to {run_path}...")
+    logger.log_json(event=f"save_{filename}_run")
+    df.to_csv(run_path, index=False)
+
+    return global_path, run_path
+
+
+def save_productions_csv(
+        global_output_dir: str,
+        run_output_dir: str,
+        array_type: str,
+        centers,
+        aperture,
+        productions: dict,
+        logger: RunLogger,
+):
+    """
+    Save the per-production aperture diagnostics to CSV (one row per production and bin).
+
+    The table is written once to run_output_dir/data/; the copy in
+    global_output_dir/data/ is created by publish_artifacts().
+
+    Final CSV columns:
+        Production, Energy, N_MC_reco, N_MC_thrown, N_MC_reco_w, N_MC_thrown_w,
+        Aperture, Share, Combined_aperture
+
+    Here:
+        Energy            = log10(E/eV) bin center
+        N_MC_*_w          = spectrally weighted counts (equal to the raw ones without reweighting)
+        Aperture          = aperture of the production on its own [m^2 sr]
+        Share             = fraction of the thrown fluence (weight in the combination)
+        Combined_aperture = aperture of all productions combined [m^2 sr]
+
+    :param global_output_dir: str
+                              Path to global output directory (e.g., "output")
+    :param run_output_dir: str
+                           Path to run-specific output directory (e.g., "output/runs/<timestamp>")
+    :param array_type: str
+                       "TASD" or "CBSD". Used to tag filenames
+    :param centers: array-like
+                    Filtered log10(E/eV) bin centers
+    :param aperture: array-like
+                     Combined aperture per filtered bin [m^2 sr]
+    :param productions: dict
+                        production_apertures output of the aperture stage
+                        (arrays shaped (n_productions, n_bins))
+    :param logger: RunLogger
+    :return global_path: str
+                         Publish destination in the global data directory
+    :return run_path: str
+                      Path to the written run-specific CSV file
+    """
+    # Global directory (publish destination)
+    global_data_dir = os.path.join(global_output_dir, "data")
+
+    # Run-specific directory
+    run_data_dir = os.path.join(run_output_dir, "data")
+    ensure_dir(run_data_dir)
+
+    import pandas as pd
+
+    # Long format: production varies slowest, like the stacked arrays
+    n_productions = len(productions["names"])
+    df = pd.DataFrame({
+        "Production": np.repeat(productions["names"], len(centers)),
+        "Energy": np.tile(centers, n_productions),
+        "N_MC_reco": productions["mc_counts"].ravel(),
+        "N_MC_thrown": productions["mc_thrown_counts"].ravel(),
+        "N_MC_reco_w": productions["mc_counts_w"].ravel(),
+        "N_MC_thrown_w": productions["mc_thrown_counts_w"].ravel(),
+        "Aperture": productions["aperture"].ravel(),
+        "Share": productions["share"].ravel(),
+        "Combined_aperture": np.tile(aperture, n_productions),
+    })
+
+    # Array-tagged filename
+    filename = f"{array_type}_productions.csv"
+
+    global_path = os.path.join(global_data_dir, filename)
+    run_path = os.path.join(run_data_dir, filename)
+
+    # Serialize once into the run directory
+    logger.log_text(f"Saving {filename} to {run_path}...")
+    logger.log_json(event=f"save_{filename}_run")
+    df.to_csv(run_path, index=False)
+
+    return global_path, run_path
@@ -0,0 +1,383 @@
+"""
+Mergeable partial histograms: map-reduce ingestion across nodes.
+
+    # on each node: any subset of the MC/data shards
+    python -m cbspec partial --config cfg.yaml --mc /scratch/mc_00*.parquet --dt /scratch/dt_03.parquet \
+        --output node07.partial.arrow
+    # anywhere: sum the partials and run aperture → flux → spectrum
+    python -m cbspec merge node*.partial.arrow --config cfg.yaml
+
+A partial is a small, self-describing Arrow IPC file (results_store format)
+holding, on a fine log10(E/eV) grid of FINE_STEP bins over FINE_RANGE:
+
+    fine_edges                 grid edges
+    mc_counts, dt_counts       reconstructed MC/data events passing the cuts
+    mc_thrown_counts           thrown MC events (every MC row)
+    n_mc_reco, n_data, n_mc_thrown   totals (including events off the grid)
+    cutflow_mc, cutflow_dt     events left after each cut (process_data.cut_flow;
+                               first entry: all rows)
+    migration                  optional MC (thrown, reconstructed) counts of
+                               passing events on a MIGRATION_STEP grid
+
+and, in its metadata, the array type, quality cuts, grids and one
+fingerprint per input shard (path, size, mtime, host, rows, tree type).
+
+merge_partials sums partials that share array type, cuts and grids, and
+refuses mismatches and shards contributing twice. stage_outputs rebins the
+merged counts onto the configured energy bins (every bin edge must lie on
+the fine grid) and onto the plot histogram grid; run_pipeline(partial=...)
+seeds them as the bin_energy/event_histograms stages, so the downstream
+stages are the ones of a regular run -- and share its stage cache.
+
+Counts are exact: rebinning sums fine bins, and the grid edges are rounded
+to the nearest double of their decimal value, like the YAML bin edges. The
+energy-scale scan needs per-event energies and is not available from partials.
+"""
+
+import socket
+from dataclasses import asdict
+from pathlib import Path
+
+import numpy as np
+
+from .constants import hist_bins, hist_range
+from .data_classes import QualityCuts
+from .logging_utils import RunLogger, DEBUG
+from .provenance import file_fingerprint, stable_hash
+
+PARTIAL_FORMAT = "cbspec.partial"
+PARTIAL_VERSION = 1
+
+# Fine log10(E/eV) grid of the partial histograms
+FINE_STEP = 0.01
+FINE_RANGE = (16.0, 21.5)
+
+# Grid of the optional (thrown, reconstructed) migration matrix
+MIGRATION_STEP = 0.1
+
+COUNT_ARRAYS = ("mc_counts", "dt_counts", "mc_thrown_counts")
+TOTALS = ("n_mc_reco", "n_data", "n_mc_thrown")
+
+
+def make_grid(step, value_range=FINE_RANGE):
+    """
+    Edges from value_range[0] to value_range[1] in steps of `step`, rounded to
+    the decimal values (so 18.1 is the same double as in the YAML bins).
+    """
+    n = int(round((value_range[1] - value_range[0]) / step))
+    decimals = max(0, -int(np.floor(np.log10(step))))
+    return np.round(value_range[0] + step * np.arange(n + 1), decimals)
+
+
+def _cut_flow(variables, cuts):
+    from .process_data import cut_terms
+
+    flow = [len(variables["logen"])]
+    mask = None
+    for _, passed in cut_terms(variables, cuts):
+        mask = passed if mask is None else mask & passed
+        flow.append(int(mask.sum()))
+    return np.array(flow, dtype=np.int64), mask
+
+
+def _numpy_batch(batch, role, array_type, cuts, arrays, fine, coarse, migration):
+    # Reference path: per-event arrays via pandas, then np.histogram
+    from .cut_expressions import compile_cuts
+    from .process_data import extract_cut_variables
+
+    _, variables = extract_cut_variables(batch.to_pandas(), array_type, compile_cuts(cuts).columns)
+    flow, mask = _cut_flow(variables, cuts)
+    logen = variables["logen"][mask]
+    if role == "mc":
+        mclogen = variables["mclogen"]
+        arrays["mc_counts"] += np.histogram(logen, bins=fine)[0]
+        arrays["mc_thrown_counts"] += np.histogram(mclogen, bins=fine)[0]
+        arrays["n_mc_reco"] += len(logen)
+        arrays["n_mc_thrown"] += len(mclogen)
+        arrays["cutflow_mc"] += flow
+        if migration:
+            arrays["migration"] += np.histogram2d(
+                mclogen[mask], logen, bins=(coarse, coarse)
+            )[0].astype(np.int64)
+    else:
+        arrays["dt_counts"] += np.histogram(logen, bins=fine)[0]
+        arrays["n_data"] += len(logen)
+        arrays["cutflow_dt"] += flow
+    return len(logen)
+
+
+def _fused_batch(kernel, batch, role, arrays, grids, migration):
+    # One pass over the Arrow buffers (fused.py); counts are updated in place
+    if role == "mc":
+        accepted = kernel(batch, True, grids, arrays["mc_counts"], arrays["mc_thrown_counts"],
+                          arrays["cutflow_mc"], arrays["migration"] if migration else None)
+        arrays["n_mc_reco"] += accepted
+        arrays["n_mc_thrown"] += batch.num_rows
+    else:
+        accepted = kernel(batch, False, grids, arrays["dt_counts"], arrays["mc_thrown_counts"],
+                          arrays["cutflow_dt"])
+        arrays["n_data"] += accepted
+    return accepted
+
+
+def ingest_partial(mc_files, dt_files, array_type, cuts: QualityCuts, logger: RunLogger,
+                   migration=True, batch_size=160000, progress=None, jit=None):
+    """
+    Stream MC/data shards into fine-grid counts (no per-event arrays are kept).
+
+    :param mc_files: list of Path
+                     MC shards (may be empty)
+    :param dt_files: list of Path
+                     Data shards (may be empty)
+    :param array_type: str
+                       "TASD" or "CBSD"
+    :param cuts: QualityCuts
+    :param logger: RunLogger
+    :param migration: bool
+                      Also fill the MC migration matrix
+    :param batch_size: int
+                       Rows per parquet batch
+    :param progress: progress.Progress, optional
+    :param jit: bool, optional
+                Fused numba kernel (fused.py): None uses it when available and the
+                shards hold at least fused.JIT_MIN_ROWS rows, False always takes the
+                NumPy path, True requires it
+    :return partial: dict
+                     arrays (see module docstring) and "meta"
+    """
+    import pyarrow.parquet as pq
+
+    from .fused import energy_thresholds, fused_kernel, use_jit
+    from .process_data import cut_columns, cut_flow, detect_tree_type
+    from .skim import read_skim_metadata
+
+    fine = make_grid(FINE_STEP)
+    coarse = make_grid(MIGRATION_STEP)
+    grids = None  # energy thresholds of the fused kernel, computed on first use
+    n_fine = len(fine) - 1
+    arrays = {name: np.zeros(n_fine, dtype=np.int64) for name in COUNT_ARRAYS}
+    arrays.update({name: np.zeros((), dtype=np.int64) for name in TOTALS})
+    names = cut_flow(cuts)
+    arrays["cutflow_mc"] = np.zeros(len(names) + 1, dtype=np.int64)
+    arrays["cutflow_dt"] = np.zeros(len(names) + 1, dtype=np.int64)
+    if migration:
+        arrays["migration"] = np.zeros((len(coarse) - 1, len(coarse) - 1), dtype=np.int64)
+
+    host = socket.gethostname()
+    inputs = []
+    use_kernel, reason = use_jit(jit, sum(pq.ParquetFile(f).metadata.num_rows for f in [*mc_files, *dt_files]))
+    for role, files in (("mc", mc_files), ("dt", dt_files)):
+        for infile in files:
+            parquet_file = pq.ParquetFile(infile)
+            if read_skim_metadata(parquet_file) is not None:
+                raise ValueError(f"{infile} is a skim; partial ingestion needs the raw parquet dumps")
+            tree_type = detect_tree_type(parquet_file.schema_arrow.names)
+            columns = list(cut_columns(tree_type, cuts))
+            logger.log_text(f"Partial ingestion of {role} shard {infile} ({tree_type})...")
+            logger.log_json(event="partial_input", role=role, file=str(infile), tree_type=tree_type)
+
+            kernel = None
+            if use_kernel:
+                kernel, reason = fused_kernel(tree_type, array_type, cuts, parquet_file.schema_arrow)
+            if kernel is None and jit:
+                raise ValueError(f"Fused ingest kernel unavailable: {reason}")
+            if kernel is not None and grids is None:
+                grids = (*energy_thresholds(fine), *energy_thresholds(coarse))
+            logger.log_text(
+                f"Ingest kernel: {'fused (numba)' if kernel is not None else f'NumPy ({reason})'}", level=DEBUG
+            )
+
+            accepted = 0
+            with logger.span("partial_shard", role=role, file=str(infile)) as span:
+                for batch_idx, batch in enumerate(parquet_file.iter_batches(batch_size=batch_size, columns=columns)):
+                    if kernel is not None:
+                        n_accepted = _fused_batch(kernel, batch, role, arrays, grids, migration)
+                    else:
+                        n_accepted = _numpy_batch(batch, role, array_type, cuts, arrays, fine, coarse, migration)
+                    accepted += n_accepted
+                    span.add(rows=batch.num_rows, bytes=batch.nbytes)
+                    logger.log_text(f"Batch {batch_idx}: {n_accepted} of {batch.num_rows} events accepted", level=DEBUG)
+                    if progress is not None:
+                        progress.update(rows=batch.num_rows, accepted=n_accepted, nbytes=batch.nbytes)
+
+            rows = parquet_file.metadata.num_rows
+            logger.log_text(f"Total number of accepted events from {infile}: {accepted} of {rows}")
+            inputs.append({"role": role, **file_fingerprint(infile), "host": host, "rows": rows,
+                           "accepted": accepted, "tree_type": tree_type})
+
+    meta = {
+        "format": PARTIAL_FORMAT,
+        "version": PARTIAL_VERSION,
+        "array_type": array_type,
+        "quality_cuts": asdict(cuts),
+        "fine_step": FINE_STEP,
+        "fine_range": list(FINE_RANGE),
+        "migration_step": MIGRATION_STEP if migration else None,
+        "cut_flow": ["all", *names],
+        "inputs": inputs,
+    }
+    return {"fine_edges": fine, **arrays, "meta": meta}
+
+
+def compatibility_key(meta):
+    """
+    Settings two partials must share to be merged.
+    """
+    return {k: meta[k] for k in ("format", "version", "array_type", "quality_cuts", "fine_step", "fine_range")}
+
+
+def save_partial(path, partial, logger: RunLogger = None):
+    """
+    Write a partial (ingest_partial / merge_partials result) as Arrow IPC.
+    """
+    from .results_store import save_results
+
+    meta = partial["meta"]
+    return save_results(
+        path=path,
+        results={k: v for k, v in partial.items() if k != "meta"},
+        array_type=meta["array_type"],
+        config=meta,
+        config_digest=stable_hash(compatibility_key(meta)),
+        logger=logger,
+    )
+
+
+def load_partial(path):
+    """
+    Read a partial written by save_partial.
+
+    :return partial: dict
+    """
+    from .results_store import load_results
+
+    path = Path(path)
+    if not path.exists():
+        raise FileNotFoundError(f"File {path} does not exist")
+    arrays, metadata = load_results(path)
+    meta = metadata["config"]
+    if meta.get("format") != PARTIAL_FORMAT:
+        raise ValueError(f"{path} is not a cbspec partial file")
+    if meta.get("version") != PARTIAL_VERSION:
+        raise ValueError(f"{path}: unsupported partial version {meta.get('version')} (expected {PARTIAL_VERSION})")
+    return {**{k: np.array(v) for k, v in arrays.items()}, "meta": meta}
+
+
+def merge_partials(partials):
+    """
+    Sum compatible partials.
+
+    :param partials: list of dict
+                     load_partial / ingest_partial results
+    :return merged: dict
+                    Same layout; the migration matrix is kept only if every
+                    partial with MC events has one
+    """
+    if not partials:
+        raise ValueError("No partials to merge")
+
+    first = partials[0]
+    reference = compatibility_key(first["meta"])
+    seen = {}
+    for k, partial in enumerate(partials):
+        key = compatibility_key(partial["meta"])
+        mismatched = sorted(name for name in reference if key[name] != reference[name])
+        if mismatched or not np.array_equal(partial["fine_edges"], first["fine_edges"]):
+            raise ValueError(
+                f"Partial {k} is incompatible with partial 0: differs in {', '.join(mismatched) or 'fine_edges'}"
+            )
+        for info in partial["meta"]["inputs"]:
+            shard = (info["host"], info["path"], info["size"], info["mtime_ns"])
+            if shard in seen:
+                raise ValueError(f"Shard {info['path']} on {info['host']} is in partials {seen[shard]} and {k}")
+            seen[shard] = k
+
+    merged = {"fine_edges": first["fine_edges"]}
+    summed = COUNT_ARRAYS + TOTALS + ("cutflow_mc", "cutflow_dt")
+    for name in summed:
+        merged[name] = np.sum([p[name] for p in partials], axis=0).astype(np.int64)
+
+    # Migration needs every partial with MC events to carry one (data-only partials add nothing)
+    with_mc = [p for p in partials if int(p["n_mc_thrown"]) > 0]
+    steps = {p["meta"]["migration_step"] for p in with_mc}
+    with_migration = bool(with_mc) and all("migration" in p for p in with_mc) and len(steps) == 1
+    if with_migration:
+        merged["migration"] = np.sum([p["migration"] for p in with_mc], axis=0).astype(np.int64)
+
+    merged["meta"] = {
+        **first["meta"],
+        "migration_step": steps.pop() if with_migration else None,
+        "inputs": [info for p in partials for info in p["meta"]["inputs"]],
+    }
+    return merged
+
+
+def rebin(fine_counts, fine_edges, edges):
+    """
+    Sum fine-grid counts into coarser bins whose edges lie on the fine grid.
+
+    :raise ValueError: if an edge is not on the fine grid
+    """
+    edges = np.asarray(edges, dtype=float)
+    index = np.searchsorted(fine_edges, edges)
+    off_grid = (index >= len(fine_edges)) | ~np.isclose(
+        fine_edges[np.minimum(index, len(fine_edges) - 1)], edges, rtol=0., atol=1e-9
+    )
+    if np.any(off_grid):
+        raise ValueError(
+            f"Bin edges {edges[off_grid].tolist()} are not on the partial grid "
+            f"({fine_edges[0]}..{fine_edges[-1]} in steps of {fine_edges[1] - fine_edges[0]:.3g})"
+        )
+    cumulative = np.concatenate([[0], np.cumsum(fine_counts)])
+    return cumulative[index[1:]] - cumulative[index[:-1]]
+
+
+def stage_outputs(partial, edges):
+    """
+    bin_energy and event_histograms stage outputs of a (merged) partial.
+
+    :param edges: array-like
+                  Configured energy bin edges
+    :return outputs: dict
+                     {stage name: outputs}
+    """
+    fine = partial["fine_edges"]
+    hist_edges = np.linspace(hist_range[0], hist_range[1], hist_bins + 1)
+    return {
+        "bin_energy": {
+            "mc_counts": rebin(partial["mc_counts"], fine, edges),
+            "dt_counts": rebin(partial["dt_counts"], fine, edges),
+            "mc_thrown_counts": rebin(partial["mc_thrown_counts"], fine, edges),
+        },
+        "event_histograms": {
+            "hist_edges": hist_edges,
+            "mc_hist": rebin(partial["mc_counts"], fine, hist_edges),
+            "mc_thrown_hist": rebin(partial["mc_thrown_counts"], fine, hist_edges),
+            "dt_hist": rebin(partial["dt_counts"], fine, hist_edges),
+            "n_mc_reco": int(partial["n_mc_reco"]),
+            "n_data": int(partial["n_data"]),
+            "n_mc_thrown": int(partial["n_mc_thrown"]),
+        },
+    }
+
+
+def log_inputs(partial, logger: RunLogger):
+    """
+    Record the shards a (merged) partial was built from in run.log/run.jsonl.
+    """
+    inputs = partial["meta"]["inputs"]
+    for info in inputs:
+        logger.log_text(
+            f"Partial input: {info['role']} {info['host']}:{info['path']} "
+            f"({info['rows']} rows, {info['accepted']} accepted)"
+        )
+    logger.log_json(event="partial_inputs", inputs=inputs)
+
+    incremental = partial["meta"].get("incremental")
+    if incremental is not None:
+        logger.log_text(
+            f"Incremental state {incremental['state_dir']}: MC {incremental['mc']}, "
+            f"new shards {incremental['new'] or '-'}, changed {incremental['changed'] or '-'}, "
+            f"reused {len(incremental['reused'])}, removed {incremental['removed'] or '-'}"
+        )
+        logger.log_json(event="incremental_inputs", **incremental)
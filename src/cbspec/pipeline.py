@@ -0,0 +1,397 @@
+"""
+In-memory, incremental pipeline for interactive (notebook) use.
+
+    from cbspec import Pipeline
+
+    pipeline = Pipeline.from_config("config/default_config.yaml")
+    pipeline.spectrum                          # ingests, bins, ..., E³J(E)
+    pipeline.spectrum_cfg.run_time_s = 4.5e8
+    pipeline.flux                              # exposure → flux only
+    pipeline.bins = np.arange(18.0, 20.6, 0.1)
+    pipeline.aperture                          # rebins; parquet ingestion is kept
+
+A Pipeline holds the configuration dataclasses and the outputs of every stage
+it resolved. Nothing is computed until a result is accessed. Each access
+flattens the *current* configuration (stages.pipeline_settings) -- so in-place
+edits such as `pipeline.spectrum_cfg.run_time_s = ...` are picked up -- and
+resolves the requested stage through a StageRunner whose in-memory store keeps
+one (key, outputs, output hash) entry per stage. Stage keys are the cache keys
+of stages.py, so dependency tracking is the stage DAG's own: a stage whose
+params, input files or upstream output hashes changed is recomputed, every
+other stage is reused from memory, and a recomputed stage with identical
+outputs invalidates nothing downstream.
+
+With a StageCache (from_config(use_cache=True)), stages missing from memory
+are looked up in output/cache/stages before executing, and executed stages are
+stored there, exactly as in run_pipeline -- which is a thin wrapper around a
+Pipeline plus the run directory, artifacts and registry.
+
+Returned outputs are the stored objects, not copies: modify them in place and
+the pipeline's later results are modified too.
+"""
+
+import shutil
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+from .data_classes import QualityCuts, SpectrumConfig
+from .logging_utils import RunLogger
+from .provenance import file_fingerprints, stable_hash
+from .stages import STAGE_NAMES, STAGES, StageCache, StageRunner, pipeline_settings
+
+# Stages run_pipeline resolves: event arrays are consumed inside the stages only
+RESULT_STAGES = tuple(name for name in STAGE_NAMES if name != "parquet_ingest")
+
+
+def final_results(outputs):
+    """
+    The filtered arrays run_pipeline returns, from merged stage outputs.
+
+    :param outputs: dict
+                    Merged outputs of RESULT_STAGES (StageRunner.run)
+    :return results: dict
+    """
+    return {
+        "centers": outputs["centers_f"],
+        "widths": outputs["widths_f"],
+        "mc_counts": outputs["mc_counts_f"],
+        "dt_counts": outputs["dt_counts_f"],
+        "mc_thrown_counts": outputs["mc_thrown_counts_f"],
+        "aperture": outputs["aperture"],
+        "exposure": outputs["exposure"],
+        "flux": outputs["flux"],
+        "flux_lower": outputs["flux_lower"],
+        "flux_upper": outputs["flux_upper"],
+        "spectrum": outputs["spectrum"],
+        "spectrum_lower": outputs["spectrum_lower"],
+        "spectrum_upper": outputs["spectrum_upper"],
+        "energy_scale": outputs["scan"],
+        "zenith": outputs["zenith"],
+        "productions": outputs["production_apertures"],
+    }
+
+
+class Pipeline:
+    """
+    Configuration plus lazily computed, dependency-tracked stage outputs
+    (see module docstring).
+
+    :param array_cfg: ArrayConfig
+                      Array type and MC/data file paths (mc_file/dt_file set)
+    :param spectrum_cfg: SpectrumConfig
+    :param cuts_cfg: QualityCuts
+    :param energy_scale_cfg: EnergyScaleConfig, optional
+                             Energy-scale scan settings (no scan if None)
+    :param zenith_cfg: ZenithConfig, optional
+                       Energy × zenith binning (1D energy binning only if None)
+    :param productions_cfg: MCProductionsConfig, optional
+                            Several MC productions replacing array_cfg.mc_file
+                            (see productions.py)
+    :param fc_cl: float
+                  Feldman-Cousins confidence level
+    :param logger: RunLogger, optional
+                   Default: a logger writing to a new temporary directory,
+                   removed by close()
+    :param cache: StageCache, optional
+                  On-disk stage cache consulted for stages not held in memory
+    :param force: iterable of str
+                  Stages to recompute on first access even if cached ("all" for every stage)
+    :param profiler: profiling.StageProfiler, optional
+    :param options: dict
+                    Reporting / side-output settings of stages.pipeline_settings
+                    (progress, heartbeat_s, skim, skim_dir, checkpoint_s, checkpoint_dir,
+                    production_workers, jit)
+
+    Attributes array_cfg, spectrum_cfg, cuts_cfg, energy_scale_cfg, zenith_cfg,
+    productions_cfg and fc_cl may be replaced or edited in place at any time.
+    """
+
+    def __init__(self, array_cfg, spectrum_cfg: SpectrumConfig, cuts_cfg: QualityCuts, energy_scale_cfg=None,
+                 zenith_cfg=None, productions_cfg=None, fc_cl=0.68, logger: RunLogger = None,
+                 cache: StageCache = None, force=(), profiler=None, **options):
+        self.array_cfg = array_cfg
+        self.spectrum_cfg = spectrum_cfg
+        self.cuts_cfg = cuts_cfg
+        self.energy_scale_cfg = energy_scale_cfg
+        self.zenith_cfg = zenith_cfg
+        self.productions_cfg = productions_cfg
+        self.fc_cl = fc_cl
+        self.cache = cache
+        self.profiler = profiler
+        self.options = options
+        self._owns_logger = logger is None
+        # Temporary log directory of the default logger, removed by close()
+        self._temp_logs = None
+        if logger is None:
+            self._temp_logs = Path(tempfile.mkdtemp(prefix="cbspec-"))
+            logger = RunLogger(self._temp_logs)
+        self.logger = logger
+
+        self._memory = {}
+        self._seeds = {}
+        self._force = set(force or ())
+        self._runner = None
+        self._snapshot = None
+        self._settings()  # unknown options fail here, not on first access
+
+    @classmethod
+    def from_config(cls, path, array_type=None, use_cache=True, **kwargs):
+        """
+        Pipeline of a YAML configuration (input files, energy_scale, zenith and
+        mc_productions blocks included).
+
+        :param path: str or Path
+                     YAML configuration (see load_config.py)
+        :param array_type: str, optional
+                           Override array.array_type ("TASD" or "CBSD")
+        :param use_cache: bool
+                          Use the on-disk stage cache under output.cache_dir (default True)
+        :param kwargs: dict
+                       Further Pipeline arguments (fc_cl, logger, force, options, ...);
+                       without a logger, one writing to output.logs_dir/pipeline is
+                       created and closed by close()
+        :return pipeline: Pipeline
+        """
+        from .load_config import (load_config, load_energy_scale_config, load_mc_productions_config,
+                                  load_zenith_config)
+        from .main import select_input_files
+
+        array_cfg, spectrum_cfg, cuts_cfg, output_cfg, cfg = load_config(path)
+        if array_type is not None:
+            array_cfg.array_type = array_type
+        select_input_files(array_cfg, cfg)
+        kwargs.setdefault("energy_scale_cfg", load_energy_scale_config(cfg))
+        kwargs.setdefault("zenith_cfg", load_zenith_config(cfg))
+        kwargs.setdefault("productions_cfg", load_mc_productions_config(cfg, array_cfg.array_type))
+        kwargs.setdefault("production_workers", output_cfg.production_workers)
+        kwargs.setdefault("jit", output_cfg.jit)
+        kwargs.setdefault("cache", StageCache(output_cfg.cache_dir / "stages") if use_cache else None)
+        owns_logger = kwargs.get("logger") is None
+        if owns_logger:
+            kwargs["logger"] = RunLogger(Path(output_cfg.logs_dir) / "pipeline", level=output_cfg.log_level)
+        pipeline = cls(array_cfg, spectrum_cfg, cuts_cfg, **kwargs)
+        # Its logs stay in logs_dir/pipeline; close() only closes the logger
+        pipeline._owns_logger = owns_logger
+        return pipeline
+
+    # Dependency tracking
+    def _settings(self):
+        return pipeline_settings(
+            self.array_cfg,
+            self.spectrum_cfg,
+            self.cuts_cfg,
+            self.energy_scale_cfg,
+            fc_cl=self.fc_cl,
+            zenith=self.zenith_cfg,
+            mc_productions=self.productions_cfg,
+            **self.options,
+        )
+
+    def _current(self):
+        # Runner of the current configuration; a new one (sharing the in-memory
+        # store) whenever a stage param or input file changed since the last access
+        settings = self._settings()
+        params = {p for stage in STAGES for p in stage.params}
+        files = {f for stage in STAGES for f in stage.files}
+        snapshot = stable_hash({
+            "params": {p: settings[p] for p in sorted(params)},
+            "files": {f: file_fingerprints(settings[f]) for f in sorted(files)},
+        })
+        if self._runner is None or snapshot != self._snapshot:
+            self._runner = StageRunner(
+                settings=settings,
+                logger=self.logger,
+                cache=self.cache,
+                force=self._force,
+                profiler=self.profiler,
+                memory=self._memory,
+            )
+            self._force = set()  # forced once, then reused like any other stage
+            for name, (outputs, output_hash) in self._seeds.items():
+                self._runner.seed(name, outputs, output_hash)
+            self._snapshot = snapshot
+        return self._runner
+
+    def seed(self, name, outputs, output_hash):
+        """
+        Provide the outputs of a stage computed elsewhere (see StageRunner.seed).
+
+        Seeded outputs are kept until unseeded with invalidate(name).
+        """
+        if name not in STAGE_NAMES:
+            raise ValueError(f"Unknown stage {name!r}; valid stages: {', '.join(STAGE_NAMES)}")
+        self._seeds[name] = (outputs, output_hash)
+        self._runner = None
+
+    def invalidate(self, *names):
+        """
+        Drop stages (default: all) from memory and recompute them on next access,
+        even if the on-disk cache holds them.
+        """
+        names = names or STAGE_NAMES
+        unknown = set(names) - set(STAGE_NAMES)
+        if unknown:
+            raise ValueError(f"Unknown stage(s) {sorted(unknown)}; valid stages: {', '.join(STAGE_NAMES)}")
+        for name in names:
+            self._memory.pop(name, None)
+            self._seeds.pop(name, None)
+        self._force |= set(names)
+        self._runner = None
+
+    # Stage outputs
+    def stage(self, name):
+        """
+        Outputs of one stage under the current configuration.
+
+        :param name: str
+                     Stage name (stages.STAGE_NAMES)
+        :return outputs: dict
+        """
+        if name not in STAGE_NAMES:
+            raise ValueError(f"Unknown stage {name!r}; valid stages: {', '.join(STAGE_NAMES)}")
+        return self._current().outputs(name)
+
+    def run(self, names=RESULT_STAGES):
+        """
+        Resolve several stages and return their merged outputs.
+
+        :param names: iterable of str
+                      Stage names (default: RESULT_STAGES)
+        :return outputs: dict
+        """
+        return self._current().run(list(names))
+
+    def results(self):
+        """
+        The dict run_pipeline returns (without run_dir), see final_results.
+        """
+        return final_results(self.run())
+
+    @property
+    def status(self):
+        """
+        Stage → how it was resolved on the latest access
+        ("memory", "hit", "miss", "forced" or "shared").
+        """
+        return dict(self._runner.status) if self._runner is not None else {}
+
+    @property
+    def bins(self):
+        """
+        log10(E/eV) bin edges (spectrum_cfg.en_range); assigning rebins.
+        """
+        return self.spectrum_cfg.en_range
+
+    @bins.setter
+    def bins(self, edges):
+        edges = np.asarray(edges, dtype=float)
+        if edges.ndim != 1 or len(edges) < 2 or np.any(np.diff(edges) <= 0):
+            raise ValueError("bins must be at least two strictly increasing log10(E/eV) edges")
+        self.spectrum_cfg.en_range = edges
+
+    @property
+    def events(self):
+        """
+        Cut-passing log10(E/eV) arrays: mc_array, dt_array, mc_thrown_array.
+        """
+        return self.stage("parquet_ingest")
+
+    @property
+    def edges(self):
+        """
+        Energy bins: edges, centers, widths.
+        """
+        return self.stage("create_bins")
+
+    @property
+    def histograms(self):
+        """
+        Counts per energy bin: mc_counts, dt_counts, mc_thrown_counts.
+        """
+        return self.stage("bin_energy")
+
+    @property
+    def filtered(self):
+        """
+        Bin filter: mask plus the filtered counts, centers and widths.
+        """
+        return self.stage("filter_energy")
+
+    @property
+    def mask(self):
+        """
+        Energy bins kept by the bin filter.
+        """
+        return self.filtered["mask"]
+
+    @property
+    def aperture(self):
+        """
+        AΩ(E) per filtered bin, m² sr.
+        """
+        return self.stage("aperture")["aperture"]
+
+    @property
+    def exposure(self):
+        """
+        λ(E) per filtered bin, m² sr s.
+        """
+        return self.stage("exposure")["exposure"]
+
+    @property
+    def fc_intervals(self):
+        """
+        Feldman-Cousins intervals of the data counts: fc_lower, fc_upper.
+        """
+        return self.stage("feldman_cousins")
+
+    @property
+    def flux(self):
+        """
+        J(E): flux, flux_lower, flux_upper.
+        """
+        return self.stage("flux")
+
+    @property
+    def spectrum(self):
+        """
+        E³J(E): spectrum, spectrum_lower, spectrum_upper.
+        """
+        return self.stage("spectrum")
+
+    @property
+    def energy_scale(self):
+        """
+        Energy-scale scan (systematics.run_energy_scale_scan), None without energy_scale_cfg.
+        """
+        return self.stage("energy_scale_scan")["scan"]
+
+    @property
+    def zenith(self):
+        """
+        Energy × zenith aperture, exposure and flux, None without zenith_cfg.
+        """
+        return self.stage("zenith_flux")["zenith"]
+
+    def close(self):
+        """
+        Close the logger if the pipeline created it, and remove its temporary directory
+        (the default logger's only; logs under output.logs_dir are kept).
+        """
+        if self._owns_logger:
+            self.logger.close()
+        if self._temp_logs is not None:
+            shutil.rmtree(self._temp_logs, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def __repr__(self):
+        held = [name for name in STAGE_NAMES if name in self._memory]
+        return f"Pipeline({self.array_cfg.array_type}, {len(held)}/{len(STAGE_NAMES)} stages in memory)"
@@ -9,10 +9,21 @@ This module generates the following plots:
     - MC reconstructed histogram
     - MC thrown histogram
     - Data reconstructed histogram
+    - Aperture and flux ratio heatmaps vs. log10(E/eV) × zenith (optional)
+    - Aperture per MC production and combined (optional, MC productions)
 
-All plots are saved to BOTH:
-    - global_output_dir/plots/
-    - run_output_dir/plots/
+Figures are built with the object-oriented Figure API on the Agg canvas --
+no pyplot global state -- so independent figures can be rendered
+concurrently. render_plots() fans a list of plot jobs out over a process
+pool; each job renders one figure into run_output_dir/plots/.
+
+Histogram plots take PRE-BINNED counts (see the event_histograms stage) and
+draw them with Axes.stairs, so the per-event MC arrays never reach matplotlib.
+
+Each plot is rendered and encoded ONCE into run_output_dir/plots/. The global
+copy in global_output_dir/plots/ is published afterwards as a hardlink (see
+output_utils.publish_artifacts), so render_plots returns the
+(global_path, run_path) pairs.
 
 Filenames are automatically array-tagged:
     - TASD_flux.png
@@ -22,53 +33,46 @@ Filenames are automatically array-tagged:
 
 
 import os
-import matplotlib.pyplot as plt
+import time
+from concurrent.futures import ProcessPoolExecutor
+
 import numpy as np
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 
 from .output_utils import ensure_dir
 from .constants import m2_to_km2, s_to_yr
 from .logging_utils import RunLogger
 
 
-def save_plot(global_output_dir, run_output_dir, filename, logger: RunLogger):
+def _new_axes():
     """
-    Saves plots to both global and run-specific output directories.
-    :param global_output_dir:
-    :param run_output_dir:
-    :param filename:
-    :param logger: RunLogger
-    :return:
+    Create a standalone 8×6 Agg figure with one axes.
+    :return: (Figure, Axes)
     """
-    global_plot_dir = os.path.join(global_output_dir, "plots")
-    run_plot_dir = os.path.join(run_output_dir, "plots")
-    ensure_dir(global_plot_dir)
-    ensure_dir(run_plot_dir)
-
-    logger.log_text(f"Saving {filename} to {global_plot_dir}...")
-    logger.log_json(event=f"save_{filename}_global")
-    plt.savefig(os.path.join(global_plot_dir, filename))
+    fig = Figure(figsize=[8, 6])
+    FigureCanvasAgg(fig)
+    return fig, fig.add_subplot()
 
-    logger.log_text(f"Saving {filename} to {run_plot_dir}...")
-    logger.log_json(event=f"save_{filename}_run")
-    plt.savefig(os.path.join(run_plot_dir, filename))
 
-def plot_scatter_log_energy(centers, y_comp):
+def plot_scatter_log_energy(ax, centers, y_comp):
     """
     Basic structure of scatter plots vs. log10(E/eV).
+    :param ax: matplotlib Axes
     :param centers:
     :param y_comp:
     :return:
     """
-    plt.figure(figsize=[8, 6])
-    plt.scatter(centers, y_comp)
-    plt.yscale("log")
-    plt.xlim(17.8, 20.5)
-    plt.xlabel(r"$\log_{10}(E/eV)$")
+    ax.scatter(centers, y_comp)
+    ax.set_yscale("log")
+    ax.set_xlim(17.8, 20.5)
+    ax.set_xlabel(r"$\log_{10}(E/eV)$")
 
 
-def plot_error_bars_log_energy(centers, y_comp, lower, upper):
+def plot_error_bars_log_energy(ax, centers, y_comp, lower, upper):
     """
     Basic structure of plots needing error bars vs. log10(E/eV).
+    :param ax: matplotlib Axes
     :param centers:
     :param y_comp:
     :param lower:
@@ -77,8 +81,7 @@ def plot_error_bars_log_energy(centers, y_comp, lower, upper):
     """
     yerr = [y_comp - np.asarray(lower), np.asarray(upper) - y_comp]
 
-    plt.figure(figsize=[8, 6])
-    plt.errorbar(
+    ax.errorbar(
         centers,
         y_comp,
         yerr=yerr,
@@ -89,205 +92,292 @@ def plot_error_bars_log_energy(centers, y_comp, lower, upper):
         ecolor="k",
         linewidth=1,
     )
-    plt.yscale("log")
-    plt.xlim(17.8, 20.5)
-    plt.xlabel(r"$\log_{10}(E/eV)$")
+    ax.set_yscale("log")
+    ax.set_xlim(17.8, 20.5)
+    ax.set_xlabel(r"$\log_{10}(E/eV)$")
 
 
-def plot_histogram(data):
+def plot_histogram(ax, counts, edges):
     """
-    Plot histogram of data.
-    :param data:
+    Plot a pre-binned histogram.
+    :param ax: matplotlib Axes
+    :param counts: Counts per bin
+    :param edges: Bin edges in log10(E/eV)
     :return:
     """
-    plt.figure(figsize=[8, 6])
-    plt.hist(data, range=(18, 21), bins=30)
-    plt.yscale("log")
-    plt.xlabel(r"$\log_{10}(E/eV)$")
+    ax.stairs(counts, edges, fill=True)
+    ax.set_yscale("log")
+    ax.set_xlabel(r"$\log_{10}(E/eV)$")
 
 
-def plot_aperture(centers, aperture, array_type, global_output_dir, run_output_dir, logger: RunLogger):
+# Renderers: build one figure and write it to `path` (run in pool workers)
+def render_aperture(path, centers, aperture, array_type):
     """
     Plot aperture vs. log10(E/eV).
-    :param centers:
-    :param aperture:
-    :param array_type:
-    :param global_output_dir:
-    :param run_output_dir:
-    :param logger: RunLogger
-    :return:
     """
-    filename = f"{array_type}_aperture.png"
-
     # Convert aperture from [m^2 sr] to [km^2 sr]
     aperture = np.asarray(aperture, dtype=float) * m2_to_km2
 
-    # Basic structure
-    plot_scatter_log_energy(centers, aperture)
+    fig, ax = _new_axes()
+    plot_scatter_log_energy(ax, centers, aperture)
 
     # Aperture specific parameters
-    plt.ylim(5, 5 * 10**3)
-    plt.title(f"{array_type} Main Aperture")
-    plt.ylabel(r"Aperture [km$^{2}$ sr]")
-
-    save_plot(global_output_dir, run_output_dir, filename, logger)
+    ax.set_ylim(5, 5 * 10**3)
+    ax.set_title(f"{array_type} Main Aperture")
+    ax.set_ylabel(r"Aperture [km$^{2}$ sr]")
+    fig.savefig(path)
 
-    plt.close()
 
-
-def plot_exposure(centers, exposure, array_type, global_output_dir, run_output_dir, logger: RunLogger):
+def render_exposure(path, centers, exposure, array_type):
     """
     Plot exposure vs. log10(E/eV).
-    :param centers:
-    :param exposure:
-    :param array_type:
-    :param global_output_dir:
-    :param run_output_dir:
-    :param logger: RunLogger
-    :return:
     """
-    filename = f"{array_type}_exposure.png"
-
     # Convert exposure from [m^2 sr s] to [km^2 sr yr]
     exposure = np.asarray(exposure, dtype=float) * m2_to_km2 * s_to_yr
 
-    plot_scatter_log_energy(centers, exposure)
+    fig, ax = _new_axes()
+    plot_scatter_log_energy(ax, centers, exposure)
 
     # Exposure specific parameters
-    plt.ylim(1, 2 * 10**4)
-    plt.title(f"{array_type} Main Exposure")
-    plt.ylabel(r"Exposure [km$^{2}$ sr yr]")
-
-    save_plot(global_output_dir, run_output_dir, filename, logger)
-
-    plt.close()
+    ax.set_ylim(1, 2 * 10**4)
+    ax.set_title(f"{array_type} Main Exposure")
+    ax.set_ylabel(r"Exposure [km$^{2}$ sr yr]")
+    fig.savefig(path)
 
 
-def plot_flux(centers, flux, flux_lower, flux_upper, array_type, global_output_dir, run_output_dir, logger: RunLogger):
+def render_flux(path, centers, flux, flux_lower, flux_upper, array_type):
     """
     Plot flux vs. log10(E/eV).
-    :param centers:
-    :param flux:
-    :param flux_lower:
-    :param flux_upper:
-    :param array_type:
-    :param global_output_dir:
-    :param run_output_dir:
-    :param logger: RunLogger
-    :return:
     """
-    filename = f"{array_type}_flux.png"
-
     # Convert flux and error bars to 10**30 scale
     flux = np.asarray(flux, dtype=float) * 10**30
     flux_lower = np.asarray(flux_lower, dtype=float) * 10**30
     flux_upper = np.asarray(flux_upper, dtype=float) * 10**30
 
-    plot_error_bars_log_energy(centers, flux, flux_lower, flux_upper)
+    fig, ax = _new_axes()
+    plot_error_bars_log_energy(ax, centers, flux, flux_lower, flux_upper)
 
     # Flux specific parameters
-    plt.ylim(10 ** (-7), 2)
-    plt.title(f"{array_type} Main Flux")
-    plt.ylabel(r"J × 10$^{30}$ [eV$^{-1}$ m$^{-2}$ sr$^{-1}$ s$^{-1}$]")
+    ax.set_ylim(10 ** (-7), 2)
+    ax.set_title(f"{array_type} Main Flux")
+    ax.set_ylabel(r"J × 10$^{30}$ [eV$^{-1}$ m$^{-2}$ sr$^{-1}$ s$^{-1}$]")
+    fig.savefig(path)
 
-    save_plot(global_output_dir, run_output_dir, filename, logger)
 
-    plt.close()
-
-
-def plot_spectrum(centers, spectrum, spectrum_lower, spectrum_upper, array_type, global_output_dir, run_output_dir, logger: RunLogger):
+def render_spectrum(path, centers, spectrum, spectrum_lower, spectrum_upper, array_type):
     """
     Plot spectrum vs. log10(E/eV).
-    :param centers:
-    :param spectrum:
-    :param spectrum_lower:
-    :param spectrum_upper:
-    :param array_type:
-    :param global_output_dir:
-    :param run_output_dir:
-    :param logger: RunLogger
-    :return:
     """
-    filename = f"{array_type}_spectrum.png"
-
     # Convert spectrum and error bars to 10**-24 scale
     spectrum = np.asarray(spectrum, dtype=float) / 10**24
     spectrum_lower = np.asarray(spectrum_lower, dtype=float) / 10**24
     spectrum_upper = np.asarray(spectrum_upper, dtype=float) / 10**24
 
-    plot_error_bars_log_energy(centers, spectrum, spectrum_lower, spectrum_upper)
+    fig, ax = _new_axes()
+    plot_error_bars_log_energy(ax, centers, spectrum, spectrum_lower, spectrum_upper)
 
     # Spectrum specific parameters
-    plt.ylim(4 * 10 ** (-1), 4)
-    plt.title(f"{array_type} Main Spectrum")
-    plt.ylabel(r"E$^{3}$ J / 10$^{24}$ [eV$^{2}$ m$^{-2}$ sr$^{-1}$ s$^{-1}$]")
+    ax.set_ylim(4 * 10 ** (-1), 4)
+    ax.set_title(f"{array_type} Main Spectrum")
+    ax.set_ylabel(r"E$^{3}$ J / 10$^{24}$ [eV$^{2}$ m$^{-2}$ sr$^{-1}$ s$^{-1}$]")
+    fig.savefig(path)
 
-    save_plot(global_output_dir, run_output_dir, filename, logger)
 
-    plt.close()
+def render_histogram(path, counts, edges, title, ylabel):
+    """
+    Plot a pre-binned MC/data energy histogram.
+    """
+    fig, ax = _new_axes()
+    plot_histogram(ax, counts, edges)
+    ax.set_title(title)
+    ax.set_ylabel(ylabel)
+    fig.savefig(path)
 
 
-def mc_recon_hist(mc_array, array_type, global_output_dir, run_output_dir, logger: RunLogger):
+def render_heatmap(path, edges, zenith_edges, values, axis, title, label, log=False):
     """
-    Histogram of MC reconstructed energies.
-    :param mc_array:
-    :param array_type:
-    :param global_output_dir:
-    :param run_output_dir:
-    :param logger: RunLogger
-    :return:
+    Plot a log10(E/eV) × zenith heatmap (NaN bins left blank).
     """
-    filename = f"{array_type}_MC_recon_hist.png"
+    from matplotlib.colors import LogNorm
 
-    plot_histogram(mc_array)
+    values = np.ma.masked_invalid(np.asarray(values, dtype=float))
+    if log:
+        values = np.ma.masked_less_equal(values, 0.)
 
-    plt.title(f"{array_type} MC Reconstructed Energies Histogram")
-    plt.ylabel("N$^{MC}_{REC}$")
+    fig, ax = _new_axes()
+    mesh = ax.pcolormesh(edges, zenith_edges, values.T, norm=LogNorm() if log else None, shading="flat")
+    fig.colorbar(mesh, ax=ax, label=label)
+    ax.set_xlabel(r"$\log_{10}(E/eV)$")
+    ax.set_ylabel(r"$\cos\theta$" if axis == "cos_theta" else r"$\sec\theta$")
+    ax.set_title(title)
+    fig.savefig(path)
 
-    save_plot(global_output_dir, run_output_dir, filename, logger)
 
-    plt.close()
+def render_productions_aperture(path, centers, aperture, production_apertures, names, array_type):
+    """
+    Plot the aperture of every MC production and their combination vs. log10(E/eV).
+    """
+    fig, ax = _new_axes()
+    for name, values in zip(names, np.asarray(production_apertures, dtype=float) * m2_to_km2):
+        shown = values > 0
+        ax.plot(centers[shown], values[shown], marker="o", linestyle="", alpha=0.6, label=name)
+    ax.scatter(centers, np.asarray(aperture, dtype=float) * m2_to_km2, color="black", label="combined", zorder=3)
+    ax.set_yscale("log")
+    ax.set_xlim(17.8, 20.5)
+    ax.set_xlabel(r"$\log_{10}(E/eV)$")
+    ax.set_ylim(5, 5 * 10**3)
+    ax.set_title(f"{array_type} Aperture per MC Production")
+    ax.set_ylabel(r"Aperture [km$^{2}$ sr]")
+    ax.legend()
+    fig.savefig(path)
+
+
+def _render_job(job):
+    """
+    Pool worker: render one plot job.
+    :param job: (render_func, run_path, kwargs)
+    :return: (run_path, seconds)
+    """
+    render_func, run_path, kwargs = job
+    t0 = time.perf_counter()
+    render_func(run_path, **kwargs)
+    return run_path, time.perf_counter() - t0
 
 
-def mc_thrown_hist(mc_thrown_array, array_type, global_output_dir, run_output_dir, logger: RunLogger):
+def make_plot_jobs(
+        array_type,
+        centers,
+        aperture,
+        exposure,
+        flux,
+        flux_lower,
+        flux_upper,
+        spectrum,
+        spectrum_lower,
+        spectrum_upper,
+        hist_edges,
+        mc_hist,
+        mc_thrown_hist,
+        dt_hist,
+):
     """
-    Histogram of MC thrown energies.
-    :param mc_thrown_array:
-    :param array_type:
-    :param global_output_dir:
-    :param run_output_dir:
-    :param logger: RunLogger
-    :return:
+    Build the standard list of plot jobs for one run.
+
+    :param array_type: "TASD" or "CBSD". Used to tag filenames and titles
+    :param centers: Filtered log10(E/eV) bin centers
+    :param hist_edges: Edges of the pre-binned event histograms
+    :param mc_hist: Pre-binned MC reconstructed counts
+    :param mc_thrown_hist: Pre-binned MC thrown counts
+    :param dt_hist: Pre-binned data reconstructed counts
+    :return jobs: list of (filename, render_func, kwargs)
     """
-    filename = f"{array_type}_MC_thrown_hist.png"
-
-    plot_histogram(mc_thrown_array)
+    return [
+        (f"{array_type}_aperture.png", render_aperture,
+         dict(centers=centers, aperture=aperture, array_type=array_type)),
+        (f"{array_type}_exposure.png", render_exposure,
+         dict(centers=centers, exposure=exposure, array_type=array_type)),
+        (f"{array_type}_flux.png", render_flux,
+         dict(centers=centers, flux=flux, flux_lower=flux_lower, flux_upper=flux_upper,
+              array_type=array_type)),
+        (f"{array_type}_spectrum.png", render_spectrum,
+         dict(centers=centers, spectrum=spectrum, spectrum_lower=spectrum_lower,
+              spectrum_upper=spectrum_upper, array_type=array_type)),
+        (f"{array_type}_MC_recon_hist.png", render_histogram,
+         dict(counts=mc_hist, edges=hist_edges,
+              title=f"{array_type} MC Reconstructed Energies Histogram", ylabel="N$^{MC}_{REC}$")),
+        (f"{array_type}_MC_thrown_hist.png", render_histogram,
+         dict(counts=mc_thrown_hist, edges=hist_edges,
+              title=f"{array_type} MC Thrown Energies Histogram", ylabel="N$^{MC}_{GEN}$")),
+        (f"{array_type}_DATA_recon_hist.png", render_histogram,
+         dict(counts=dt_hist, edges=hist_edges,
+              title=f"{array_type} Data Reconstructed Energies Histogram", ylabel="N$^{DATA}_{REC}$")),
+    ]
+
+
+def make_zenith_plot_jobs(array_type, edges, mask, flux, zenith):
+    """
+    Plot jobs of the energy × zenith binning (zenith_flux stage outputs).
 
-    plt.title(f"{array_type} MC Thrown Energies Histogram")
-    plt.ylabel("N$^{MC}_{GEN}$")
+    Heatmaps span all energy bins; bins removed by filter_bins stay blank.
 
-    save_plot(global_output_dir, run_output_dir, filename, logger)
+    :param array_type: "TASD" or "CBSD". Used to tag filenames and titles
+    :param edges: Unfiltered log10(E/eV) bin edges
+    :param mask: Energy-bin mask of filter_bins
+    :param flux: 1D flux J(E) of the filtered bins
+    :param zenith: dict, output of the zenith_flux stage
+    :return jobs: list of (filename, render_func, kwargs)
+    """
+    def full_grid(values):
+        grid = np.full((len(mask), values.shape[1]), np.nan)
+        grid[mask] = values
+        return grid
+
+    aperture = full_grid(zenith["aperture"] * m2_to_km2)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratio = full_grid(np.where(np.asarray(flux)[:, None] > 0, zenith["flux"] / np.asarray(flux)[:, None], np.nan))
+    axis_kwargs = dict(edges=edges, zenith_edges=zenith["zenith_edges"], axis=zenith["axis"])
+    return [
+        (f"{array_type}_aperture_2d.png", render_heatmap,
+         dict(values=aperture, title=f"{array_type} Aperture per Zenith Bin",
+              label=r"Aperture [km$^{2}$ sr]", log=True, **axis_kwargs)),
+        (f"{array_type}_flux_ratio_2d.png", render_heatmap,
+         dict(values=ratio, title=f"{array_type} Flux per Zenith Bin / Flux",
+              label=r"J$_{\theta}$(E) / J(E)", **axis_kwargs)),
+    ]
+
+
+def make_productions_plot_jobs(array_type, centers, aperture, productions):
+    """
+    Plot jobs of the MC-production diagnostics (aperture stage outputs).
 
-    plt.close()
+    :param array_type: "TASD" or "CBSD". Used to tag filenames and titles
+    :param centers: Filtered log10(E/eV) bin centers
+    :param aperture: Combined aperture of the filtered bins
+    :param productions: dict, production_apertures output of the aperture stage
+    :return jobs: list of (filename, render_func, kwargs)
+    """
+    return [
+        (f"{array_type}_aperture_productions.png", render_productions_aperture,
+         dict(centers=np.asarray(centers, dtype=float), aperture=aperture,
+              production_apertures=productions["aperture"], names=productions["names"], array_type=array_type)),
+    ]
 
 
-def dt_hist(dt_array, array_type, global_output_dir, run_output_dir, logger: RunLogger):
+def render_plots(jobs, global_output_dir, run_output_dir, logger: RunLogger, max_workers=None):
     """
-    Histogram of MC thrown energies.
-    :param dt_array:
-    :param array_type:
-    :param global_output_dir:
-    :param run_output_dir:
+    Render plot jobs concurrently into run_output_dir/plots/.
+
+    :param jobs: list of (filename, render_func, kwargs)
+                 See make_plot_jobs
+    :param global_output_dir: Global output directory (publish destination)
+    :param run_output_dir: Run-specific output directory
     :param logger: RunLogger
-    :return:
+    :param max_workers: int, optional
+                        Process-pool size. None → one worker per job (capped at
+                        the CPU count); 0 or 1 → render serially in this process.
+    :return: list of (global_path, run_path) pairs for output_utils.publish_artifacts
     """
-    filename = f"{array_type}_DATA_recon_hist.png"
-
-    plot_histogram(dt_array)
-
-    plt.title(f"{array_type} Data Reconstructed Energies Histogram")
-    plt.ylabel("N$^{DATA}_{REC}$")
-
-    save_plot(global_output_dir, run_output_dir, filename, logger)
+    global_plot_dir = os.path.join(global_output_dir, "plots")
+    run_plot_dir = os.path.join(run_output_dir, "plots")
+    ensure_dir(run_plot_dir)
 
-    plt.close()
\ No newline at end of file
+    work = [
+        (render_func, os.path.join(run_plot_dir, filename), kwargs)
+        for filename, render_func, kwargs in jobs
+    ]
+
+    if max_workers is None:
+        max_workers = min(len(work), os.cpu_count() or 1)
+
+    if max_workers <= 1:
+        done = [_render_job(job) for job in work]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            done = list(pool.map(_render_job, work))
+
+    paths = []
+    for (filename, _, _), (run_path, seconds) in zip(jobs, done):
+        logger.log_text(f"Saving {filename} to {run_plot_dir}...")
+        logger.log_json(event=f"save_{filename}_run", seconds=round(seconds, 4))
+        paths.append((os.path.join(global_plot_dir, filename), run_path))
+    return paths
@@ -0,0 +1,335 @@
+"""
+Metadata-only preflight check of a configuration and its parquet inputs.
+
+    python -m cbspec check --config config/default_config.yaml
+    python -m cbspec check --config a.yaml --config b.yaml --array_type CBSD
+
+Runs before the ingestion pass of every pipeline run and sweep (and on its
+own as `cbspec check`), reading only parquet footers, schemas and a small
+sample of rows -- it finishes in well under a second. It verifies:
+
+    - both input files (or every MC production and the data file) exist
+      and are readable parquet files
+    - the tree type (resTree / tTlfit) is detected and every column of
+      process_data.TREE_SCHEMAS is present with a numeric (list) type
+    - list columns hold at least as many elements as the branch index
+      needs (checked on the first SAMPLE_ROWS rows; footers do not record
+      list lengths)
+    - skim inputs (skim.py): the role and quality cuts they were made with
+      match, logen is present and an MC skim has its thrown companion file
+    - energy bin edges: at least two, finite, strictly increasing
+    - quality cuts, geometry, run time and energy scales: numeric and finite
+      (positive where required); cut expressions parse, and every name they
+      use is a cut variable, threshold or column of the inputs
+
+and estimates rows, bytes and memory of the ingestion pass:
+
+    - rows / compressed / uncompressed bytes from the footers
+    - event arrays: 8 bytes per MC event twice (reconstructed + thrown) plus
+      8 bytes per data event (upper bound, before cuts)
+    - one in-flight batch: INGEST_BATCH_ROWS rows at the uncompressed
+      bytes/row, times PANDAS_OVERHEAD for the pandas conversion
+
+Problems that make ingestion fail are errors; suspicious but runnable
+settings (e.g. no bin above the 10^18.5 eV filter) are warnings.
+"""
+
+import math
+from pathlib import Path
+
+import numpy as np
+
+from .cut_expressions import compile_cuts, thresholds
+from .data_classes import QualityCuts
+
+# Rows read per file to check list element counts
+SAMPLE_ROWS = 1000
+
+# Batch size of process_data.set_up_energy_array
+INGEST_BATCH_ROWS = 160000
+
+# In-memory size of a pandas batch relative to its Arrow size (list columns
+# become Python lists of floats)
+PANDAS_OVERHEAD = 4.
+
+# filter_bins keeps bins above this log10(E/eV)
+MIN_FILTERED_ENERGY = 18.5
+
+
+def _numeric(arrow_type):
+    import pyarrow as pa
+
+    return pa.types.is_integer(arrow_type) or pa.types.is_floating(arrow_type)
+
+
+def inspect_parquet(path, role, array_type=None, cuts=None):
+    """
+    Footer/schema inspection of one input file.
+
+    :param path: str or Path
+    :param role: str
+                 "mc" or "dt"
+    :param array_type: str, optional
+                       Only used in messages
+    :param cuts: QualityCuts, optional
+                 Configured cuts; a skim input made with other cuts is an error
+    :return info: dict
+                  path, role, tree_type, rows, row_groups, bytes (file size),
+                  uncompressed_bytes, skim (bool), errors (list of str)
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+
+    from .process_data import TREE_SCHEMAS, detect_tree_type
+    from .skim import read_skim_metadata
+
+    path = Path(path)
+    label = f"{array_type + ' ' if array_type else ''}{role} file {path}"
+    info = {"path": str(path), "role": role, "tree_type": None, "rows": None, "row_groups": None,
+            "bytes": None, "uncompressed_bytes": None, "skim": False, "errors": []}
+
+    if not path.exists():
+        info["errors"].append(f"{label} does not exist")
+        return info
+    try:
+        parquet_file = pq.ParquetFile(path)
+    except (OSError, pa.ArrowException) as exc:
+        info["errors"].append(f"{label} is not a readable parquet file: {exc}")
+        return info
+
+    meta = parquet_file.metadata
+    info["rows"] = meta.num_rows
+    info["row_groups"] = meta.num_row_groups
+    info["bytes"] = path.stat().st_size
+    info["uncompressed_bytes"] = sum(meta.row_group(i).total_byte_size for i in range(meta.num_row_groups))
+
+    schema = parquet_file.schema_arrow
+    skim_meta = read_skim_metadata(parquet_file)
+    if skim_meta is not None:
+        _inspect_skim(path, role, label, skim_meta, schema, cuts, info)
+        return info
+    try:
+        tree_type = detect_tree_type(schema.names)
+    except ValueError:
+        info["errors"].append(
+            f"{label}: unknown tree type (neither 'energy' (resTree) nor 'energy_s800_p' (tTlfit) column)"
+        )
+        return info
+    info["tree_type"] = tree_type
+
+    if cuts is not None:
+        try:
+            extra = compile_cuts(cuts).columns
+        except (TypeError, ValueError):
+            extra = ()  # reported by check_settings
+        for column in extra:
+            if column not in schema.names:
+                info["errors"].append(
+                    f"{label}: quality cuts use {column!r}, which is neither a cut variable, "
+                    f"a threshold nor a column"
+                )
+
+    list_columns = {}
+    for column, min_length in TREE_SCHEMAS[tree_type].items():
+        if column not in schema.names:
+            info["errors"].append(f"{label}: {tree_type} column '{column}' is missing")
+            continue
+        arrow_type = schema.field(column).type
+        if min_length is None:
+            if not _numeric(arrow_type):
+                info["errors"].append(f"{label}: column '{column}' must be numeric, found {arrow_type}")
+        elif not (pa.types.is_list(arrow_type) or pa.types.is_large_list(arrow_type)) \
+                or not _numeric(arrow_type.value_type):
+            info["errors"].append(f"{label}: column '{column}' must be a list of numbers, found {arrow_type}")
+        else:
+            list_columns[column] = min_length
+
+    if list_columns and meta.num_rows:
+        batch = next(parquet_file.iter_batches(batch_size=SAMPLE_ROWS, columns=list(list_columns)))
+        for column, min_length in list_columns.items():
+            lengths = pc.list_value_length(batch.column(column))
+            shortest = pc.min(lengths).as_py()
+            if shortest is not None and shortest < min_length:
+                info["errors"].append(
+                    f"{label}: column '{column}' has lists with {shortest} element(s); "
+                    f"{tree_type} needs at least {min_length}"
+                )
+    return info
+
+
+def _inspect_skim(path, role, label, skim_meta, schema, cuts, info):
+    # Skims (skim.py): cuts already applied, energies in the logen column
+    from .skim import check_cuts, thrown_path
+
+    info["skim"] = True
+    info["tree_type"] = skim_meta["tree_type"]
+    if skim_meta["role"] != role:
+        info["errors"].append(f"{label} is a {skim_meta['role']} skim, not a {role} file")
+    if "logen" not in schema.names:
+        info["errors"].append(f"{label}: skim has no 'logen' column")
+    if cuts is not None:
+        problem = check_cuts(skim_meta, cuts)
+        if problem is not None:
+            info["errors"].append(f"{label}: {problem}")
+    if skim_meta["role"] == "mc" and not thrown_path(path, skim_meta).exists():
+        info["errors"].append(f"{label}: thrown MC energies {thrown_path(path, skim_meta)} are missing")
+
+
+def _check_number(errors, name, value, positive=False):
+    if isinstance(value, bool) or not isinstance(value, (int, float, np.integer, np.floating)):
+        errors.append(f"{name} must be a number, got {value!r} ({type(value).__name__})")
+    elif not math.isfinite(value):
+        errors.append(f"{name} must be finite, got {value}")
+    elif positive and value <= 0:
+        errors.append(f"{name} must be positive, got {value}")
+
+
+def check_settings(spectrum_cfg, cuts_cfg: QualityCuts, energy_scale_cfg=None):
+    """
+    Validate bin edges, cut values, geometry, run time and energy scales.
+
+    :return errors: list of str
+    :return warnings: list of str
+    """
+    errors, warnings = [], []
+
+    edges = np.asarray(spectrum_cfg.en_range, dtype=float)
+    if edges.ndim != 1 or edges.size < 2:
+        errors.append(f"energy.bins needs at least two edges, got {edges.size}")
+    elif not np.all(np.isfinite(edges)):
+        errors.append("energy.bins must be finite")
+    elif not np.all(np.diff(edges) > 0):
+        errors.append(f"energy.bins must be strictly increasing, got {edges.tolist()}")
+    elif edges[-1] <= MIN_FILTERED_ENERGY:
+        warnings.append(
+            f"energy.bins end at {edges[-1]}: every bin is dropped by the log10(E/eV) > {MIN_FILTERED_ENERGY} filter"
+        )
+
+    n_errors = len(errors)
+    for name, value in thresholds(cuts_cfg).items():
+        _check_number(errors, f"quality_cuts.{name}", value)
+    if len(errors) == n_errors:
+        try:
+            compile_cuts(cuts_cfg)
+        except ValueError as exc:
+            errors.append(str(exc))
+    if isinstance(cuts_cfg.number_of_good_sd, float) and not float(cuts_cfg.number_of_good_sd).is_integer():
+        warnings.append(f"quality_cuts.number_of_good_sd is not an integer ({cuts_cfg.number_of_good_sd})")
+
+    _check_number(errors, "geometry.generated_area_m2", spectrum_cfg.generated_area_m2, positive=True)
+    _check_number(errors, "geometry.generated_solid_angle_sr", spectrum_cfg.generated_solid_angle_sr, positive=True)
+    _check_number(errors, "run.time_s", spectrum_cfg.run_time_s, positive=True)
+
+    if energy_scale_cfg is not None:
+        scales = np.asarray(energy_scale_cfg.scales, dtype=float)
+        if not np.all(np.isfinite(scales)) or np.any(scales <= 0):
+            errors.append(f"energy_scale.scales must be positive, got {scales.tolist()}")
+
+    return errors, warnings
+
+
+def estimate_resources(inputs):
+    """
+    Rows, bytes and memory estimate of the ingestion pass (see module docstring).
+
+    :param inputs: list of dict
+                   inspect_parquet results
+    :return estimate: dict
+    """
+    rows = {info["role"]: info["rows"] or 0 for info in inputs}
+    uncompressed = sum(info["uncompressed_bytes"] or 0 for info in inputs)
+    total_rows = sum(rows.values())
+    bytes_per_row = uncompressed / total_rows if total_rows else 0.
+    array_bytes = 8 * (2 * rows.get("mc", 0) + rows.get("dt", 0))
+    batch_bytes = PANDAS_OVERHEAD * bytes_per_row * min(INGEST_BATCH_ROWS, max(rows.values(), default=0))
+    return {
+        "rows": total_rows,
+        "bytes": sum(info["bytes"] or 0 for info in inputs),
+        "uncompressed_bytes": uncompressed,
+        "event_array_bytes": array_bytes,
+        "batch_bytes": int(batch_bytes),
+        "peak_memory_bytes": int(array_bytes + batch_bytes),
+    }
+
+
+def preflight(array_cfg, spectrum_cfg, cuts_cfg, energy_scale_cfg=None, productions_cfg=None):
+    """
+    Check a configuration and its inputs (array_cfg.mc_file/dt_file already selected).
+
+    :param productions_cfg: MCProductionsConfig, optional
+                            MC productions checked instead of array_cfg.mc_file
+    :return report: dict
+                    array_type, inputs (inspect_parquet results), estimate,
+                    errors, warnings
+    """
+    errors, warnings = [], []
+    if array_cfg.array_type not in ("TASD", "CBSD"):
+        errors.append(f"array.type must be TASD or CBSD, got {array_cfg.array_type!r}")
+
+    if productions_cfg is None:
+        inputs = [
+            inspect_parquet(array_cfg.mc_file, "mc", array_cfg.array_type, cuts_cfg),
+            inspect_parquet(array_cfg.dt_file, "dt", array_cfg.array_type, cuts_cfg),
+        ]
+        if inputs[0]["rows"] == 0:
+            warnings.append(f"MC file {inputs[0]['path']} has no rows: the aperture is undefined")
+    else:
+        # Productions are streamed into histograms: no per-event MC arrays to estimate
+        inputs = []
+        for production in productions_cfg.productions:
+            info = inspect_parquet(production.file, "mc", array_cfg.array_type, cuts_cfg)
+            if info["skim"]:
+                errors.append(f"MC production {production.name}: {production.file} is a skim; "
+                              "productions need every thrown event")
+            if info["rows"] == 0:
+                warnings.append(f"MC production {production.name} ({production.file}) has no rows")
+            inputs.append({**info, "role": "mc_production"})
+        inputs.append(inspect_parquet(array_cfg.dt_file, "dt", array_cfg.array_type, cuts_cfg))
+    for info in inputs:
+        errors += info["errors"]
+
+    setting_errors, setting_warnings = check_settings(spectrum_cfg, cuts_cfg, energy_scale_cfg)
+    return {
+        "array_type": array_cfg.array_type,
+        "inputs": inputs,
+        "estimate": estimate_resources(inputs),
+        "errors": errors + setting_errors,
+        "warnings": warnings + setting_warnings,
+    }
+
+
+def raise_on_errors(report):
+    """
+    Raise ValueError listing every preflight error of a report (no-op if none).
+    """
+    if report["errors"]:
+        raise ValueError(
+            f"Preflight check failed ({len(report['errors'])} error(s)):\n  - " + "\n  - ".join(report["errors"])
+        )
+
+
+def log_report(report, logger):
+    """
+    Write a preflight report to run.log (summary, warnings, errors) and run.jsonl.
+    """
+    from .logging_utils import ERROR, WARNING
+
+    est = report["estimate"]
+    logger.log_text(
+        f"Preflight {report['array_type']}: {est['rows']} rows, {est['bytes'] / 2**20:.1f} MB on disk "
+        f"({est['uncompressed_bytes'] / 2**20:.1f} MB uncompressed), "
+        f"estimated peak memory {est['peak_memory_bytes'] / 2**20:.1f} MB"
+    )
+    for warning in report["warnings"]:
+        logger.log_text(f"Preflight warning: {warning}", level=WARNING)
+    for error in report["errors"]:
+        logger.log_text(f"Preflight error: {error}", level=ERROR)
+    logger.log_json(
+        event="preflight",
+        array=report["array_type"],
+        estimate=est,
+        inputs=[{k: v for k, v in info.items() if k != "errors"} for info in report["inputs"]],
+        errors=report["errors"],
+        warnings=report["warnings"],
+    )
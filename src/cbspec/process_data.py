@@ -14,7 +14,18 @@ This module performs the following tasks:
         - reconstructed MC log10(E/eV)
         - reconstructed data log10(E/eV)
         - thrown MC log10(E/eV)
-    6. Log all steps to text + JSON logs
+    6. Log all steps to text + JSON logs (per-batch text lines at DEBUG level,
+       so by default they appear in run.jsonl only; each batch is a "batch"
+       span with the rows/bytes read)
+
+extract_cut_variables/quality_mask separate the per-event cut variables
+from the cut itself, so load_cut_variables can keep uncut events in memory
+(cbspec serve) and re-apply different cuts without re-reading parquet. The
+cuts are expressions compiled into one fused kernel (cut_expressions.py);
+with numba, set_up_energy_array applies them through a selection kernel
+generated from the same expressions (fused.py) instead of pandas.
+EventHistograms fills N-dimensional histograms (energy × zenith stages)
+in the same batch loop, from the cut variables of the accepted events.
 
 This module contains **no physics** beyond energy corrections and log10
 conversion -- all physics (binning, aperture, exposure, flux, spectrum) is
@@ -24,191 +35,334 @@ handled downstream.
 from pathlib import Path
 import pyarrow.parquet as pq
 import numpy as np
-import pandas as pd
 
 from .data_classes import QualityCuts
 from .constants import fd_energy_corr, EeV_corr
-from .logging_utils import RunLogger
-
-
-def apply_quality_cuts(
-        df,
-        theta_corr,
-        s,
-        sc,
-        dsc,
-        ngsd,
-        bdist,
-        ldf,
-        gf,
-        cuts: QualityCuts
-):
+from .logging_utils import RunLogger, DEBUG
+from .cut_expressions import DEFAULT_EXPRESSIONS, compile_cuts
+
+
+# Columns read per tree type (see extract_cut_variables):
+# column → minimum list length, or None for a scalar column
+TREE_SCHEMAS = {
+    "resTree": {
+        "energy": 1,
+        "sc": 1,
+        "dsc": 1,
+        "nstclust": None,
+        "bdist": None,  # km
+        "ldfchi2": 1,
+        "gfchi2": 3,
+        "theta": 3,
+        "pderr": 3,
+        "mcenergy": None,
+    },
+    "tTlfit": {
+        "energy_s800_p": None,
+        "sc": None,
+        "dsc": None,
+        "ngsd": None,
+        "bdist": None,  # m
+        "ldfchi2pdof": None,
+        "gfchi2pdof": 2,
+        "theta": 2,
+        "pderr": 2,
+        "mcenergy": None,
+    },
+}
+
+# Branch index s: element of the fit-dependent list columns (gfchi2/theta/pderr)
+BRANCH = {"resTree": 2, "tTlfit": 1}
+
+# List element read per list column (see extract_cut_variables)
+LIST_ELEMENT = {
+    "resTree": {"energy": 0, "sc": 0, "dsc": 0, "ldfchi2": 0, "gfchi2": 2, "theta": 2, "pderr": 2},
+    "tTlfit": {"gfchi2pdof": 1, "theta": 1, "pderr": 1},
+}
+
+# Parquet columns read per tree type
+CUT_COLUMNS = {tree_type: tuple(schema) for tree_type, schema in TREE_SCHEMAS.items()}
+
+# Per-event arrays returned by extract_cut_variables
+CUT_VARIABLES = ("logen", "mclogen", "theta", "fs800", "pderr", "ngsd", "bdist", "ldf", "gf")
+
+# Derived binning axes (EventHistograms): name → (cut variables used, function of them)
+AXIS_VARIABLES = {
+    "cos_theta": (("theta",), lambda v: np.cos(np.radians(v["theta"]))),
+    "sec_theta": (("theta",), lambda v: 1. / np.cos(np.radians(v["theta"]))),
+}
+
+
+def detect_tree_type(columns):
     """
-    Apply TA-style quality cuts using thresholds from the YAML configuration file.
+    Tree type of a parquet file or batch from its column names.
+
+    :param columns: iterable of str
+    :return tree_type: str
+                       "resTree" or "tTlfit"
+    """
+    columns = set(columns)
+    if "energy" in columns:
+        return "resTree"
+    if "energy_s800_p" in columns:
+        return "tTlfit"
+    raise ValueError("Unknown tree type: no energy column found")
+
+
+def extract_cut_variables(df, array_type, columns=()):
+    """
+    Per-event energies and quality-cut variables of a parquet batch.
+
+    Branch selection per tree type:
+        - resTree → energy/sc/dsc/ldfchi2 element 0, gfchi2/theta/pderr element 2,
+                    bdist in km (converted to m)
+        - tTlfit  → scalar energy_s800_p/sc/dsc/ldfchi2pdof, gfchi2pdof/theta/pderr
+                    element 1, bdist in m
+
     :param df: pandas.DataFrame
-               The full parquet batch
-    :param theta_corr: float
-                       Array-specific zenith-angle correction:
-                        - TASD → 0.5°
-                        - CBSD → 1.0°
-    :param s: int
-              Index for selecting the correct reconstruction branch:
-                - resTree → 2
-                - tTlfit → 1
-    :param sc: array-like
-               S800 values (branch dependent)
-    :param dsc: array-like
-                ΔS800 values (branch dependent)
-    :param ngsd: array-like
-                 Number of good surface detectors
-    :param bdist: array-like
-                  Detector array border distance in meters
-    :param ldf: array-like
-                LDF χ² values
-    :param gf: array-like
-               Geometry χ² values
+               The parquet batch
+    :param array_type: str
+                       "TASD" or "CBSD" (zenith-angle correction 0.5° / 1.0°)
+    :param columns: iterable of str, optional
+                    Further parquet columns used by cut expressions (list columns
+                    give their LIST_ELEMENT element, else branch s)
+    :return tree_type: str
+    :return variables: dict of np.ndarray
+                       logen, mclogen (log10(E/eV) reconstructed / thrown), theta (deg,
+                       corrected), fs800, pderr, ngsd, bdist (m), ldf, gf, plus columns
+    """
+    tree_type = detect_tree_type(df.columns)
+
+    # Array-specific zenith-angle correction
+    theta_corr = 0.5 if array_type == "TASD" else 1.0
+
+    if tree_type == "resTree":
+        s = BRANCH[tree_type] # branch index
+        en = df['energy'].str[0] / fd_energy_corr
+        sc = df['sc'].str[0]
+        dsc = df['dsc'].str[0]
+        ngsd = df['nstclust']
+        bdist = df['bdist'] * 1000 # km → m
+        ldf = df['ldfchi2'].str[0]
+        gf = df['gfchi2'].str[2]
+    else:
+        s = BRANCH[tree_type]
+        en = df['energy_s800_p'] / fd_energy_corr
+        sc = df['sc']
+        dsc = df['dsc']
+        ngsd = df['ngsd']
+        bdist = df['bdist']
+        ldf = df['ldfchi2pdof']
+        gf = df['gfchi2pdof'].str[1]
+
+    # MC true energy
+    mcen = df["mcenergy"] / fd_energy_corr
+
+    variables = {
+        "logen": np.log10(en) + EeV_corr,
+        "mclogen": np.log10(mcen) + EeV_corr,
+        # Reconstructed zenith angles with array-specific correction
+        "theta": df["theta"].str[s] + theta_corr,
+        # Fractional S800
+        "fs800": dsc / sc,
+        # Pedestal error
+        "pderr": df["pderr"].str[s],
+        "ngsd": ngsd,
+        "bdist": bdist,
+        "ldf": ldf,
+        "gf": gf,
+    }
+    for name in columns:
+        if name not in df.columns:
+            raise ValueError(f"Quality cuts use {name!r}, which is neither a cut variable nor a column")
+        column = df[name]
+        if column.dtype == object:
+            column = column.str[LIST_ELEMENT[tree_type].get(name, s)]
+        variables[name] = column
+    return tree_type, {name: np.asarray(value, dtype=float) for name, value in variables.items()}
+
+
+def cut_terms(variables, cuts: QualityCuts):
+    """
+    Individual quality cuts, in cut-flow order (cut_flow(cuts)).
+
+    :param variables: dict of array-like
+                      See extract_cut_variables
     :param cuts: QualityCuts
-                 Dataclass containing all cut thresholds
-    :return df.loc[mask]: pandas.DataFrame
-                          Subset of df passing all cuts
+                 Dataclass containing all cut thresholds and expressions
+    :return terms: list of (str, np.ndarray of bool)
+                   (cut name, events passing that cut alone)
+    """
+    return compile_cuts(cuts).terms(variables)
+
+
+# Cut names of the default cuts, in the order a cut flow applies them
+CUT_FLOW = tuple(DEFAULT_EXPRESSIONS)
+
+
+def cut_flow(cuts: QualityCuts):
     """
+    Cut names of cut_terms for a cut setting (CUT_FLOW unless expressions change it).
+    """
+    return compile_cuts(cuts).names
+
 
-    # Reconstructed zenith angles with array-specific correction
-    theta = df["theta"].str[s] + theta_corr
+def cut_columns(tree_type, cuts: QualityCuts):
+    """
+    Parquet columns read for a cut setting: CUT_COLUMNS plus the columns
+    used by cut expressions.
+    """
+    extra = [c for c in compile_cuts(cuts).columns if c not in CUT_COLUMNS[tree_type]]
+    return CUT_COLUMNS[tree_type] + tuple(extra)
 
-    # Fractional S800
-    fs800 = dsc / sc
 
-    # Pedestal error
-    pderr = df["pderr"].str[s]
+def quality_mask(variables, cuts: QualityCuts):
+    """
+    TA-style quality cuts using thresholds from the YAML configuration file,
+    evaluated as one fused kernel (see cut_expressions.py).
 
-    # Boolean mask for all cuts
-    mask = (
-        (ngsd >= cuts.number_of_good_sd)
-        & (theta < cuts.theta_deg)
-        & (bdist >= cuts.boarder_dist_m)
-        & (gf < cuts.geometry_chi2)
-        & (ldf < cuts.ldf_chi2)
-        & (pderr < cuts.ped_error)
-        & (fs800 < cuts.frac_s800)
-    )
+    :param variables: dict of array-like
+                      See extract_cut_variables
+    :param cuts: QualityCuts
+                 Dataclass containing all cut thresholds and expressions
+    :return mask: np.ndarray of bool
+                  True for events passing all cuts
+    """
+    return compile_cuts(cuts).mask(variables)
 
-    # Returns the filtered DataFrame
-    return df.loc[mask]
 
-def process_batch(df, array_type, j_index, comp_df, cuts: QualityCuts, batch_idx, logger: RunLogger):
+def process_batch(batch, array_type, j_index, cuts: QualityCuts, batch_idx, logger: RunLogger, kernel=None,
+                  outputs=()):
     """
     Processes parquet data each batch.
 
     Steps:
     1. Detect tree type (resTree or tTlfit)
     2. Apply FD energy correction
-    3. Compute:
-        - log10(E_recon/eV)
-        - log10(E_thrown/eV) for MC
-    4. Apply quality cuts (returns cdata)
-    5. Append accepted log energies to comp_df
-    6. Log batch progress
-
-    :param df: pandas.DataFrame
-               The parquet batch
+    3. Apply quality cuts
+    4. Compute:
+        - log10(E_recon/eV) of the accepted events
+        - log10(E_thrown/eV) of every event for MC
+    5. Log batch progress
+
+    With a fused.SelectKernel, steps 2-3 are one compiled pass over the Arrow
+    buffers of the batch; otherwise the batch goes through pandas
+    (extract_cut_variables → quality_mask). Both give identical results.
+
+    :param batch: pyarrow.RecordBatch
+                  The parquet batch (cut columns at least)
     :param array_type: str
                        "TASD" or "CBSD"
     :param j_index: int
                     0 → MC file
                     1 → data file.
-    :param comp_df: list of pandas.DataFrame
-                    Accumulators:
-                        comp_df[0] → MC reconstructed log10(E/eV)
-                        comp_df[1] → data reconstructed log10(E/eV)
-                        comp_df[2] → MC thrown log10(E/eV)
     :param cuts: QualityCuts
                  Quality cut thresholds
     :param batch_idx: int
                       Current batch index
     :param logger: RunLogger
                    Handles text + JSON logging
-    :return comp_df: pandas.DataFrame
-                     Updated comp_df entries
-    :return cdata: pandas.DataFrame
-                   Filtered DataFrame of current batch
+    :param kernel: fused.SelectKernel, optional
+                   Compiled kernel of this tree type and cut setting
+    :param outputs: tuple of str
+                    Cut variables (see extract_cut_variables) to return for the
+                    accepted events; a kernel must have been built with the same outputs
+    :return rows: np.ndarray of int64
+                  Positions in the batch of the events passing the cuts
+    :return logen: np.ndarray
+                   Reconstructed log10(E/eV) of those events
+    :return mclogen: np.ndarray or None
+                     Thrown log10(E/eV) of every event (MC file only)
+    :return accepted: dict of np.ndarray
+                      `outputs` of the accepted events
     """
 
-    logger.log_text(f"Processing batch {batch_idx} for file index {j_index}...")
+    logger.log_text(f"Processing batch {batch_idx} for file index {j_index}...", level=DEBUG)
     logger.log_json(event="batch_start", batch=batch_idx, file_index=j_index)
 
-    # Array-specific zenith-angle correction
-    theta_corr = 0.5 if array_type == "TASD" else 1.0
-
-    # Detect tree type and extract variables
-    if "energy" in df.columns:
-        tree_type = "resTree"
-        s = 2 # branch index
-        en = df['energy'].str[0] / fd_energy_corr
-        sc = df['sc'].str[0]
-        dsc = df['dsc'].str[0]
-        ngsd = df['nstclust']
-        bdist = df['bdist'] * 1000 # km → m
-        ldf = df['ldfchi2'].str[0]
-        gf = df['gfchi2'].str[2]
-
-    elif "energy_s800_p" in df.columns:
-        tree_type = "tTlfit"
-        s = 1
-        df['energy'] = df['energy_s800_p']
-        en = df['energy'] / fd_energy_corr
-        sc = df['sc']
-        dsc = df['dsc']
-        ngsd = df['ngsd']
-        bdist = df['bdist']
-        ldf = df['ldfchi2pdof']
-        gf = df['gfchi2pdof'].str[1]
-
+    if kernel is not None:
+        tree_type = detect_tree_type(batch.schema.names)
+        rows, energy, accepted = kernel(batch)
+        logen = np.log10(energy) + EeV_corr
+        mclogen = None
+        if j_index == 0:
+            mcen = batch.column("mcenergy").to_numpy(zero_copy_only=False) / fd_energy_corr
+            mclogen = np.log10(mcen) + EeV_corr
     else:
-        raise ValueError("Unknown tree type: no energy column found")
+        # Detect tree type and extract energies + cut variables
+        tree_type, variables = extract_cut_variables(batch.to_pandas(), array_type, compile_cuts(cuts).columns)
+        mask = quality_mask(variables, cuts)
+        rows = np.flatnonzero(mask)
+        logen = variables["logen"][mask]
+        mclogen = variables["mclogen"] if j_index == 0 else None
+        accepted = {name: variables[name][mask] for name in outputs}
 
     # Log the detected tree type
-    logger.log_text(f"Detected tree type: {tree_type}")
+    logger.log_text(f"Detected tree type: {tree_type}", level=DEBUG)
     logger.log_json(event="tree_type", value=tree_type, batch=batch_idx)
 
-    # MC true energy
-    mcen = df["mcenergy"] / fd_energy_corr
+    logger.log_text(f"Number of accepted events in current loop: {len(rows)}", level=DEBUG)
+    logger.log_json(event="batch_end", batch=batch_idx, accepted=len(rows))
+
+    return rows, logen, mclogen, accepted
 
-    # Compute log10 energies
-    df['logen'] = np.log10(en) + EeV_corr
-    df['mclogen'] = np.log10(mcen) + EeV_corr
 
-    # Save uncut MC thrown energies (only for j_index == 0 MC file)
-    if j_index == 0:
-        comp_df[-1] = pd.concat([comp_df[-1], df['mclogen']], ignore_index=True)
+def load_cut_variables(infile, array_type, logger: RunLogger, batch_size=160000, columns=()):
+    """
+    Read the energies and quality-cut variables of every event in a parquet
+    file (no cuts applied), e.g. to re-apply different cuts in memory.
+
+    Only the columns listed in CUT_COLUMNS (and `columns`) are read.
+
+    :param infile: Path
+    :param array_type: str
+                       "TASD" or "CBSD"
+    :param logger: RunLogger
+    :param batch_size: int
+                       Rows per parquet batch
+    :param columns: iterable of str, optional
+                    Further columns used by cut expressions (see extract_cut_variables)
+    :return variables: dict of np.ndarray
+                       See extract_cut_variables
+    """
+    from .skim import read_skim_metadata
 
-    # Apply quality cuts
-    cdata = apply_quality_cuts(
-        df=df,
-        theta_corr=theta_corr,
-        s=s,
-        sc=sc,
-        dsc=dsc,
-        ngsd=ngsd,
-        bdist=bdist,
-        ldf=ldf,
-        gf=gf,
-        cuts=cuts,
-    )
+    parquet_file = pq.ParquetFile(infile)
+    if read_skim_metadata(parquet_file) is not None:
+        raise ValueError(f"{infile} is a skim: its quality-cut variables are not kept per event")
+    extra = tuple(columns)
+    read = CUT_COLUMNS[detect_tree_type(parquet_file.schema_arrow.names)]
+    read = read + tuple(c for c in extra if c not in read)
 
-    # Append reconstructed log10(E) from accepted events
-    comp_df[j_index] = pd.concat([comp_df[j_index], cdata["logen"]], ignore_index=True)
+    chunks = []
+    with logger.span("load_cut_variables", file=str(infile)) as span:
+        for batch in parquet_file.iter_batches(batch_size=batch_size, columns=list(read)):
+            chunks.append(extract_cut_variables(batch.to_pandas(), array_type, extra)[1])
+            span.add(rows=batch.num_rows, bytes=batch.nbytes)
 
-    # Events accepted this batch
-    accepted_now = len(cdata)
+    if not chunks:
+        return {name: np.empty(0) for name in CUT_VARIABLES + extra}
+    variables = {name: np.concatenate([chunk[name] for chunk in chunks]) for name in chunks[0]}
+    logger.log_text(f"Loaded cut variables of {len(variables['logen'])} events from {infile}")
+    return variables
 
-    logger.log_text(f"Number of accepted events in current loop: {accepted_now}")
-    logger.log_json(event="batch_end", batch=batch_idx, accepted=accepted_now)
 
-    return comp_df[j_index], comp_df[-1], cdata
+def _row_group_batches(parquet_file, first_group, batch_size, columns=None):
+    """
+    Batches of the row groups from first_group on, each paired with the index
+    of the next row group after the last batch of a row group (else None).
+    """
+    for group in range(first_group, parquet_file.num_row_groups):
+        batches = parquet_file.iter_batches(batch_size=batch_size, row_groups=[group], columns=columns)
+        batch = next(batches, None)
+        while batch is not None:
+            following = next(batches, None)
+            yield batch, (group + 1 if following is None else None)
+            batch = following
 
 
-def set_up_energy_array(infiles, array_type, cuts: QualityCuts, logger: RunLogger):
+def set_up_energy_array(infiles, array_type, cuts: QualityCuts, logger: RunLogger, progress=None, skim=None,
+                        checkpoint=None, jit=None, histograms=None):
     """
     Read MC and data parquet files and return:
         mc_array            = MC reconstructed log10(E/eV) np.ndarray
@@ -221,52 +375,228 @@ def set_up_energy_array(infiles, array_type, cuts: QualityCuts, logger: RunLogge
         - Accepted events per batch
         - Running total per file
 
+    Only the cut columns are read (every column when skimming). Batches go
+    through the numba selection kernel (fused.SelectKernel) when it is used, else
+    through pandas; accepted energies are collected per batch and
+    concatenated once at the end.
+
     :param infiles: list of Path
-                    [MC_file, data_file]
+                    [MC_file, data_file]; MC_file may be None (MC productions,
+                    see productions.py), leaving the MC arrays empty
     :param array_type: str
                        "TASD" or "CBSD"
     :param cuts: QualityCuts
                  Quality cut thresholds
     :param logger: RunLogger
                    Handles text + JSON logging
+    :param progress: progress.Progress, optional
+                     Receives rows/accepted events/bytes after every batch
+    :param skim: skim.SkimWriter, optional
+                 Receives the cut-passing rows of every batch
+    :param checkpoint: checkpoint.IngestCheckpoint, optional
+                       Checkpoints the accumulators at row-group boundaries; an
+                       existing checkpoint is resumed (files are then read row
+                       group by row group)
+    :param jit: bool, optional
+                Numba selection kernel: None uses it when numba is installed and the
+                inputs hold at least fused.JIT_MIN_ROWS rows, False never, True
+                always (ValueError if it is unavailable)
+    :param histograms: EventHistograms, optional
+                       Filled with the accepted events of every batch (energy ×
+                       zenith binning); not available for skim inputs
     :return mc_array: np.ndarray
     :return dt_array: np.ndarray
     :return mc_thrown_array: np.ndarray
     """
-    comp_df = [pd.DataFrame(), pd.DataFrame(), pd.DataFrame()]
+    from .fused import select_kernel, use_jit
+    from .skim import read_skim, read_skim_metadata
+
+    # Per-batch parts of the MC reco, data and MC thrown arrays
+    parts = [[], [], []]
+
+    # Resume: restore the accumulators and skip what the checkpoint covers
+    start_file, start_group, start_count = 0, 0, 0
+    state = checkpoint.load() if checkpoint is not None else None
+    if state is not None:
+        parts = [[array] for array in state["arrays"]]
+        start_file, start_group, start_count = state["file_index"], state["row_group"], state["count"]
+        if progress is not None:
+            done = sum(pq.ParquetFile(f).metadata.num_rows for f in infiles[:start_file] if f is not None)
+            metadata = pq.ParquetFile(infiles[start_file]).metadata
+            done += sum(metadata.row_group(g).num_rows for g in range(start_group))
+            progress.update(rows=done, accepted=len(parts[0][0]) + len(parts[1][0]), nbytes=0)
+
+    outputs = histograms.variables if histograms is not None else ()
+    use_kernel, reason = use_jit(jit, sum(pq.ParquetFile(f).metadata.num_rows for f in infiles if f is not None))
 
     for j, infile in enumerate(infiles):
+        if j < start_file or infile is None:  # no MC file: MC productions are streamed separately
+            continue
         logger.log_text(f"Input File: {infile}")
         logger.log_json(event="input_file", file=str(infile), index=j)
 
-        count = 0 # running total of accepted events in this file
+        count = start_count if j == start_file else 0 # running total of accepted events in this file
         parquet_file = pq.ParquetFile(infile)
 
-        # Iterate through parquet batches
-        for batch_idx, batch in enumerate(parquet_file.iter_batches(batch_size=160000)):
-            df = batch.to_pandas()
-
-            # Process batch
-            comp_df[j], comp_df[-1], cdata = process_batch(
-                df=df,
-                array_type=array_type,
-                j_index=j,
-                comp_df=comp_df,
-                cuts=cuts,
-                batch_idx=batch_idx,
-                logger=logger,
-            )
+        # Skims already passed the cuts: take their energies as they are
+        skim_meta = read_skim_metadata(parquet_file)
+        if skim_meta is not None and histograms is not None:
+            raise ValueError(f"{infile} is a skim: its zenith angles are not kept per event")
+        if skim_meta is not None:
+            logen, thrown = read_skim(parquet_file, infile, skim_meta, cuts)
+            parts[j].append(np.asarray(logen, dtype=float))
+            if j == 0:
+                parts[-1].append(np.asarray(thrown, dtype=float))
+            if progress is not None:
+                progress.update(rows=parquet_file.metadata.num_rows, accepted=len(logen), nbytes=0)
+            logger.log_text(f"Input is a skim (quality cuts already applied): {len(logen)} accepted events")
+            logger.log_json(event="skim_input", file=str(infile), accepted=len(logen),
+                            source=skim_meta["source"]["path"])
+            continue
+
+        tree_type = detect_tree_type(parquet_file.schema_arrow.names)
+        kernel = None
+        if use_kernel:
+            kernel, reason = select_kernel(tree_type, array_type, cuts, parquet_file.schema_arrow, outputs=outputs)
+            if kernel is None and jit:
+                raise ValueError(f"Selection kernel unavailable: {reason}")
+        logger.log_text(
+            f"Ingest kernel: {'selection (numba)' if kernel is not None else f'NumPy ({reason})'}", level=DEBUG
+        )
+
+        columns = None
+        if skim is not None:
+            skim.open("mc" if j == 0 else "dt", infile, parquet_file)
+        else:
+            columns = list(cut_columns(tree_type, cuts))
+
+        # Iterate through parquet batches (row group by row group when checkpointing)
+        if checkpoint is None:
+            batches = ((batch, None) for batch in parquet_file.iter_batches(batch_size=160000, columns=columns))
+        else:
+            batches = _row_group_batches(parquet_file, start_group if j == start_file else 0, 160000, columns)
+        for batch_idx, (batch, next_group) in enumerate(batches):
+            with logger.span("batch", file_index=j, batch=batch_idx) as span:
+                # Process batch
+                rows, logen, mclogen, accepted = process_batch(
+                    batch=batch,
+                    array_type=array_type,
+                    j_index=j,
+                    cuts=cuts,
+                    batch_idx=batch_idx,
+                    logger=logger,
+                    kernel=kernel,
+                    outputs=outputs,
+                )
+                parts[j].append(logen)
+                if mclogen is not None:
+                    parts[-1].append(mclogen)
+                if histograms is not None:
+                    histograms.fill(j, logen, accepted, mclogen)
+                span.add(rows=batch.num_rows, bytes=batch.nbytes)
+
+            if skim is not None:
+                skim.write(batch, rows, logen, mclogen)
+
+            if progress is not None:
+                progress.update(rows=batch.num_rows, accepted=len(rows), nbytes=batch.nbytes)
 
             # Update running total
-            accepted_now = len(cdata)
+            accepted_now = len(rows)
             count += accepted_now
 
-            logger.log_text(f"Total number of accepted events from {infile}: {count}")
+            logger.log_text(f"Total number of accepted events from {infile}: {count}", level=DEBUG)
             logger.log_json(event="running_total", file=str(infile), total=count)
 
-    # Convert accumulated DataFrames to numpy arrays
-    mc_array = comp_df[0].to_numpy()
-    dt_array = comp_df[1].to_numpy()
-    mc_thrown_array = comp_df[-1].to_numpy()
+            if next_group is not None and checkpoint.due():
+                checkpoint.save(parts, j, next_group, count)
+
+        logger.log_text(f"Total number of accepted events from {infile}: {count}")
+        if skim is not None:
+            skim.close_file()
+
+    # Concatenate the accumulated parts
+    mc_array, dt_array, mc_thrown_array = (np.concatenate(p) if p else np.empty(0) for p in parts)
+
+    return mc_array, dt_array, mc_thrown_array
+
+
+def axis_values(variables, name):
+    """
+    Per-event values of one binning axis: a cut variable (e.g. logen) or a
+    derived axis of AXIS_VARIABLES (cos_theta, sec_theta of the corrected zenith).
+
+    :param variables: dict of np.ndarray
+                      See extract_cut_variables
+    :param name: str
+    :return values: np.ndarray
+    """
+    if name in AXIS_VARIABLES:
+        return AXIS_VARIABLES[name][1](variables)
+    if name in variables:
+        return variables[name]
+    raise ValueError(f"Unknown binning axis {name!r} (available: {', '.join(CUT_VARIABLES + tuple(AXIS_VARIABLES))})")
+
+
+class EventHistograms:
+    """
+    N-dimensional histograms filled by set_up_energy_array, batch by batch.
+
+    Every batch adds its accepted events with a single bincount over
+    flattened multi-indices (binning.histograms_nd), so no per-event array
+    outlives its batch. The thrown MC is binned in energy only: the trees
+    carry no thrown zenith angle.
+
+    :param axes: tuple of str
+                 Binning axes, starting with "logen" (see axis_values)
+    :param edges: tuple of array-like
+                  Bin edges per axis
+    """
 
-    return mc_array, dt_array, mc_thrown_array
\ No newline at end of file
+    def __init__(self, axes, edges):
+        if not axes or axes[0] != "logen":
+            raise ValueError(f"The first binning axis must be logen, got {axes!r}")
+        for name in axes[1:]:
+            if name not in AXIS_VARIABLES and name not in CUT_VARIABLES[2:]:
+                raise ValueError(f"Unknown binning axis {name!r} "
+                                 f"(available: {', '.join(CUT_VARIABLES[2:] + tuple(AXIS_VARIABLES))})")
+        self.axes = tuple(axes)
+        self.edges = [np.asarray(e, dtype=float) for e in edges]
+        # Cut variables process_batch returns for the accepted events
+        self.variables = tuple(dict.fromkeys(
+            v for name in self.axes[1:] for v in (AXIS_VARIABLES[name][0] if name in AXIS_VARIABLES else (name,))
+        ))
+        shape = tuple(len(e) - 1 for e in self.edges)
+        self.counts = [np.zeros(shape, dtype=np.int64), np.zeros(shape, dtype=np.int64),
+                       np.zeros(shape[0], dtype=np.int64)]
+
+    def fill(self, j_index, logen, accepted, mclogen=None):
+        """
+        Add the accepted events of one batch.
+
+        :param j_index: int
+                        0 → MC file, 1 → data file
+        :param logen: np.ndarray
+                      Reconstructed log10(E/eV) of the accepted events
+        :param accepted: dict of np.ndarray
+                         `variables` of the accepted events (see process_batch)
+        :param mclogen: np.ndarray or None
+                        Thrown log10(E/eV) of every event (MC file only)
+        """
+        from .binning import histograms_nd
+
+        values = [logen] + [axis_values(accepted, name) for name in self.axes[1:]]
+        no_events = [np.empty(0)] * len(self.axes)
+        blocks = [
+            (values if j_index == 0 else no_events, self.edges),
+            (values if j_index == 1 else no_events, self.edges),
+            ([mclogen] if mclogen is not None else [np.empty(0)], self.edges[:1]),
+        ]
+        for total, counts in zip(self.counts, histograms_nd(blocks)):
+            total += counts
+
+    def spec(self):
+        """
+        JSON-able axes and edges (identity of a checkpoint holding these counts).
+        """
+        return {"axes": list(self.axes), "edges": [e.tolist() for e in self.edges]}
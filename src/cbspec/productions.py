@@ -0,0 +1,287 @@
+"""
+Several MC productions combined into one aperture.
+
+    mc_productions:
+        reference_index: 3.0                  (optional spectral reweighting)
+        tasd:
+            - name: low
+              file: mc_tasd_low.parquet
+              generated_area_m2: 1.96e9
+              generated_solid_angle_sr: 2.356
+              spectral_index: 2.0
+            - name: high
+              file: mc_tasd_high.parquet
+              generated_area_m2: 7.85e9
+              generated_solid_angle_sr: 2.356
+              spectral_index: 1.0
+
+The productions replace data.<array>.mc_file. The mc_productions stage
+streams every production once, in a process pool (one process per
+production, output.production_workers): each batch is cut with the fused
+quality-cut kernel and binned with bincounts, so no per-event MC array is
+kept. Workers report their rows to the parent's progress display through a
+shared progress.ProgressCounter. Per production it returns
+
+    - reconstructed counts in log10(E_reco/eV) bins and thrown counts in
+      log10(E_thrown/eV) bins, raw and spectrally weighted
+    - fixed-range plot histograms and event totals
+
+stacked into (n_productions, n_bins) arrays. The aperture stage combines the
+weighted counts with exposure.compute_combined_aperture -- every
+production's thrown counts normalized by its own A_gen × Ω_gen -- into one
+aperture, and keeps per-production apertures and fluence shares as
+diagnostics ({array}_productions.csv, {array}_aperture_productions.png).
+
+Spectral weights: with a reference_index γ_ref, an event of production p
+thrown at energy E gets w = (E / E_pivot)^(γ_p - γ_ref), so every production
+samples the same E^-γ_ref spectrum within the energy bins. Reconstructed
+events are weighted by their thrown energy too. Weights are normalized so
+that they sum to the production's number of thrown events, keeping each
+production's statistical weight in the combination. Without a
+reference_index all weights are 1.
+
+Bin filtering uses the raw (unweighted) thrown counts summed over the
+productions. The energy-scale scan and the energy × zenith binning need a
+single MC event file and are skipped when productions are configured.
+"""
+
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from .binning import bin_index, histogram_events
+from .cut_expressions import compile_cuts
+from .data_classes import MCProduction, MCProductionsConfig, QualityCuts
+from .logging_utils import RunLogger
+from .progress import Progress, init_worker_progress, worker_progress
+
+# log10(E/eV) where spectral weights are 1 before normalization (keeps powers small)
+PIVOT_LOG10_EV = 19.0
+
+
+def spectral_weights(mc_log_energy, spectral_index, reference_index):
+    """
+    Unnormalized weights reweighting a thrown E^-γ_p spectrum to E^-γ_ref.
+
+    :param mc_log_energy: np.ndarray
+                          Thrown log10(E/eV) of the events
+    :param spectral_index: float or None
+                           γ_p of the production
+    :param reference_index: float or None
+                            γ_ref (None: no reweighting)
+    :return weights: np.ndarray or None
+                     None when no reweighting applies
+    """
+    if reference_index is None or spectral_index is None or spectral_index == reference_index:
+        return None
+    return 10.0 ** ((spectral_index - reference_index) * (np.asarray(mc_log_energy, dtype=float) - PIVOT_LOG10_EV))
+
+
+def _bincount(values, edges, weights=None):
+    # Counts (weighted sums) per bin with the np.histogram convention
+    index = bin_index(values, edges)
+    inside = index >= 0
+    return np.bincount(index[inside], weights=None if weights is None else weights[inside],
+                       minlength=len(edges) - 1)
+
+
+def histogram_production(production: MCProduction, array_type, cuts: QualityCuts, edges, hist_edges,
+                         logger: RunLogger, reference_index=None, progress: Progress = None, batch_size=160000):
+    """
+    Stream one MC production into raw and weighted energy histograms.
+
+    :param production: MCProduction
+    :param array_type: str
+                       "TASD" or "CBSD"
+    :param cuts: QualityCuts
+    :param edges: np.ndarray
+                  log10(E/eV) bin edges
+    :param hist_edges: np.ndarray
+                       Fixed-range plot histogram edges
+    :param logger: RunLogger or WorkerLogger
+    :param reference_index: float, optional
+                            Spectral index to reweight to (see module docstring)
+    :param progress: Progress, optional
+                     Updated per batch; None → report through progress.worker_progress
+                     (the shared counter of a pool worker)
+    :param batch_size: int
+                       Rows per parquet batch
+    :raise ValueError: if the production file is a skim (it holds no thrown events)
+    :return histograms: dict
+                        mc_counts, mc_thrown_counts (raw), mc_counts_w,
+                        mc_thrown_counts_w (weighted), mc_hist, mc_thrown_hist,
+                        n_mc_reco, n_mc_thrown
+    """
+    import pyarrow.parquet as pq
+
+    from .process_data import cut_columns, detect_tree_type, extract_cut_variables
+    from .skim import read_skim_metadata
+
+    parquet_file = pq.ParquetFile(production.file)
+    if read_skim_metadata(parquet_file) is not None:
+        raise ValueError(f"MC production {production.name}: {production.file} is a skim; "
+                         "productions need every thrown event")
+    compiled = compile_cuts(cuts)
+    columns = cut_columns(detect_tree_type(parquet_file.schema_arrow.names), cuts)
+
+    n_bins = len(edges) - 1
+    mc_counts = np.zeros(n_bins, dtype=np.int64)
+    mc_thrown_counts = np.zeros(n_bins, dtype=np.int64)
+    mc_counts_w = np.zeros(n_bins, dtype=float)
+    mc_thrown_counts_w = np.zeros(n_bins, dtype=float)
+    mc_hist = np.zeros(len(hist_edges) - 1, dtype=np.int64)
+    mc_thrown_hist = np.zeros(len(hist_edges) - 1, dtype=np.int64)
+    n_mc_reco = n_mc_thrown = 0
+    weight_sum = 0.
+
+    with logger.span("mc_production", production=production.name, file=str(production.file)) as span:
+        for batch in parquet_file.iter_batches(batch_size=batch_size, columns=list(columns)):
+            variables = extract_cut_variables(batch.to_pandas(), array_type, compiled.columns)[1]
+            mask = compiled.mask(variables)
+            mclogen = np.asarray(variables["mclogen"], dtype=float)
+            logen = np.asarray(variables["logen"], dtype=float)[mask]
+
+            weights = spectral_weights(mclogen, production.spectral_index, reference_index)
+            if weights is None:
+                weights = np.ones(len(mclogen))
+            weight_sum += weights.sum()
+
+            mc_counts += _bincount(logen, edges)
+            mc_thrown_counts += _bincount(mclogen, edges)
+            mc_counts_w += _bincount(logen, edges, weights[mask])
+            mc_thrown_counts_w += _bincount(mclogen, edges, weights)
+            mc_hist += histogram_events(logen, hist_edges)
+            mc_thrown_hist += histogram_events(mclogen, hist_edges)
+            n_mc_reco += len(logen)
+            n_mc_thrown += len(mclogen)
+            span.add(rows=batch.num_rows, bytes=batch.nbytes)
+            if progress is not None:
+                progress.update(rows=batch.num_rows, accepted=len(logen), nbytes=batch.nbytes)
+            else:
+                worker_progress(rows=batch.num_rows, accepted=len(logen), nbytes=batch.nbytes)
+
+    # Weights sum to the number of thrown events of the production
+    if weight_sum > 0:
+        mc_counts_w *= n_mc_thrown / weight_sum
+        mc_thrown_counts_w *= n_mc_thrown / weight_sum
+
+    logger.log_text(f"MC production {production.name}: {n_mc_reco} reconstructed of {n_mc_thrown} thrown events")
+    logger.log_json(event="mc_production", production=production.name, file=str(production.file),
+                    n_mc_reco=n_mc_reco, n_mc_thrown=n_mc_thrown)
+    return {
+        "mc_counts": mc_counts,
+        "mc_thrown_counts": mc_thrown_counts,
+        "mc_counts_w": mc_counts_w,
+        "mc_thrown_counts_w": mc_thrown_counts_w,
+        "mc_hist": mc_hist,
+        "mc_thrown_hist": mc_thrown_hist,
+        "n_mc_reco": n_mc_reco,
+        "n_mc_thrown": n_mc_thrown,
+    }
+
+
+def _production_task(task):
+    """
+    Pool worker: histogram one production.
+    :param task: (production, array_type, cuts, edges, hist_edges, logger, reference_index, progress)
+    :return: (histograms, seconds)
+    """
+    production, array_type, cuts, edges, hist_edges, logger, reference_index, progress = task
+    t0 = time.perf_counter()
+    histograms = histogram_production(production, array_type, cuts, edges, hist_edges, logger,
+                                      reference_index=reference_index, progress=progress)
+    return histograms, time.perf_counter() - t0
+
+
+def histogram_productions(productions_cfg: MCProductionsConfig, array_type, cuts: QualityCuts, edges, hist_edges,
+                          logger: RunLogger, max_workers=None, progress: Progress = None):
+    """
+    Histogram every MC production, in parallel, into stacked arrays.
+
+    :param productions_cfg: MCProductionsConfig
+    :param array_type: str
+    :param cuts: QualityCuts
+    :param edges: np.ndarray
+                  log10(E/eV) bin edges
+    :param hist_edges: np.ndarray
+                       Fixed-range plot histogram edges
+    :param logger: RunLogger
+    :param max_workers: int, optional
+                        Process-pool size. None → one worker per production (capped
+                        at the CPU count); 0 or 1 → stream serially in this process.
+    :param progress: Progress, optional
+                     Ingestion progress over all productions; pool workers report
+                     through its ProgressCounter (required for max_workers > 1)
+    :return stacked: dict
+                     names, files, spectral_index, reference_index, generated_area_m2,
+                     generated_solid_angle_sr (one entry per production) and the
+                     histogram_production arrays stacked to (n_productions, n_bins)
+    """
+    productions = productions_cfg.productions
+    if max_workers is None:
+        max_workers = min(len(productions), os.cpu_count() or 1)
+
+    if max_workers <= 1:
+        done = [_production_task((p, array_type, cuts, edges, hist_edges, logger, productions_cfg.reference_index,
+                                  progress))
+                for p in productions]
+    else:
+        worker_logger = logger.worker_handle()
+        tasks = [(p, array_type, cuts, edges, hist_edges, worker_logger, productions_cfg.reference_index, None)
+                 for p in productions]
+        counter = None if progress is None else progress.counter
+        with ProcessPoolExecutor(max_workers=min(max_workers, len(productions)),
+                                 initializer=init_worker_progress, initargs=(counter,)) as pool:
+            done = list(pool.map(_production_task, tasks))
+
+    for production, (_, seconds) in zip(productions, done):
+        logger.log_json(event="mc_production_done", production=production.name, seconds=round(seconds, 4))
+
+    histograms = [h for h, _ in done]
+    return {
+        "names": [p.name for p in productions],
+        "files": [str(p.file) for p in productions],
+        "spectral_index": [p.spectral_index for p in productions],
+        "reference_index": productions_cfg.reference_index,
+        "generated_area_m2": np.array([p.generated_area_m2 for p in productions], dtype=float),
+        "generated_solid_angle_sr": np.array([p.generated_solid_angle_sr for p in productions], dtype=float),
+        **{key: np.stack([h[key] for h in histograms]) for key in histograms[0]},
+    }
+
+
+def combine_productions(productions, mask):
+    """
+    One aperture from the stacked production histograms, with per-production diagnostics.
+
+    :param productions: dict
+                        Output of histogram_productions
+    :param mask: np.ndarray of bool
+                 Energy-bin mask of filter_bins
+    :return aperture: np.ndarray
+                      Combined aperture of the filtered bins [m² sr]
+    :return diagnostics: dict
+                         names, aperture (per production), share (fluence fraction),
+                         mc_counts / mc_thrown_counts (raw) and their weighted
+                         versions, all shaped (n_productions, n_filtered_bins)
+    """
+    from .exposure import compute_combined_aperture
+
+    mc_counts_w = productions["mc_counts_w"][:, mask]
+    mc_thrown_counts_w = productions["mc_thrown_counts_w"][:, mask]
+    aperture, production_apertures, share = compute_combined_aperture(
+        mc_counts_w,
+        mc_thrown_counts_w,
+        productions["generated_area_m2"],
+        productions["generated_solid_angle_sr"],
+    )
+    return aperture, {
+        "names": productions["names"],
+        "aperture": production_apertures,
+        "share": share,
+        "mc_counts": productions["mc_counts"][:, mask],
+        "mc_thrown_counts": productions["mc_thrown_counts"][:, mask],
+        "mc_counts_w": mc_counts_w,
+        "mc_thrown_counts_w": mc_thrown_counts_w,
+    }
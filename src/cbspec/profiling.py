@@ -0,0 +1,256 @@
+"""
+Per-stage CPU and memory profiling for a cbspec run.
+
+Enabled with `python -m cbspec --profile cpu|memory|both`. Every pipeline
+stage (and the save/plot/publish steps) is profiled separately into
+
+    output/runs/<timestamp>/profile/
+
+    NN_<stage>.pstats          → cProfile statistics (pstats / snakeviz)
+    NN_<stage>.collapsed.txt   → collapsed stacks for flamegraph.pl / speedscope
+    NN_<stage>.tracemalloc.txt → peak traced memory and the allocations made
+                                 during the stage that are still held at its end
+
+and the top N entries of each profile are summarized in run.log.
+
+Notes:
+    - cProfile records caller → callee edges, not full stacks. The collapsed
+      stacks are reconstructed from those edges by splitting each function's
+      time over its callers proportionally, which is exact for tree-shaped
+      call graphs and an approximation otherwise.
+    - Profilers do not nest: a stage started while another is being profiled
+      is accounted to the outer one.
+    - tracemalloc keeps TRACE_FRAMES frames per allocation and slows
+      allocation-heavy stages (ingestion) several-fold; under "both" the CPU
+      profile includes that overhead, so use "cpu" for timings.
+    - Only this process is profiled; work in process pools (plot rendering)
+      is not visible, so the pipeline renders plots serially under CPU
+      profiling.
+"""
+
+import cProfile
+import io
+import pstats
+import re
+import tracemalloc
+from contextlib import contextmanager
+from pathlib import Path
+
+from .logging_utils import RunLogger
+
+PROFILE_MODES = ("cpu", "memory", "both")
+
+# Frames stored per traced allocation (tracebacks in the tracemalloc report)
+TRACE_FRAMES = 10
+
+
+def _func_label(func):
+    """
+    Readable label of a pstats function key (filename, lineno, name).
+    """
+    filename, lineno, name = func
+    if filename == "~":
+        return name  # builtin, e.g. "<built-in method numpy.array>"
+    return f"{Path(filename).name}:{lineno}({name})"
+
+
+def collapsed_stacks(stats: pstats.Stats, max_depth=64, min_fraction=1e-4):
+    """
+    Collapsed-stack lines ("root;caller;callee <microseconds>") from pstats.
+
+    :param stats: pstats.Stats
+    :param max_depth: int
+                      Stacks are truncated at this depth
+    :param min_fraction: float
+                         Paths carrying less than this fraction of the total
+                         time are dropped (bounds the walk on large call graphs)
+    :return lines: list of str
+    """
+    raw = stats.stats  # func → (cc, nc, tt, ct, callers{caller: (cc, nc, tt, ct)})
+    callees = {}
+    for func, (_, _, _, _, callers) in raw.items():
+        for caller, edge in callers.items():
+            callees.setdefault(caller, []).append((func, edge[3]))
+
+    roots = [func for func, value in raw.items() if not value[4]]
+    min_s = max(sum(raw[root][3] for root in roots) * min_fraction, 1e-6)
+    folded = {}
+
+    def walk(func, path, fraction):
+        tt, ct = raw[func][2], raw[func][3]
+        stack = path + (_func_label(func),)
+        self_us = tt * fraction * 1e6
+        if self_us >= 1:
+            key = ";".join(stack)
+            folded[key] = folded.get(key, 0) + self_us
+        if len(stack) >= max_depth:
+            return
+        for callee, edge_ct in callees.get(func, ()):
+            callee_ct = raw[callee][3]
+            if callee_ct <= 0 or edge_ct * fraction < min_s or _func_label(callee) in stack:
+                continue
+            walk(callee, stack, min(fraction * edge_ct / callee_ct, 1.))
+
+    for root in roots:
+        if raw[root][3] >= min_s:
+            walk(root, (), 1.)
+
+    return [f"{key} {int(round(us))}" for key, us in sorted(folded.items())]
+
+
+class StageProfiler:
+    """
+    Profile pipeline stages one at a time.
+
+    :param profile_dir: Path
+                        Output directory (run_dir/profile)
+    :param mode: str
+                 "cpu", "memory" or "both"
+    :param logger: RunLogger
+    :param top_n: int
+                  Entries per profile written to run.log and the tracemalloc report
+    """
+
+    def __init__(self, profile_dir: Path, mode: str, logger: RunLogger, top_n: int = 15):
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"Unknown profile mode {mode!r}; use one of {', '.join(PROFILE_MODES)}")
+        self.profile_dir = Path(profile_dir)
+        self.profile_dir.mkdir(parents=True, exist_ok=True)
+        self.mode = mode
+        self.cpu = mode in ("cpu", "both")
+        self.memory = mode in ("memory", "both")
+        self.logger = logger
+        self.top_n = top_n
+
+        self._index = 0
+        self._active = None
+
+    def start(self, name):
+        """
+        Start profiling a stage. Returns False (and does nothing) if another
+        stage is already being profiled.
+        """
+        if self._active is not None:
+            return False
+
+        profile = None
+        tracing = False
+        if self.memory:
+            if tracemalloc.is_tracing():
+                self.logger.log_text(f"Profile {name}: tracemalloc already active elsewhere, memory profile skipped")
+            else:
+                # A fresh trace per stage: the end snapshot holds only this stage's allocations
+                tracemalloc.start(TRACE_FRAMES)
+                tracing = True
+        if self.cpu:
+            profile = cProfile.Profile()
+            profile.enable()
+
+        self._active = (name, profile, tracing)
+        return True
+
+    def stop(self):
+        """
+        Stop profiling the active stage and write its reports.
+        """
+        if self._active is None:
+            return
+        name, profile, tracing = self._active
+        self._active = None
+
+        if profile is not None:
+            profile.disable()
+
+        snapshot = None
+        if tracing:
+            _, peak = tracemalloc.get_traced_memory()
+            snapshot = tracemalloc.take_snapshot()
+            tracemalloc.stop()
+
+        self._index += 1
+        stem = f"{self._index:02d}_{re.sub(r'[^A-Za-z0-9_.-]', '_', name)}"
+
+        if profile is not None:
+            self._write_cpu(name, stem, profile)
+        if snapshot is not None:
+            self._write_memory(name, stem, snapshot, peak)
+
+    @contextmanager
+    def profile(self, name):
+        """
+        Context manager profiling one stage (see start/stop).
+        """
+        started = self.start(name)
+        try:
+            yield
+        finally:
+            if started:
+                self.stop()
+
+    def _write_cpu(self, name, stem, profile):
+        stats = pstats.Stats(profile)
+        stats.dump_stats(self.profile_dir / f"{stem}.pstats")
+
+        with open(self.profile_dir / f"{stem}.collapsed.txt", "w") as f:
+            f.write("\n".join(collapsed_stacks(stats)) + "\n")
+
+        hot = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:self.top_n]
+        self.logger.log_text(
+            f"Profile {name}: {stats.total_tt:.3f} s CPU, top {len(hot)} by cumulative time "
+            f"(ncalls, tottime, cumtime, function):"
+        )
+        for func, (_, nc, tt, ct, _) in hot:
+            self.logger.log_text(f"    {nc:>9} {tt:9.4f} {ct:9.4f}  {_func_label(func)}")
+        self.logger.log_json(
+            event="profile_cpu",
+            stage=name,
+            file=f"{stem}.pstats",
+            total_s=stats.total_tt,
+            top=[{"function": _func_label(func), "ncalls": nc, "tottime": tt, "cumtime": ct}
+                 for func, (_, nc, tt, ct, _) in hot],
+        )
+
+    def _write_memory(self, name, stem, snapshot, peak):
+        # Leave out allocations made by the profilers themselves
+        snapshot = snapshot.filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, cProfile.__file__),
+            tracemalloc.Filter(False, __file__),
+        ])
+        top = snapshot.statistics("lineno")[:self.top_n]
+
+        buf = io.StringIO()
+        buf.write(f"Stage: {name}\n")
+        buf.write(f"Peak traced memory during stage: {peak / 2**20:.2f} MB\n\n")
+        buf.write(f"Top {len(top)} allocation sites still held at the end of the stage:\n")
+        for stat in top:
+            buf.write(f"{stat}\n")
+        buf.write("\nTracebacks of the top 3 allocation stacks:\n")
+        for stat in snapshot.statistics("traceback")[:3]:
+            buf.write(f"\n{stat.size / 2**20:.2f} MB in {stat.count} blocks\n")
+            buf.write("\n".join(stat.traceback.format()) + "\n")
+        with open(self.profile_dir / f"{stem}.tracemalloc.txt", "w") as f:
+            f.write(buf.getvalue())
+
+        self.logger.log_text(
+            f"Profile {name}: peak traced memory {peak / 2**20:.2f} MB, top {min(len(top), 5)} allocation sites:"
+        )
+        for stat in top[:5]:
+            frame = stat.traceback[0]
+            self.logger.log_text(
+                f"    {stat.size / 2**20:9.2f} MB  {Path(frame.filename).name}:{frame.lineno}"
+            )
+        self.logger.log_json(
+            event="profile_memory",
+            stage=name,
+            file=f"{stem}.tracemalloc.txt",
+            peak_bytes=peak,
+            top=[{"site": f"{s.traceback[0].filename}:{s.traceback[0].lineno}",
+                  "size_bytes": s.size, "count": s.count} for s in top],
+        )
+
+    def close(self):
+        """
+        Stop the active profile, if any.
+        """
+        self.stop()
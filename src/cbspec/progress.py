@@ -0,0 +1,274 @@
+"""
+Progress reporting for the parquet ingestion pass.
+
+The total work is known up front from the parquet footers of all inputs
+(parquet_totals: rows and uncompressed bytes, no data pages read). Progress
+reports rows/s, accepted events/s, MB/s and the ETA in one of three modes:
+
+    - bar       → tqdm progress bar on the console (interactive terminals)
+    - heartbeat → a "progress" JSONL entry (and one run.log line) every
+                  `heartbeat_s` seconds, for batch schedulers where stdout is a file
+    - off       → only the final "progress_end" entry
+
+mode="auto" picks "bar" when stdout is a TTY and tqdm is installed, else
+"heartbeat".
+
+Serial and threaded ingestion call Progress.update() directly (thread-safe).
+Process-pool workers add to a ProgressCounter -- a lock-protected shared
+memory array handed to the pool through its initializer:
+
+    progress = Progress(rows, nbytes, logger, counter=ProgressCounter())
+    with ProcessPoolExecutor(initializer=init_worker_progress, initargs=(progress.counter,)) as pool:
+        ...                       # workers call worker_progress(rows, accepted, nbytes)
+    progress.close()
+
+A monitor thread in the parent polls the counter and refreshes the display.
+"""
+
+import multiprocessing
+import sys
+import threading
+import time
+
+from .logging_utils import RunLogger
+
+PROGRESS_MODES = ("auto", "bar", "heartbeat", "off")
+
+_ROWS, _ACCEPTED, _BYTES = range(3)
+
+
+def parquet_totals(paths):
+    """
+    Total rows and uncompressed bytes of parquet files, from their footers.
+
+    :param paths: list of str or Path
+    :return rows: int
+    :return nbytes: int
+    """
+    import pyarrow.parquet as pq
+
+    rows = 0
+    nbytes = 0
+    for path in paths:
+        meta = pq.ParquetFile(path).metadata
+        rows += meta.num_rows
+        nbytes += sum(meta.row_group(i).total_byte_size for i in range(meta.num_row_groups))
+    return rows, nbytes
+
+
+class ProgressCounter:
+    """
+    Rows/accepted/bytes counters in shared memory, safe to update from
+    processes that inherited it (pool initializer or Process args).
+    """
+
+    def __init__(self):
+        self._values = multiprocessing.Array("q", 3)
+
+    def add(self, rows=0, accepted=0, nbytes=0):
+        with self._values.get_lock():
+            self._values[_ROWS] += int(rows)
+            self._values[_ACCEPTED] += int(accepted)
+            self._values[_BYTES] += int(nbytes)
+
+    def read(self):
+        """
+        :return (rows, accepted, nbytes)
+        """
+        with self._values.get_lock():
+            return tuple(self._values)
+
+
+# Counter of the current pool worker (set by init_worker_progress)
+_worker_counter = None
+
+
+def init_worker_progress(counter: ProgressCounter):
+    """
+    Process-pool initializer: make `counter` the target of worker_progress().
+    """
+    global _worker_counter
+    _worker_counter = counter
+
+
+def worker_progress(rows=0, accepted=0, nbytes=0):
+    """
+    Report progress from a pool worker (no-op outside an initialized worker).
+    """
+    if _worker_counter is not None:
+        _worker_counter.add(rows, accepted, nbytes)
+
+
+def _resolve_mode(mode):
+    if mode not in PROGRESS_MODES:
+        raise ValueError(f"Unknown progress mode {mode!r}; use one of {', '.join(PROGRESS_MODES)}")
+    if mode != "auto":
+        return mode
+    if not sys.stdout.isatty():
+        return "heartbeat"
+    try:
+        import tqdm  # noqa: F401  (optional dependency)
+    except ImportError:
+        return "heartbeat"
+    return "bar"
+
+
+class Progress:
+    """
+    Ingestion progress over all input files.
+
+    :param total_rows: int
+                       Rows in all inputs (see parquet_totals)
+    :param total_bytes: int, optional
+                        Uncompressed bytes in all inputs
+    :param logger: RunLogger, optional
+                   Receives heartbeat and progress_end entries
+    :param mode: str
+                 "auto", "bar", "heartbeat" or "off" (see module docstring)
+    :param heartbeat_s: float
+                        Seconds between heartbeats
+    :param counter: ProgressCounter, optional
+                    Shared counter updated by pool workers; polled by a monitor thread
+    :param desc: str
+                 Label of the bar / heartbeat entries
+    """
+
+    def __init__(
+            self,
+            total_rows,
+            total_bytes=None,
+            logger: RunLogger = None,
+            mode="auto",
+            heartbeat_s=30.0,
+            counter: ProgressCounter = None,
+            desc="ingest",
+    ):
+        self.total_rows = int(total_rows)
+        self.total_bytes = None if total_bytes is None else int(total_bytes)
+        self.logger = logger
+        self.mode = _resolve_mode(mode)
+        self.heartbeat_s = heartbeat_s
+        self.counter = counter
+        self.desc = desc
+
+        self.rows = 0
+        self.accepted = 0
+        self.bytes = 0
+
+        self._lock = threading.Lock()
+        self._t0 = time.monotonic()
+        self._last_beat = self._t0
+        self._closed = False
+
+        self._bar = None
+        if self.mode == "bar":
+            from tqdm import tqdm
+
+            self._bar = tqdm(total=self.total_rows, desc=desc, unit="rows", unit_scale=True, dynamic_ncols=True)
+
+        self._monitor = None
+        self._stop = threading.Event()
+        if counter is not None:
+            self._monitor = threading.Thread(target=self._poll, name="cbspec-progress", daemon=True)
+            self._monitor.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def update(self, rows=0, accepted=0, nbytes=0):
+        """
+        Add processed rows, accepted events and bytes (thread-safe).
+        """
+        with self._lock:
+            self.rows += int(rows)
+            self.accepted += int(accepted)
+            self.bytes += int(nbytes)
+        self._refresh()
+
+    def _poll(self):
+        while not self._stop.wait(0.5):
+            self._refresh()
+
+    def _totals(self):
+        rows, accepted, nbytes = self.rows, self.accepted, self.bytes
+        if self.counter is not None:
+            c_rows, c_accepted, c_bytes = self.counter.read()
+            rows, accepted, nbytes = rows + c_rows, accepted + c_accepted, nbytes + c_bytes
+        return rows, accepted, nbytes
+
+    def snapshot(self):
+        """
+        Current progress and rates.
+
+        :return dict: rows, total_rows, fraction, accepted, mb, elapsed_s,
+                      rows_per_s, accepted_per_s, mb_per_s, eta_s
+        """
+        rows, accepted, nbytes = self._totals()
+        elapsed = max(time.monotonic() - self._t0, 1e-9)
+        rows_per_s = rows / elapsed
+        remaining = max(self.total_rows - rows, 0)
+        return {
+            "rows": rows,
+            "total_rows": self.total_rows,
+            "fraction": rows / self.total_rows if self.total_rows else None,
+            "accepted": accepted,
+            "mb": nbytes / 2**20,
+            "elapsed_s": elapsed,
+            "rows_per_s": rows_per_s,
+            "accepted_per_s": accepted / elapsed,
+            "mb_per_s": nbytes / 2**20 / elapsed,
+            "eta_s": remaining / rows_per_s if rows_per_s > 0 else None,
+        }
+
+    def _refresh(self):
+        if self._closed:
+            return
+        if self._bar is not None:
+            with self._lock:
+                snap = self.snapshot()
+                self._bar.n = snap["rows"]
+                self._bar.set_postfix(
+                    accepted_per_s=f"{snap['accepted_per_s']:.3g}",
+                    MB_per_s=f"{snap['mb_per_s']:.3g}",
+                    refresh=False,
+                )
+                self._bar.refresh()
+        elif self.mode == "heartbeat":
+            now = time.monotonic()
+            with self._lock:
+                if now - self._last_beat < self.heartbeat_s:
+                    return
+                self._last_beat = now
+            self._beat("progress")
+
+    def _beat(self, event):
+        if self.logger is None:
+            return
+        snap = self.snapshot()
+        eta = "?" if snap["eta_s"] is None else f"{snap['eta_s']:.0f} s"
+        self.logger.log_text(
+            f"{self.desc}: {snap['rows']}/{self.total_rows} rows "
+            f"({100 * (snap['fraction'] or 0):.1f}%), {snap['rows_per_s']:.3g} rows/s, "
+            f"{snap['accepted_per_s']:.3g} accepted/s, {snap['mb_per_s']:.3g} MB/s, ETA {eta}"
+        )
+        self.logger.log_json(event=event, desc=self.desc, **{k: round(v, 6) if isinstance(v, float) else v
+                                                           for k, v in snap.items()})
+
+    def close(self):
+        """
+        Stop the monitor thread, close the bar and log a final progress_end entry.
+        """
+        if self._closed:
+            return
+        if self._monitor is not None:
+            self._stop.set()
+            self._monitor.join()
+        if self._bar is not None:
+            self._bar.n = self._totals()[0]
+            self._bar.close()
+        self._closed = True
+        self._beat("progress_end")
@@ -0,0 +1,100 @@
+"""
+Provenance helpers: configuration hashing and input-file fingerprints.
+
+These helpers give every run a stable identity:
+    - config_to_dict → JSON-serializable view of the configuration dataclasses
+    - config_hash    → SHA-256 of that view (order-independent)
+    - file_fingerprint → cheap identity of an input file (path, size, mtime)
+
+Fingerprints intentionally avoid hashing file contents -- the MC and data
+parquet files are many GB, and size + modification time is sufficient to
+detect a replaced or appended file.
+"""
+
+import hashlib
+import json
+import os
+from dataclasses import asdict, is_dataclass
+from pathlib import Path
+
+import numpy as np
+
+
+def _jsonable(value):
+    """
+    Convert numpy arrays/scalars, Paths and dataclasses into JSON-serializable values.
+    """
+    if is_dataclass(value):
+        return {k: _jsonable(v) for k, v in asdict(value).items()}
+    if isinstance(value, dict):
+        return {str(k): _jsonable(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_jsonable(v) for v in value]
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, Path):
+        return str(value)
+    return value
+
+
+def config_to_dict(**sections):
+    """
+    Build a JSON-serializable dictionary from configuration sections.
+
+    :param sections: dataclasses or plain values keyed by section name,
+                     e.g. array=array_cfg, spectrum=spectrum_cfg, quality_cuts=cuts_cfg
+    :return config: dict
+    """
+    return {name: _jsonable(section) for name, section in sections.items()}
+
+
+def stable_hash(value):
+    """
+    SHA-256 hex digest of any JSON-serializable value (keys sorted).
+    """
+    payload = json.dumps(_jsonable(value), sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def config_hash(**sections):
+    """
+    Hash configuration sections into a stable SHA-256 hex digest.
+
+    :param sections: see config_to_dict
+    :return digest: str
+    """
+    return stable_hash(config_to_dict(**sections))
+
+
+def file_fingerprint(path):
+    """
+    Cheap identity of an input file.
+
+    :param path: str or Path
+    :return fingerprint: dict
+                         {"path", "size", "mtime_ns"}; size/mtime are None if the
+                         file does not exist
+    """
+    path = Path(path)
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return {"path": str(path.resolve()), "size": None, "mtime_ns": None}
+    return {"path": str(path.resolve()), "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+def file_fingerprints(paths):
+    """
+    Fingerprints of a file setting that may hold one file, several or none.
+
+    :param paths: str, Path, list/tuple of them, or None
+    :return fingerprint: dict, list of dict or None
+                         file_fingerprint of each file (None without a file)
+    """
+    if paths is None:
+        return None
+    if isinstance(paths, (list, tuple)):
+        return [file_fingerprint(p) for p in paths]
+    return file_fingerprint(paths)
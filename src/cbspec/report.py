@@ -0,0 +1,118 @@
+"""
+Performance report for a single cbspec run.
+
+    python -m cbspec report output/runs/<timestamp>
+
+Reads the RunLogger spans in <run_dir>/logs/run.jsonl and builds:
+    - a stage breakdown: wall time, share of the run, CPU time, CPU
+      utilisation, peak-RSS growth and cache status per top-level span
+    - a throughput table: events (rows) and bytes per second for every span
+      name that processed rows (stages and parquet batches)
+"""
+
+from pathlib import Path
+
+from .run_registry import read_jsonl
+
+
+def load_spans(run_dir):
+    """
+    Read the span entries of a run.
+
+    :param run_dir: str or Path
+                    Run directory (output/runs/<timestamp>) or a run.jsonl file
+    :return spans: list of dict
+    :return events: list of dict
+                    All JSONL entries
+    """
+    path = Path(run_dir)
+    if path.is_dir():
+        path = path / "logs" / "run.jsonl"
+    if not path.exists():
+        raise FileNotFoundError(f"No JSONL log found at {path}")
+
+    events = read_jsonl(path)
+    return [e for e in events if e.get("event") == "span"], events
+
+
+def run_wall_seconds(events):
+    """
+    Wall time between pipeline_start and pipeline_end (None if incomplete).
+    """
+    marks = {e["event"]: e.get("mono_s") for e in events if e.get("event") in ("pipeline_start", "pipeline_end")}
+    if marks.get("pipeline_start") is None or marks.get("pipeline_end") is None:
+        return None
+    return marks["pipeline_end"] - marks["pipeline_start"]
+
+
+def stage_breakdown(spans, total_s=None):
+    """
+    Aggregate top-level spans by name (in first-seen order).
+
+    :param spans: list of dict
+                  See load_spans
+    :param total_s: float, optional
+                    Run wall time used for the share column (default: sum of spans)
+    :return rows: list of tuple
+                  (name, cache, calls, wall_s, share_%, cpu_s, cpu/wall, peak_rss_delta_MB)
+    """
+    agg = {}
+    for span in spans:
+        if span.get("parent") is not None:
+            continue
+        a = agg.setdefault(span["name"], {"cache": set(), "calls": 0, "wall": 0., "cpu": 0., "rss": 0})
+        a["calls"] += 1
+        a["wall"] += span["wall_s"]
+        a["cpu"] += span["cpu_s"]
+        a["rss"] += span["rss_peak_delta_bytes"]
+        if "cache" in span:
+            a["cache"].add(span["cache"])
+
+    if total_s is None:
+        total_s = sum(a["wall"] for a in agg.values())
+
+    return [
+        (
+            name,
+            "/".join(sorted(a["cache"])) or "-",
+            a["calls"],
+            a["wall"],
+            100. * a["wall"] / total_s if total_s else None,
+            a["cpu"],
+            a["cpu"] / a["wall"] if a["wall"] > 0 else None,
+            a["rss"] / 2**20,
+        )
+        for name, a in agg.items()
+    ]
+
+
+def throughput(spans):
+    """
+    Rows and bytes per second for every span name that processed rows.
+
+    :param spans: list of dict
+    :return rows: list of tuple
+                  (name, calls, rows, wall_s, rows_per_s, MB, MB_per_s)
+    """
+    agg = {}
+    for span in spans:
+        if not span.get("rows"):
+            continue
+        a = agg.setdefault(span["name"], {"calls": 0, "rows": 0, "bytes": 0, "wall": 0.})
+        a["calls"] += 1
+        a["rows"] += span["rows"]
+        a["bytes"] += span.get("bytes", 0)
+        a["wall"] += span["wall_s"]
+
+    return [
+        (
+            name,
+            a["calls"],
+            a["rows"],
+            a["wall"],
+            a["rows"] / a["wall"] if a["wall"] > 0 else None,
+            a["bytes"] / 2**20,
+            a["bytes"] / 2**20 / a["wall"] if a["wall"] > 0 and a["bytes"] else None,
+        )
+        for name, a in agg.items()
+    ]
@@ -0,0 +1,170 @@
+"""
+Columnar results store for a single cbspec run.
+
+Every array produced by the pipeline (filtered and unfiltered counts, mask,
+bin edges, aperture, exposure, flux, spectrum, FC bounds, ...) is written into
+ONE Arrow IPC file together with the run configuration:
+
+    output/runs/<timestamp>/data/{array_type}_results.arrow
+
+Layout:
+    - One row, one column per array
+    - Each column is a list<dtype> of a numeric or boolean dtype (strings
+      belong in the configuration); multi-dimensional arrays are stored
+      flattened and their shapes recorded in the schema metadata
+    - Nested result dictionaries are flattened with "." separators,
+      e.g. "energy_scale.flux"
+    - Schema metadata (all keys prefixed with "cbspec."):
+        schema_version, array_type, config_hash, config (JSON), shapes (JSON),
+        created
+
+The file is uncompressed so that load_results() can memory-map it and return
+numpy views on the Arrow buffers without copying (boolean arrays excepted,
+since Arrow bit-packs them).
+
+Arrow IPC is used instead of Parquet because Parquet always decodes into new
+buffers; readers that only need a few arrays from hundreds of runs pay only
+for the pages they touch.
+"""
+
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pyarrow as pa
+
+from .logging_utils import RunLogger
+
+SCHEMA_VERSION = 1
+META_PREFIX = "cbspec."
+
+
+def _flatten_results(results, prefix=""):
+    """
+    Flatten a (possibly nested) results dictionary into {name: np.ndarray}.
+
+    None entries are skipped.
+
+    :raise TypeError: for an entry that is not numeric or boolean (strings,
+                      objects): load_results could not read it back zero-copy
+    """
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if value is None:
+            continue
+        if isinstance(value, dict):
+            flat.update(_flatten_results(value, prefix=f"{name}."))
+            continue
+        array = np.asarray(value)
+        if array.dtype.kind not in "biuf":
+            raise TypeError(f"Results entry {name!r} has dtype {array.dtype}; "
+                            "only numeric and boolean arrays can be stored")
+        flat[name] = array
+    return flat
+
+
+def save_results(
+        path,
+        results,
+        array_type: str,
+        config: dict,
+        config_digest: str,
+        logger: RunLogger = None,
+):
+    """
+    Write all result arrays and run metadata into one Arrow IPC file.
+
+    :param path: str or Path
+                 Destination file (e.g. ".../data/TASD_results.arrow")
+    :param results: dict
+                    Arrays to store. Nested dictionaries are flattened.
+    :param array_type: str
+                       "TASD" or "CBSD"
+    :param config: dict
+                   JSON-serializable configuration (see provenance.config_to_dict)
+    :param config_digest: str
+                          Configuration hash (see provenance.config_hash)
+    :param logger: RunLogger, optional
+    :raise TypeError: if a results entry is not numeric or boolean
+    :return path: Path
+                  Path to the written file
+
+    Notes:
+        - The file is written to a temporary name and renamed into place, so a
+          reader never sees a partially written results file.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    flat = _flatten_results(results)
+
+    columns = {}
+    shapes = {}
+    for name, array in flat.items():
+        shapes[name] = list(array.shape)
+        columns[name] = pa.array([array.ravel()], type=pa.list_(pa.from_numpy_dtype(array.dtype)))
+
+    metadata = {
+        f"{META_PREFIX}schema_version": str(SCHEMA_VERSION),
+        f"{META_PREFIX}array_type": array_type,
+        f"{META_PREFIX}config_hash": config_digest,
+        f"{META_PREFIX}config": json.dumps(config, sort_keys=True, default=str),
+        f"{META_PREFIX}shapes": json.dumps(shapes),
+        f"{META_PREFIX}created": datetime.now().isoformat(timespec="seconds"),
+    }
+    table = pa.table(columns).replace_schema_metadata(metadata)
+
+    if logger is not None:
+        logger.log_text(f"Saving {path.name} to {path.parent}...")
+        logger.log_json(event=f"save_{path.name}", columns=len(columns))
+
+    tmp_path = path.with_name(f".{path.name}.tmp-{os.getpid()}")
+    with pa.OSFile(str(tmp_path), "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp_path, path)
+
+    return path
+
+
+def load_results(path, columns=None):
+    """
+    Load a results file written by save_results.
+
+    :param path: str or Path
+                 Results file
+    :param columns: list of str, optional
+                    Subset of arrays to return (default: all)
+    :return arrays: dict
+                    {name: np.ndarray}. Numeric arrays are zero-copy views on
+                    the memory-mapped file; they stay valid after this call.
+    :return metadata: dict
+                      schema_version, array_type, config_hash, config (dict),
+                      created
+    """
+    source = pa.memory_map(str(path), "r")
+    table = pa.ipc.open_file(source).read_all()
+
+    raw_meta = {k.decode(): v.decode() for k, v in (table.schema.metadata or {}).items()}
+    shapes = json.loads(raw_meta.get(f"{META_PREFIX}shapes", "{}"))
+
+    metadata = {
+        "schema_version": int(raw_meta.get(f"{META_PREFIX}schema_version", 0)),
+        "array_type": raw_meta.get(f"{META_PREFIX}array_type"),
+        "config_hash": raw_meta.get(f"{META_PREFIX}config_hash"),
+        "config": json.loads(raw_meta.get(f"{META_PREFIX}config", "{}")),
+        "created": raw_meta.get(f"{META_PREFIX}created"),
+    }
+
+    names = table.column_names if columns is None else columns
+    arrays = {}
+    for name in names:
+        values = table.column(name).chunk(0).values
+        zero_copy = not pa.types.is_boolean(values.type)
+        array = values.to_numpy(zero_copy_only=zero_copy)
+        arrays[name] = array.reshape(shapes.get(name, [len(array)]))
+
+    return arrays, metadata
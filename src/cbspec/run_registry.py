@@ -0,0 +1,536 @@
+"""
+SQLite registry indexing every cbspec run under output/runs/.
+
+Each completed run writes a run record (output/runs/<timestamp>/run_record.json)
+and registers it in:
+
+    output/runs.sqlite
+
+Tables:
+    runs          → one row per run: directory, status, array type, config hash,
+                    input files, final event counts, total wall time
+    run_params    → flattened configuration, e.g. ("quality_cuts.theta_deg", 45.0)
+    run_inputs    → input file fingerprints (role, path, size, mtime)
+    run_stages    → per-stage wall time in seconds
+    run_artifacts → data/plot/log files produced by the run
+
+All lookups used by `cbspec runs list/query/diff` hit indexed columns, so
+"the last CBSD run with theta_deg=45 on the 2025 data file" is a single query
+instead of a grep through thousands of run.jsonl files.
+
+`rebuild_registry` backfills the index from existing run directories. It uses
+run_record.json when present, and otherwise reconstructs what it can from the
+results store metadata and logs/run.jsonl (runs from before the registry).
+"""
+
+import json
+import sqlite3
+from datetime import datetime
+from pathlib import Path
+
+REGISTRY_FILENAME = "runs.sqlite"
+RECORD_FILENAME = "run_record.json"
+
+# JSONL events that mark the start of a pipeline stage (in pipeline order)
+STAGE_EVENTS = (
+    "pipeline_start",
+    "type_select",
+    "parquet_ingest",
+    "create_bins",
+    "mc_productions",
+    "bin_energy",
+    "event_histograms",
+    "filter_energy",
+    "convert_log10_eV",
+    "aperture",
+    "exposure",
+    "feldman_cousins",
+    "flux",
+    "spectrum",
+    "energy_scale_scan",
+    "zenith_histograms",  # logs of runs before parquet_ingest filled the zenith histograms
+    "zenith_aperture",
+    "zenith_flux",
+    "save_outputs",
+    "plotting",
+    "publish_outputs",
+    "pipeline_end",
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id          TEXT PRIMARY KEY,
+    run_dir         TEXT NOT NULL,
+    started         TEXT,
+    finished        TEXT,
+    status          TEXT,
+    array_type      TEXT,
+    config_hash     TEXT,
+    mc_file         TEXT,
+    dt_file         TEXT,
+    n_mc_reco       INTEGER,
+    n_data          INTEGER,
+    n_mc_thrown     INTEGER,
+    n_data_in_bins  REAL,
+    total_seconds   REAL
+);
+CREATE INDEX IF NOT EXISTS idx_runs_array_started ON runs (array_type, started);
+CREATE INDEX IF NOT EXISTS idx_runs_config_hash ON runs (config_hash);
+
+CREATE TABLE IF NOT EXISTS run_params (
+    run_id  TEXT NOT NULL REFERENCES runs (run_id) ON DELETE CASCADE,
+    key     TEXT NOT NULL,
+    value   TEXT,
+    num     REAL
+);
+CREATE INDEX IF NOT EXISTS idx_params_key_num ON run_params (key, num);
+CREATE INDEX IF NOT EXISTS idx_params_key_value ON run_params (key, value);
+CREATE INDEX IF NOT EXISTS idx_params_run ON run_params (run_id);
+
+CREATE TABLE IF NOT EXISTS run_inputs (
+    run_id    TEXT NOT NULL REFERENCES runs (run_id) ON DELETE CASCADE,
+    role      TEXT,
+    path      TEXT,
+    size      INTEGER,
+    mtime_ns  INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_inputs_path ON run_inputs (path);
+CREATE INDEX IF NOT EXISTS idx_inputs_run ON run_inputs (run_id);
+
+CREATE TABLE IF NOT EXISTS run_stages (
+    run_id   TEXT NOT NULL REFERENCES runs (run_id) ON DELETE CASCADE,
+    stage    TEXT NOT NULL,
+    seconds  REAL
+);
+CREATE INDEX IF NOT EXISTS idx_stages_run ON run_stages (run_id);
+
+CREATE TABLE IF NOT EXISTS run_artifacts (
+    run_id  TEXT NOT NULL REFERENCES runs (run_id) ON DELETE CASCADE,
+    kind    TEXT,
+    path    TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_artifacts_run ON run_artifacts (run_id);
+"""
+
+_RUN_COLUMNS = (
+    "run_id", "run_dir", "started", "finished", "status", "array_type", "config_hash",
+    "mc_file", "dt_file", "n_mc_reco", "n_data", "n_mc_thrown", "n_data_in_bins",
+    "total_seconds",
+)
+
+# Comparison operators accepted by query filters, longest first
+_OPERATORS = (">=", "<=", "!=", "=", ">", "<")
+
+
+def flatten_config(config, prefix=""):
+    """
+    Flatten a nested configuration dict into {"section.key": value}.
+    """
+    flat = {}
+    for key, value in (config or {}).items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten_config(value, prefix=f"{name}."))
+        else:
+            flat[name] = value
+    return flat
+
+
+def stage_timings_from_events(events):
+    """
+    Derive per-stage wall time from JSONL events.
+
+    Top-level RunLogger spans named after a stage give the timing directly.
+    For logs without spans, a stage lasts from its start event to the next
+    stage event, using the monotonic "mono_s" field (or, in older logs, the
+    second-resolution "time" field).
+
+    :param events: list of dict
+                   Parsed run.jsonl entries
+    :return timings: dict
+                     {stage: seconds}
+    """
+    spans = [
+        e for e in events
+        if e.get("event") == "span" and e.get("parent") is None and e.get("name") in STAGE_EVENTS
+    ]
+    if spans:
+        timings = {}
+        for span in spans:
+            timings[span["name"]] = timings.get(span["name"], 0.) + float(span["wall_s"])
+        return timings
+
+    marks = []
+    for entry in events:
+        if entry.get("event") not in STAGE_EVENTS:
+            continue
+        if "mono_s" in entry:
+            t = float(entry["mono_s"])
+        else:
+            t = datetime.strptime(entry["time"], "%Y-%m-%d %H:%M:%S").timestamp()
+        marks.append((entry["event"], t))
+
+    timings = {}
+    for (stage, t0), (_, t1) in zip(marks[:-1], marks[1:]):
+        timings[stage] = timings.get(stage, 0.) + (t1 - t0)
+    return timings
+
+
+def _artifact_kind(path: Path):
+    if path.suffix == ".png":
+        return "plot"
+    if path.parent.name == "logs":
+        return "log"
+    return "data"
+
+
+def list_artifacts(run_dir: Path):
+    """
+    List all files produced inside a run directory.
+
+    :return artifacts: list of (kind, path)
+    """
+    run_dir = Path(run_dir)
+    return [
+        (_artifact_kind(p), str(p))
+        for p in sorted(run_dir.rglob("*"))
+        if p.is_file() and p.name != RECORD_FILENAME
+    ]
+
+
+def write_run_record(run_dir: Path, record: dict):
+    """
+    Write run_record.json into the run directory.
+    """
+    path = Path(run_dir) / RECORD_FILENAME
+    with open(path, "w") as f:
+        json.dump(record, f, indent=2, default=str)
+    return path
+
+
+def read_jsonl(path: Path):
+    """
+    Parse a run.jsonl file, skipping truncated or malformed lines.
+
+    :return events: list of dict
+    """
+    events = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                try:
+                    events.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue
+    return events
+
+
+def record_from_run_dir(run_dir: Path):
+    """
+    Reconstruct a run record from an existing run directory.
+
+    Preference order:
+        1. run_record.json (written by every run since the registry exists)
+        2. results store metadata (config + hash) + logs/run.jsonl
+        3. logs/run.jsonl only (array type, inputs, counts, stage timings)
+
+    :return record: dict or None
+                    None if the directory does not look like a cbspec run
+    """
+    run_dir = Path(run_dir)
+    record_path = run_dir / RECORD_FILENAME
+    if record_path.exists():
+        with open(record_path) as f:
+            return json.load(f)
+
+    jsonl_path = run_dir / "logs" / "run.jsonl"
+    if not jsonl_path.exists():
+        return None
+    events = read_jsonl(jsonl_path)
+
+    record = {
+        "run_id": run_dir.name,
+        "run_dir": str(run_dir),
+        "started": events[0]["time"].replace(" ", "T") if events else None,
+        "finished": None,
+        "status": "incomplete",
+        "array_type": None,
+        "config_hash": None,
+        "config": {},
+        "inputs": [],
+        "counts": {},
+        "stage_timings": stage_timings_from_events(events),
+        "artifacts": list_artifacts(run_dir),
+    }
+
+    totals = {}
+    for entry in events:
+        event = entry.get("event")
+        if event == "pipeline_start":
+            record["array_type"] = entry.get("array")
+        elif event == "pipeline_end":
+            record["status"] = "completed"
+            record["finished"] = entry.get("time", "").replace(" ", "T")
+        elif event == "input_file":
+            role = "mc" if entry.get("index") == 0 else "dt"
+            record["inputs"].append({"role": role, "path": entry.get("file")})
+        elif event == "running_total":
+            totals[entry.get("file")] = entry.get("total")
+
+    for inp in record["inputs"]:
+        key = "n_mc_reco" if inp["role"] == "mc" else "n_data"
+        if inp["path"] in totals:
+            record["counts"][key] = totals[inp["path"]]
+
+    # Config + hash from the results store, if the run got that far
+    for results_path in sorted((run_dir / "data").glob("*_results.arrow")):
+        try:
+            from .results_store import load_results
+            _, meta = load_results(results_path, columns=[])
+        except Exception:
+            continue
+        record["config"] = meta["config"]
+        record["config_hash"] = meta["config_hash"]
+        record["array_type"] = record["array_type"] or meta["array_type"]
+        break
+
+    return record
+
+
+class RunRegistry:
+    """
+    SQLite index of cbspec runs.
+
+    :param path: Path
+                 Registry database file, normally output/runs.sqlite.
+                 Created (with schema) on first use.
+
+    Notes:
+        - Each register() call is one transaction; concurrent runs are
+          serialized by SQLite's file lock (timeout 30 s).
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(self.path), timeout=30.)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA foreign_keys = ON")
+        self.conn.executescript(_SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    # Writing
+    def register(self, record: dict):
+        """
+        Insert or replace one run record.
+
+        :param record: dict
+                       Keys: run_id, run_dir, started, finished, status, array_type,
+                       config_hash, config, inputs, counts, stage_timings, artifacts
+        """
+        counts = record.get("counts") or {}
+        inputs = record.get("inputs") or []
+        files = {inp.get("role"): inp.get("path") for inp in inputs}
+        timings = record.get("stage_timings") or {}
+
+        row = {
+            "run_id": record["run_id"],
+            "run_dir": record["run_dir"],
+            "started": record.get("started"),
+            "finished": record.get("finished"),
+            "status": record.get("status"),
+            "array_type": record.get("array_type"),
+            "config_hash": record.get("config_hash"),
+            "mc_file": files.get("mc"),
+            "dt_file": files.get("dt"),
+            "n_mc_reco": counts.get("n_mc_reco"),
+            "n_data": counts.get("n_data"),
+            "n_mc_thrown": counts.get("n_mc_thrown"),
+            "n_data_in_bins": counts.get("n_data_in_bins"),
+            "total_seconds": sum(timings.values()) if timings else None,
+        }
+
+        with self.conn:
+            self.conn.execute("DELETE FROM runs WHERE run_id = ?", (row["run_id"],))
+            self.conn.execute(
+                f"INSERT INTO runs ({', '.join(_RUN_COLUMNS)}) "
+                f"VALUES ({', '.join('?' for _ in _RUN_COLUMNS)})",
+                [row[c] for c in _RUN_COLUMNS],
+            )
+            self.conn.executemany(
+                "INSERT INTO run_params (run_id, key, value, num) VALUES (?, ?, ?, ?)",
+                [
+                    (
+                        row["run_id"],
+                        key,
+                        json.dumps(value, default=str),
+                        float(value) if isinstance(value, (int, float)) and not isinstance(value, bool) else None,
+                    )
+                    for key, value in flatten_config(record.get("config")).items()
+                ],
+            )
+            self.conn.executemany(
+                "INSERT INTO run_inputs (run_id, role, path, size, mtime_ns) VALUES (?, ?, ?, ?, ?)",
+                [
+                    (row["run_id"], inp.get("role"), inp.get("path"), inp.get("size"), inp.get("mtime_ns"))
+                    for inp in inputs
+                ],
+            )
+            self.conn.executemany(
+                "INSERT INTO run_stages (run_id, stage, seconds) VALUES (?, ?, ?)",
+                [(row["run_id"], stage, seconds) for stage, seconds in timings.items()],
+            )
+            self.conn.executemany(
+                "INSERT INTO run_artifacts (run_id, kind, path) VALUES (?, ?, ?)",
+                [(row["run_id"], kind, path) for kind, path in record.get("artifacts") or []],
+            )
+
+    # Reading
+    def query(self, where=(), array_type=None, input_like=None, status=None, limit=None):
+        """
+        Find runs matching parameter filters, newest first.
+
+        :param where: iterable of str
+                      Filters on flattened config keys, e.g. "quality_cuts.theta_deg=45",
+                      "run.time_s>=5e8". Operators: = != >= <= > <
+        :param array_type: str, optional
+                           "TASD" or "CBSD"
+        :param input_like: str, optional
+                           Substring of an input file path (SQL LIKE %...%)
+        :param status: str, optional
+                       e.g. "completed"
+        :param limit: int, optional
+        :return rows: list of sqlite3.Row (columns of the runs table)
+        """
+        sql = ["SELECT runs.* FROM runs"]
+        join_args = []
+        conds = []
+        args = []
+
+        for i, expr in enumerate(where):
+            key, op, value = _parse_filter(expr)
+            alias = f"p{i}"
+            sql.append(f"JOIN run_params {alias} ON {alias}.run_id = runs.run_id AND {alias}.key = ?")
+            join_args.append(key)
+            try:
+                conds.append(f"{alias}.num {op} ?")
+                args.append(float(value))
+            except ValueError:
+                conds.append(f"{alias}.value {op} ?")
+                args.append(json.dumps(value))
+
+        if input_like:
+            conds.append("runs.run_id IN (SELECT run_id FROM run_inputs WHERE path LIKE ?)")
+            args.append(f"%{input_like}%")
+        if array_type:
+            conds.append("runs.array_type = ?")
+            args.append(array_type)
+        if status:
+            conds.append("runs.status = ?")
+            args.append(status)
+
+        if conds:
+            sql.append("WHERE " + " AND ".join(conds))
+        sql.append("ORDER BY runs.started DESC, runs.run_id DESC")
+        if limit:
+            sql.append("LIMIT ?")
+            args.append(int(limit))
+
+        return self.conn.execute(" ".join(sql), join_args + args).fetchall()
+
+    def get(self, run_id: str):
+        """
+        Full record of one run: run row, params, inputs, stage timings, artifacts.
+
+        :return record: dict or None
+        """
+        row = self.conn.execute("SELECT * FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+        if row is None:
+            return None
+        record = dict(row)
+        record["params"] = {
+            r["key"]: json.loads(r["value"])
+            for r in self.conn.execute("SELECT key, value FROM run_params WHERE run_id = ?", (run_id,))
+        }
+        record["inputs"] = [
+            dict(r) for r in self.conn.execute(
+                "SELECT role, path, size, mtime_ns FROM run_inputs WHERE run_id = ?", (run_id,)
+            )
+        ]
+        record["stage_timings"] = {
+            r["stage"]: r["seconds"]
+            for r in self.conn.execute("SELECT stage, seconds FROM run_stages WHERE run_id = ?", (run_id,))
+        }
+        record["artifacts"] = [
+            (r["kind"], r["path"])
+            for r in self.conn.execute("SELECT kind, path FROM run_artifacts WHERE run_id = ?", (run_id,))
+        ]
+        return record
+
+    def diff(self, run_a: str, run_b: str):
+        """
+        Compare two runs.
+
+        :return diff: dict
+                      {"params": [(key, a, b)], "runs": [(column, a, b)],
+                       "stages": [(stage, a_s, b_s)]} -- params/runs only where different
+        """
+        a, b = self.get(run_a), self.get(run_b)
+        if a is None or b is None:
+            missing = run_a if a is None else run_b
+            raise KeyError(f"Run {missing} is not in the registry {self.path}")
+
+        params = [
+            (key, a["params"].get(key), b["params"].get(key))
+            for key in sorted(set(a["params"]) | set(b["params"]))
+            if a["params"].get(key) != b["params"].get(key)
+        ]
+        runs = [
+            (col, a[col], b[col])
+            for col in _RUN_COLUMNS
+            if col not in ("run_id", "run_dir") and a[col] != b[col]
+        ]
+        stages = [
+            (stage, a["stage_timings"].get(stage), b["stage_timings"].get(stage))
+            for stage in STAGE_EVENTS
+            if stage in a["stage_timings"] or stage in b["stage_timings"]
+        ]
+        return {"params": params, "runs": runs, "stages": stages}
+
+
+def _parse_filter(expr: str):
+    """
+    Split "key<op>value" into (key, op, value).
+    """
+    for op in _OPERATORS:
+        if op in expr:
+            key, value = expr.split(op, 1)
+            return key.strip(), op, value.strip()
+    raise ValueError(f"Invalid filter {expr!r}: expected key=value (operators: {', '.join(_OPERATORS)})")
+
+
+def rebuild_registry(registry: RunRegistry, runs_dir: Path):
+    """
+    Backfill the registry from every run directory under runs_dir.
+
+    :return n_registered: int
+    """
+    n_registered = 0
+    for run_dir in sorted(Path(runs_dir).iterdir()):
+        if not run_dir.is_dir():
+            continue
+        record = record_from_run_dir(run_dir)
+        if record is None:
+            continue
+        registry.register(record)
+        n_registered += 1
+    return n_registered
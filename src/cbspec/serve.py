@@ -0,0 +1,401 @@
+"""
+Resident analysis server: event data loaded once, spectra on request.
+
+    python -m cbspec serve --config config/default_config.yaml --array TASD --array CBSD
+    python -m cbspec serve --socket /tmp/cbspec.sock
+
+At start-up the energies and quality-cut variables of every MC and data event
+(process_data.load_cut_variables, no cuts applied) are read once per array
+type and kept in memory. Each request then re-applies the cuts in memory and
+runs the binning → spectrum stages (stages.py, no on-disk cache, no run
+directory), typically in milliseconds.
+
+JSON API (HTTP on host:port, or on a Unix socket):
+
+    GET  /health       → loaded array types, event counts, input fingerprints
+    GET  /stats        → result-cache size, hits and misses
+    POST /spectrum     → flux/spectrum arrays for the requested settings
+    POST /invalidate   → reload inputs whose files changed ({"force": true}
+                         reloads regardless; {"array_type": "TASD"} limits it)
+                         and clear the result cache
+
+A /spectrum request overrides the YAML configuration with the same layout,
+plus the confidence level:
+
+    {"array_type": "CBSD",
+     "energy": {"bins": [18.5, 18.7, 19.0, 19.5, 20.0]},
+     "quality_cuts": {"theta_deg": 40},
+     "geometry": {"generated_area_m2": 1.9e9},
+     "run": {"time_s": 4.0e8},
+     "fc_cl": 0.9}
+
+The merged settings go through the same checks as `cbspec check`
+(preflight.check_settings); invalid ones are answered with 400.
+
+Responses are held in an LRU cache keyed by the hash of the request and the
+fingerprints of the loaded input files. Non-finite floats are returned as null.
+"""
+
+import json
+import math
+import socketserver
+import threading
+import time
+from collections import OrderedDict
+from copy import deepcopy
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from .cut_expressions import clear_compiled_cuts, compile_cuts
+from .data_classes import ArrayConfig
+from .load_config import config_from_dict
+from .logging_utils import RunLogger
+from .main import select_input_files
+from .preflight import check_settings
+from .process_data import load_cut_variables, quality_mask
+from .provenance import file_fingerprint, stable_hash
+from .stages import StageRunner, pipeline_settings
+
+# YAML sections a /spectrum request may override
+REQUEST_SECTIONS = ("energy", "geometry", "run", "quality_cuts")
+
+# Stages evaluated per request (everything downstream of the in-memory cuts)
+SERVE_STAGES = (
+    "create_bins",
+    "bin_energy",
+    "filter_energy",
+    "convert_log10_eV",
+    "aperture",
+    "exposure",
+    "feldman_cousins",
+    "flux",
+    "spectrum",
+)
+
+DEFAULT_FC_CL = 0.68
+
+
+class ResultCache:
+    """
+    Least-recently-used cache of responses (thread-safe).
+
+    :param maxsize: int
+                    Entries kept; 0 disables caching
+    """
+
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {"size": len(self._entries), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses}
+
+
+def _json_safe(value):
+    """
+    numpy → lists/scalars, non-finite floats → None.
+    """
+    if isinstance(value, dict):
+        return {str(k): _json_safe(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_json_safe(v) for v in value]
+    if isinstance(value, np.ndarray):
+        return _json_safe(value.tolist())
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    return value
+
+
+def _merge(base, overrides):
+    """
+    Recursively merge override dicts into a copy of base.
+    """
+    merged = deepcopy(base)
+    for key, value in overrides.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = _merge(merged[key], value)
+        else:
+            merged[key] = value
+    return merged
+
+
+class AnalysisServer:
+    """
+    In-memory event store plus spectrum computation for `cbspec serve`.
+
+    :param cfg: dict
+                Raw YAML configuration (defaults of every request)
+    :param array_types: iterable of str
+                        Array types to load ("TASD", "CBSD")
+    :param logger: RunLogger
+    :param cache_size: int
+                       Responses kept in the LRU cache
+    """
+
+    def __init__(self, cfg, array_types, logger: RunLogger, cache_size=128):
+        self.cfg = cfg
+        self.logger = logger
+        self.cache = ResultCache(cache_size)
+        self._events = {}
+        self._lock = threading.Lock()
+        self._compute_lock = threading.Lock()  # stages (FCpy) run one request at a time
+        for array_type in array_types:
+            self.load(array_type)
+
+        # Import the stage modules now (FCpy) so the first request is as fast as the others
+        from . import feldman_cousins  # noqa: F401
+
+    def _input_files(self, array_type):
+        array_cfg = select_input_files(ArrayConfig(array_type=array_type, mc_file=None, dt_file=None), self.cfg)
+        return array_cfg.mc_file, array_cfg.dt_file
+
+    def load(self, array_type):
+        """
+        (Re)load the MC and data events of one array type.
+        """
+        mc_file, dt_file = self._input_files(array_type)
+        t0 = time.monotonic()
+        # Extra columns used by the configured cut expressions are kept in memory too
+        columns = compile_cuts(config_from_dict(self.cfg)[2]).columns
+        events = {
+            "mc_file": mc_file,
+            "dt_file": dt_file,
+            "inputs": [file_fingerprint(mc_file), file_fingerprint(dt_file)],
+            "mc": load_cut_variables(mc_file, array_type, self.logger, columns=columns),
+            "dt": load_cut_variables(dt_file, array_type, self.logger, columns=columns),
+        }
+        with self._lock:
+            self._events[array_type] = events
+        n_mc, n_dt = len(events["mc"]["logen"]), len(events["dt"]["logen"])
+        self.logger.log_text(
+            f"Loaded {array_type}: {n_mc} MC and {n_dt} data events in {time.monotonic() - t0:.2f} s"
+        )
+        self.logger.log_json(event="serve_load", array=array_type, n_mc=n_mc, n_data=n_dt,
+                             inputs=events["inputs"])
+
+    def invalidate(self, array_type=None, force=False):
+        """
+        Reload array types whose input files changed (all of them if force)
+        and clear the result cache and the compiled-cut cache.
+
+        :return reloaded: list of str
+        """
+        with self._lock:
+            loaded = list(self._events)
+        if array_type is not None:
+            if array_type not in loaded:
+                raise ValueError(f"Array type {array_type} is not loaded (loaded: {', '.join(loaded)})")
+            loaded = [array_type]
+
+        reloaded = []
+        for name in loaded:
+            current = [file_fingerprint(path) for path in self._input_files(name)]
+            if force or current != self._events[name]["inputs"]:
+                self.load(name)
+                reloaded.append(name)
+        self.cache.clear()
+        clear_compiled_cuts()
+        self.logger.log_json(event="serve_invalidate", reloaded=reloaded, force=force)
+        return reloaded
+
+    def health(self):
+        with self._lock:
+            return {
+                "status": "ok",
+                "arrays": {
+                    name: {
+                        "n_mc": len(ev["mc"]["logen"]),
+                        "n_data": len(ev["dt"]["logen"]),
+                        "inputs": ev["inputs"],
+                    }
+                    for name, ev in self._events.items()
+                },
+            }
+
+    def spectrum(self, request):
+        """
+        Flux and spectrum for one request (see module docstring).
+
+        :param request: dict
+        :return response: dict
+        """
+        unknown = set(request) - set(REQUEST_SECTIONS) - {"array_type", "fc_cl"}
+        if unknown:
+            raise ValueError(f"Unknown request keys {sorted(unknown)}; "
+                             f"use array_type, fc_cl, {', '.join(REQUEST_SECTIONS)}")
+        with self._lock:
+            loaded = dict(self._events)
+        array_type = request.get("array_type", next(iter(loaded)))
+        if array_type not in loaded:
+            raise ValueError(f"Array type {array_type} is not loaded (loaded: {', '.join(loaded)})")
+        events = loaded[array_type]
+
+        key = stable_hash({"request": request, "array_type": array_type, "inputs": events["inputs"]})
+        cached = self.cache.get(key)
+        if cached is not None:
+            return {**cached, "cached": True}
+
+        with self._compute_lock:
+            response = self._compute(request, array_type, events, key)
+        self.cache.put(key, response)
+        return {**response, "cached": False}
+
+    def _compute(self, request, array_type, events, key):
+        t0 = time.monotonic()
+        overrides = {section: request[section] for section in REQUEST_SECTIONS if section in request}
+        array_cfg, spectrum_cfg, cuts_cfg, _, _ = config_from_dict(
+            _merge(self.cfg, {**overrides, "array": {"type": array_type}})
+        )
+        errors, _ = check_settings(spectrum_cfg, cuts_cfg)
+        if errors:
+            raise ValueError("Invalid request: " + "; ".join(errors))
+        array_cfg.mc_file, array_cfg.dt_file = events["mc_file"], events["dt_file"]
+        fc_cl = float(request.get("fc_cl", DEFAULT_FC_CL))
+        if not 0 < fc_cl < 1:
+            raise ValueError(f"fc_cl must be in (0, 1), got {fc_cl}")
+
+        mc, dt = events["mc"], events["dt"]
+        mc_mask = quality_mask(mc, cuts_cfg)
+        dt_mask = quality_mask(dt, cuts_cfg)
+
+        runner = StageRunner(
+            settings=pipeline_settings(array_cfg, spectrum_cfg, cuts_cfg, fc_cl=fc_cl, progress="off"),
+            logger=self.logger,
+        )
+        runner.seed(
+            "parquet_ingest",
+            {
+                "mc_array": mc["logen"][mc_mask],
+                "dt_array": dt["logen"][dt_mask],
+                "mc_thrown_array": mc["mclogen"],
+            },
+            stable_hash({"inputs": events["inputs"], "array_type": array_type, "quality_cuts": cuts_cfg}),
+        )
+        out = runner.run(SERVE_STAGES)
+
+        response = _json_safe({
+            "array_type": array_type,
+            "request_hash": key,
+            "fc_cl": fc_cl,
+            "n_mc_reco": int(mc_mask.sum()),
+            "n_data": int(dt_mask.sum()),
+            "n_mc_thrown": len(mc["mclogen"]),
+            "edges": out["edges"],
+            "mask": out["mask"],
+            "centers": out["centers_f"],
+            "widths": out["widths_f"],
+            "mc_counts": out["mc_counts_f"],
+            "dt_counts": out["dt_counts_f"],
+            "mc_thrown_counts": out["mc_thrown_counts_f"],
+            "aperture": out["aperture"],
+            "exposure": out["exposure"],
+            "flux": out["flux"],
+            "flux_lower": out["flux_lower"],
+            "flux_upper": out["flux_upper"],
+            "spectrum": out["spectrum"],
+            "spectrum_lower": out["spectrum_lower"],
+            "spectrum_upper": out["spectrum_upper"],
+        })
+        elapsed_ms = 1e3 * (time.monotonic() - t0)
+        response["compute_ms"] = elapsed_ms
+        self.logger.log_json(event="serve_spectrum", array=array_type, request_hash=key, compute_ms=elapsed_ms)
+        return response
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = "cbspec"
+
+    def address_string(self):
+        # Unix-socket clients have no (host, port) address
+        return self.client_address[0] if isinstance(self.client_address, tuple) else "unix"
+
+    def _send(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if not length:
+            return {}
+        payload = json.loads(self.rfile.read(length))
+        if not isinstance(payload, dict):
+            raise ValueError("Request body must be a JSON object")
+        return payload
+
+    def _dispatch(self, routes):
+        route = routes.get(self.path.split("?", 1)[0])
+        if route is None:
+            self._send(404, {"error": f"Unknown endpoint {self.command} {self.path}"})
+            return
+        try:
+            self._send(200, route())
+        except (ValueError, KeyError, TypeError) as exc:
+            self._send(400, {"error": f"{type(exc).__name__}: {exc}"})
+        except Exception as exc:
+            self.server.analysis.logger.log_json(event="serve_error", path=self.path, error=repr(exc))
+            self._send(500, {"error": f"{type(exc).__name__}: {exc}"})
+
+    def do_GET(self):
+        analysis = self.server.analysis
+        self._dispatch({
+            "/health": analysis.health,
+            "/stats": analysis.cache.stats,
+        })
+
+    def do_POST(self):
+        analysis = self.server.analysis
+        self._dispatch({
+            "/spectrum": lambda: analysis.spectrum(self._read_json()),
+            "/invalidate": lambda: {"reloaded": analysis.invalidate(**self._read_json())},
+        })
+
+
+class _UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def make_server(analysis: AnalysisServer, host="127.0.0.1", port=8765, socket_path=None):
+    """
+    HTTP server exposing `analysis` on host:port, or on a Unix socket.
+
+    :return httpd: socketserver.BaseServer
+    """
+    if socket_path is not None:
+        httpd = _UnixHTTPServer(str(socket_path), _Handler)
+    else:
+        httpd = ThreadingHTTPServer((host, port), _Handler)
+    httpd.analysis = analysis
+    return httpd
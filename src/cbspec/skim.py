@@ -0,0 +1,250 @@
+"""
+Skims: the events passing the quality cuts, written as compact parquet.
+
+    python -m cbspec --skim                     # or a `skim:` block in the YAML
+    # then point data.<array>.mc_file/dt_file at run_dir/skim/<array>_{mc,dt}_skim.parquet
+
+With skimming enabled, the parquet ingestion pass streams the passing rows
+of both inputs into the run directory:
+
+    output/runs/<timestamp>/skim/{array_type}_mc_skim.parquet
+    output/runs/<timestamp>/skim/{array_type}_dt_skim.parquet
+    output/runs/<timestamp>/skim/{array_type}_mc_thrown.parquet   (mclogen of every MC row)
+
+Skim files hold:
+    - the projected input columns (skim.columns, default: all), with list
+      columns flattened to the element the pipeline reads
+      (process_data.LIST_ELEMENT; other list columns: branch index s)
+    - logen (and mclogen for MC): log10(E/eV) as computed by the pipeline
+    - metadata "cbspec.skim": array type, tree type, quality cuts, source
+      file fingerprint, flattened elements and the thrown companion file
+
+Rows are buffered up to skim.row_group_size and written one row group at a
+time with skim.compression (default zstd), so memory stays bounded.
+
+Reading a skim back (process_data.set_up_energy_array detects the metadata)
+skips the cuts -- they were applied when the skim was written -- and takes
+the thrown MC energies from the companion file, so the spectrum matches the
+run that wrote the skim. A skim can only be used with the quality cuts it
+was made with; preflight reports a mismatch as an error.
+"""
+
+import json
+from dataclasses import asdict
+from pathlib import Path
+
+import numpy as np
+
+from .data_classes import QualityCuts, SkimConfig
+from .logging_utils import RunLogger
+from .provenance import file_fingerprint
+
+METADATA_KEY = b"cbspec.skim"
+
+
+def read_skim_metadata(parquet_file):
+    """
+    Skim metadata of an open pyarrow.parquet.ParquetFile (None for other files).
+    """
+    metadata = parquet_file.schema_arrow.metadata or {}
+    if METADATA_KEY not in metadata:
+        return None
+    return json.loads(metadata[METADATA_KEY])
+
+
+def thrown_path(skim_path, meta):
+    """
+    Companion file with the thrown MC energies of an MC skim.
+    """
+    return Path(skim_path).parent / meta["thrown_file"]
+
+
+def check_cuts(meta, cuts: QualityCuts):
+    """
+    Error message if a skim was made with other quality cuts (None if they match).
+    """
+    if meta["quality_cuts"] == asdict(cuts):
+        return None
+    stored = meta["quality_cuts"]
+    changed = sorted(k for k, v in asdict(cuts).items() if stored.get(k) != v)
+    made_with = ", ".join(f"{k}={stored.get(k)}" for k in changed)
+    configured = ", ".join(f"{k}={getattr(cuts, k)}" for k in changed)
+    return f"skim was made with other quality cuts ({made_with}; configured: {configured})"
+
+
+class SkimWriter:
+    """
+    Streams cut-passing rows of the ingestion pass into skim files.
+
+    :param skim_dir: Path
+                     Destination directory (run_dir/skim)
+    :param array_type: str
+    :param cuts: QualityCuts
+                 Cuts applied by the ingestion pass (stored in the metadata)
+    :param skim_cfg: SkimConfig
+    :param logger: RunLogger
+    """
+
+    def __init__(self, skim_dir, array_type, cuts: QualityCuts, skim_cfg: SkimConfig, logger: RunLogger):
+        self.skim_dir = Path(skim_dir)
+        self.array_type = array_type
+        self.cuts = cuts
+        self.cfg = skim_cfg
+        self.logger = logger
+        self.paths = []
+        self._writer = None
+        self._thrown_writer = None
+        self._pending = []
+        self._pending_rows = 0
+
+    def open(self, role, infile, parquet_file):
+        """
+        Start the skim of one input file.
+
+        :param role: str
+                     "mc" or "dt"
+        """
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        from .process_data import BRANCH, LIST_ELEMENT, detect_tree_type
+
+        schema = parquet_file.schema_arrow
+        self.role = role
+        self.tree_type = detect_tree_type(schema.names)
+        columns = list(self.cfg.columns) if self.cfg.columns else list(schema.names)
+        missing = [c for c in columns if c not in schema.names]
+        if missing:
+            raise ValueError(f"skim.columns {missing} are not columns of {infile}")
+        self.columns = [c for c in columns if c not in ("logen", "mclogen")]
+
+        # Element kept per list column
+        self.elements = {}
+        for name in self.columns:
+            field_type = schema.field(name).type
+            if pa.types.is_list(field_type) or pa.types.is_large_list(field_type):
+                self.elements[name] = LIST_ELEMENT[self.tree_type].get(name, BRANCH[self.tree_type])
+
+        self.skim_dir.mkdir(parents=True, exist_ok=True)
+        self.path = self.skim_dir / f"{self.array_type}_{role}_skim.parquet"
+        thrown_file = f"{self.array_type}_mc_thrown.parquet" if role == "mc" else None
+        self.meta = {
+            "array_type": self.array_type,
+            "role": role,
+            "tree_type": self.tree_type,
+            "quality_cuts": asdict(self.cuts),
+            "source": file_fingerprint(infile),
+            "elements": self.elements,
+            "thrown_file": thrown_file,
+        }
+        self._metadata = {METADATA_KEY: json.dumps(self.meta).encode()}
+        self._writer = None
+        if thrown_file is not None:
+            thrown_schema = pa.schema([("mclogen", pa.float64())], metadata=self._metadata)
+            self._thrown_writer = pq.ParquetWriter(
+                self.skim_dir / thrown_file, thrown_schema, compression=self.cfg.compression
+            )
+
+    def write(self, batch, rows, logen, mclogen=None):
+        """
+        Add the passing rows of one batch.
+
+        :param batch: pyarrow.RecordBatch
+                      Batch as read from parquet
+        :param rows: np.ndarray of int
+                     Positions in batch of the rows passing the cuts
+        :param logen: np.ndarray
+                      Their reconstructed log10(E/eV)
+        :param mclogen: np.ndarray, optional
+                        Thrown log10(E/eV) of every row of batch (MC only)
+        """
+        import pyarrow as pa
+        import pyarrow.compute as pc
+
+        indices = pa.array(rows)
+        columns = {}
+        for name in self.columns:
+            column = batch.column(name).take(indices)
+            if name in self.elements:
+                column = pc.list_element(column, self.elements[name])
+            columns[name] = column
+        columns["logen"] = pa.array(np.asarray(logen, dtype=float))
+        if self.role == "mc":
+            columns["mclogen"] = pa.array(np.asarray(mclogen, dtype=float)[rows])
+            self._thrown_writer.write_table(
+                pa.table({"mclogen": pa.array(np.asarray(mclogen, dtype=float))})
+            )
+
+        self._pending.append(pa.table(columns))
+        self._pending_rows += len(rows)
+        if self._pending_rows >= self.cfg.row_group_size:
+            self._flush()
+
+    def _flush(self, final=False):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if not self._pending:
+            return
+        table = pa.concat_tables(self._pending)
+        if self._writer is None:
+            self._writer = pq.ParquetWriter(
+                self.path, table.schema.with_metadata(self._metadata), compression=self.cfg.compression
+            )
+        size = self.cfg.row_group_size
+        n_full = len(table) // size * size if not final else len(table)
+        if n_full:
+            self._writer.write_table(table.slice(0, n_full).replace_schema_metadata(self._metadata),
+                                     row_group_size=size)
+        rest = table.slice(n_full)
+        self._pending = [rest] if len(rest) else []
+        self._pending_rows = len(rest)
+
+    def close_file(self):
+        """
+        Flush and close the skim of the current input file.
+
+        :return path: Path
+        """
+        import pyarrow as pa
+
+        self._flush(final=True)
+        if self._writer is None:
+            # No passing events: still write an (empty) skim with the full schema
+            import pyarrow.parquet as pq
+
+            empty = pa.table({name: pa.array([], type=pa.float64()) for name in self.columns + ["logen"]})
+            pq.write_table(empty.replace_schema_metadata(self._metadata), self.path, compression=self.cfg.compression)
+        else:
+            self._writer.close()
+        if self._thrown_writer is not None:
+            self._thrown_writer.close()
+            self._thrown_writer = None
+        self.paths.append(self.path)
+        self.logger.log_text(f"Skim of {self.meta['source']['path']} written to {self.path}")
+        self.logger.log_json(event="skim_written", role=self.role, file=str(self.path),
+                             source=self.meta["source"]["path"], columns=self.columns + ["logen"])
+        return self.path
+
+
+def read_skim(parquet_file, infile, meta, cuts: QualityCuts, batch_size=160000):
+    """
+    Reconstructed (and for MC, thrown) log10(E/eV) of a skim.
+
+    :raise ValueError: if the skim was made with other quality cuts
+    :return logen: np.ndarray
+    :return mclogen_thrown: np.ndarray or None
+                            Thrown energies of every MC row (None for data skims)
+    """
+    import pyarrow.parquet as pq
+
+    problem = check_cuts(meta, cuts)
+    if problem is not None:
+        raise ValueError(f"{infile}: {problem}")
+
+    logen = [b.column("logen").to_numpy() for b in parquet_file.iter_batches(batch_size=batch_size, columns=["logen"])]
+    logen = np.concatenate(logen) if logen else np.empty(0)
+    if meta["role"] != "mc":
+        return logen, None
+    thrown = pq.read_table(thrown_path(infile, meta), columns=["mclogen"]).column("mclogen").to_numpy()
+    return logen, thrown
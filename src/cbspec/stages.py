@@ -0,0 +1,739 @@
+"""
+Stage-level memoization DAG for the cbspec pipeline.
+
+The physics pipeline is expressed as a set of stages. Each stage declares:
+    - params → pipeline settings it reads (config subsections, e.g. "quality_cuts")
+    - files  → settings holding input file paths (fingerprinted: path, size, mtime)
+    - deps   → upstream stages whose outputs it consumes
+
+A stage's cache key is the hash of its name, code version, param values, file
+fingerprints and the *content hashes* of its upstream outputs. Outputs are
+content-hashed and stored on disk:
+
+    output/cache/stages/<stage>/<key>.pkl       → pickled outputs
+    output/cache/stages/<stage>/<key>.json      → output hash + metadata
+
+On a rerun only stages whose inputs changed are executed. Because keys use
+upstream *content* hashes, a recomputed stage that produces identical outputs
+does not invalidate anything downstream. Changing only run.time_s, for
+example, re-executes exposure → flux → spectrum and reuses the parquet
+ingestion, binning, histograms and aperture from the cache.
+
+A StageRunner can also keep the latest outputs of each stage in memory
+(`memory`, status "memory"): pipeline.Pipeline shares that store between the
+runners of successive configurations, so a notebook edit recomputes only
+the stages whose keys changed.
+
+With a `zenith` binning configured, parquet_ingest also fills log10(E/eV) ×
+cos θ (or sec θ) histograms in its batch loop -- one bincount per batch over
+the accepted events, no second pass over the inputs -- and zenith_aperture /
+zenith_flux push the 2D counts through compute_aperture, compute_exposure
+and compute_flux. Without it parquet_ingest's zenith_hist is None, the two
+stages return None and cost nothing, and the energy bins never enter the
+parquet_ingest key.
+
+With `mc_productions` configured, the mc_productions stage streams every MC
+production (in parallel) into stacked reco/thrown histograms; bin_energy,
+event_histograms and aperture take the MC side from it and the aperture
+combines the productions (productions.py). Without it the stage returns None
+and the MC comes from parquet_ingest as before.
+
+Plot histograms are binned once by the event_histograms stage; a fully cached
+run therefore never loads the per-event parquet_ingest outputs from disk.
+
+Stage names match the JSONL stage events used by run_registry, so per-stage
+timings stay comparable between cached and uncached runs. Every executed
+stage (and every cache load) is wrapped in a RunLogger span carrying its
+wall/CPU time, peak-RSS growth, events processed and pickled output size.
+"""
+
+import hashlib
+import json
+import os
+import pickle
+from contextlib import nullcontext
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable
+
+import numpy as np
+
+from .binning import make_energy_bins, histogram_events, histgram_data_per_bin, filter_bins, energy_conv
+from .constants import hist_range, hist_bins
+from .exposure import compute_aperture, compute_exposure
+from .flux import compute_flux
+from .spectrum import flux_to_spectrum
+from .provenance import file_fingerprints, stable_hash
+from .logging_utils import DEBUG, RunLogger
+
+
+@dataclass(frozen=True)
+class Stage:
+    """
+    Declaration of one pipeline stage.
+
+    :param name: str
+                 Stage name (also the JSONL event name)
+    :param func: Callable
+                 func(settings: dict, inputs: dict, logger: RunLogger) -> dict of outputs.
+                 `inputs` holds the merged outputs of all deps.
+    :param params: tuple of str
+                   Settings keys the stage depends on
+    :param files: tuple of str
+                  Settings keys holding input file paths
+    :param deps: tuple of str
+                 Upstream stage names
+    :param version: int
+                    Bump to invalidate cached outputs after a code change
+    """
+    name: str
+    func: Callable
+    params: tuple = ()
+    files: tuple = ()
+    deps: tuple = ()
+    version: int = 1
+
+
+# Stage implementations
+# Modules pulling in pyarrow/pandas (process_data) or FCpy (feldman_cousins,
+# systematics) are imported inside the stage that needs them, so importing
+# cbspec, the CLI, or a fully cached run does not pay for them.
+def _ingest(settings, inputs, logger):
+    from .process_data import set_up_energy_array
+    from .progress import Progress, parquet_totals
+
+    logger.log_text("Reading parquet files and applying quality cuts...")
+    # With MC productions (mc_productions stage) only the data file is ingested
+    infiles = [settings["mc_file"], settings["dt_file"]]
+    total_rows, total_bytes = parquet_totals([f for f in infiles if f is not None])
+    skim = None
+    if settings.get("skim") is not None:
+        from .skim import SkimWriter
+
+        skim = SkimWriter(settings["skim_dir"], settings["array_type"], settings["quality_cuts"],
+                          settings["skim"], logger)
+    histograms = None
+    zenith_cfg = settings["zenith"]
+    if zenith_cfg is not None:
+        from .process_data import EventHistograms
+
+        # Filled in the same pass from the cut variables of the accepted events
+        logger.log_text(f"Binning events in log10(E/eV) × {zenith_cfg.axis} while reading...")
+        histograms = EventHistograms(("logen", zenith_cfg.axis),
+                                     (make_energy_bins(settings["zenith_en_range"])[0], zenith_cfg.edges))
+    checkpoint = None
+    checkpoint_dir = settings.get("checkpoint_dir")
+    if checkpoint_dir is not None and skim is None:
+        from .checkpoint import MANIFEST, IngestCheckpoint
+
+        # Saved every checkpoint_s (0: never); an existing checkpoint is always resumed
+        if settings.get("checkpoint_s") or (Path(checkpoint_dir) / MANIFEST).exists():
+            checkpoint = IngestCheckpoint(checkpoint_dir, infiles, settings["array_type"], settings["quality_cuts"],
+                                          logger, interval_s=settings.get("checkpoint_s") or 0.,
+                                          histograms=histograms)
+    with Progress(
+        total_rows,
+        total_bytes,
+        logger=logger,
+        mode=settings.get("progress", "auto"),
+        heartbeat_s=settings.get("heartbeat_s", 30.0),
+    ) as progress:
+        mc_array, dt_array, mc_thrown_array = set_up_energy_array(
+            infiles=infiles,
+            array_type=settings["array_type"],
+            cuts=settings["quality_cuts"],
+            logger=logger,
+            progress=progress,
+            skim=skim,
+            checkpoint=checkpoint,
+            jit=settings.get("jit"),
+            histograms=histograms,
+        )
+    if checkpoint is not None:
+        checkpoint.remove()
+    zenith_hist = None
+    if histograms is not None:
+        zenith_hist = {
+            "axis": zenith_cfg.axis,
+            "zenith_edges": zenith_cfg.edges,
+            "mc_counts": histograms.counts[0],
+            "dt_counts": histograms.counts[1],
+            "mc_thrown_counts": histograms.counts[2],
+        }
+    return {"mc_array": mc_array, "dt_array": dt_array, "mc_thrown_array": mc_thrown_array,
+            "zenith_hist": zenith_hist}
+
+
+def _bins(settings, inputs, logger):
+    logger.log_text("Creating energy bins...")
+    edges, centers, widths = make_energy_bins(settings["en_range"])
+    return {"edges": edges, "centers": centers, "widths": widths}
+
+
+def _productions(settings, inputs, logger):
+    productions_cfg = settings["mc_productions"]
+    if productions_cfg is None:
+        return {"productions": None}
+
+    from .productions import histogram_productions
+    from .progress import Progress, ProgressCounter, parquet_totals
+
+    logger.log_text(f"Binning {len(productions_cfg.productions)} MC productions...")
+    total_rows, total_bytes = parquet_totals([p.file for p in productions_cfg.productions])
+    with Progress(
+        total_rows,
+        total_bytes,
+        logger=logger,
+        mode=settings.get("progress", "auto"),
+        heartbeat_s=settings.get("heartbeat_s", 30.0),
+        counter=ProgressCounter(),
+        desc="mc_productions",
+    ) as progress:
+        productions = histogram_productions(
+            productions_cfg,
+            settings["array_type"],
+            settings["quality_cuts"],
+            inputs["edges"],
+            np.linspace(hist_range[0], hist_range[1], hist_bins + 1),
+            logger,
+            max_workers=settings.get("production_workers"),
+            progress=progress,
+        )
+    logger.add_to_span(rows=int(productions["n_mc_thrown"].sum()))
+    return {"productions": productions}
+
+
+def _histograms(settings, inputs, logger):
+    logger.log_text("Binning energy arrays...")
+    productions = inputs["productions"]
+    if productions is None:
+        mc_counts, dt_counts, mc_thrown_counts = histgram_data_per_bin(
+            inputs["mc_array"], inputs["dt_array"], inputs["mc_thrown_array"], inputs["edges"]
+        )
+    else:
+        # MC counts of all productions (raw; the aperture uses the weighted ones)
+        dt_counts = histogram_events(inputs["dt_array"], inputs["edges"])
+        mc_counts = productions["mc_counts"].sum(axis=0)
+        mc_thrown_counts = productions["mc_thrown_counts"].sum(axis=0)
+    logger.add_to_span(rows=len(inputs["mc_array"]) + len(inputs["dt_array"]) + len(inputs["mc_thrown_array"]))
+    return {"mc_counts": mc_counts, "dt_counts": dt_counts, "mc_thrown_counts": mc_thrown_counts}
+
+
+def _event_histograms(settings, inputs, logger):
+    # Fixed-range histograms for the MC/data plots, so plotting never touches event arrays
+    logger.log_text("Binning event histograms for plotting...")
+    hist_edges = np.linspace(hist_range[0], hist_range[1], hist_bins + 1)
+    logger.add_to_span(rows=len(inputs["mc_array"]) + len(inputs["dt_array"]) + len(inputs["mc_thrown_array"]))
+    productions = inputs["productions"]
+    if productions is not None:
+        return {
+            "hist_edges": hist_edges,
+            "mc_hist": productions["mc_hist"].sum(axis=0),
+            "mc_thrown_hist": productions["mc_thrown_hist"].sum(axis=0),
+            "dt_hist": histogram_events(inputs["dt_array"], hist_edges),
+            "n_mc_reco": int(productions["n_mc_reco"].sum()),
+            "n_data": len(inputs["dt_array"]),
+            "n_mc_thrown": int(productions["n_mc_thrown"].sum()),
+        }
+    return {
+        "hist_edges": hist_edges,
+        "mc_hist": histogram_events(inputs["mc_array"], hist_edges),
+        "mc_thrown_hist": histogram_events(inputs["mc_thrown_array"], hist_edges),
+        "dt_hist": histogram_events(inputs["dt_array"], hist_edges),
+        "n_mc_reco": len(inputs["mc_array"]),
+        "n_data": len(inputs["dt_array"]),
+        "n_mc_thrown": len(inputs["mc_thrown_array"]),
+    }
+
+
+def _filter(settings, inputs, logger):
+    # Filter bins (log10(E/eV) > 18.5, N_MC_Thrown > 1)
+    logger.log_text("Filtering energy bins...")
+    mask, mc_counts_f, dt_counts_f, mc_thrown_counts_f, centers_f = filter_bins(
+        inputs["mc_counts"], inputs["dt_counts"], inputs["mc_thrown_counts"], inputs["centers"]
+    )
+    return {
+        "mask": mask,
+        "mc_counts_f": mc_counts_f,
+        "dt_counts_f": dt_counts_f,
+        "mc_thrown_counts_f": mc_thrown_counts_f,
+        "centers_f": centers_f,
+        "widths_f": inputs["widths"][mask],
+    }
+
+
+def _energies(settings, inputs, logger):
+    logger.log_text("Converting log10(E/eV) to eV...")
+    energies_ev, delta_energies_ev = energy_conv(inputs["centers_f"], inputs["widths_f"])
+    return {"energies_ev": energies_ev, "delta_energies_ev": delta_energies_ev}
+
+
+def _aperture(settings, inputs, logger):
+    productions = inputs["productions"]
+    if productions is not None:
+        from .productions import combine_productions
+
+        logger.log_text(f"Combining {len(productions['names'])} MC productions into one aperture...")
+        aperture, diagnostics = combine_productions(productions, inputs["mask"])
+        return {"aperture": aperture, "production_apertures": diagnostics}
+
+    logger.log_text("Calculating aperture...")
+    aperture = compute_aperture(
+        inputs["mc_counts_f"],
+        inputs["mc_thrown_counts_f"],
+        settings["generated_area_m2"],
+        settings["generated_solid_angle_sr"],
+    )
+    return {"aperture": aperture, "production_apertures": None}
+
+
+def _exposure(settings, inputs, logger):
+    logger.log_text("Calculating exposure...")
+    return {"exposure": compute_exposure(inputs["aperture"], settings["run_time_s"])}
+
+
+def _feldman_cousins(settings, inputs, logger):
+    from .feldman_cousins import feldman_cousins_vector
+
+    logger.log_text("Calculating Feldman-Cousins intervals...")
+    fc_lower, fc_upper = feldman_cousins_vector(inputs["dt_counts_f"], cl=settings["fc_cl"])
+    return {"fc_lower": fc_lower, "fc_upper": fc_upper}
+
+
+def _flux(settings, inputs, logger):
+    logger.log_text("Calculating Flux J(E)...")
+    exposure = inputs["exposure"]
+    delta_energies_ev = inputs["delta_energies_ev"]
+    return {
+        "flux": compute_flux(inputs["dt_counts_f"], exposure, delta_energies_ev),
+        "flux_lower": compute_flux(inputs["fc_lower"], exposure, delta_energies_ev),
+        "flux_upper": compute_flux(inputs["fc_upper"], exposure, delta_energies_ev),
+    }
+
+
+def _spectrum(settings, inputs, logger):
+    logger.log_text("Calculating Spectrum E³J(E)...")
+    spectrum, spectrum_lower, spectrum_upper = flux_to_spectrum(
+        inputs["energies_ev"], inputs["flux"], inputs["flux_lower"], inputs["flux_upper"]
+    )
+    return {"spectrum": spectrum, "spectrum_lower": spectrum_lower, "spectrum_upper": spectrum_upper}
+
+
+def _energy_scale_scan(settings, inputs, logger):
+    escale_cfg = settings["energy_scale"]
+    if escale_cfg is None:
+        return {"scan": None}
+
+    from .systematics import run_energy_scale_scan
+
+    logger.log_text(f"Running energy-scale scan over scales {list(escale_cfg.scales)}...")
+    scan = run_energy_scale_scan(
+        inputs["mc_array"],
+        inputs["dt_array"],
+        inputs["mc_thrown_array"],
+        inputs["edges"],
+        inputs["centers"],
+        inputs["widths"],
+        settings["spectrum_cfg"],
+        escale_cfg,
+        cl=settings["fc_cl"],
+    )
+    n_events = len(inputs["dt_array"]) + (len(inputs["mc_array"]) if escale_cfg.apply_to_mc else 0)
+    logger.add_to_span(rows=n_events * len(escale_cfg.scales))
+    return {"scan": scan}
+
+
+def _zenith_aperture(settings, inputs, logger):
+    hist = inputs["zenith_hist"]
+    if hist is None:
+        return {"zenith_aperture": None}
+
+    # Same energy bins as the 1D pipeline (thrown counts are identical, so is the mask).
+    # Without a thrown zenith angle, each zenith band's acceptance is taken relative
+    # to all thrown events of its energy bin: the band apertures sum to AΩ(E).
+    logger.log_text(f"Calculating aperture in log10(E/eV) × {hist['axis']} bins...")
+    mask = inputs["mask"]
+    mc_counts_f = hist["mc_counts"][mask]
+    mc_thrown_counts_f = np.broadcast_to(hist["mc_thrown_counts"][mask][:, None], mc_counts_f.shape)
+    aperture = compute_aperture(
+        mc_counts_f,
+        mc_thrown_counts_f,
+        settings["generated_area_m2"],
+        settings["generated_solid_angle_sr"],
+    )
+    return {"zenith_aperture": {
+        "axis": hist["axis"],
+        "zenith_edges": hist["zenith_edges"],
+        "mc_counts_f": mc_counts_f,
+        "dt_counts_f": hist["dt_counts"][mask],
+        "aperture": aperture,
+    }}
+
+
+def _zenith_flux(settings, inputs, logger):
+    zenith = inputs["zenith_aperture"]
+    if zenith is None:
+        return {"zenith": None}
+
+    from .feldman_cousins import feldman_cousins_vector
+
+    logger.log_text(f"Calculating exposure, Feldman-Cousins intervals and flux per {zenith['axis']} bin...")
+    exposure = compute_exposure(zenith["aperture"], settings["run_time_s"])
+
+    # One FC interval per distinct count (the 2D grid repeats small counts a lot)
+    dt_counts_f = zenith["dt_counts_f"]
+    unique_counts, inverse = np.unique(dt_counts_f, return_inverse=True)
+    fc_lower, fc_upper = feldman_cousins_vector(unique_counts, cl=settings["fc_cl"])
+    fc_lower = fc_lower[inverse].reshape(dt_counts_f.shape)
+    fc_upper = fc_upper[inverse].reshape(dt_counts_f.shape)
+
+    energies_ev = inputs["energies_ev"][:, None]
+    delta_energies_ev = inputs["delta_energies_ev"][:, None]
+    flux = compute_flux(dt_counts_f, exposure, delta_energies_ev)
+    flux_lower = compute_flux(fc_lower, exposure, delta_energies_ev)
+    flux_upper = compute_flux(fc_upper, exposure, delta_energies_ev)
+    spectrum, spectrum_lower, spectrum_upper = flux_to_spectrum(energies_ev, flux, flux_lower, flux_upper)
+    logger.add_to_span(rows=len(unique_counts))
+    return {"zenith": {
+        **zenith,
+        "exposure": exposure,
+        "flux": flux,
+        "flux_lower": flux_lower,
+        "flux_upper": flux_upper,
+        "spectrum": spectrum,
+        "spectrum_lower": spectrum_lower,
+        "spectrum_upper": spectrum_upper,
+    }}
+
+
+# Pipeline DAG (in execution order)
+STAGES = (
+    Stage(
+        "parquet_ingest",
+        _ingest,
+        params=("array_type", "quality_cuts", "zenith", "zenith_en_range"),
+        files=("mc_file", "dt_file"),
+    ),
+    Stage("create_bins", _bins, params=("en_range",)),
+    Stage(
+        "mc_productions",
+        _productions,
+        params=("array_type", "quality_cuts", "mc_productions"),
+        files=("mc_production_files",),
+        deps=("create_bins",),
+    ),
+    Stage("bin_energy", _histograms, deps=("parquet_ingest", "create_bins", "mc_productions")),
+    Stage("event_histograms", _event_histograms, deps=("parquet_ingest", "mc_productions")),
+    Stage("filter_energy", _filter, deps=("bin_energy", "create_bins")),
+    Stage("convert_log10_eV", _energies, deps=("filter_energy",)),
+    Stage(
+        "aperture",
+        _aperture,
+        params=("generated_area_m2", "generated_solid_angle_sr"),
+        deps=("filter_energy", "mc_productions"),
+    ),
+    Stage("exposure", _exposure, params=("run_time_s",), deps=("aperture",)),
+    Stage("feldman_cousins", _feldman_cousins, params=("fc_cl",), deps=("filter_energy",)),
+    Stage("flux", _flux, deps=("filter_energy", "convert_log10_eV", "exposure", "feldman_cousins")),
+    Stage("spectrum", _spectrum, deps=("convert_log10_eV", "flux")),
+    Stage(
+        "energy_scale_scan",
+        _energy_scale_scan,
+        params=("energy_scale", "generated_area_m2", "generated_solid_angle_sr", "run_time_s", "fc_cl"),
+        deps=("parquet_ingest", "create_bins"),
+    ),
+    Stage(
+        "zenith_aperture",
+        _zenith_aperture,
+        params=("generated_area_m2", "generated_solid_angle_sr"),
+        deps=("parquet_ingest", "filter_energy"),
+    ),
+    Stage(
+        "zenith_flux",
+        _zenith_flux,
+        params=("run_time_s", "fc_cl"),
+        deps=("zenith_aperture", "convert_log10_eV"),
+    ),
+)
+STAGE_NAMES = tuple(stage.name for stage in STAGES)
+
+
+def pipeline_settings(
+        array_cfg,
+        spectrum_cfg,
+        cuts_cfg,
+        energy_scale_cfg=None,
+        fc_cl=0.68,
+        progress="auto",
+        heartbeat_s=30.0,
+        skim=None,
+        skim_dir=None,
+        zenith=None,
+        checkpoint_s=0.,
+        checkpoint_dir=None,
+        mc_productions=None,
+        production_workers=None,
+        jit=None,
+):
+    """
+    Flatten the configuration dataclasses into the settings read by the stages.
+
+    progress/heartbeat_s only control reporting, skim/skim_dir only add an
+    output of parquet_ingest (skim.py) and checkpoint_s/checkpoint_dir only
+    make it resumable (checkpoint.py), production_workers only sizes the
+    process pool of mc_productions and jit only picks the numba or NumPy
+    selection path (fused.py, identical arrays); none of them is declared as a param
+    of any stage, so they never change a cache key.
+
+    :return settings: dict
+    """
+    return {
+        "array_type": array_cfg.array_type,
+        # MC productions replace the single MC file
+        "mc_file": None if array_cfg.mc_file is None or mc_productions is not None else Path(array_cfg.mc_file),
+        "dt_file": None if array_cfg.dt_file is None else Path(array_cfg.dt_file),
+        "quality_cuts": cuts_cfg,
+        "en_range": spectrum_cfg.en_range,
+        "generated_area_m2": spectrum_cfg.generated_area_m2,
+        "generated_solid_angle_sr": spectrum_cfg.generated_solid_angle_sr,
+        "run_time_s": spectrum_cfg.run_time_s,
+        "fc_cl": fc_cl,
+        "energy_scale": energy_scale_cfg,
+        "spectrum_cfg": spectrum_cfg,
+        "progress": progress,
+        "heartbeat_s": heartbeat_s,
+        "skim": skim,
+        "skim_dir": skim_dir,
+        "zenith": zenith,
+        # Energy edges of the zenith histograms filled by parquet_ingest
+        "zenith_en_range": None if zenith is None else spectrum_cfg.en_range,
+        "checkpoint_s": checkpoint_s,
+        "checkpoint_dir": checkpoint_dir,
+        "mc_productions": mc_productions,
+        "mc_production_files": () if mc_productions is None else tuple(
+            Path(p.file) for p in mc_productions.productions
+        ),
+        "production_workers": production_workers,
+        "jit": jit,
+    }
+
+
+def serialize_outputs(outputs):
+    """
+    Pickle stage outputs and hash the payload.
+
+    :return payload: bytes
+    :return output_hash: str
+                         Content hash used in downstream cache keys
+    """
+    payload = pickle.dumps(outputs, protocol=pickle.HIGHEST_PROTOCOL)
+    return payload, hashlib.blake2b(payload, digest_size=32).hexdigest()
+
+
+class StageCache:
+    """
+    On-disk store of stage outputs keyed by stage name and cache key.
+
+    :param cache_dir: Path
+                      Root directory, e.g. output/cache/stages
+
+    Notes:
+        - Entries are written to a temporary file and renamed into place, so
+          concurrent runs never read a partial entry.
+    """
+
+    def __init__(self, cache_dir: Path):
+        self.cache_dir = Path(cache_dir)
+
+    def _paths(self, stage_name, key):
+        stage_dir = self.cache_dir / stage_name
+        return stage_dir / f"{key}.pkl", stage_dir / f"{key}.json"
+
+    def meta(self, stage_name, key):
+        """
+        Return the metadata of a cached entry, or None on a miss.
+        """
+        data_path, meta_path = self._paths(stage_name, key)
+        if not (data_path.exists() and meta_path.exists()):
+            return None
+        with open(meta_path) as f:
+            return json.load(f)
+
+    def load(self, stage_name, key):
+        data_path, _ = self._paths(stage_name, key)
+        with open(data_path, "rb") as f:
+            return pickle.load(f)
+
+    def store(self, stage_name, key, payload: bytes, meta: dict):
+        data_path, meta_path = self._paths(stage_name, key)
+        data_path.parent.mkdir(parents=True, exist_ok=True)
+
+        for path, mode, content in (
+            (data_path, "wb", payload),
+            (meta_path, "w", json.dumps(meta, indent=2, default=str)),
+        ):
+            tmp_path = path.with_name(f".{path.name}.tmp-{os.getpid()}")
+            with open(tmp_path, mode) as f:
+                f.write(content)
+            os.replace(tmp_path, path)
+
+
+@dataclass
+class StageRunner:
+    """
+    Resolve stage outputs through the on-disk cache.
+
+    :param settings: dict
+                     See pipeline_settings
+    :param logger: RunLogger
+    :param cache: StageCache or None
+                  None disables the on-disk cache (everything recomputes)
+    :param force: set of str
+                  Stage names to recompute even on a cache hit ("all" for every stage)
+    :param stages: tuple of Stage
+                   DAG definition (default: STAGES)
+    :param profiler: profiling.StageProfiler or None
+                     Profile each executed stage separately
+    :param memory: dict or None
+                   In-memory store {stage: (key, outputs, output_hash)} shared by
+                   successive runners (pipeline.Pipeline); consulted before the
+                   on-disk cache and updated with every stage resolved to outputs
+    """
+    settings: dict
+    logger: RunLogger
+    cache: StageCache = None
+    force: set = field(default_factory=set)
+    stages: tuple = STAGES
+    profiler: object = None
+    memory: dict = None
+
+    def __post_init__(self):
+        self._by_name = {stage.name: stage for stage in self.stages}
+        unknown = set(self.force) - set(self._by_name) - {"all"}
+        if unknown:
+            raise ValueError(
+                f"Unknown stage(s) {sorted(unknown)}; valid stages: {', '.join(self._by_name)}"
+            )
+        self._keys = {}
+        self._hashes = {}
+        self._outputs = {}
+        self.status = {}
+
+    def _forced(self, name):
+        return "all" in self.force or name in self.force
+
+    def key(self, name):
+        """
+        Cache key of a stage: name, version, params, file fingerprints, upstream output hashes.
+        """
+        if name not in self._keys:
+            stage = self._by_name[name]
+            self._keys[name] = stable_hash({
+                "stage": stage.name,
+                "version": stage.version,
+                "params": {p: self.settings[p] for p in stage.params},
+                "files": {f: file_fingerprints(self.settings[f]) for f in stage.files},
+                "deps": {d: self.output_hash(d) for d in stage.deps},
+            })
+        return self._keys[name]
+
+    def output_hash(self, name):
+        """
+        Content hash of a stage's outputs. Executes the stage on a cache miss.
+        """
+        if name in self._hashes:
+            return self._hashes[name]
+
+        key = self.key(name)
+        kept = None if self.memory is None or self._forced(name) else self.memory.get(name)
+        if kept is not None and kept[0] == key:
+            _, self._outputs[name], self._hashes[name] = kept
+            self.status[name] = "memory"
+            self.logger.log_text(f"Stage {name}: in memory ({key[:12]})", level=DEBUG)
+            self.logger.log_json(event="stage_cache", stage=name, status="memory", key=key)
+            return self._hashes[name]
+
+        meta = None if self.cache is None or self._forced(name) else self.cache.meta(name, key)
+
+        if meta is not None:
+            self._hashes[name] = meta["output_hash"]
+            self.status[name] = "hit"
+            self.logger.log_text(f"Stage {name}: cache hit ({key[:12]})")
+            self.logger.log_json(event="stage_cache", stage=name, status="hit", key=key)
+        else:
+            self.status[name] = "forced" if self._forced(name) else "miss"
+            self._execute(name, key)
+
+        return self._hashes[name]
+
+    def _execute(self, name, key):
+        stage = self._by_name[name]
+
+        inputs = {}
+        for dep in stage.deps:
+            inputs.update(self.outputs(dep))
+
+        self.logger.log_text(f"Stage {name}: cache {self.status[name]} ({key[:12]}), executing...")
+        self.logger.log_json(event="stage_cache", stage=name, status=self.status[name], key=key)
+        self.logger.log_json(event=name)
+
+        profile = self.profiler.profile(name) if self.profiler is not None else nullcontext()
+        with self.logger.span(name, cache=self.status[name]) as span, profile:
+            outputs = stage.func(self.settings, inputs, self.logger)
+            payload, output_hash = serialize_outputs(outputs)
+            span.fields["output_bytes"] = len(payload)
+
+        if self.cache is not None:
+            self.cache.store(name, key, payload, {
+                "stage": name,
+                "key": key,
+                "output_hash": output_hash,
+                "version": stage.version,
+                "bytes": len(payload),
+            })
+
+        self._hashes[name] = output_hash
+        self._outputs[name] = outputs
+        if self.memory is not None:
+            self.memory[name] = (key, outputs, output_hash)
+
+    def seed(self, name, outputs, output_hash):
+        """
+        Provide the outputs of a stage computed elsewhere (status "shared").
+
+        Downstream cache keys use `output_hash`, so it must be the content hash
+        another runner produced for the same stage key (see StageRunner.output_hash).
+        """
+        if name not in self._by_name:
+            raise ValueError(f"Unknown stage {name!r}; valid stages: {', '.join(self._by_name)}")
+        self._outputs[name] = outputs
+        self._hashes[name] = output_hash
+        self.status[name] = "shared"
+        self.logger.log_json(event="stage_cache", stage=name, status="shared", output_hash=output_hash)
+
+    def outputs(self, name):
+        """
+        Outputs of a stage, loaded from the cache or computed.
+
+        :return outputs: dict
+        """
+        if name not in self._outputs:
+            self.output_hash(name)
+        if name not in self._outputs:
+            self.logger.log_json(event=name, cache="hit")
+            with self.logger.span(name, cache="hit"):
+                self._outputs[name] = self.cache.load(name, self.key(name))
+            if self.memory is not None:
+                self.memory[name] = (self.key(name), self._outputs[name], self._hashes[name])
+        return self._outputs[name]
+
+    def run(self, names=None):
+        """
+        Resolve the given stages (default: all) and return their merged outputs.
+
+        :return results: dict
+        """
+        results = {}
+        for name in names or self._by_name:
+            results.update(self.outputs(name))
+        return results
@@ -0,0 +1,441 @@
+"""
+Parameter sweeps: run many configuration variants in one process tree.
+
+    python -m cbspec sweep configs/*.yaml
+    python -m cbspec sweep --matrix config/sweep.yaml --workers 8
+
+Variants come from a list of YAML files and/or a matrix spec:
+
+    base: default_config.yaml        # relative to the spec file
+    matrix:                          # cartesian product of dotted-key lists
+      run.time_s: [4.0e8, 5.049216e8]
+      quality_cuts.theta_deg: [40., 45.]
+
+Instead of paying interpreter start-up and a full parquet ingestion per
+variant, the sweep
+    0. runs the preflight check (preflight.py) of every variant, so a missing
+       file or column fails the whole sweep before any ingestion,
+    1. groups variants by their parquet_ingest cache key (array type, input
+       file fingerprints, quality cuts, energy × zenith binning),
+    2. resolves parquet_ingest once per group (stage cache or ingestion) and
+       writes the event arrays to <sweep_dir>/shared/<group>/*.npy,
+    3. runs the downstream stages of every variant in a process pool; workers
+       memory-map the shared arrays and seed them into their StageRunner, so
+       stage cache keys are identical to those of a standalone run,
+    4. registers every run in <sweep_dir>/runs.sqlite and writes a summary
+       table (summary.csv, summary.json).
+
+Layout:
+
+    output/sweeps/<timestamp>/
+        runs/<variant>/      → one run directory per variant (as output/runs/<ts>)
+        logs/                → sweep-level run.log / run.jsonl (group ingestion)
+        runs.sqlite          → registry of the sweep's runs
+        summary.csv          → variant, group, varying parameters, status, counts, time
+
+Sweep runs are not published to the global output/data and output/plots
+copies (variants would overwrite each other); the stage cache is shared with
+normal runs.
+"""
+
+import csv
+import itertools
+import json
+import os
+import re
+import shutil
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from copy import deepcopy
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import yaml
+
+from .load_config import config_from_dict, load_energy_scale_config, load_mc_productions_config, load_zenith_config
+from .logging_utils import RunLogger
+from .main import run_pipeline, select_input_files, zenith_unavailable
+from .output_utils import make_unique_dir
+from .preflight import log_report, preflight
+from .run_registry import REGISTRY_FILENAME, RECORD_FILENAME, RunRegistry, flatten_config
+from .stages import StageCache, StageRunner, pipeline_settings
+
+# Outputs of the shared ingestion stage written as .npy for the workers
+SHARED_STAGE = "parquet_ingest"
+
+SUMMARY_FIELDS = ("variant", "group", "status", "n_data", "n_data_in_bins", "seconds", "run_id", "error")
+
+
+@dataclass
+class Variant:
+    """
+    One configuration of a sweep.
+
+    :param name: str
+                 Unique variant name (also its run directory name)
+    :param cfg: dict
+                Raw YAML configuration
+    :param source: str
+                   File or matrix point the variant came from
+    """
+    name: str
+    cfg: dict
+    source: str
+
+
+def _set_dotted(cfg, dotted_key, value):
+    """
+    Set cfg["a"]["b"] = value for dotted_key "a.b" (intermediate dicts are created).
+    """
+    *parents, last = dotted_key.split(".")
+    node = cfg
+    for key in parents:
+        node = node.setdefault(key, {})
+        if not isinstance(node, dict):
+            raise ValueError(f"Matrix key {dotted_key!r}: {key!r} is not a section")
+    node[last] = value
+
+
+def _safe_name(text):
+    return re.sub(r"[^A-Za-z0-9_.=+-]", "_", text)
+
+
+def expand_matrix(spec_path):
+    """
+    Variants of a matrix spec (cartesian product of the `matrix` lists).
+
+    :param spec_path: str or Path
+    :return variants: list of Variant
+    """
+    spec_path = Path(spec_path)
+    if not spec_path.exists():
+        raise FileNotFoundError(f"File {spec_path} does not exist")
+    with open(spec_path) as f:
+        spec = yaml.safe_load(f) or {}
+
+    if "base" not in spec:
+        raise ValueError(f"Matrix spec {spec_path} needs a `base` configuration file")
+    base_path = Path(spec["base"])
+    if not base_path.is_absolute():
+        base_path = spec_path.parent / base_path
+    if not base_path.exists():
+        raise FileNotFoundError(f"File {base_path} does not exist")
+    with open(base_path) as f:
+        base = yaml.safe_load(f)
+
+    matrix = spec.get("matrix") or {}
+    for key, values in matrix.items():
+        if not isinstance(values, list) or not values:
+            raise ValueError(f"Matrix entry {key!r} must be a non-empty list")
+
+    keys = list(matrix)
+    variants = []
+    for i, point in enumerate(itertools.product(*(matrix[k] for k in keys))):
+        cfg = deepcopy(base)
+        for key, value in zip(keys, point):
+            _set_dotted(cfg, key, value)
+        label = ",".join(f"{key.split('.')[-1]}={value}" for key, value in zip(keys, point))
+        name = _safe_name(f"{i:03d}_{label}" if label else f"{i:03d}")
+        variants.append(Variant(name=name, cfg=cfg, source=f"{spec_path}[{label}]"))
+    return variants
+
+
+def load_variants(config_paths=(), matrix_paths=()):
+    """
+    Variants from YAML files (one each) and matrix specs.
+
+    :param config_paths: iterable of str or Path
+    :param matrix_paths: iterable of str or Path
+    :return variants: list of Variant
+                      Names are unique (file stem, suffixed on clashes)
+    """
+    variants = []
+    for path in config_paths:
+        path = Path(path)
+        if not path.exists():
+            raise FileNotFoundError(f"File {path} does not exist")
+        with open(path) as f:
+            variants.append(Variant(name=_safe_name(path.stem), cfg=yaml.safe_load(f), source=str(path)))
+    for spec_path in matrix_paths:
+        variants += expand_matrix(spec_path)
+
+    if not variants:
+        raise ValueError("No sweep variants: pass configuration files and/or --matrix specs")
+
+    seen = {}
+    for variant in variants:
+        n = seen.get(variant.name, 0) + 1
+        seen[variant.name] = n
+        if n > 1:
+            variant.name = f"{variant.name}-{n}"
+    return variants
+
+
+def varying_parameters(variants):
+    """
+    Flattened config keys (outside `output`) whose value differs between variants.
+
+    :return keys: list of str
+    """
+    flats = [flatten_config({k: v for k, v in v.cfg.items() if k != "output"}) for v in variants]
+    keys = sorted(set().union(*flats))
+    return [k for k in keys if len({json.dumps(f.get(k), default=str) for f in flats}) > 1]
+
+
+def _variant_configs(variant):
+    array_cfg, spectrum_cfg, cuts_cfg, output_cfg, cfg = config_from_dict(deepcopy(variant.cfg))
+    select_input_files(array_cfg, cfg)
+    return array_cfg, spectrum_cfg, cuts_cfg, output_cfg, cfg
+
+
+def _share_group(runner, shared_dir, logger):
+    """
+    Resolve parquet_ingest once and write its arrays as .npy files.
+
+    :return spec: dict
+                  {"output_hash": str, "arrays": {output name: npy path},
+                  "values": {output name: value}} -- values holds the small
+                  non-array outputs (zenith_hist), handed to the workers as they are
+    """
+    outputs = runner.outputs(SHARED_STAGE)
+    shared_dir.mkdir(parents=True, exist_ok=True)
+    arrays, values = {}, {}
+    for name, value in outputs.items():
+        if not isinstance(value, np.ndarray):
+            values[name] = value
+            continue
+        path = shared_dir / f"{name}.npy"
+        np.save(path, value)
+        arrays[name] = str(path)
+    logger.log_json(event="sweep_shared", dir=str(shared_dir), arrays=sorted(arrays))
+    return {"output_hash": runner.output_hash(SHARED_STAGE), "arrays": arrays, "values": values}
+
+
+def _run_variant(task):
+    """
+    Process-pool worker: run the downstream stages of one variant.
+
+    :param task: dict
+                 variant, shared, sweep_dir, use_cache, make_plots, write_csv, force_stages
+    :return row: dict
+                 Summary fields plus the run directory
+    """
+    variant = task["variant"]
+    t0 = time.monotonic()
+    row = {"variant": variant.name, "group": task["group"], "status": "completed", "error": None}
+    try:
+        array_cfg, spectrum_cfg, cuts_cfg, output_cfg, cfg = _variant_configs(variant)
+        output_cfg.runs_dir = Path(task["sweep_dir"]) / "runs"
+        output_cfg.base_dir = Path(task["sweep_dir"])
+        output_cfg.plot_workers = 0  # parallelism is across variants
+        output_cfg.progress = "off"
+        if task["write_csv"] is False:
+            output_cfg.write_csv = False
+
+        shared = task["shared"]
+        ingest_outputs = {**shared["values"],
+                          **{name: np.load(path, mmap_mode="r") for name, path in shared["arrays"].items()}}
+
+        results = run_pipeline(
+            array_cfg=array_cfg,
+            spectrum_cfg=spectrum_cfg,
+            cuts_cfg=cuts_cfg,
+            output_cfg=output_cfg,
+            cfg=cfg,
+            energy_scale_cfg=load_energy_scale_config(cfg),
+            force_stages=task["force_stages"],
+            use_cache=task["use_cache"],
+            make_plots=task["make_plots"],
+            run_name=variant.name,
+            shared_stages={SHARED_STAGE: (ingest_outputs, shared["output_hash"])},
+            publish=False,
+            register=False,
+        )
+        row["run_dir"] = str(results["run_dir"])
+        row["run_id"] = results["run_dir"].name
+        row["n_data_in_bins"] = float(np.sum(results["dt_counts"]))
+    except Exception as exc:
+        row["status"] = "failed"
+        row["error"] = f"{type(exc).__name__}: {exc}"
+        row["traceback"] = traceback.format_exc()
+    row["seconds"] = time.monotonic() - t0
+    return row
+
+
+def run_sweep(
+        variants,
+        sweep_dir=None,
+        max_workers=None,
+        use_cache=True,
+        make_plots=True,
+        write_csv=None,
+        force_stages=(),
+        keep_shared=False,
+):
+    """
+    Run all variants, sharing the parquet ingestion within each input group.
+
+    :param variants: list of Variant
+                     See load_variants
+    :param sweep_dir: str or Path, optional
+                      Sweep directory (default: <base_dir of the first variant>/sweeps/<timestamp>)
+    :param max_workers: int, optional
+                        Worker processes (default: min(variants, CPUs); 0 or 1: serial)
+    :param use_cache: bool
+                      Use the stage cache (output.cache_dir of each variant)
+    :param make_plots: bool
+                       Render plots in every run
+    :param write_csv: bool, optional
+                      Override output.write_csv of every variant
+    :param force_stages: iterable of str
+                         Stages to recompute ("all" for every stage); forcing
+                         parquet_ingest re-ingests each group once
+    :param keep_shared: bool
+                        Keep the shared .npy event arrays after the sweep
+    :return summary: list of dict
+                     One row per variant (see SUMMARY_FIELDS) plus the varying
+                     parameters; also written to summary.csv/summary.json
+    :return sweep_dir: Path
+    """
+    configs = {v.name: _variant_configs(v) for v in variants}
+
+    if sweep_dir is None:
+        base_dir = configs[variants[0].name][3].base_dir
+        sweep_dir = make_unique_dir(Path(base_dir) / "sweeps", datetime.now().strftime("%Y%m%d-%H%M%S"))
+    sweep_dir = Path(sweep_dir)
+    sweep_dir.mkdir(parents=True, exist_ok=True)
+
+    logger = RunLogger(sweep_dir / "logs")
+    logger.log_text(f"Starting cbspec sweep: {len(variants)} variants → {sweep_dir}")
+    logger.log_json(event="sweep_start", n_variants=len(variants), dir=str(sweep_dir))
+
+    # 0. Preflight every variant before ingesting anything
+    failures = []
+    reports = {}
+    for variant in variants:
+        array_cfg, spectrum_cfg, cuts_cfg, _, cfg = configs[variant.name]
+        report = preflight(array_cfg, spectrum_cfg, cuts_cfg, load_energy_scale_config(cfg),
+                           load_mc_productions_config(cfg, array_cfg.array_type))
+        log_report(report, logger)
+        reports[variant.name] = report
+        failures += [f"{variant.name}: {error}" for error in report["errors"]]
+    if failures:
+        logger.close()
+        raise ValueError(f"Sweep preflight failed ({len(failures)} error(s)):\n  - " + "\n  - ".join(failures))
+
+    # 1. Group variants by their parquet_ingest cache key
+    runners = {}
+    groups = {}
+    for variant in variants:
+        array_cfg, spectrum_cfg, cuts_cfg, output_cfg, cfg = configs[variant.name]
+        productions_cfg = load_mc_productions_config(cfg, array_cfg.array_type)
+        # parquet_ingest also fills the energy × zenith histograms (as run_pipeline decides)
+        zenith_cfg = load_zenith_config(cfg)
+        if zenith_unavailable(reports[variant.name], productions_cfg) is not None:
+            zenith_cfg = None
+        runner = StageRunner(
+            settings=pipeline_settings(
+                array_cfg,
+                spectrum_cfg,
+                cuts_cfg,
+                load_energy_scale_config(cfg),
+                progress=output_cfg.progress,
+                heartbeat_s=output_cfg.heartbeat_s,
+                zenith=zenith_cfg,
+                mc_productions=productions_cfg,
+                jit=output_cfg.jit,
+            ),
+            logger=logger,
+            cache=StageCache(output_cfg.cache_dir / "stages") if use_cache else None,
+            force=set(force_stages or ()) & {SHARED_STAGE, "all"},
+        )
+        group = runner.key(SHARED_STAGE)[:12]
+        runners.setdefault(group, runner)
+        groups.setdefault(group, []).append(variant)
+
+    logger.log_text(f"{len(groups)} ingestion group(s): "
+                    + ", ".join(f"{g} ({len(vs)} variants)" for g, vs in groups.items()))
+
+    # 2. Ingest (or load from the cache) once per group
+    shared = {}
+    for group in list(runners):
+        runner = runners.pop(group)  # drop the in-memory arrays; workers read the .npy copies
+        logger.log_text(f"Group {group}: resolving {SHARED_STAGE}...")
+        with logger.span("sweep_ingest", group=group, n_variants=len(groups[group])):
+            shared[group] = _share_group(runner, sweep_dir / "shared" / group, logger)
+
+    # 3. Downstream stages of every variant in a process pool
+    downstream_force = tuple(s for s in (force_stages or ()) if s != SHARED_STAGE)
+    tasks = [
+        {
+            "variant": variant,
+            "group": group,
+            "shared": shared[group],
+            "sweep_dir": str(sweep_dir),
+            "use_cache": use_cache,
+            "make_plots": make_plots,
+            "write_csv": write_csv,
+            "force_stages": downstream_force,
+        }
+        for group, members in groups.items()
+        for variant in members
+    ]
+    if max_workers is None:
+        max_workers = min(len(tasks), os.cpu_count() or 1)
+
+    logger.log_text(f"Running {len(tasks)} variants with {max(max_workers, 1)} worker(s)...")
+    rows = []
+    with logger.span("sweep_runs", n_variants=len(tasks), workers=max(max_workers, 1)):
+        if max_workers <= 1:
+            results = map(_run_variant, tasks)
+        else:
+            pool = ProcessPoolExecutor(max_workers=max_workers)
+            results = pool.map(_run_variant, tasks)
+        for row in results:
+            rows.append(row)
+            logger.log_text(f"Variant {row['variant']}: {row['status']} in {row['seconds']:.2f} s"
+                            + (f" ({row['error']})" if row["error"] else ""))
+            logger.log_json(event="sweep_variant", **{k: row.get(k) for k in SUMMARY_FIELDS})
+            if row.get("traceback"):
+                logger.log_text(row["traceback"])
+        if max_workers > 1:
+            pool.shutdown()
+
+    # 4. Register the runs and write the summary table
+    varying = varying_parameters(variants)
+    flat = {v.name: flatten_config(v.cfg) for v in variants}
+    summary = []
+    with RunRegistry(sweep_dir / REGISTRY_FILENAME) as registry:
+        for row in rows:
+            record_path = Path(row["run_dir"]) / RECORD_FILENAME if row.get("run_dir") else None
+            if record_path is not None and record_path.exists():
+                with open(record_path) as f:
+                    record = json.load(f)
+                registry.register(record)
+                row["n_data"] = record["counts"]["n_data"]
+            summary.append({
+                **{k: row.get(k) for k in SUMMARY_FIELDS},
+                **{k: flat[row["variant"]].get(k) for k in varying},
+            })
+
+    columns = list(SUMMARY_FIELDS[:2]) + varying + list(SUMMARY_FIELDS[2:])
+    with open(sweep_dir / "summary.csv", "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=columns)
+        writer.writeheader()
+        writer.writerows(summary)
+    with open(sweep_dir / "summary.json", "w") as f:
+        json.dump({"varying": varying, "variants": summary}, f, indent=2, default=str)
+
+    if not keep_shared:
+        shutil.rmtree(sweep_dir / "shared", ignore_errors=True)
+
+    n_failed = sum(row["status"] != "completed" for row in summary)
+    logger.log_text(f"Sweep finished: {len(summary) - n_failed} completed, {n_failed} failed. "
+                    f"Summary: {sweep_dir / 'summary.csv'}")
+    logger.log_json(event="sweep_end", n_completed=len(summary) - n_failed, n_failed=n_failed)
+    logger.close()
+
+    return summary, sweep_dir
@@ -0,0 +1,393 @@
+"""
+Synthetic resTree/tTlfit parquet datasets for scale testing.
+
+    python -m cbspec synth --kind mc --rows 1e8 --shards 16 --workers 16
+    python -m cbspec synth --tree_type tTlfit --kind data --rows 1e6 --output_dir output/synth
+
+The files use the column layout process_data.TREE_SCHEMAS expects, so they
+feed set_up_energy_array, preflight and the benchmarks unchanged:
+
+    resTree → list<double> energy/sc/dsc/ldfchi2 (3 elements) and gfchi2/theta/pderr
+              (3 elements, the pipeline reads element 2), nstclust, bdist [km]
+    tTlfit  → flat energy_s800_p/sc/dsc/ngsd/ldfchi2pdof, bdist [m],
+              list<double> gfchi2pdof/theta/pderr (2 elements, element 1 is read)
+
+Energies (energy, energy_s800_p, mcenergy) are stored in EeV times
+constants.fd_energy_corr, as in the TA dumps.
+
+Event model:
+    1. true log10(E/eV) from a broken power law dN/dE ∝ E^-γ_k between
+       `breaks`, continuous at every break (inverse CDF per segment)
+    2. isotropic arrival directions on a flat detector: sin²θ uniform up to
+       theta_max_deg (projected solid angle π sin²θ_max = 3π/4 for 60°)
+    3. cores uniform over a disk of radius THROW_RADIUS_KM (the default
+       generated area π (25 km)²); the array is a disk of ARRAY_RADIUS_KM and
+       bdist is the core's distance to its edge
+    4. simple detector response: logistic trigger efficiency in energy (core
+       inside the array required), Poisson ngsd growing with energy,
+       log-normal energy smearing (σ = resolution, wider below 10^18.5 eV),
+       Gaussian zenith smearing, χ²/dof fit qualities and S800 errors that
+       shrink with ngsd
+
+MC files hold every thrown event (untriggered ones have ngsd = 0 and fail
+the cuts); data files hold triggered events only, with mcenergy = 0.
+
+Generation is vectorized in chunks of row_group_size rows, each written as
+one row group, so memory stays bounded by one chunk. Shards are independent
+files with their own random streams (SeedSequence.spawn) and can be written
+in parallel processes.
+"""
+
+import json
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, replace
+from pathlib import Path
+
+import numpy as np
+
+from .constants import EeV_corr, fd_energy_corr
+from .data_classes import SynthConfig
+
+TREE_TYPES = ("resTree", "tTlfit")
+KINDS = ("mc", "data")
+
+# Throw disk (π (25 km)² = SpectrumConfig.generated_area_m2 default) and array disk
+THROW_RADIUS_KM = 25.
+ARRAY_RADIUS_KM = 15.
+
+# Trigger efficiency: logistic in log10(E/eV)
+TRIGGER_LOG_E50 = 18.2
+TRIGGER_WIDTH = 0.1
+
+# Zenith-angle resolution [deg]
+THETA_RESOLUTION_DEG = 1.5
+
+# Parquet key-value metadata entry holding the SynthConfig of a file
+METADATA_KEY = b"cbspec.synth"
+
+
+def validate_config(cfg: SynthConfig):
+    """
+    Raise ValueError for settings the generator cannot honour.
+    """
+    if cfg.tree_type not in TREE_TYPES:
+        raise ValueError(f"Unknown tree type {cfg.tree_type!r}; use one of {', '.join(TREE_TYPES)}")
+    if cfg.kind not in KINDS:
+        raise ValueError(f"Unknown kind {cfg.kind!r}; use one of {', '.join(KINDS)}")
+    if cfg.rows < 0 or cfg.row_group_size < 1 or cfg.shards < 1:
+        raise ValueError(
+            f"rows must be >= 0 and row_group_size/shards >= 1, got {cfg.rows}/{cfg.row_group_size}/{cfg.shards}"
+        )
+    if not cfg.log_e_min < cfg.log_e_max:
+        raise ValueError(f"log_e_min must be below log_e_max, got {cfg.log_e_min} >= {cfg.log_e_max}")
+    if len(cfg.indices) != len(cfg.breaks) + 1:
+        raise ValueError(f"Need one more spectral index than breaks, got {len(cfg.indices)} and {len(cfg.breaks)}")
+    if list(cfg.breaks) != sorted(cfg.breaks):
+        raise ValueError(f"breaks must be increasing, got {list(cfg.breaks)}")
+    if not 0 < cfg.theta_max_deg <= 90:
+        raise ValueError(f"theta_max_deg must be in (0, 90], got {cfg.theta_max_deg}")
+
+
+def power_law_segments(log_e_min, log_e_max, breaks, indices):
+    """
+    Segments of a continuous broken power law dN/dE ∝ E^-γ_k.
+
+    :return lo, hi: np.ndarray
+                    Segment edges in E/EeV (empty segments outside the range
+                    have lo == hi)
+    :return gamma: np.ndarray
+                   Spectral index per segment
+    :return prob: np.ndarray
+                  Fraction of events per segment
+    """
+    edges = np.clip(np.concatenate([[log_e_min], breaks, [log_e_max]]), log_e_min, log_e_max)
+    x = 10 ** (edges - EeV_corr)
+    lo, hi = x[:-1], x[1:]
+    gamma = np.asarray(indices, dtype=float)
+
+    # Normalizations continuous at the breaks: A_{k+1} = A_k b^(γ_{k+1} - γ_k)
+    log_norm = np.zeros(len(gamma))
+    for k in range(1, len(gamma)):
+        log_norm[k] = log_norm[k - 1] + (gamma[k] - gamma[k - 1]) * np.log(lo[k])
+
+    integral = np.empty(len(gamma))
+    for k, g in enumerate(gamma):
+        if hi[k] <= lo[k]:
+            integral[k] = 0.
+        elif g == 1:
+            integral[k] = np.exp(log_norm[k]) * np.log(hi[k] / lo[k])
+        else:
+            integral[k] = np.exp(log_norm[k]) * (hi[k] ** (1 - g) - lo[k] ** (1 - g)) / (1 - g)
+    return lo, hi, gamma, integral / integral.sum()
+
+
+def sample_broken_power_law(n, rng, log_e_min, log_e_max, breaks, indices):
+    """
+    True log10(E/eV) of n events (inverse CDF within a randomly chosen segment).
+    """
+    lo, hi, gamma, prob = power_law_segments(log_e_min, log_e_max, breaks, indices)
+    seg = rng.choice(len(prob), size=n, p=prob)
+    u = rng.random(n)
+    lo, hi, g = lo[seg], hi[seg], gamma[seg]
+
+    x = np.empty(n)
+    log_case = g == 1
+    p = 1 - g[~log_case]
+    a, b = lo[~log_case] ** p, hi[~log_case] ** p
+    x[~log_case] = (a + u[~log_case] * (b - a)) ** (1 / p)
+    x[log_case] = lo[log_case] * (hi[log_case] / lo[log_case]) ** u[log_case]
+    return np.log10(x) + EeV_corr
+
+
+def throw(n, rng, cfg: SynthConfig, core_radius_km=THROW_RADIUS_KM):
+    """
+    True energies, core positions and trigger decisions of n thrown events.
+
+    :param core_radius_km: float
+                           Radius of the disk the cores are drawn from
+    :return log_e: np.ndarray
+                   True log10(E/eV)
+    :return bdist_km: np.ndarray
+                      Core distance to the array edge (negative outside)
+    :return triggered: np.ndarray of bool
+    """
+    log_e = sample_broken_power_law(n, rng, cfg.log_e_min, cfg.log_e_max, cfg.breaks, cfg.indices)
+    bdist_km = ARRAY_RADIUS_KM - core_radius_km * np.sqrt(rng.random(n))
+    efficiency = 1 / (1 + np.exp(-(log_e - TRIGGER_LOG_E50) / TRIGGER_WIDTH))
+    triggered = (bdist_km > 0) & (rng.random(n) < efficiency)
+    return log_e, bdist_km, triggered
+
+
+def detector_response(log_e, triggered, rng, cfg: SynthConfig):
+    """
+    Reconstructed quantities of thrown events (see module docstring).
+
+    :return events: dict of np.ndarray
+                    log_e_reco, theta (deg, uncorrected), ngsd, pderr, gf, ldf, sc, dsc
+    """
+    n = len(log_e)
+
+    sin2_max = math.sin(math.radians(cfg.theta_max_deg)) ** 2
+    theta_true = np.degrees(np.arcsin(np.sqrt(rng.random(n) * sin2_max)))
+    theta = np.abs(theta_true + rng.normal(0., THETA_RESOLUTION_DEG, n))
+
+    ngsd = rng.poisson(3 + 6 * 10 ** (0.9 * (log_e - 18.5)))
+    ngsd = np.where(triggered, np.maximum(ngsd, 3), 0).astype(np.int32)
+
+    sigma = cfg.resolution * np.sqrt(1 + 10 ** (18.5 - log_e))
+    log_e_reco = log_e + rng.normal(0., 1., n) * sigma / np.log(10)
+
+    k = np.maximum(ngsd - 4, 1)
+    gf = rng.gamma(k / 2, 2 / k)
+    ldf = rng.gamma(k / 2, 2 / k)
+    pderr = rng.exponential(8 / np.sqrt(ngsd + 1))
+
+    sc = 10 * 10 ** (log_e_reco - 19)
+    fs800 = 0.4 / np.sqrt(ngsd + 1) * np.exp(rng.normal(0., 0.3, n))
+
+    return {
+        "log_e_reco": log_e_reco,
+        "theta": theta,
+        "ngsd": ngsd,
+        "pderr": pderr,
+        "gf": gf,
+        "ldf": ldf,
+        "sc": sc,
+        "dsc": sc * fs800,
+    }
+
+
+def _draw(n, rng, cfg: SynthConfig):
+    """
+    n rows of cfg.kind: thrown events (mc) or triggered events only (data).
+
+    Data events are thrown onto the array disk only (cores outside never
+    trigger) and the response is computed for the triggered ones only.
+    """
+    if cfg.kind == "mc":
+        log_e, bdist_km, triggered = throw(n, rng, cfg)
+    else:
+        log_e, bdist_km = [], []
+        thrown, have = 0, 0
+        while have < n:
+            # Throw enough events for the missing rows at the acceptance seen so far
+            acceptance = max(have / thrown, 1e-3) if thrown else 0.05
+            size = min(int((n - have) / acceptance * 1.1) + 1024, 10 * max(cfg.row_group_size, n))
+            e, d, keep = throw(size, rng, cfg, core_radius_km=ARRAY_RADIUS_KM)
+            log_e.append(e[keep])
+            bdist_km.append(d[keep])
+            thrown += size
+            have += int(keep.sum())
+        log_e, bdist_km = np.concatenate(log_e)[:n], np.concatenate(bdist_km)[:n]
+        triggered = np.ones(n, dtype=bool)
+
+    events = detector_response(log_e, triggered, rng, cfg)
+    events["log_e"] = log_e
+    events["bdist_km"] = bdist_km
+    return events
+
+
+def _list_column(values, width):
+    """
+    Arrow list<double> column repeating each value `width` times.
+    """
+    import pyarrow as pa
+
+    offsets = np.arange(0, len(values) * width + 1, width, dtype=np.int32)
+    return pa.ListArray.from_arrays(pa.array(offsets), pa.array(np.repeat(values.astype(float), width)))
+
+
+def make_table(n, rng, cfg: SynthConfig):
+    """
+    One chunk of n synthetic rows as a pyarrow.Table in cfg.tree_type layout.
+    """
+    import pyarrow as pa
+
+    ev = _draw(n, rng, cfg)
+    energy = 10 ** (ev["log_e_reco"] - EeV_corr) * fd_energy_corr
+    mcenergy = 10 ** (ev["log_e"] - EeV_corr) * fd_energy_corr if cfg.kind == "mc" else np.zeros(n)
+
+    if cfg.tree_type == "resTree":
+        columns = {
+            "energy": _list_column(energy, 3),
+            "sc": _list_column(ev["sc"], 3),
+            "dsc": _list_column(ev["dsc"], 3),
+            "theta": _list_column(ev["theta"], 3),
+            "pderr": _list_column(ev["pderr"], 3),
+            "gfchi2": _list_column(ev["gf"], 3),
+            "ldfchi2": _list_column(ev["ldf"], 3),
+            "nstclust": ev["ngsd"],
+            "bdist": ev["bdist_km"],
+            "mcenergy": mcenergy,
+        }
+    else:
+        columns = {
+            "energy_s800_p": energy,
+            "sc": ev["sc"],
+            "dsc": ev["dsc"],
+            "ngsd": ev["ngsd"],
+            "bdist": ev["bdist_km"] * 1000,
+            "ldfchi2pdof": ev["ldf"],
+            "gfchi2pdof": _list_column(ev["gf"], 2),
+            "theta": _list_column(ev["theta"], 2),
+            "pderr": _list_column(ev["pderr"], 2),
+            "mcenergy": mcenergy,
+        }
+    return pa.table(columns)
+
+
+def write_parquet(path, cfg: SynthConfig, rows=None, seed_sequence=None):
+    """
+    Write one synthetic parquet file chunk by chunk (one row group per chunk).
+
+    :param path: str or Path
+    :param cfg: SynthConfig
+    :param rows: int, optional
+                 Rows of this file (default: cfg.rows)
+    :param seed_sequence: np.random.SeedSequence, optional
+                          Random stream of this file (default: from cfg.seed)
+    :return info: dict
+                  path, rows, row_groups, bytes, seconds
+    """
+    import pyarrow.parquet as pq
+
+    validate_config(cfg)
+    path = Path(path)
+    rows = cfg.rows if rows is None else rows
+    rng = np.random.default_rng(seed_sequence if seed_sequence is not None else cfg.seed)
+    metadata = {METADATA_KEY: json.dumps(asdict(cfg)).encode()}
+
+    t0 = time.perf_counter()
+    writer = None
+    row_groups = 0
+    try:
+        for start in range(0, max(rows, 1), cfg.row_group_size):
+            table = make_table(min(cfg.row_group_size, rows - start), rng, cfg)
+            if writer is None:
+                writer = pq.ParquetWriter(
+                    path, table.schema.with_metadata(metadata), compression=cfg.compression
+                )
+            writer.write_table(table.replace_schema_metadata(metadata), row_group_size=cfg.row_group_size)
+            row_groups += 1
+    finally:
+        if writer is not None:
+            writer.close()
+
+    return {
+        "path": str(path),
+        "rows": rows,
+        "row_groups": row_groups,
+        "bytes": path.stat().st_size,
+        "seconds": time.perf_counter() - t0,
+    }
+
+
+def _write_shard(task):
+    """
+    Process-pool worker: (path, cfg, rows, seed_sequence) → write_parquet info.
+    """
+    return write_parquet(*task)
+
+
+def shard_paths(output_dir, cfg: SynthConfig, prefix=None):
+    """
+    Output files: <prefix>.parquet, or <prefix>_0000.parquet ... for several shards.
+    """
+    prefix = prefix or f"{cfg.tree_type}_{cfg.kind}"
+    output_dir = Path(output_dir)
+    if cfg.shards == 1:
+        return [output_dir / f"{prefix}.parquet"]
+    return [output_dir / f"{prefix}_{i:04d}.parquet" for i in range(cfg.shards)]
+
+
+def generate(cfg: SynthConfig, output_dir, prefix=None, max_workers=None):
+    """
+    Write a synthetic dataset of cfg.rows rows split over cfg.shards files.
+
+    :param cfg: SynthConfig
+    :param output_dir: str or Path
+                       Created if missing
+    :param prefix: str, optional
+                   Filename prefix (default: "<tree_type>_<kind>")
+    :param max_workers: int, optional
+                        Processes writing shards in parallel (None: one per
+                        shard, capped at the CPU count; 0 or 1: serial)
+    :return files: list of dict
+                   write_parquet info per shard
+    """
+    validate_config(cfg)
+    Path(output_dir).mkdir(parents=True, exist_ok=True)
+
+    paths = shard_paths(output_dir, cfg, prefix)
+    per_shard, extra = divmod(cfg.rows, cfg.shards)
+    # Independent, reproducible stream per (seed, tree type, kind, shard)
+    streams = np.random.SeedSequence(
+        [cfg.seed, TREE_TYPES.index(cfg.tree_type), KINDS.index(cfg.kind)]
+    ).spawn(cfg.shards)
+    tasks = [
+        (path, cfg, per_shard + (i < extra), stream)
+        for i, (path, stream) in enumerate(zip(paths, streams))
+    ]
+
+    if max_workers is None:
+        max_workers = min(len(tasks), os.cpu_count() or 1)
+    if max_workers <= 1:
+        return [_write_shard(task) for task in tasks]
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        return list(pool.map(_write_shard, tasks))
+
+
+def read_synth_config(path):
+    """
+    SynthConfig stored in a synthetic file's metadata (None for other files).
+    """
+    import pyarrow.parquet as pq
+
+    metadata = pq.read_schema(path).metadata or {}
+    if METADATA_KEY not in metadata:
+        return None
+    values = json.loads(metadata[METADATA_KEY])
+    return replace(SynthConfig(), **{k: tuple(v) if isinstance(v, list) else v for k, v in values.items()})
@@ -0,0 +1,175 @@
+"""
+Energy-scale systematic scan in log10(E/eV) space.
+
+The FD energy correction is a division, E = E_SD / fd_energy_corr, so in log
+space every energy-scale variation is a constant shift:
+
+    log10(s × E) = log10(E) + log10(s)
+
+This module reuses the log energies produced once by the ingestion pass and,
+for a list of scale factors s_k, re-histograms them for all scales at once:
+
+    1. Shift the cached log energies by log10(s_k)           (k = 0..K-1)
+    2. Compute bin indices for every (scale, event) pair
+    3. Fill one flattened histogram with a single np.bincount
+
+The resulting (K, n_bins) count matrix is pushed through the standard
+aperture → exposure → Feldman-Cousins → flux → spectrum chain, one row per
+scale, and the per-bin envelope over all scales forms the systematic band.
+"""
+
+import numpy as np
+
+from .binning import filter_bins, energy_conv
+from .exposure import compute_aperture, compute_exposure
+from .feldman_cousins import feldman_cousins_vector
+from .flux import compute_flux
+from .spectrum import flux_to_spectrum
+from .data_classes import EnergyScaleConfig
+
+
+def histogram_energy_scale_scan(log_energy, edges, scales, chunk_size=1_000_000):
+    """
+    Histogram log10(E/eV) values for several energy-scale factors in one pass.
+
+    :param log_energy: array-like
+                       Nominal log10(E/eV) values (after FD energy correction)
+    :param edges: array-like
+                  Bin edges in log10(E/eV)
+    :param scales: array-like
+                   Multiplicative energy-scale factors (1.0 = nominal)
+    :param chunk_size: int, optional
+                       Number of events shifted at once. Bounds the size of the
+                       (n_scales, chunk_size) temporary index array.
+    :return counts: np.ndarray
+                    Counts with shape (n_scales, n_bins)
+
+    Notes:
+        - Binning follows np.histogram: bins are half-open [lo, hi) except the
+          last bin, which also includes its upper edge.
+    """
+    log_energy = np.asarray(log_energy, dtype=float).ravel()
+    edges = np.asarray(edges, dtype=float)
+    log_shifts = np.log10(np.asarray(scales, dtype=float))
+
+    n_scales = len(log_shifts)
+    n_bins = len(edges) - 1
+    offsets = (np.arange(n_scales) * n_bins)[:, None]
+
+    counts = np.zeros(n_scales * n_bins, dtype=np.int64)
+
+    for start in range(0, len(log_energy), chunk_size):
+        chunk = log_energy[start:start + chunk_size]
+
+        # (n_scales, n_chunk) shifted log energies → bin indices
+        shifted = chunk[None, :] + log_shifts[:, None]
+        idx = np.searchsorted(edges, shifted, side="right") - 1
+
+        # Upper edge belongs to the last bin (np.histogram convention)
+        idx[shifted == edges[-1]] = n_bins - 1
+
+        valid = (idx >= 0) & (idx < n_bins)
+        counts += np.bincount((idx + offsets)[valid], minlength=n_scales * n_bins)
+
+    return counts.reshape(n_scales, n_bins)
+
+
+def run_energy_scale_scan(
+        mc_array,
+        dt_array,
+        mc_thrown_array,
+        edges,
+        centers,
+        widths,
+        spectrum_cfg,
+        escale_cfg: EnergyScaleConfig,
+        cl=0.68,
+):
+    """
+    Compute flux and spectrum for every energy-scale factor.
+
+    :param mc_array: np.ndarray
+                     MC reconstructed log10(E/eV)
+    :param dt_array: np.ndarray
+                     Data reconstructed log10(E/eV)
+    :param mc_thrown_array: np.ndarray
+                            MC thrown log10(E/eV). Never shifted -- the thrown
+                            energies are the MC truth.
+    :param edges: np.ndarray
+                  Bin edges in log10(E/eV)
+    :param centers: np.ndarray
+                    Bin centers in log10(E/eV)
+    :param widths: np.ndarray
+                   Bin widths in log10(E/eV)
+    :param spectrum_cfg: SpectrumConfig
+                         Geometry and run time
+    :param escale_cfg: EnergyScaleConfig
+                       Scale factors and whether to shift MC reconstruction
+    :param cl: float, optional
+               Feldman-Cousins confidence level
+    :return scan: dict
+                  Per-scale results stacked along axis 0 plus the shared
+                  filtered centers/widths and the bin mask
+    """
+    scales = np.asarray(escale_cfg.scales, dtype=float)
+
+    # Data (and optionally MC reco) are shifted; thrown MC is shared
+    dt_counts = histogram_energy_scale_scan(dt_array, edges, scales)
+    if escale_cfg.apply_to_mc:
+        mc_counts = histogram_energy_scale_scan(mc_array, edges, scales)
+    else:
+        mc_counts = np.broadcast_to(
+            histogram_energy_scale_scan(mc_array, edges, [1.0]), dt_counts.shape
+        )
+    mc_thrown_counts = histogram_energy_scale_scan(mc_thrown_array, edges, [1.0])[0]
+
+    # The bin mask depends only on centers and thrown counts → same for all scales
+    mask, _, _, mc_thrown_counts_f, centers_f = filter_bins(
+        mc_counts[0], dt_counts[0], mc_thrown_counts, centers
+    )
+    widths_f = widths[mask]
+    energies_ev, delta_energies_ev = energy_conv(centers_f, widths_f)
+
+    dt_counts_f = dt_counts[:, mask].astype(float)
+    mc_counts_f = mc_counts[:, mask].astype(float)
+
+    aperture = compute_aperture(
+        mc_counts_f,
+        np.broadcast_to(mc_thrown_counts_f, mc_counts_f.shape),
+        spectrum_cfg.generated_area_m2,
+        spectrum_cfg.generated_solid_angle_sr,
+    )
+    exposure = compute_exposure(aperture, spectrum_cfg.run_time_s)
+
+    flux = compute_flux(dt_counts_f, exposure, delta_energies_ev[None, :])
+
+    fc_lower = np.zeros_like(dt_counts_f)
+    fc_upper = np.zeros_like(dt_counts_f)
+    for k in range(len(scales)):
+        fc_lower[k], fc_upper[k] = feldman_cousins_vector(dt_counts_f[k], cl=cl)
+
+    flux_lower = compute_flux(fc_lower, exposure, delta_energies_ev[None, :])
+    flux_upper = compute_flux(fc_upper, exposure, delta_energies_ev[None, :])
+
+    spectrum, spectrum_lower, spectrum_upper = flux_to_spectrum(
+        energies_ev[None, :], flux, flux_lower, flux_upper
+    )
+
+    return {
+        "scales": scales,
+        "mask": mask,
+        "centers": centers_f,
+        "widths": widths_f,
+        "dt_counts": dt_counts_f,
+        "mc_counts": mc_counts_f,
+        "mc_thrown_counts": mc_thrown_counts_f,
+        "aperture": aperture,
+        "exposure": exposure,
+        "flux": flux,
+        "flux_lower": flux_lower,
+        "flux_upper": flux_upper,
+        "spectrum": spectrum,
+        "spectrum_lower": spectrum_lower,
+        "spectrum_upper": spectrum_upper,
+    }
+